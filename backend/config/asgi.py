@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Each process builds the in-memory recipe indexes in the background from its first request.
+from recipes.services import warm_indexes  # noqa: E402 - needs the app registry
+
+warm_indexes()
@@ -16,7 +16,6 @@ from pathlib import Path
 
 import dj_database_url
 from dotenv import load_dotenv
-from urllib.parse import urlparse, urlunparse
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -56,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'recipes.profiling.profiling_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -105,31 +105,127 @@ DATABASES = {
     )
 }
 
-if _database_url:
-    parsed_url = urlparse(_database_url)
-    netloc = parsed_url.netloc
-    if parsed_url.username or parsed_url.password:
-        username = parsed_url.username or ""
-        host = parsed_url.hostname or ""
-        port = f":{parsed_url.port}" if parsed_url.port else ""
-        netloc = f"{username}:***@{host}{port}"
-    masked_url = urlunparse(
-        (
-            parsed_url.scheme,
-            netloc,
-            parsed_url.path,
-            parsed_url.params,
-            parsed_url.query,
-            parsed_url.fragment,
-        )
-    )
-    print(f"[config] DATABASE_URL={masked_url}")
+# Host-local cache shared by every worker process: a memory-mapped file under
+# SHARED_CACHE_DIR (use tmpfs, e.g. /dev/shm/recipes-cache). Empty keeps Django's
+# per-process LocMemCache. Entries larger than a slot are not cached.
+SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR", "")
+SHARED_CACHE_SLOTS = int(os.getenv("SHARED_CACHE_SLOTS", "4096"))
+SHARED_CACHE_SLOT_BYTES = int(os.getenv("SHARED_CACHE_SLOT_BYTES", "16384"))
+if SHARED_CACHE_DIR and not IS_TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'recipes.cache_backends.SharedMemoryCache',
+            'LOCATION': SHARED_CACHE_DIR,
+            'OPTIONS': {'SLOTS': SHARED_CACHE_SLOTS, 'SLOT_SIZE': SHARED_CACHE_SLOT_BYTES},
+        }
+    }
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 
+PROFILE_CACHE_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+GENERATION_CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", "86400"))
+# Compiled nutrient table; built from recipes/data/nutrients.csv on first use if missing.
+NUTRIENT_TABLE_PATH = os.getenv("NUTRIENT_TABLE_PATH") or str(BASE_DIR / "recipes" / "data" / "nutrients.bin")
+
+# Minimum weighted Jaccard similarity between pantry and a stored recipe for it to be reused.
+PANTRY_REUSE_THRESHOLD = float(os.getenv("PANTRY_REUSE_THRESHOLD", "0.6"))
+PANTRY_INDEX_TTL_SECONDS = int(os.getenv("PANTRY_INDEX_TTL_SECONDS", "900"))
+# A cached or stored recipe adapted by ingredient substitution is served instead of a
+# new generation when the product of the substitution weights reaches this.
+SUBSTITUTION_MIN_CONFIDENCE = float(os.getenv("SUBSTITUTION_MIN_CONFIDENCE", "0.6"))
+
+# Estimated Jaccard similarity (MinHash) at which a new recipe is linked to an existing one.
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+NEAR_DUPLICATE_INDEX_TTL_SECONDS = int(os.getenv("NEAR_DUPLICATE_INDEX_TTL_SECONDS", "900"))
+
+# Token buckets for the generation endpoints ("<count>/<s|min|hour|day>"; empty disables).
+SUGGESTION_RATE_USER = os.getenv("SUGGESTION_RATE_USER", "20/min")
+SUGGESTION_RATE_ANON = os.getenv("SUGGESTION_RATE_ANON", "5/min")
+# recipes.throttling.CacheBucketStore shares buckets between workers through the Django cache.
+THROTTLE_BUCKET_STORE = os.getenv("THROTTLE_BUCKET_STORE", "recipes.throttling.LocalBucketStore")
+# Daily LLM tokens per user / per anonymous IP, reset at midnight UTC (0 disables).
+LLM_DAILY_TOKEN_QUOTA_USER = int(os.getenv("LLM_DAILY_TOKEN_QUOTA_USER", "200000"))
+LLM_DAILY_TOKEN_QUOTA_ANON = int(os.getenv("LLM_DAILY_TOKEN_QUOTA_ANON", "20000"))
+
+# LLM admission control per process: concurrent completions, waiting requests and
+# how long a request may wait for a slot. Keep concurrency + queue below the worker's
+# thread count so cheap endpoints always find a free thread. 0 concurrency disables.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "8"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "15"))
+
+# Route the suggestion, meal-plan and recipe views to their async variants
+# (recipes.async_views). Serve config.asgi:application under an ASGI server; waiting
+# requests then hold no thread, so LLM_MAX_CONCURRENCY can be raised accordingly.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "0") == "1"
+
+# Asynchronous generation jobs (`Prefer: respond-async`): worker threads per process,
+# how often queued/orphaned jobs are swept, how long a claimed job is leased, how many
+# admission rejections a job tolerates, and how long finished jobs are kept.
+GENERATION_JOB_WORKERS = int(os.getenv("GENERATION_JOB_WORKERS", "2"))
+GENERATION_JOB_POLL_SECONDS = float(os.getenv("GENERATION_JOB_POLL_SECONDS", "5"))
+GENERATION_JOB_LEASE_SECONDS = int(os.getenv("GENERATION_JOB_LEASE_SECONDS", "300"))
+GENERATION_JOB_MAX_ATTEMPTS = int(os.getenv("GENERATION_JOB_MAX_ATTEMPTS", "3"))
+GENERATION_JOB_TTL_SECONDS = int(os.getenv("GENERATION_JOB_TTL_SECONDS", "86400"))
+# Run jobs inline during submission (tests / single-threaded debugging).
+GENERATION_JOBS_EAGER = os.getenv("GENERATION_JOBS_EAGER", "0") == "1"
+
+# Recipe images are rendered by a background worker, never on the request path.
+RECIPE_IMAGES_ENABLED = os.getenv("RECIPE_IMAGES_ENABLED", "0") == "1"
+# recipes.services.images.OpenAIImageProvider renders with RECIPE_IMAGE_MODEL.
+RECIPE_IMAGE_PROVIDER = os.getenv("RECIPE_IMAGE_PROVIDER", "recipes.services.images.PlaceholderImageProvider")
+RECIPE_IMAGE_MODEL = os.getenv("RECIPE_IMAGE_MODEL", "gpt-image-1")
+# recipes.services.images.SupabaseImageStore uploads to the RECIPE_IMAGE_BUCKET bucket.
+RECIPE_IMAGE_STORE = os.getenv("RECIPE_IMAGE_STORE", "recipes.services.images.FileSystemImageStore")
+RECIPE_IMAGE_BUCKET = os.getenv("RECIPE_IMAGE_BUCKET", "recipe-images")
+RECIPE_IMAGE_ROOT = os.getenv("RECIPE_IMAGE_ROOT") or str(BASE_DIR / "media" / "recipe-images")
+RECIPE_IMAGE_BASE_URL = os.getenv("RECIPE_IMAGE_BASE_URL", "/media/recipe-images/")
+RECIPE_IMAGE_THUMBNAIL_SIZE = int(os.getenv("RECIPE_IMAGE_THUMBNAIL_SIZE", "256"))
+RECIPE_IMAGE_POLL_SECONDS = float(os.getenv("RECIPE_IMAGE_POLL_SECONDS", "60"))
+# A failed render is retried one poll interval later, then with doubling delays, and
+# left alone after this many failures (recipes/sql/0007_recipe_image_failures.sql).
+RECIPE_IMAGE_MAX_ATTEMPTS = int(os.getenv("RECIPE_IMAGE_MAX_ATTEMPTS", "6"))
+
+# Model tiers for generation as a JSON list of {name, model, max_tokens, max_complexity,
+# temperature?, latency_slo?, max_output_tokens?}; empty uses recipes.services.model_router.DEFAULT_TIERS.
+LLM_MODEL_TIERS = os.getenv("LLM_MODEL_TIERS", "")
+# A tier is avoided once its failure-rate EWMA or latency EWMA exceeds these; a share
+# of requests still probes it so it can recover.
+LLM_ROUTER_FAILURE_THRESHOLD = float(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", "0.5"))
+LLM_ROUTER_LATENCY_SLO_SECONDS = float(os.getenv("LLM_ROUTER_LATENCY_SLO_SECONDS", "20"))
+LLM_ROUTER_PROBE_RATE = float(os.getenv("LLM_ROUTER_PROBE_RATE", "0.05"))
+
+# Write endpoints replay the first response for a repeated `Idempotency-Key`
+# (see recipes/idempotency.py). Records are kept this long, a running request holds its
+# key for at most IDEMPOTENCY_LOCK_SECONDS, and retries wait this long for it to finish.
+IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", "recipes.idempotency.DatabaseIdempotencyStore")
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "300"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+
+# Stack-sampling profiler (see recipes/profiling.py): requests with a signed
+# X-Profile-Request header, this percentage of all requests, and requests running
+# longer than PROFILER_SLOW_REQUEST_MS (0 disables) are sampled every
+# PROFILER_INTERVAL_MS and written to PROFILER_DIR as collapsed stacks.
+PROFILER_SAMPLE_PERCENT = float(os.getenv("PROFILER_SAMPLE_PERCENT", "0"))
+PROFILER_SLOW_REQUEST_MS = int(os.getenv("PROFILER_SLOW_REQUEST_MS", "0"))
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+PROFILER_DIR = os.getenv("PROFILER_DIR") or str(BASE_DIR / "profiles")
+PROFILER_MAX_PROFILES = int(os.getenv("PROFILER_MAX_PROFILES", "200"))
+PROFILER_TOKEN_MAX_AGE_SECONDS = int(os.getenv("PROFILER_TOKEN_MAX_AGE_SECONDS", "3600"))
+# Supabase user ids allowed to use the operator endpoints (/api/metrics/, /api/profiler/...).
+ADMIN_USER_IDS = [user_id.strip() for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()]
+
+# `manage.py compact_search_history` keeps this many whole months of raw search history
+# (plus the current one) and rolls older months into per-user aggregates.
+SEARCH_HISTORY_RETENTION_MONTHS = int(os.getenv("SEARCH_HISTORY_RETENTION_MONTHS", "6"))
+SEARCH_HISTORY_PARTITIONS_AHEAD = int(os.getenv("SEARCH_HISTORY_PARTITIONS_AHEAD", "3"))
+
+FAVORITES_BULK_MAX_ITEMS = int(os.getenv("FAVORITES_BULK_MAX_ITEMS", "500"))
+
 ALLOWED_EMAIL_DOMAINS = [
     domain.strip()
     for domain in os.getenv(
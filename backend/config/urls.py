@@ -14,6 +14,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
@@ -21,3 +23,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('recipes.urls')),
 ]
+
+# Locally stored recipe images (FileSystemImageStore); only served while DEBUG is on.
+urlpatterns += static(settings.RECIPE_IMAGE_BASE_URL, document_root=settings.RECIPE_IMAGE_ROOT)
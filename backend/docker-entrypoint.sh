@@ -0,0 +1,18 @@
+#!/bin/sh
+set -e
+
+# Django's own tables (generation jobs, idempotency records, sessions) live in
+# DATABASE_URL. Without it every container gets a throwaway SQLite file of its own.
+case "${DATABASE_URL:-sqlite:}" in
+    sqlite:*)
+        echo "DATABASE_URL is not a persistent database; using an SQLite file inside this container, which is lost with it." >&2
+        ;;
+esac
+
+# Deployments with a separate release step run `python manage.py migrate` there and
+# set RUN_MIGRATIONS=0.
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+    python manage.py migrate --noinput
+fi
+
+exec "$@"
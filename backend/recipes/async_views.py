@@ -0,0 +1,155 @@
+"""
+Async variants of the generation and recipe views, routed instead of the sync ones
+when `ASYNC_VIEWS` is on and the app is served through `config.asgi`.
+
+While a request waits on the model or on Supabase it suspends a coroutine instead of
+pinning a worker thread, so one worker holds as many in-flight generations as
+admission control lets through. DRF has no async dispatch, so `AsyncAPIViewMixin`
+supplies one: authentication, permissions and throttling still run through DRF, then
+the handler is awaited.
+"""
+
+import asyncio
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from .idempotency import idempotent
+from .models import GenerationJob
+from .serializers import RecipeListQuerySerializer, meal_plan_request_schema, suggestion_request_schema
+from .services import (
+    AdmissionRejected,
+    AsyncSupabaseRepository,
+    SupabaseConfigurationError,
+    aplan_meals,
+    asuggest_recipe,
+    request_lane,
+)
+from .throttling import record_llm_tokens
+from .views import (
+    MealPlanView,
+    RecipeDetailView,
+    RecipeListView,
+    RecipeSuggestionView,
+    overloaded_response,
+)
+
+
+class AsyncAPIViewMixin:
+    """`APIView.dispatch` with the handler awaited; mix in ahead of the DRF view."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            self.initial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            # OPTIONS and 405 responses come from DRF's own sync handlers.
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncRecipeSuggestionView(AsyncAPIViewMixin, RecipeSuggestionView):
+    @idempotent
+    async def post(self, request):
+        payload = suggestion_request_schema.validate(request.data)
+        if self._wants_async(request):
+            return await sync_to_async(self._submit_job)(request, GenerationJob.Kind.SUGGESTION, payload)
+
+        mode = payload.pop("mode")
+        try:
+            result = await asuggest_recipe(
+                await self._aget_repository_optional(),
+                payload,
+                mode=mode,
+                user_id=self._user_id(request),
+                lane=request_lane(request),
+            )
+        except AdmissionRejected as exc:
+            return overloaded_response(exc)
+        record_llm_tokens(request, result.tokens)
+        return Response(result.data, status=result.status)
+
+    async def _aget_repository_optional(self) -> AsyncSupabaseRepository | None:
+        if not settings.SUPABASE_URL:
+            return None
+
+        try:
+            return await AsyncSupabaseRepository.create()
+        except SupabaseConfigurationError:
+            return None
+
+
+class AsyncMealPlanView(AsyncRecipeSuggestionView, MealPlanView):
+    @idempotent
+    async def post(self, request):
+        payload = meal_plan_request_schema.validate(request.data)
+        if self._wants_async(request):
+            return await sync_to_async(self._submit_job)(request, GenerationJob.Kind.MEAL_PLAN, payload)
+
+        days = payload.pop("days")
+        try:
+            result = await aplan_meals(
+                await self._aget_repository_optional(),
+                payload,
+                days=days,
+                user_id=self._user_id(request),
+                lane=request_lane(request),
+            )
+        except AdmissionRejected as exc:
+            return overloaded_response(exc)
+        record_llm_tokens(request, result.tokens)
+        return Response(result.data, status=result.status)
+
+
+class AsyncRecipeListView(AsyncAPIViewMixin, RecipeListView):
+    async def get(self, request):
+        query_serializer = RecipeListQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        params = query_serializer.validated_data
+
+        try:
+            repo = await AsyncSupabaseRepository.create()
+        except SupabaseConfigurationError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        records = await repo.list_recipes(
+            user_id=request.user.id,
+            scope=params["scope"],
+            limit=params["limit"],
+            fields=params["fields"],
+        )
+        return Response({"recipes": records}, status=status.HTTP_200_OK)
+
+
+class AsyncRecipeDetailView(AsyncAPIViewMixin, RecipeDetailView):
+    async def get(self, request, recipe_id):
+        try:
+            repo = await AsyncSupabaseRepository.create()
+        except SupabaseConfigurationError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        recipe, is_favorite = await asyncio.gather(
+            repo.get_recipe(str(recipe_id)),
+            repo.is_favorite(request.user.id, str(recipe_id)),
+        )
+        if recipe is None:
+            return Response({"detail": "Recipe not found."}, status=status.HTTP_404_NOT_FOUND)
+        recipe["is_favorite"] = is_favorite
+        return Response({"recipe": recipe}, status=status.HTTP_200_OK)
@@ -1,6 +1,7 @@
 import jwt
 from dataclasses import dataclass
 from rest_framework.authentication import BaseAuthentication
+from rest_framework.permissions import BasePermission
 from rest_framework import exceptions
 from django.conf import settings
 from typing import Optional
@@ -65,3 +66,17 @@ class SupabaseJWTAuthentication(BaseAuthentication):
         user = SupabaseUser(id=user_id, email=email)
         return (user, token)
 
+
+
+class IsAdminUserId(BasePermission):
+    """
+    Supabase users listed in `ADMIN_USER_IDS`; the JWT carries no role of its own.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(
+            user
+            and getattr(user, "is_authenticated", False)
+            and getattr(user, "id", None) in getattr(settings, "ADMIN_USER_IDS", [])
+        )
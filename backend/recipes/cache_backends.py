@@ -0,0 +1,321 @@
+"""
+A Django cache backend shared by every worker process on a host.
+
+Entries live in one memory-mapped file (on tmpfs such as `/dev/shm` in production),
+so each cached value is stored once per host instead of once per worker and a value
+cached by one worker is a hit in all the others. Reading an entry unpickles just
+that entry; nothing is mirrored into each worker's heap.
+
+The file is a fixed array of equally sized slots grouped into small sets. A key
+hashes to one set and can only live in one of that set's `WAYS` slots, so lookups
+touch a handful of slots and need no separate index. When a set is full, a CLOCK
+sweep over its reference bits evicts an entry that has not been read since the hand
+last passed. Sets are guarded by striped locks that work both across threads
+(`threading.Lock`) and across processes (`fcntl` byte-range locks). Values larger
+than a slot are not cached.
+
+Configure it with::
+
+    CACHES = {
+        "default": {
+            "BACKEND": "recipes.cache_backends.SharedMemoryCache",
+            "LOCATION": "/dev/shm/recipes-cache",
+            "OPTIONS": {"SLOTS": 4096, "SLOT_SIZE": 16384},
+        }
+    }
+"""
+
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+MAGIC = b"RSC1"
+HEADER = struct.Struct("<4sIIH")  # magic, slots, slot size, ways
+# key hash, absolute expiry (0 = never), value length, key length, flags, padding
+SLOT_HEADER = struct.Struct("<QdIHBx")
+EXPIRES_AT, FLAGS_AT = 8, 22  # field offsets within SLOT_HEADER
+FLAG_USED = 1
+FLAG_REFERENCED = 2
+# Byte-range locks are taken far past the end of the file so they never overlap data.
+LOCK_BASE = 1 << 40
+
+
+def _key_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+class _Region:
+    """
+    The mapping and locks for one cache file, shared by every backend instance in a
+    process (Django creates one backend per thread).
+    """
+
+    def __init__(self, path: str, slots: int, slot_size: int, ways: int):
+        try:
+            import fcntl
+        except ImportError as exc:  # pragma: no cover - Windows
+            raise ImproperlyConfigured("SharedMemoryCache needs POSIX file locks (fcntl).") from exc
+
+        self._fcntl = fcntl
+        self.pid = os.getpid()
+        self.ways = ways
+        self.sets = slots // ways
+        self.slot_size = slot_size
+        self.hands_offset = 64
+        self.data_offset = self.hands_offset + -(-self.sets // 64) * 64
+        self.stripes = min(self.sets, 64)
+        self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+        size = self.data_offset + self.sets * ways * slot_size
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, 0, LOCK_BASE)
+        try:
+            header = os.pread(self.fd, HEADER.size, 0)
+            if os.fstat(self.fd).st_size != size or header != HEADER.pack(MAGIC, slots, slot_size, ways):
+                # A new (or unrecognised) file: start empty. The geometry is part of the
+                # file name, so this never resizes a file another worker has mapped.
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, HEADER.pack(MAGIC, slots, slot_size, ways), 0)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 0, LOCK_BASE)
+        self.map = mmap.mmap(self.fd, size)
+
+    @contextmanager
+    def locked(self, set_index: int):
+        stripe = set_index % self.stripes
+        with self._thread_locks[stripe]:
+            self._fcntl.lockf(self.fd, self._fcntl.LOCK_EX, 1, LOCK_BASE + stripe)
+            try:
+                yield
+            finally:
+                self._fcntl.lockf(self.fd, self._fcntl.LOCK_UN, 1, LOCK_BASE + stripe)
+
+    @contextmanager
+    def locked_all(self):
+        for lock in self._thread_locks:
+            lock.acquire()
+        try:
+            self._fcntl.lockf(self.fd, self._fcntl.LOCK_EX, 0, LOCK_BASE)
+            try:
+                yield
+            finally:
+                self._fcntl.lockf(self.fd, self._fcntl.LOCK_UN, 0, LOCK_BASE)
+        finally:
+            for lock in reversed(self._thread_locks):
+                lock.release()
+
+    def slot_offset(self, set_index: int, way: int) -> int:
+        return self.data_offset + (set_index * self.ways + way) * self.slot_size
+
+    # The methods below expect the set's lock to be held.
+    def find(self, set_index: int, key_hash: int, key: bytes, now: float) -> Optional[Tuple[int, tuple]]:
+        for way in range(self.ways):
+            offset = self.slot_offset(set_index, way)
+            header = SLOT_HEADER.unpack_from(self.map, offset)
+            hashed, expires, _, key_length, flags = header
+            if not flags & FLAG_USED or hashed != key_hash or key_length != len(key):
+                continue
+            start = offset + SLOT_HEADER.size
+            if self.map[start:start + key_length] != key:
+                continue
+            if expires and expires <= now:
+                self.map[offset + FLAGS_AT] = 0
+                return None
+            return offset, header
+        return None
+
+    def read_value(self, offset: int, header: tuple, touch: bool = True) -> bytes:
+        _, _, value_length, key_length, flags = header
+        if touch and not flags & FLAG_REFERENCED:
+            self.map[offset + FLAGS_AT] = flags | FLAG_REFERENCED
+        start = offset + SLOT_HEADER.size + key_length
+        return self.map[start:start + value_length]
+
+    def victim(self, set_index: int, now: float) -> int:
+        """A free or expired slot in the set, else the CLOCK hand's choice."""
+
+        for way in range(self.ways):
+            offset = self.slot_offset(set_index, way)
+            _, expires, _, _, flags = SLOT_HEADER.unpack_from(self.map, offset)
+            if not flags & FLAG_USED or (expires and expires <= now):
+                return offset
+
+        hand_at = self.hands_offset + set_index
+        hand = self.map[hand_at] % self.ways
+        while True:
+            offset = self.slot_offset(set_index, hand)
+            flags = self.map[offset + FLAGS_AT]
+            hand = (hand + 1) % self.ways
+            if flags & FLAG_REFERENCED:
+                self.map[offset + FLAGS_AT] = flags & ~FLAG_REFERENCED
+                continue
+            self.map[hand_at] = hand
+            return offset
+
+    def write(self, offset: int, key_hash: int, key: bytes, value: bytes, expires: float) -> None:
+        # New entries start unreferenced: a key must be read once before it survives a sweep.
+        start = offset + SLOT_HEADER.size
+        self.map[start:start + len(key)] = key
+        self.map[start + len(key):start + len(key) + len(value)] = value
+        SLOT_HEADER.pack_into(self.map, offset, key_hash, expires, len(value), len(key), FLAG_USED)
+
+    def free(self, offset: int) -> None:
+        self.map[offset + FLAGS_AT] = 0
+
+
+_regions: Dict[Tuple[str, int, int, int], _Region] = {}
+_regions_lock = threading.Lock()
+
+
+def _get_region(path: str, slots: int, slot_size: int, ways: int) -> _Region:
+    key = (path, slots, slot_size, ways)
+    region = _regions.get(key)
+    # Locks held by other threads at fork time would never be released in the child.
+    if region is None or region.pid != os.getpid():
+        with _regions_lock:
+            region = _regions.get(key)
+            if region is None or region.pid != os.getpid():
+                region = _regions[key] = _Region(path, slots, slot_size, ways)
+    return region
+
+
+class SharedMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location: str, params: Dict[str, Any]):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.slots = int(options.get("SLOTS", 4096))
+        self.slot_size = int(options.get("SLOT_SIZE", 16384))
+        self.ways = int(options.get("WAYS", 8))
+        if self.ways < 1 or self.ways > 255 or self.slots < self.ways:
+            raise ImproperlyConfigured("SharedMemoryCache needs 1 <= WAYS <= 255 and SLOTS >= WAYS.")
+        if self.slot_size <= SLOT_HEADER.size:
+            raise ImproperlyConfigured(f"SharedMemoryCache SLOT_SIZE must exceed {SLOT_HEADER.size} bytes.")
+        self.directory = location or "/dev/shm/recipes-cache"
+        self.path = os.path.join(self.directory, f"slots-{self.slots}x{self.slot_size}-{self.ways}way.bin")
+        self._region: Optional[_Region] = None
+
+    @property
+    def region(self) -> _Region:
+        if self._region is None or self._region.pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            self._region = _get_region(self.path, self.slots, self.slot_size, self.ways)
+        return self._region
+
+    def _locate(self, key, version) -> Tuple[_Region, bytes, int, int]:
+        encoded = self.make_and_validate_key(key, version=version).encode("utf-8")
+        key_hash = _key_hash(encoded)
+        region = self.region
+        return region, encoded, key_hash, key_hash % region.sets
+
+    def _store(self, key, value, timeout, version, only_if_missing: bool) -> bool:
+        region, encoded, key_hash, set_index = self._locate(key, version)
+        expires = self.get_backend_timeout(timeout)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        fits = SLOT_HEADER.size + len(encoded) + len(pickled) <= region.slot_size
+        now = time.time()
+        with region.locked(set_index):
+            found = region.find(set_index, key_hash, encoded, now)
+            if found and only_if_missing:
+                return False
+            if not fits or (expires is not None and expires <= now):
+                # Too large to cache, or already expired: make sure no stale copy survives.
+                if found:
+                    region.free(found[0])
+                return False
+            offset = found[0] if found else region.victim(set_index, now)
+            region.write(offset, key_hash, encoded, pickled, expires or 0.0)
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None) -> bool:
+        return self._store(key, value, timeout, version, only_if_missing=True)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None) -> None:
+        self._store(key, value, timeout, version, only_if_missing=False)
+
+    def get(self, key, default=None, version=None):
+        region, encoded, key_hash, set_index = self._locate(key, version)
+        with region.locked(set_index):
+            found = region.find(set_index, key_hash, encoded, time.time())
+            if found is None:
+                return default
+            pickled = region.read_value(*found)
+        return pickle.loads(pickled)
+
+    def has_key(self, key, version=None) -> bool:
+        region, encoded, key_hash, set_index = self._locate(key, version)
+        with region.locked(set_index):
+            return region.find(set_index, key_hash, encoded, time.time()) is not None
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None) -> bool:
+        region, encoded, key_hash, set_index = self._locate(key, version)
+        expires = self.get_backend_timeout(timeout)
+        with region.locked(set_index):
+            found = region.find(set_index, key_hash, encoded, time.time())
+            if found is None:
+                return False
+            struct.pack_into("<d", region.map, found[0] + EXPIRES_AT, expires or 0.0)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        region, encoded, key_hash, set_index = self._locate(key, version)
+        with region.locked(set_index):
+            found = region.find(set_index, key_hash, encoded, time.time())
+            if found is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(region.read_value(*found)) + delta
+            pickled = pickle.dumps(value, self.pickle_protocol)
+            if SLOT_HEADER.size + len(encoded) + len(pickled) > region.slot_size:
+                region.free(found[0])
+            else:
+                region.write(found[0], key_hash, encoded, pickled, found[1][1])
+        return value
+
+    def delete(self, key, version=None) -> bool:
+        region, encoded, key_hash, set_index = self._locate(key, version)
+        with region.locked(set_index):
+            found = region.find(set_index, key_hash, encoded, time.time())
+            if found is None:
+                return False
+            region.free(found[0])
+        return True
+
+    def clear(self) -> None:
+        region = self.region
+        with region.locked_all():
+            for set_index in range(region.sets):
+                for way in range(region.ways):
+                    region.free(region.slot_offset(set_index, way))
+                region.map[region.hands_offset + set_index] = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Slot occupancy across the whole file (takes every lock; for diagnostics)."""
+
+        region = self.region
+        used = expired = 0
+        now = time.time()
+        with region.locked_all():
+            for set_index in range(region.sets):
+                for way in range(region.ways):
+                    _, expires, _, _, flags = SLOT_HEADER.unpack_from(region.map, region.slot_offset(set_index, way))
+                    if flags & FLAG_USED:
+                        used += 1
+                        expired += bool(expires and expires <= now)
+        return {
+            "path": self.path,
+            "slots": region.sets * region.ways,
+            "slot_size": region.slot_size,
+            "used": used,
+            "expired": expired,
+        }
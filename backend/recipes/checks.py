@@ -0,0 +1,38 @@
+"""
+Deployment checks (`manage.py check --deploy`).
+"""
+
+from django.conf import settings
+from django.core import checks
+
+# Backends whose entries are private to one process; per-caller limits kept there are
+# multiplied by the number of workers.
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_throttle_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    shared_state = []
+    if getattr(settings, "LLM_DAILY_TOKEN_QUOTA_USER", 0) or getattr(settings, "LLM_DAILY_TOKEN_QUOTA_ANON", 0):
+        shared_state.append("LLM_DAILY_TOKEN_QUOTA_USER/ANON")
+    if getattr(settings, "THROTTLE_BUCKET_STORE", "").endswith(".CacheBucketStore"):
+        shared_state.append("THROTTLE_BUCKET_STORE=recipes.throttling.CacheBucketStore")
+    if not shared_state:
+        return []
+    return [
+        checks.Warning(
+            f"{' and '.join(shared_state)} keep their counters in the default cache, which is {backend}.",
+            hint=(
+                "Each worker process then enforces its own copy, so the effective limit is "
+                "multiplied by the number of workers. Set SHARED_CACHE_DIR (one host) or "
+                "configure a networked cache such as Redis (several hosts)."
+            ),
+            id="recipes.W001",
+        )
+    ]
@@ -0,0 +1,347 @@
+"""
+`Idempotency-Key` support for the write endpoints.
+
+A client that sends the header gets the first response for that key replayed on
+every retry instead of the write (and, for suggestions, the LLM call) running again.
+Records are kept per caller and key together with a hash of the request, for
+`IDEMPOTENCY_TTL_SECONDS`; reusing a key for a different request is a `422`.
+
+While the first request runs its record is locked. A retry that arrives meanwhile
+waits up to `IDEMPOTENCY_WAIT_SECONDS` for the result and gets `409` with
+`Retry-After` if it is still running. The lock lapses after
+`IDEMPOTENCY_LOCK_SECONDS` so a crashed worker does not block the key forever.
+Responses with a 5xx status are not recorded, so they can be retried.
+
+Records live in a pluggable store (`IDEMPOTENCY_STORE`): `DatabaseIdempotencyStore`
+(default) uses the `IdempotencyRecord` table; `CacheIdempotencyStore` uses the Django
+cache, which is cheaper but loses records on eviction.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+from .throttling import request_throttle_ident
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# Response headers worth replaying; the rest are recomputed per response.
+REPLAYED_HEADERS = ("Location", "Retry-After")
+
+STARTED = "started"
+COMPLETED = "completed"
+IN_PROGRESS = "in_progress"
+MISMATCH = "mismatch"
+
+
+@dataclass
+class Outcome:
+    state: str
+    status: Optional[int] = None
+    body: Any = None
+    headers: Optional[Dict[str, str]] = None
+
+
+def _ttl() -> int:
+    return getattr(settings, "IDEMPOTENCY_TTL_SECONDS", 86400)
+
+
+def _lock_seconds() -> int:
+    return getattr(settings, "IDEMPOTENCY_LOCK_SECONDS", 300)
+
+
+class DatabaseIdempotencyStore:
+    """
+    Records in the `IdempotencyRecord` table. The unique (scope, key) constraint makes
+    claiming a key atomic; taking over an expired record or a lapsed lock is a
+    conditional update, so only one request wins it.
+    """
+
+    def begin(self, scope: str, key: str, request_hash: str) -> Outcome:
+        now = timezone.now()
+        locked_until = now + timedelta(seconds=_lock_seconds())
+        try:
+            with transaction.atomic():
+                IdempotencyRecord.objects.create(
+                    scope=scope,
+                    key=key,
+                    request_hash=request_hash,
+                    locked_until=locked_until,
+                    expires_at=now + timedelta(seconds=_ttl()),
+                )
+            return Outcome(STARTED)
+        except IntegrityError:
+            pass
+
+        record = IdempotencyRecord.objects.filter(scope=scope, key=key).first()
+        if record is None:
+            # Purged between the insert and the read; let the caller try again.
+            return Outcome(IN_PROGRESS)
+        if record.expires_at <= now or (record.response_status is None and record.locked_until <= now):
+            claimed = IdempotencyRecord.objects.filter(
+                pk=record.pk,
+                expires_at=record.expires_at,
+                locked_until=record.locked_until,
+            ).update(
+                request_hash=request_hash,
+                response_status=None,
+                response_body=None,
+                response_headers=None,
+                locked_until=locked_until,
+                expires_at=now + timedelta(seconds=_ttl()),
+            )
+            return Outcome(STARTED if claimed else IN_PROGRESS)
+        if record.request_hash != request_hash:
+            return Outcome(MISMATCH)
+        if record.response_status is None:
+            return Outcome(IN_PROGRESS)
+        return Outcome(COMPLETED, record.response_status, record.response_body, record.response_headers or {})
+
+    def complete(
+        self, scope: str, key: str, request_hash: str, status_code: int, body: Any, headers: Dict[str, str]
+    ) -> None:
+        IdempotencyRecord.objects.filter(scope=scope, key=key, request_hash=request_hash).update(
+            response_status=status_code,
+            response_body=body,
+            response_headers=headers,
+        )
+
+    def release(self, scope: str, key: str) -> None:
+        IdempotencyRecord.objects.filter(scope=scope, key=key, response_status__isnull=True).delete()
+
+    def purge_expired(self, now=None) -> int:
+        deleted, _ = IdempotencyRecord.objects.filter(expires_at__lt=now or timezone.now()).delete()
+        return deleted
+
+
+class CacheIdempotencyStore:
+    """
+    Records in the Django cache: a lock entry claimed with `cache.add` while the first
+    request runs, and the response entry once it finishes. Expiry is the cache's own.
+    """
+
+    prefix = "recipes:idempotency:"
+
+    def _keys(self, scope: str, key: str):
+        digest = hashlib.sha256(f"{scope}\0{key}".encode("utf-8")).hexdigest()
+        return f"{self.prefix}{digest}", f"{self.prefix}{digest}:lock"
+
+    def begin(self, scope: str, key: str, request_hash: str) -> Outcome:
+        record_key, lock_key = self._keys(scope, key)
+        for _ in range(2):
+            record = cache.get(record_key)
+            if record is not None:
+                if record["request_hash"] != request_hash:
+                    return Outcome(MISMATCH)
+                return Outcome(COMPLETED, record["status"], record["body"], record["headers"])
+            if cache.add(lock_key, request_hash, timeout=_lock_seconds()):
+                # The original may have finished between the read and the claim.
+                if cache.get(record_key) is None:
+                    return Outcome(STARTED)
+                cache.delete(lock_key)
+                continue
+            holder = cache.get(lock_key)
+            if holder is not None and holder != request_hash:
+                return Outcome(MISMATCH)
+            return Outcome(IN_PROGRESS)
+        return Outcome(IN_PROGRESS)
+
+    def complete(
+        self, scope: str, key: str, request_hash: str, status_code: int, body: Any, headers: Dict[str, str]
+    ) -> None:
+        record_key, lock_key = self._keys(scope, key)
+        cache.set(
+            record_key,
+            {"request_hash": request_hash, "status": status_code, "body": body, "headers": headers},
+            timeout=_ttl(),
+        )
+        cache.delete(lock_key)
+
+    def release(self, scope: str, key: str) -> None:
+        cache.delete(self._keys(scope, key)[1])
+
+    def purge_expired(self, now=None) -> int:
+        return 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_idempotency_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = getattr(settings, "IDEMPOTENCY_STORE", "recipes.idempotency.DatabaseIdempotencyStore")
+                _store = import_string(path)()
+    return _store
+
+
+def reset_idempotency_store() -> None:
+    global _store
+    with _store_lock:
+        _store = None
+
+
+def request_hash(request) -> str:
+    """Method, path, query string and body, so one key cannot cover two different writes."""
+
+    try:
+        body = json.dumps(request.data, sort_keys=True, separators=(",", ":"), default=str)
+    except TypeError:
+        body = request.body.decode("utf-8", "replace")
+    material = "\n".join((request.method, request.path, request.META.get("QUERY_STRING", ""), body))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _replay(outcome: Outcome) -> Response:
+    response = Response(outcome.body, status=outcome.status, headers=outcome.headers or {})
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _refusal(outcome: Outcome) -> Response:
+    if outcome.state == MISMATCH:
+        return Response(
+            {"detail": f"This {HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(
+        {"detail": f"A request with this {HEADER} is still being processed."},
+        status=status.HTTP_409_CONFLICT,
+        headers={"Retry-After": "1"},
+    )
+
+
+def _claim(request):
+    """
+    (scope, key, outcome) for a request carrying the header, None without it, or a
+    ready `Response` when the header is malformed.
+    """
+
+    key = request.headers.get(HEADER)
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {"detail": f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return request_throttle_ident(request), key, request_hash(request)
+
+
+def _delays():
+    """Poll intervals while a concurrent request holds the key, capped by the wait budget."""
+
+    deadline = time.monotonic() + getattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 30)
+    delay = 0.05
+    while time.monotonic() < deadline:
+        yield min(delay, max(deadline - time.monotonic(), 0))
+        delay = min(delay * 2, 1.0)
+
+
+def _record(store, scope: str, key: str, digest: str, response) -> None:
+    if not isinstance(response, Response) or response.status_code >= 500:
+        store.release(scope, key)
+        return
+    headers = {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)}
+    store.complete(scope, key, digest, response.status_code, response.data, headers)
+
+
+def idempotent(handler):
+    """
+    Honour `Idempotency-Key` on a view handler (sync or async). Without the header the
+    handler runs as before.
+    """
+
+    if inspect.iscoroutinefunction(handler):
+
+        @functools.wraps(handler)
+        async def async_wrapper(view, request, *args, **kwargs):
+            claim = _claim(request)
+            if claim is None:
+                return await handler(view, request, *args, **kwargs)
+            if isinstance(claim, Response):
+                return claim
+            scope, key, digest = claim
+            store = get_idempotency_store()
+            outcome = await sync_to_async(store.begin)(scope, key, digest)
+            delays = _delays()
+            while outcome.state == IN_PROGRESS:
+                delay = next(delays, None)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+                outcome = await sync_to_async(store.begin)(scope, key, digest)
+            if outcome.state == COMPLETED:
+                return _replay(outcome)
+            if outcome.state != STARTED:
+                return _refusal(outcome)
+            try:
+                response = await handler(view, request, *args, **kwargs)
+            except BaseException:
+                await sync_to_async(store.release)(scope, key)
+                raise
+            await sync_to_async(_record)(store, scope, key, digest, response)
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        claim = _claim(request)
+        if claim is None:
+            return handler(view, request, *args, **kwargs)
+        if isinstance(claim, Response):
+            return claim
+        scope, key, digest = claim
+        store = get_idempotency_store()
+        outcome = store.begin(scope, key, digest)
+        delays = _delays()
+        while outcome.state == IN_PROGRESS:
+            delay = next(delays, None)
+            if delay is None:
+                break
+            time.sleep(delay)
+            outcome = store.begin(scope, key, digest)
+        if outcome.state == COMPLETED:
+            return _replay(outcome)
+        if outcome.state != STARTED:
+            return _refusal(outcome)
+        try:
+            response = handler(view, request, *args, **kwargs)
+        except BaseException:
+            store.release(scope, key)
+            raise
+        _record(store, scope, key, digest, response)
+        return response
+
+    return wrapper
+
+
+__all__ = [
+    "CacheIdempotencyStore",
+    "DatabaseIdempotencyStore",
+    "get_idempotency_store",
+    "idempotent",
+    "reset_idempotency_store",
+]
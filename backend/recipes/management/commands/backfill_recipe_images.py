@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import ImagePipeline, SupabaseConfigurationError, SupabaseRepository
+
+
+class Command(BaseCommand):
+    help = (
+        "Render images for saved recipes that have an image prompt but no image, "
+        "reusing one image per distinct prompt, and backfill recipes.image_url."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Stop after updating this many recipes.")
+
+    def handle(self, *args, **options):
+        try:
+            repo = SupabaseRepository()
+        except SupabaseConfigurationError as exc:
+            raise CommandError(str(exc)) from exc
+
+        pipeline = ImagePipeline(repo)
+        updated = pipeline.backfill(limit=options["limit"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated {updated} recipes with {pipeline.rendered} newly rendered images.")
+        )
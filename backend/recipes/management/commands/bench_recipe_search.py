@@ -0,0 +1,162 @@
+import json
+import os
+import re
+import uuid
+
+import psycopg
+from django.core.management.base import BaseCommand, CommandError
+from psycopg import sql
+
+ADJECTIVES = ["smoky", "crispy", "creamy", "spicy", "zesty", "roasted", "braised", "grilled", "sticky", "herby", "golden", "charred"]
+PROTEINS = ["chicken", "salmon", "tofu", "beef", "chickpea", "lentil", "shrimp", "pork", "halloumi", "turkey", "tempeh", "cod", "lamb", "egg", "mushroom", "bean", "duck"]
+DISHES = ["curry", "tacos", "stew", "salad", "noodles", "risotto", "traybake", "skewers", "soup", "pie", "burrito", "stir fry", "bowl"]
+CUISINES = ["thai", "mexican", "italian", "indian", "japanese", "greek", "moroccan", "korean", "french", "lebanese", "peruvian"]
+VEGETABLES = ["spinach", "peppers", "courgette", "aubergine", "broccoli", "sweet potato", "kale", "tomatoes", "carrots", "leeks"]
+
+# Synthetic rows; the moduli are coprime so titles and descriptions cycle independently.
+# `%%` is the modulo operator: the statement is sent with psycopg placeholders.
+SEED_SQL = """
+insert into public.recipes (title, description, servings, source, model_version)
+select
+    initcap(adj[1 + i %% 12] || ' ' || pro[1 + i %% 17] || ' ' || dish[1 + i %% 13]),
+    initcap(cui[1 + i %% 11]) || '-style ' || dish[1 + (i / 13) %% 13] || ' with '
+        || veg[1 + i %% 10] || ', ' || veg[1 + (i / 7) %% 10] || ' and ' || pro[1 + (i / 17) %% 17] || '.',
+    1 + i %% 6,
+    'benchmark',
+    'bench_recipe_search'
+from generate_series(1, %(rows)s) as i,
+     (select %(adj)s::text[] as adj, %(pro)s::text[] as pro, %(dish)s::text[] as dish,
+             %(cui)s::text[] as cui, %(veg)s::text[] as veg) as words
+"""
+
+# (label, query, scope): stemmed words, a misspelling, a half-typed word, a rare phrase.
+CASES = [
+    ("full text", "chicken curry", "public"),
+    ("misspelled", "chiken", "public"),
+    ("search as you type", "halloum", "public"),
+    ("rare phrase", "moroccan tempeh skewers", "public"),
+    ("scope=mine", "salmon", "mine"),
+    ("scope=favorites", "salmon", "favorites"),
+]
+
+FUNCTION = "public.search_recipes(text, text, uuid, real, uuid, integer)"
+PARAMETERS = ("search_query", "search_scope", "requesting_user", "after_rank", "after_id", "page_size")
+
+SEARCH_INDEXES = {"recipes_search_vector_idx", "recipes_title_trgm_idx", "recipes_created_by_idx", "favorites_pkey"}
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def table_scans(nodes):
+    """Scans that may read all of `recipes`: sequential, or an index walked without a condition."""
+
+    return [
+        node for node in nodes
+        if node.get("Relation Name") == "recipes"
+        and (node["Node Type"] == "Seq Scan" or (node["Node Type"] == "Index Scan" and "Index Cond" not in node))
+    ]
+
+
+def prepare_search(cur) -> None:
+    """
+    Prepare the body of `search_recipes` as the statement `search`, under the function's
+    own settings. The function carries a SET clause, so it is not inlined and EXPLAIN of
+    a call would only show a function scan.
+    """
+
+    cur.execute("select prosrc, coalesce(proconfig, '{}') from pg_proc where oid = %s::regprocedure", (FUNCTION,))
+    body, config = cur.fetchone()
+    for position, name in enumerate(PARAMETERS, start=1):
+        body = re.sub(rf"\b{name}\b", f"${position}", body)
+    for setting in config:
+        name, value = setting.split("=", 1)
+        cur.execute(sql.SQL("set local {} = {}").format(sql.Identifier(name), sql.Literal(value)))
+    cur.execute(f"prepare search(text, text, uuid, real, uuid, integer) as {body.strip().rstrip(';')}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Load synthetic recipes into public.recipes inside a transaction, EXPLAIN ANALYZE "
+        "search_recipes() against them with custom and generic plans and roll back. Fails if "
+        "any search scans the table or takes longer than --budget-ms."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Synthetic recipes to load.")
+        parser.add_argument(
+            "--budget-ms", type=float, default=150.0, help="Slowest acceptable search, in milliseconds."
+        )
+        parser.add_argument("--show-plans", action="store_true", help="Print each query plan as text.")
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        if rows < 1:
+            raise CommandError("--rows must be at least 1.")
+        database_url = os.environ.get("DATABASE_URL")
+        if not database_url or database_url.startswith("sqlite"):
+            raise CommandError("Set DATABASE_URL to the Supabase PostgreSQL connection string.")
+
+        try:
+            conn = psycopg.connect(database_url)
+        except Exception as exc:  # pragma: no cover - error path
+            raise CommandError(f"Failed to connect: {exc}") from exc
+
+        failures = []
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("select to_regclass('public.recipes_search_vector_idx') is not null")
+                if not cur.fetchone()[0]:
+                    raise CommandError("Apply recipes/sql/0005_recipe_search.sql first.")
+
+                self.stdout.write(f"Loading {rows:,} synthetic recipes (rolled back afterwards)...")
+                cur.execute(
+                    SEED_SQL,
+                    {"rows": rows, "adj": ADJECTIVES, "pro": PROTEINS, "dish": DISHES, "cui": CUISINES, "veg": VEGETABLES},
+                )
+                cur.execute("analyze public.recipes")
+                cur.execute("select count(*) from public.recipes")
+                self.stdout.write(f"public.recipes now holds {cur.fetchone()[0]:,} rows.\n")
+
+                user_id = str(uuid.uuid4())
+                budget = options["budget_ms"]
+                # Cached plans of the function body may be generic ones, planned without
+                # looking at the query text, so every case runs both ways.
+                prepare_search(cur)
+                self.stdout.write(f"{'case':<22}{'plan':<9}{'ms':>10}{'rows':>6}  indexes")
+                for label, query, scope in CASES:
+                    execute = sql.SQL("execute search({}, null, null, 20)").format(
+                        sql.SQL(", ").join(sql.Literal(value) for value in (query, scope, user_id))
+                    )
+                    for plan_mode in ("custom", "generic"):
+                        cur.execute(f"set local plan_cache_mode = force_{plan_mode}_plan")
+                        cur.execute(sql.SQL("explain (analyze, buffers, format json) {}").format(execute))
+                        explained = cur.fetchone()[0]
+                        if isinstance(explained, str):
+                            explained = json.loads(explained)
+                        plan = explained[0]["Plan"]
+                        elapsed = explained[0]["Execution Time"] + explained[0].get("Planning Time", 0.0)
+                        nodes = list(plan_nodes(plan))
+                        indexes = sorted({node["Index Name"] for node in nodes if "Index Name" in node})
+                        scanned = table_scans(nodes)
+                        if scanned or not SEARCH_INDEXES.intersection(indexes):
+                            failures.append(f"{label} ({plan_mode}): not served by an index")
+                        if elapsed > budget:
+                            failures.append(f"{label} ({plan_mode}): {elapsed:.0f} ms")
+                        self.stdout.write(
+                            f"{label:<22}{plan_mode:<9}{elapsed:>10.1f}{plan.get('Actual Rows', 0):>6}  "
+                            f"{', '.join(indexes) or '-'}{'  TABLE SCAN' if scanned else ''}"
+                        )
+                        if options["show_plans"]:
+                            cur.execute(sql.SQL("explain (analyze, buffers) {}").format(execute))
+                            self.stdout.write("\n".join(line for (line,) in cur.fetchall()) + "\n")
+            conn.rollback()
+
+        if failures:
+            raise CommandError(f"Searches over the {budget:g} ms budget or scanning the table: {'; '.join(failures)}.")
+        self.stdout.write(
+            self.style.SUCCESS(f"Every search was served by the GIN/btree indexes within {budget:g} ms.")
+        )
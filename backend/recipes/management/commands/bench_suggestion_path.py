@@ -0,0 +1,89 @@
+import time
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from recipes.serializers import RecipeSuggestionRequestSerializer, suggestion_request_schema
+from recipes.services import GeneratedRecipe
+
+SAMPLE_PAYLOAD = {
+    "ingredients": ["chicken thighs", "garlic", "lemon", "spinach", "rice", "onion", "yogurt", "paprika"],
+    "diet_preferences": ["high-protein"],
+    "exclude_ingredients": ["peanuts"],
+    "cuisine": "Mediterranean",
+    "servings": 4,
+    "calorie_target": 650,
+    "notes": "Weeknight dinner, one pan if possible.",
+    "mode": "auto",
+}
+
+
+def sample_recipe() -> GeneratedRecipe:
+    return GeneratedRecipe(
+        title="Lemon Garlic Chicken with Spinach Rice",
+        description="Crisp chicken thighs over garlicky spinach rice with a yogurt sauce.",
+        servings=4,
+        prep_time_minutes=15,
+        cook_time_minutes=35,
+        ingredients=[{"name": name, "quantity": "1 cup"} for name in SAMPLE_PAYLOAD["ingredients"]],
+        instructions=[{"step": step, "description": f"Step {step} of the method, in a sentence or two."} for step in range(1, 7)],
+        nutrition={"calories": 640, "protein_g": 42, "carbs_g": 58, "fat_g": 24, "per": "serving", "estimated": True},
+        shopping_list=[f"{name} (1 cup)" for name in SAMPLE_PAYLOAD["ingredients"]],
+        image_prompt="Overhead photo of lemon garlic chicken on spinach rice in a cast iron pan.",
+        model_version="gpt-4o-mini:standard",
+    )
+
+
+def cpu_per_call_us(fn, iterations: int) -> float:
+    fn()
+    started = time.process_time_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time_ns() - started) / iterations / 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request CPU spent validating a suggestion request and serializing the "
+        "generated recipe, with DRF + dataclasses.asdict versus the compiled schema + to_dict()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20000, help="Calls timed per stage.")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        if iterations < 1:
+            raise CommandError("--iterations must be at least 1.")
+        if not suggestion_request_schema.compiled:
+            raise CommandError("RecipeSuggestionRequestSerializer has fields the compiled schema does not support.")
+
+        recipe = sample_recipe()
+        renderer = JSONRenderer()
+
+        def drf_validate():
+            serializer = RecipeSuggestionRequestSerializer(data=SAMPLE_PAYLOAD)
+            serializer.is_valid(raise_exception=True)
+            return dict(serializer.validated_data)
+
+        stages = [
+            ("validate request", drf_validate, lambda: suggestion_request_schema.validate(SAMPLE_PAYLOAD)),
+            ("recipe -> response dict", lambda: asdict(recipe), recipe.to_dict),
+            ("recipe -> insert record", recipe.to_record, recipe.to_record),
+            ("render JSON response", lambda: renderer.render({"recipe": recipe.to_dict()}), None),
+        ]
+
+        self.stdout.write(f"{'stage':<26}{'before us':>12}{'after us':>12}{'speedup':>10}")
+        before_total = after_total = 0.0
+        for label, before_fn, after_fn in stages:
+            before = cpu_per_call_us(before_fn, iterations)
+            after = cpu_per_call_us(after_fn, iterations) if after_fn else before
+            before_total += before
+            after_total += after
+            self.stdout.write(f"{label:<26}{before:>12.1f}{after:>12.1f}{before / after:>9.1f}x")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'per request':<26}{before_total:>12.1f}{after_total:>12.1f}{before_total / after_total:>9.1f}x"
+            )
+        )
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services.nutrition import DEFAULT_SOURCE, NutrientTable, compile_nutrient_table, default_table_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile the bundled nutrient CSV into the memory-mapped binary table used for "
+        "local nutrition computation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            type=str,
+            help="Nutrient CSV (values per 100 g). Defaults to recipes/data/nutrients.csv.",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            help="Output path. Defaults to NUTRIENT_TABLE_PATH or recipes/data/nutrients.bin.",
+        )
+
+    def handle(self, *args, **options):
+        source = Path(options.get("source") or DEFAULT_SOURCE)
+        if not source.exists():
+            raise CommandError(f"Nutrient source not found: {source}")
+
+        output = compile_nutrient_table(source, Path(options.get("output") or default_table_path()))
+        table = NutrientTable(output)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compiled {table.count} ingredients ({len(table.index)} names) into {output} "
+                f"({output.stat().st_size} bytes)."
+            )
+        )
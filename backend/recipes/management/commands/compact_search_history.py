@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import SupabaseConfigurationError, SupabaseRepository
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll search-history months older than the retention window into per-user rollups, "
+        "drop their partitions and create partitions for the months ahead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            default=None,
+            help="Whole months of raw history kept before the current one (defaults to SEARCH_HISTORY_RETENTION_MONTHS).",
+        )
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=None,
+            help="Months of empty partitions kept ready (defaults to SEARCH_HISTORY_PARTITIONS_AHEAD).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="List the partitions without compacting.")
+
+    def handle(self, *args, **options):
+        retain_months = options["retain_months"]
+        if retain_months is None:
+            retain_months = getattr(settings, "SEARCH_HISTORY_RETENTION_MONTHS", 6)
+        months_ahead = options["months_ahead"]
+        if months_ahead is None:
+            months_ahead = getattr(settings, "SEARCH_HISTORY_PARTITIONS_AHEAD", 3)
+        if retain_months < 1:
+            raise CommandError("--retain-months must be at least 1.")
+        if months_ahead < 0:
+            raise CommandError("--months-ahead cannot be negative.")
+
+        try:
+            repo = SupabaseRepository()
+        except SupabaseConfigurationError as exc:
+            raise CommandError(str(exc)) from exc
+
+        if options["dry_run"]:
+            for partition in repo.list_search_history_partitions():
+                self.stdout.write(
+                    f"{partition.get('partition_name')}: month {partition.get('month')}, "
+                    f"~{partition.get('estimated_rows', 0)} rows"
+                )
+            return
+
+        compacted = repo.compact_search_history(retain_months, months_ahead)
+        for partition in compacted:
+            self.stdout.write(
+                f"{partition.get('partition_name')}: {partition.get('searches', 0)} searches "
+                f"rolled up for {partition.get('users', 0)} users"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Compacted {len(compacted)} search history partitions (keeping {retain_months} months).")
+        )
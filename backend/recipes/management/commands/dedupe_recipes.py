@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import NearDuplicateIndex, SupabaseConfigurationError, SupabaseRepository, recipe_signature
+
+# Keeps `in (...)` filters well inside PostgREST's URL length limit.
+MERGE_CHUNK_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = (
+        "Find near-duplicate recipes of the same creator with MinHash/LSH and merge each group "
+        "into its oldest recipe, repointing favorites and search history before deleting the rest."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=None,
+            help="Estimated similarity at which recipes are merged (defaults to NEAR_DUPLICATE_THRESHOLD).",
+        )
+        parser.add_argument("--page-size", type=int, default=1000, help="Rows fetched per keyset page.")
+        parser.add_argument("--dry-run", action="store_true", help="Report the groups without merging.")
+
+    def handle(self, *args, **options):
+        threshold = options["threshold"]
+        if threshold is None:
+            threshold = getattr(settings, "NEAR_DUPLICATE_THRESHOLD", 0.8)
+        if not 0 < threshold <= 1:
+            raise CommandError("--threshold must be in (0, 1].")
+
+        try:
+            repo = SupabaseRepository()
+        except SupabaseConfigurationError as exc:
+            raise CommandError(str(exc)) from exc
+
+        # Each recipe is compared against the first member of every group seen so far
+        # with the same creator; merging across creators would delete another user's
+        # recipe from their own listings and exports.
+        indexes = {}
+        created_at = {}
+        groups = {}
+        scanned = 0
+        for row in repo.iter_recipe_ingredients(page_size=options["page_size"]):
+            recipe_id = row.get("id")
+            if not recipe_id:
+                continue
+            scanned += 1
+            created_at[recipe_id] = row.get("created_at") or ""
+            signature = recipe_signature(row)
+            index = indexes.get(row.get("created_by"))
+            if index is None:
+                index = indexes[row.get("created_by")] = NearDuplicateIndex(threshold=threshold)
+            match = index.query(signature)
+            if match:
+                groups.setdefault(match.recipe_id, [match.recipe_id]).append(recipe_id)
+            else:
+                index.add(recipe_id, signature)
+
+        duplicates = 0
+        for members in groups.values():
+            keep = min(members, key=lambda recipe_id: (created_at[recipe_id], recipe_id))
+            merged = [recipe_id for recipe_id in members if recipe_id != keep]
+            duplicates += len(merged)
+            if options["dry_run"]:
+                self.stdout.write(f"  keep {keep}  <- {', '.join(merged)}")
+                continue
+            for start in range(0, len(merged), MERGE_CHUNK_SIZE):
+                repo.merge_duplicate_recipes(keep, merged[start:start + MERGE_CHUNK_SIZE])
+
+        verb = "Would merge" if options["dry_run"] else "Merged"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Scanned {scanned} recipes. {verb} {duplicates} duplicate recipes into {len(groups)} originals."
+            )
+        )
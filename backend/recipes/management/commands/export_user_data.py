@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import (
+    EXPORT_DATASETS,
+    EXPORT_FORMATS,
+    SupabaseConfigurationError,
+    SupabaseRepository,
+    stream_export,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a user's recipes, favorites and search history to NDJSON or CSV "
+        "using keyset-paged reads, optionally gzip-compressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", required=True, help="Supabase user id to export.")
+        parser.add_argument(
+            "--format",
+            dest="output_format",
+            choices=EXPORT_FORMATS,
+            default="ndjson",
+            help="Output encoding. Defaults to ndjson.",
+        )
+        parser.add_argument(
+            "--datasets",
+            default=",".join(EXPORT_DATASETS),
+            help="Comma-separated datasets to include. Defaults to all.",
+        )
+        parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip.")
+        parser.add_argument(
+            "--output",
+            type=str,
+            help="File to write. Defaults to stdout.",
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=1000,
+            help="Rows fetched per keyset page.",
+        )
+
+    def handle(self, *args, **options):
+        datasets = [item.strip() for item in options["datasets"].split(",") if item.strip()]
+        unknown = set(datasets) - set(EXPORT_DATASETS)
+        if unknown or not datasets:
+            raise CommandError(f"Unknown datasets: {', '.join(sorted(unknown)) or '(none)'}")
+
+        try:
+            repo = SupabaseRepository()
+        except SupabaseConfigurationError as exc:
+            raise CommandError(str(exc)) from exc
+
+        chunks = stream_export(
+            repo,
+            options["user_id"],
+            datasets=datasets,
+            output_format=options["output_format"],
+            compress=options["gzip"],
+            page_size=options["page_size"],
+        )
+
+        output = options.get("output")
+        if output:
+            written = 0
+            with Path(output).open("wb") as handle:
+                for chunk in chunks:
+                    handle.write(chunk)
+                    written += len(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {output}."))
+        else:
+            stream = sys.stdout.buffer
+            for chunk in chunks:
+                stream.write(chunk)
+            stream.flush()
@@ -0,0 +1,252 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.serializers import RecipeImportSerializer
+from recipes.services import SupabaseConfigurationError, SupabaseRepository, canonicalize_recipe
+
+JSON_COLUMNS = ("ingredients", "instructions", "nutrition", "shopping_list")
+
+# Per-process state for pool workers; each worker builds its own Supabase client.
+_worker_repo = None
+_worker_user_id = None
+_worker_dry_run = False
+
+
+def _init_worker(user_id, dry_run):
+    global _worker_repo, _worker_user_id, _worker_dry_run
+
+    import django
+
+    django.setup()
+    _worker_user_id = user_id
+    _worker_dry_run = dry_run
+    _worker_repo = None if dry_run else SupabaseRepository()
+
+
+def _process_chunk(chunk_index, rows):
+    """
+    Validate, canonicalize and insert one chunk. Runs inside a pool worker.
+
+    Returns (chunk_index, row_count, inserted, duplicates, invalid, first_error).
+    """
+
+    records = {}
+    invalid = 0
+    first_error = None
+    for line_number, row in rows:
+        serializer = RecipeImportSerializer(data=row)
+        if not serializer.is_valid():
+            invalid += 1
+            if first_error is None:
+                first_error = f"line {line_number}: {json.dumps(serializer.errors)}"
+            continue
+        record = canonicalize_recipe(serializer.validated_data)
+        records.setdefault(record["dedupe_key"], record)
+
+    inserted = 0
+    if records and not _worker_dry_run:
+        inserted = len(_worker_repo.insert_recipes(list(records.values()), user_id=_worker_user_id))
+    elif _worker_dry_run:
+        inserted = len(records)
+    duplicates = len(rows) - invalid - inserted
+    return chunk_index, len(rows), inserted, duplicates, invalid, first_error
+
+
+def iter_source_rows(path: Path, source_format: str):
+    """
+    Stream (line_number, row) pairs from a JSONL or CSV file without loading it whole.
+    """
+
+    with path.open("r", encoding="utf-8", newline="") as handle:
+        if source_format == "jsonl":
+            for line_number, line in enumerate(handle, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_number, {}
+            return
+
+        reader = csv.DictReader(handle)
+        for line_number, row in enumerate(reader, start=2):
+            for column in JSON_COLUMNS:
+                value = row.get(column)
+                if value:
+                    try:
+                        row[column] = json.loads(value)
+                    except json.JSONDecodeError:
+                        pass
+            yield line_number, {key: value for key, value in row.items() if value not in (None, "")}
+
+
+def iter_chunks(rows, chunk_size):
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Checkpoint:
+    """
+    Tracks the contiguous prefix of chunks that finished, so a rerun can skip them.
+
+    Chunks complete out of order across workers; only the watermark (every chunk
+    below it is done) is persisted. Chunks past the watermark are re-sent on resume
+    and absorbed by the dedupe key.
+    """
+
+    def __init__(self, path: Path, source: Path, chunk_size: int):
+        self.path = path
+        self.source = str(source.resolve())
+        self.chunk_size = chunk_size
+        self.watermark = 0
+        self._done = set()
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        state = json.loads(self.path.read_text(encoding="utf-8"))
+        if state.get("source") != self.source or state.get("chunk_size") != self.chunk_size:
+            raise CommandError(
+                f"Checkpoint {self.path} was written for a different source or chunk size; pass --reset to discard it."
+            )
+        self.watermark = state.get("completed_chunks", 0)
+
+    def mark_done(self, chunk_index: int) -> None:
+        self._done.add(chunk_index)
+        advanced = False
+        while self.watermark in self._done:
+            self._done.discard(self.watermark)
+            self.watermark += 1
+            advanced = True
+        if advanced:
+            self.save()
+
+    def save(self) -> None:
+        state = {"source": self.source, "chunk_size": self.chunk_size, "completed_chunks": self.watermark}
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import recipes from a JSONL or CSV file. Rows are validated against the "
+        "GeneratedRecipe shape, canonicalized, de-duplicated by content and inserted in "
+        "chunks across a pool of worker processes with resumable checkpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="JSONL or CSV file to import.")
+        parser.add_argument(
+            "--format",
+            dest="source_format",
+            choices=("jsonl", "csv"),
+            help="Source format. Inferred from the file extension when omitted.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes. Use 0 to run in the current process.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per insert request.")
+        parser.add_argument(
+            "--checkpoint",
+            type=str,
+            help="Checkpoint file. Defaults to <path>.checkpoint.json.",
+        )
+        parser.add_argument("--reset", action="store_true", help="Ignore and overwrite an existing checkpoint.")
+        parser.add_argument("--created-by", type=str, help="Optional user id to attribute imported recipes to.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate and canonicalize without inserting.")
+
+    def handle(self, *args, **options):
+        source = Path(options["path"])
+        if not source.exists():
+            raise CommandError(f"Source file not found: {source}")
+
+        source_format = options.get("source_format") or ("csv" if source.suffix.lower() == ".csv" else "jsonl")
+        chunk_size = options["chunk_size"]
+        workers = options["workers"]
+        if chunk_size < 1 or workers < 0:
+            raise CommandError("--chunk-size must be positive and --workers non-negative.")
+
+        checkpoint = Checkpoint(
+            Path(options.get("checkpoint") or f"{source}.checkpoint.json"),
+            source,
+            chunk_size,
+        )
+        if not options["reset"]:
+            checkpoint.load()
+
+        init_args = (options.get("created_by"), options["dry_run"])
+        if not options["dry_run"]:
+            try:
+                SupabaseRepository()
+            except SupabaseConfigurationError as exc:
+                raise CommandError(str(exc)) from exc
+        chunks = enumerate(iter_chunks(iter_source_rows(source, source_format), chunk_size))
+        skipped_chunks = checkpoint.watermark
+        if skipped_chunks:
+            # Consume already-committed chunks without validating them.
+            for _ in islice(chunks, skipped_chunks):
+                pass
+            self.stdout.write(self.style.NOTICE(f"Resuming after {skipped_chunks} committed chunks."))
+
+        totals = {"rows": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+        started = time.perf_counter()
+
+        if workers == 0:
+            _init_worker(*init_args)
+            for chunk_index, rows in chunks:
+                self._record(_process_chunk(chunk_index, rows), totals, checkpoint, started)
+        else:
+            self._run_pool(chunks, workers, init_args, totals, checkpoint, started)
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {totals['rows']} rows in {elapsed:.1f}s "
+                f"({totals['rows'] / elapsed:,.0f} rows/sec): {totals['inserted']} inserted, "
+                f"{totals['duplicates']} duplicates, {totals['invalid']} invalid."
+            )
+        )
+
+    def _run_pool(self, chunks, workers, init_args, totals, checkpoint, started):
+        # Keep a bounded number of chunks in flight so memory stays flat on huge files.
+        max_in_flight = workers * 2
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+            pending = set()
+            for chunk_index, rows in chunks:
+                pending.add(pool.submit(_process_chunk, chunk_index, rows))
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._record(future.result(), totals, checkpoint, started)
+            for future in wait(pending).done:
+                self._record(future.result(), totals, checkpoint, started)
+
+    def _record(self, result, totals, checkpoint, started):
+        chunk_index, row_count, inserted, duplicates, invalid, first_error = result
+        totals["rows"] += row_count
+        totals["inserted"] += inserted
+        totals["duplicates"] += duplicates
+        totals["invalid"] += invalid
+        checkpoint.mark_done(chunk_index)
+
+        if first_error:
+            self.stderr.write(self.style.WARNING(f"Chunk {chunk_index}: {invalid} invalid rows, first at {first_error}"))
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(
+            f"chunk {chunk_index}: {totals['rows']} rows, {totals['rows'] / elapsed:,.0f} rows/sec"
+        )
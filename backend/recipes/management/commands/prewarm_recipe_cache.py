@@ -0,0 +1,156 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipes.services import (
+    RecipeCache,
+    RecipeGenerator,
+    SupabaseConfigurationError,
+    SupabaseRepository,
+    canonical_payload,
+    payload_key,
+)
+from recipes.services.sketches import HeavyHitters
+
+
+def _generate(payload):
+    generator = RecipeGenerator()
+    recipe = generator.generate(payload)
+    return recipe, generator.last_token_usage, generator.last_fallback_reason
+
+
+class Command(BaseCommand):
+    help = (
+        "Mine the most common pantry combinations from search_history with a streaming "
+        "heavy-hitters sketch and pre-generate recipes for them into the generation cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=50, help="Number of popular payloads to warm.")
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Only consider searches from the last N days (0 for all history).",
+        )
+        parser.add_argument("--parallelism", type=int, default=4, help="Concurrent LLM generations.")
+        parser.add_argument(
+            "--token-budget",
+            type=int,
+            default=200_000,
+            help="Stop scheduling generations once this many LLM tokens have been spent.",
+        )
+        parser.add_argument(
+            "--servings",
+            type=int,
+            default=2,
+            help="Servings assumed for history rows recorded before their full payload was.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report the candidates without generating.")
+
+    def handle(self, *args, **options):
+        top_n = options["top"]
+        parallelism = max(1, options["parallelism"])
+        token_budget = options["token_budget"]
+
+        try:
+            repo = SupabaseRepository()
+        except SupabaseConfigurationError as exc:
+            raise CommandError(str(exc)) from exc
+
+        since = None
+        if options["days"]:
+            since = (timezone.now() - timedelta(days=options["days"])).isoformat()
+
+        hitters = HeavyHitters(k=max(top_n * 4, 100))
+        legacy = 0
+        for row in repo.iter_search_payloads(since=since):
+            # The recorded payload already includes the searcher's profile preferences,
+            # so a warmed entry has the key the live request will look up.
+            recorded = row.get("payload") or {
+                "ingredients": row.get("ingredients") or [],
+                "diet_preferences": row.get("diet_preferences") or [],
+                "servings": options["servings"],
+            }
+            payload = canonical_payload(recorded)
+            if not payload["ingredients"]:
+                continue
+            legacy += not row.get("payload")
+            hitters.add(payload_key(payload), payload)
+
+        total = hitters.total
+        if not total:
+            self.stdout.write(self.style.WARNING("No search history found; nothing to warm."))
+            return
+
+        recipe_cache = RecipeCache()
+        candidates = hitters.top(top_n)
+        already_cached = [(key, count, payload) for key, count, payload in candidates if recipe_cache.contains(payload)]
+        to_warm = [(key, count, payload) for key, count, payload in candidates if not recipe_cache.contains(payload)]
+
+        self.stdout.write(
+            self.style.NOTICE(
+                f"Scanned {total} searches; {len(candidates)} popular payloads, "
+                f"{len(already_cached)} already cached."
+            )
+        )
+        if legacy:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{legacy} searches predate recorded payloads; they were keyed on ingredients, "
+                    f"diets and --servings={options['servings']} only and may not match live requests."
+                )
+            )
+        if options["dry_run"]:
+            for _, count, payload in candidates:
+                self.stdout.write(f"  ~{count:6d}  {', '.join(payload['ingredients'])} [{', '.join(payload['diet_preferences'])}]")
+            return
+
+        tokens_spent = 0
+        warmed_hits = 0
+        generated = 0
+        failed = 0
+        started = time.perf_counter()
+
+        queue = iter(to_warm)
+        with ThreadPoolExecutor(max_workers=parallelism) as pool:
+            pending = {}
+            while True:
+                # Average cost so far is the best guess for the next call.
+                completed = generated + failed
+                average = tokens_spent / completed if completed else 0
+                while len(pending) < parallelism and tokens_spent + average * (len(pending) + 1) <= token_budget:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    pending[pool.submit(_generate, item[2])] = item
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _, count, payload = pending.pop(future)
+                    recipe, tokens, fallback_reason = future.result()
+                    tokens_spent += tokens
+                    if fallback_reason is not None:
+                        failed += 1
+                        continue
+                    recipe_cache.set(payload, recipe.to_dict())
+                    generated += 1
+                    warmed_hits += count
+
+        skipped = len(to_warm) - generated - failed
+        elapsed = time.perf_counter() - started
+        covered = warmed_hits + sum(count for _, count, _ in already_cached)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Warmed {generated} payloads in {elapsed:.1f}s using {tokens_spent} tokens "
+                f"({failed} failed, {skipped} skipped by budget)."
+            )
+        )
+        self.stdout.write(
+            f"Estimated hit-rate uplift: {warmed_hits / total:.1%} of recent searches "
+            f"(cache now covers ~{covered / total:.1%})."
+        )
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.profiling import HEADER, profile_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Print a signed X-Profile-Request header value. Requests sending it are profiled "
+        "and answered with X-Profile-Id; it is valid for PROFILER_TOKEN_MAX_AGE_SECONDS."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{HEADER}: {profile_token()}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Valid for {settings.PROFILER_TOKEN_MAX_AGE_SECONDS} seconds.")
+        )
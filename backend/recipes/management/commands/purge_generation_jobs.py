@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.services import purge_expired_jobs
+
+
+class Command(BaseCommand):
+    help = "Delete asynchronous generation jobs older than GENERATION_JOB_TTL_SECONDS."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_jobs()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired generation jobs."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.idempotency import get_idempotency_store
+
+
+class Command(BaseCommand):
+    help = "Delete Idempotency-Key records older than IDEMPOTENCY_TTL_SECONDS (database store only)."
+
+    def handle(self, *args, **options):
+        deleted = get_idempotency_store().purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency records."))
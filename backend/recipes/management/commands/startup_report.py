@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from urllib.parse import urlparse, urlunparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def mask_database_url(url: str) -> str:
+    parsed_url = urlparse(url)
+    netloc = parsed_url.netloc
+    if parsed_url.username or parsed_url.password:
+        username = parsed_url.username or ""
+        host = parsed_url.hostname or ""
+        port = f":{parsed_url.port}" if parsed_url.port else ""
+        netloc = f"{username}:***@{host}{port}"
+    return urlunparse(
+        (
+            parsed_url.scheme,
+            netloc,
+            parsed_url.path,
+            parsed_url.params,
+            parsed_url.query,
+            parsed_url.fragment,
+        )
+    )
+
+
+def parse_importtime(output: str):
+    """
+    Parse `python -X importtime` stderr into (module, self_us, cumulative_us) rows.
+    """
+
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, module = parts
+        try:
+            rows.append((module.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            # Header line ("self [us] | cumulative | imported package").
+            continue
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Report where cold-start time goes by importing the WSGI entry point in a fresh "
+        "interpreter with `python -X importtime`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--module",
+            action="append",
+            dest="modules",
+            help="Module to import (repeatable). Defaults to config.wsgi and config.urls.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=15,
+            help="Number of packages and modules to list.",
+        )
+        parser.add_argument(
+            "--budget-ms",
+            type=float,
+            help="Fail when total import time exceeds this many milliseconds.",
+        )
+
+    def handle(self, *args, **options):
+        modules = options.get("modules") or ["config.wsgi", "config.urls"]
+        limit = options["limit"]
+
+        code = "; ".join(f"import {module}" for module in modules)
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings")}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=str(settings.BASE_DIR),
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Import failed:\n{result.stderr[-2000:]}")
+
+        rows = parse_importtime(result.stderr)
+        if not rows:
+            raise CommandError("No importtime output captured.")
+
+        total_us = sum(self_us for _, self_us, _ in rows)
+        by_package = defaultdict(int)
+        for module, self_us, _ in rows:
+            by_package[module.split(".")[0]] += self_us
+
+        database_url = os.getenv("DATABASE_URL")
+        self.stdout.write(self.style.NOTICE(f"Imported: {', '.join(modules)}"))
+        self.stdout.write(f"DATABASE_URL: {mask_database_url(database_url) if database_url else 'unset (SQLite default)'}")
+        self.stdout.write(f"Modules imported: {len(rows)}")
+        self.stdout.write(f"Total import time: {total_us / 1000:.1f} ms\n")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Top packages (self time)"))
+        for package, self_us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:limit]:
+            share = self_us / total_us * 100 if total_us else 0
+            self.stdout.write(f"  {self_us / 1000:9.1f} ms  {share:5.1f}%  {package}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Top modules (cumulative)"))
+        for module, _, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:limit]:
+            self.stdout.write(f"  {cumulative_us / 1000:9.1f} ms  {module}")
+
+        heavy = [name for name in ("langchain_openai", "langchain_core", "supabase", "openai") if name in by_package]
+        if heavy:
+            self.stdout.write(self.style.WARNING(f"Heavy dependencies loaded at startup: {', '.join(heavy)}"))
+
+        budget_ms = options.get("budget_ms")
+        if budget_ms is not None and total_us / 1000 > budget_ms:
+            raise CommandError(f"Cold start {total_us / 1000:.1f} ms exceeds budget of {budget_ms:.1f} ms.")
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:04
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('suggestion', 'Suggestion'), ('meal_plan', 'Meal Plan')], max_length=16)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('user_id', models.CharField(blank=True, db_index=True, max_length=64, null=True)),
+                ('throttle_ident', models.CharField(blank=True, default='', max_length=128)),
+                ('lane', models.PositiveSmallIntegerField(default=1)),
+                ('payload', models.JSONField()),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('result_status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField()),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='generation_job_due')],
+            },
+        ),
+    ]
@@ -1,3 +1,72 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class GenerationJob(models.Model):
+    """
+    A suggestion or meal plan requested with `Prefer: respond-async`.
+
+    The table is the durable queue: workers claim `queued` rows whose `available_at`
+    has passed, and a `running` row whose lease has expired is picked up again.
+    """
+
+    class Kind(models.TextChoices):
+        SUGGESTION = "suggestion"
+        MEAL_PLAN = "meal_plan"
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        SUCCEEDED = "succeeded"
+        FAILED = "failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    user_id = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # Caller identity for LLM token quotas, and admission lane (see services.admission).
+    throttle_ident = models.CharField(max_length=128, blank=True, default="")
+    lane = models.PositiveSmallIntegerField(default=1)
+    payload = models.JSONField()
+    result = models.JSONField(null=True, blank=True)
+    result_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField()
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [models.Index(fields=["status", "available_at"], name="generation_job_due")]
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.id} ({self.status})"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    The response to a write sent with an `Idempotency-Key` (see `recipes.idempotency`).
+
+    `response_status` stays null while the first request is running; `locked_until`
+    bounds how long retries wait on it.
+    """
+
+    # Caller identity as built by `throttle_ident` ("user:<id>" or "ip:<address>").
+    scope = models.CharField(max_length=128)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    response_headers = models.JSONField(null=True, blank=True)
+    locked_until = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["scope", "key"], name="idempotency_scope_key")]
+
+    def __str__(self) -> str:
+        return f"{self.scope} {self.key}"
@@ -0,0 +1,349 @@
+"""
+On-demand stack-sampling profiler for API requests.
+
+A request is profiled when it carries a valid signed `X-Profile-Request` header
+(`manage.py profile_token` mints one), when it falls in the `PROFILER_SAMPLE_PERCENT`
+share of requests, or once it has run longer than `PROFILER_SLOW_REQUEST_MS`; the last
+captures only the part of the request past the threshold. Requests that are not
+profiled cost a dictionary insert and removal.
+
+One daemon thread per process reads `sys._current_frames()` every
+`PROFILER_INTERVAL_MS` while a profile is being taken and sleeps otherwise. Each
+finished profile is written to `PROFILER_DIR` as `<id>.folded` - collapsed stacks, one
+`frame;frame;... count` line per distinct stack, the input format of flamegraph.pl and
+speedscope - next to `<id>.json` with the request's metadata. The oldest profiles are
+removed beyond `PROFILER_MAX_PROFILES`.
+
+Each session is anchored to the middleware frame of its request, and a sample only
+counts for a session while that frame is on the sampled stack. Concurrent async
+requests share the event loop thread but are kept apart this way. An async request's
+profile therefore shows where it ran on the CPU; while it awaits, the loop runs other
+work that is not attributed to it. A sync request's thread is its own, so time spent
+blocked in I/O shows up as the blocking call.
+"""
+
+import functools
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+
+from .services.metrics import register_metrics
+
+HEADER = "X-Profile-Request"
+RESPONSE_HEADER = "X-Profile-Id"
+SIGNING_SALT = "recipes.profiling"
+MAX_STACK_DEPTH = 128
+
+HEADER_REASON = "header"
+SAMPLED_REASON = "sampled"
+SLOW_REASON = "slow"
+
+
+@dataclass
+class Session:
+    key: int
+    thread_id: int
+    # The request's middleware frame; samples without it on the stack belong to others.
+    anchor: Any
+    started: float
+    reason: Optional[str]
+    # Monotonic time after which a slow request starts being sampled.
+    slow_after: Optional[float] = None
+    stacks: Counter = field(default_factory=Counter)
+    samples: int = 0
+
+
+@functools.lru_cache(maxsize=None)
+def _path_prefixes() -> tuple:
+    return tuple(sorted({os.path.join(path, "") for path in sys.path if path}, key=len, reverse=True))
+
+
+@functools.lru_cache(maxsize=8192)
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for prefix in _path_prefixes():
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _walk(frame) -> List[Any]:
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    return frames
+
+
+def collapse(frame) -> str:
+    """The stack under `frame` as `outermost;...;innermost`."""
+
+    frames = _walk(frame)[:MAX_STACK_DEPTH]
+    return ";".join(_frame_label(each.f_code) for each in reversed(frames))
+
+
+class StackSampler:
+    """
+    Samples the threads of the registered sessions. The thread starts with the first
+    session and waits on an event while nothing needs sampling.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sessions: Dict[int, Session] = {}
+        self._keys = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self.profiles_written = 0
+
+    def start(self, reason: Optional[str], slow_after: Optional[float], anchor) -> Session:
+        now = time.monotonic()
+        with self._lock:
+            session = Session(
+                key=next(self._keys),
+                thread_id=threading.get_ident(),
+                anchor=anchor,
+                started=now,
+                reason=reason,
+                slow_after=None if slow_after is None else now + slow_after,
+            )
+            self._sessions[session.key] = session
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return session
+
+    def stop(self, session: Session) -> Session:
+        with self._lock:
+            self._sessions.pop(session.key, None)
+        session.anchor = None
+        return session
+
+    def sample(self, now: float) -> Optional[float]:
+        """Take one sample of every due session; seconds until the next one is due, or None."""
+
+        with self._lock:
+            if not self._sessions:
+                return None
+            due = []
+            next_due = None
+            for session in self._sessions.values():
+                if session.reason is None:
+                    if now < session.slow_after:
+                        wait = session.slow_after - now
+                        next_due = wait if next_due is None else min(next_due, wait)
+                        continue
+                    session.reason = SLOW_REASON
+                due.append(session)
+            if due:
+                frames = sys._current_frames()
+                # Per thread: the frame ids on its stack and the collapsed stack.
+                stacks: Dict[int, Any] = {}
+                for session in due:
+                    if session.thread_id not in stacks:
+                        frame = frames.get(session.thread_id)
+                        stacks[session.thread_id] = (
+                            {id(each) for each in _walk(frame)},
+                            collapse(frame) if frame is not None else "",
+                        )
+                    on_stack, stack = stacks[session.thread_id]
+                    if id(session.anchor) in on_stack:
+                        session.stacks[stack] += 1
+                        session.samples += 1
+                return self.interval
+            return next_due
+
+    def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            timeout = self.sample(time.monotonic())
+            self._wake.wait(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            active = sum(1 for session in self._sessions.values() if session.reason is not None)
+            watched = len(self._sessions) - active
+        return {"active": active, "watched": watched, "profiles_written": self.profiles_written}
+
+
+_sampler: Optional[StackSampler] = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler() -> StackSampler:
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = StackSampler(getattr(settings, "PROFILER_INTERVAL_MS", 5) / 1000)
+    return _sampler
+
+
+def reset_sampler() -> None:
+    global _sampler
+    with _sampler_lock:
+        _sampler = None
+
+
+def profile_token() -> str:
+    """A value for the `X-Profile-Request` header, valid for `PROFILER_TOKEN_MAX_AGE_SECONDS`."""
+
+    return signing.dumps("profile", salt=SIGNING_SALT)
+
+
+def _valid_token(value: str) -> bool:
+    try:
+        signing.loads(value, salt=SIGNING_SALT, max_age=getattr(settings, "PROFILER_TOKEN_MAX_AGE_SECONDS", 3600))
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def profile_dir() -> Path:
+    return Path(getattr(settings, "PROFILER_DIR", Path(settings.BASE_DIR) / "profiles"))
+
+
+def write_profile(session: Session, request, status_code: int) -> Optional[str]:
+    """Write `<id>.folded` and `<id>.json`, prune old profiles and return the id."""
+
+    if not session.stacks:
+        return None
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = str(uuid.uuid4())
+    folded = "".join(f"{stack} {count}\n" for stack, count in session.stacks.most_common())
+    (directory / f"{profile_id}.folded").write_text(folded, encoding="utf-8")
+    metadata = {
+        "id": profile_id,
+        "method": request.method,
+        "path": request.path,
+        "status": status_code,
+        "duration_ms": round((time.monotonic() - session.started) * 1000, 1),
+        "reason": session.reason,
+        "samples": session.samples,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    # The metadata file is written last; listings only show complete profiles.
+    (directory / f"{profile_id}.json").write_text(json.dumps(metadata), encoding="utf-8")
+    get_sampler().profiles_written += 1
+    _prune(directory)
+    return profile_id
+
+
+def _prune(directory: Path) -> None:
+    keep = getattr(settings, "PROFILER_MAX_PROFILES", 200)
+    entries = sorted(directory.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for stale in entries[keep:]:
+        stale.with_suffix(".folded").unlink(missing_ok=True)
+        stale.unlink(missing_ok=True)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Metadata of the stored profiles, newest first."""
+
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in directory.glob("*.json"):
+        try:
+            profiles.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda profile: profile.get("created_at", ""), reverse=True)
+
+
+def profile_path(profile_id: str) -> Optional[Path]:
+    path = profile_dir() / f"{uuid.UUID(str(profile_id))}.folded"
+    return path if path.is_file() else None
+
+
+def _begin(request, anchor) -> Optional[Session]:
+    token = request.headers.get(HEADER)
+    if token and _valid_token(token):
+        reason = HEADER_REASON
+    elif random.random() * 100 < getattr(settings, "PROFILER_SAMPLE_PERCENT", 0):
+        reason = SAMPLED_REASON
+    else:
+        reason = None
+    slow_ms = getattr(settings, "PROFILER_SLOW_REQUEST_MS", 0)
+    if reason is None and not slow_ms:
+        return None
+    return get_sampler().start(reason, slow_ms / 1000 if reason is None else None, anchor)
+
+
+def _finish(session: Session, request, response) -> None:
+    get_sampler().stop(session)
+    if session.reason is None:
+        return
+    profile_id = write_profile(session, request, getattr(response, "status_code", 500))
+    if profile_id and response is not None:
+        response[RESPONSE_HEADER] = profile_id
+
+
+def profiling_middleware(get_response):
+    """Profile requests as configured; profiled responses carry `X-Profile-Id`."""
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            session = _begin(request, sys._getframe())
+            if session is None:
+                return await get_response(request)
+            response = None
+            try:
+                response = await get_response(request)
+            finally:
+                await sync_to_async(_finish)(session, request, response)
+            return response
+
+        return markcoroutinefunction(middleware)
+
+    def middleware(request):
+        session = _begin(request, sys._getframe())
+        if session is None:
+            return get_response(request)
+        response = None
+        try:
+            response = get_response(request)
+        finally:
+            _finish(session, request, response)
+        return response
+
+    return middleware
+
+
+profiling_middleware.sync_capable = True
+profiling_middleware.async_capable = True
+
+register_metrics("profiler", lambda: get_sampler().snapshot())
+
+
+__all__ = [
+    "StackSampler",
+    "collapse",
+    "get_sampler",
+    "list_profiles",
+    "profile_path",
+    "profile_token",
+    "profiling_middleware",
+    "reset_sampler",
+    "write_profile",
+]
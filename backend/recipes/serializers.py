@@ -1,5 +1,14 @@
+import json
+import uuid
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
 from rest_framework import serializers
 
+from .services.exporter import EXPORT_DATASETS, EXPORT_FORMATS
+from .services.fields import RECIPE_FIELDS, RECIPE_PROJECTIONS
+from .services.validation import CompiledSerializer
+
 
 class IngredientSerializer(serializers.Serializer):
     name = serializers.CharField()
@@ -11,6 +20,25 @@ class InstructionSerializer(serializers.Serializer):
     description = serializers.CharField()
 
 
+class RecipeImportSerializer(serializers.Serializer):
+    """
+    Validates externally sourced recipes against the `GeneratedRecipe` shape.
+    """
+
+    title = serializers.CharField(max_length=300)
+    description = serializers.CharField(required=False, allow_blank=True, default="")
+    servings = serializers.IntegerField(required=False, min_value=1, default=2)
+    prep_time_minutes = serializers.IntegerField(required=False, min_value=0, default=15)
+    cook_time_minutes = serializers.IntegerField(required=False, min_value=0, default=20)
+    ingredients = IngredientSerializer(many=True, allow_empty=False)
+    instructions = InstructionSerializer(many=True, required=False, default=list)
+    nutrition = serializers.DictField(required=False, default=dict)
+    shopping_list = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    image_url = serializers.URLField(required=False, allow_blank=True, allow_null=True, default=None)
+    source = serializers.CharField(required=False, allow_blank=True, default="import")
+    model_version = serializers.CharField(required=False, allow_blank=True, allow_null=True, default=None)
+
+
 class RecipeSuggestionRequestSerializer(serializers.Serializer):
     ingredients = serializers.ListField(
         child=serializers.CharField(),
@@ -28,7 +56,11 @@ class RecipeSuggestionRequestSerializer(serializers.Serializer):
     )
     cuisine = serializers.CharField(required=False, allow_blank=True)
     servings = serializers.IntegerField(required=False, min_value=1, default=2)
+    calorie_target = serializers.IntegerField(required=False, min_value=0, allow_null=True)
     notes = serializers.CharField(required=False, allow_blank=True)
+    # "reuse" only serves stored recipes, "generate" always calls the model and
+    # "auto" reuses a stored recipe when it covers the pantry well enough.
+    mode = serializers.ChoiceField(choices=("auto", "reuse", "generate"), required=False, default="auto")
 
     def validate(self, attrs):
         text = " ".join(
@@ -43,6 +75,16 @@ class RecipeSuggestionRequestSerializer(serializers.Serializer):
         return attrs
 
 
+class MealPlanRequestSerializer(RecipeSuggestionRequestSerializer):
+    mode = None
+    days = serializers.IntegerField(required=False, min_value=1, max_value=14, default=7)
+
+
+# The generation endpoints validate through compiled checks; errors still come from DRF.
+suggestion_request_schema = CompiledSerializer(RecipeSuggestionRequestSerializer)
+meal_plan_request_schema = CompiledSerializer(MealPlanRequestSerializer)
+
+
 class RecipeListQuerySerializer(serializers.Serializer):
     limit = serializers.IntegerField(required=False, min_value=1, max_value=50, default=20)
     scope = serializers.ChoiceField(
@@ -50,6 +92,55 @@ class RecipeListQuerySerializer(serializers.Serializer):
         required=False,
         default="mine",
     )
+    # A named projection ("card", "full") or a comma-separated list of columns.
+    fields = serializers.CharField(required=False, default="card")
+
+    def validate_fields(self, value):
+        if value in RECIPE_PROJECTIONS:
+            return RECIPE_PROJECTIONS[value]
+        requested = [item.strip() for item in value.split(",") if item.strip()]
+        unknown = sorted(set(requested) - set(RECIPE_FIELDS))
+        if unknown or not requested:
+            raise serializers.ValidationError(
+                f"Use {' or '.join(RECIPE_PROJECTIONS)}, or a comma-separated list of: {', '.join(RECIPE_FIELDS)}."
+            )
+        return tuple(dict.fromkeys(requested))
+
+
+def encode_search_cursor(after) -> str:
+    """Opaque `cursor` for the page after the (rank, id) pair `search_recipes` returned."""
+
+    rank, recipe_id = after
+    return urlsafe_b64encode(json.dumps([rank, recipe_id]).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+class RecipeSearchQuerySerializer(RecipeListQuerySerializer):
+    q = serializers.CharField(min_length=2, max_length=200, trim_whitespace=True)
+    cursor = serializers.CharField(required=False)
+
+    def validate_cursor(self, value):
+        try:
+            rank, recipe_id = json.loads(urlsafe_b64decode(value + "=" * (-len(value) % 4)))
+            return float(rank), str(uuid.UUID(recipe_id))
+        except (ValueError, TypeError):
+            raise serializers.ValidationError("Invalid cursor.")
+
+
+class RecipeRescaleQuerySerializer(serializers.Serializer):
+    servings = serializers.IntegerField(min_value=1, max_value=100)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=EXPORT_FORMATS, required=False, default=EXPORT_FORMATS[0])
+    datasets = serializers.CharField(required=False, default=",".join(EXPORT_DATASETS))
+    gzip = serializers.BooleanField(required=False, default=False)
+
+    def validate_datasets(self, value):
+        requested = {item.strip() for item in value.split(",") if item.strip()}
+        unknown = requested - set(EXPORT_DATASETS)
+        if unknown or not requested:
+            raise serializers.ValidationError(f"Choose one or more of: {', '.join(EXPORT_DATASETS)}.")
+        return [dataset for dataset in EXPORT_DATASETS if dataset in requested]
 
 
 class FavoriteToggleSerializer(serializers.Serializer):
@@ -57,6 +148,20 @@ class FavoriteToggleSerializer(serializers.Serializer):
     action = serializers.ChoiceField(choices=("add", "remove"))
 
 
+class FavoriteBulkSerializer(serializers.Serializer):
+    add = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+    remove = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+
+    def validate(self, attrs):
+        max_items = getattr(settings, "FAVORITES_BULK_MAX_ITEMS", 500)
+        total = len(attrs.get("add", [])) + len(attrs.get("remove", []))
+        if not total:
+            raise serializers.ValidationError("Provide at least one recipe id to add or remove.")
+        if total > max_items:
+            raise serializers.ValidationError(f"A bulk request may contain at most {max_items} recipe ids.")
+        return attrs
+
+
 class ProfileUpdateSerializer(serializers.Serializer):
     display_name = serializers.CharField(required=False, allow_blank=True, max_length=120)
     avatar_url = serializers.URLField(required=False, allow_blank=True)
@@ -1,11 +1,119 @@
-from .supabase_client import get_supabase_client, SupabaseConfigurationError
-from .repositories import SupabaseRepository
-from .recipe_generator import RecipeGenerator, GeneratedRecipe
-
-__all__ = [
-    "get_supabase_client",
-    "SupabaseConfigurationError",
-    "SupabaseRepository",
-    "RecipeGenerator",
-    "GeneratedRecipe",
-]
\ No newline at end of file
+"""
+Service layer for the recipes app.
+
+Public names are resolved lazily (PEP 562) so importing the package - which every
+view module, management command and health check does - does not pull in the
+LangChain or Supabase stacks until a service that needs them is first used.
+"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+_EXPORTS = {
+    "get_supabase_client": ".supabase_client",
+    "SupabaseConfigurationError": ".supabase_client",
+    "get_async_supabase_client": ".supabase_client",
+    "SupabaseRepository": ".repositories",
+    "AsyncSupabaseRepository": ".async_repositories",
+    "RecipeGenerator": ".recipe_generator",
+    "AdmissionRejected": ".admission",
+    "get_admission_controller": ".admission",
+    "request_lane": ".admission",
+    "reset_admission_controller": ".admission",
+    "collect_metrics": ".metrics",
+    "ModelRouter": ".model_router",
+    "ModelTier": ".model_router",
+    "complexity_score": ".model_router",
+    "get_model_router": ".model_router",
+    "reset_model_router": ".model_router",
+    "GeneratedRecipe": ".recipe_generator",
+    "ProfileCache": ".profile_cache",
+    "apply_profile_preferences": ".profile_cache",
+    "canonical_ingredient": ".canonical",
+    "canonical_ingredients": ".canonical",
+    "canonicalize_recipe": ".canonical",
+    "recipe_dedupe_key": ".canonical",
+    "RecipeCache": ".generation_cache",
+    "canonical_payload": ".generation_cache",
+    "payload_key": ".generation_cache",
+    "consolidate_shopping_list": ".shopping_list",
+    "rescale_recipe": ".scaling",
+    "Adaptation": ".substitutions",
+    "adapt_recipe": ".substitutions",
+    "scale_quantity": ".scaling",
+    "NearDuplicateIndex": ".near_duplicates",
+    "get_near_duplicate_index": ".near_duplicates",
+    "recipe_signature": ".near_duplicates",
+    "reset_near_duplicate_index": ".near_duplicates",
+    "PantryIndex": ".pantry_index",
+    "get_pantry_index": ".pantry_index",
+    "reset_pantry_index": ".pantry_index",
+    "SuggestionResult": ".suggestions",
+    "plan_meals": ".suggestions",
+    "store_recipes": ".suggestions",
+    "suggest_recipe": ".suggestions",
+    "aplan_meals": ".suggestions",
+    "asuggest_recipe": ".suggestions",
+    "warm_indexes": ".suggestions",
+    "CompiledSerializer": ".validation",
+    "get_job_pool": ".jobs",
+    "purge_expired_jobs": ".jobs",
+    "run_job": ".jobs",
+    "submit_job": ".jobs",
+    "ImagePipeline": ".images",
+    "request_image_backfill": ".images",
+    "EXPORT_DATASETS": ".exporter",
+    "EXPORT_FORMATS": ".exporter",
+    "export_filename": ".exporter",
+    "stream_export": ".exporter",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:  # pragma: no cover - static analysis only
+    from .admission import AdmissionRejected, get_admission_controller, request_lane, reset_admission_controller
+    from .async_repositories import AsyncSupabaseRepository
+    from .canonical import canonical_ingredient, canonical_ingredients, canonicalize_recipe, recipe_dedupe_key
+    from .exporter import EXPORT_DATASETS, EXPORT_FORMATS, export_filename, stream_export
+    from .generation_cache import RecipeCache, canonical_payload, payload_key
+    from .images import ImagePipeline, request_image_backfill
+    from .jobs import get_job_pool, purge_expired_jobs, run_job, submit_job
+    from .metrics import collect_metrics
+    from .model_router import ModelRouter, ModelTier, complexity_score, get_model_router, reset_model_router
+    from .near_duplicates import (
+        NearDuplicateIndex,
+        get_near_duplicate_index,
+        recipe_signature,
+        reset_near_duplicate_index,
+    )
+    from .pantry_index import PantryIndex, get_pantry_index, reset_pantry_index
+    from .profile_cache import ProfileCache, apply_profile_preferences
+    from .recipe_generator import GeneratedRecipe, RecipeGenerator
+    from .repositories import SupabaseRepository
+    from .scaling import rescale_recipe, scale_quantity
+    from .substitutions import Adaptation, adapt_recipe
+    from .shopping_list import consolidate_shopping_list
+    from .suggestions import (
+        SuggestionResult,
+        aplan_meals,
+        asuggest_recipe,
+        plan_meals,
+        store_recipes,
+        suggest_recipe,
+        warm_indexes,
+    )
+    from .supabase_client import SupabaseConfigurationError, get_async_supabase_client, get_supabase_client
+    from .validation import CompiledSerializer
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,279 @@
+"""
+Admission control for LLM calls.
+
+Each process runs at most `LLM_MAX_CONCURRENCY` completions at once. Callers beyond
+that wait in a bounded priority queue - signed-in users ahead of anonymous ones - for
+at most `LLM_QUEUE_TIMEOUT_SECONDS`. When the queue is full the request is rejected
+immediately (or, if it outranks someone already waiting, the lowest-priority waiter
+is rejected instead), so slow completions never pile up on every worker thread and
+cheap endpoints keep their threads.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from django.conf import settings
+
+from .metrics import register_metrics
+
+LANE_AUTHENTICATED = 0
+LANE_ANONYMOUS = 1
+LANE_NAMES = {LANE_AUTHENTICATED: "authenticated", LANE_ANONYMOUS: "anonymous"}
+
+# Upper bounds (seconds) of the queue wait histogram; the last bucket is open-ended.
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class AdmissionRejected(Exception):
+    """Raised when an LLM call is shed; `retry_after` is a hint in whole seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Recipe generation is busy ({reason}); retry in {retry_after}s.")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued caller: a blocked thread (`event`) or a suspended coroutine (`future`)."""
+
+    __slots__ = ("lane", "event", "future", "loop", "state")
+
+    def __init__(self, lane: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.lane = lane
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.state: Optional[str] = None
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            # `release` may run on any thread; the future belongs to its loop.
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int, max_queue: int, timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._waiters: List[tuple] = []
+        self._active = 0
+        # Exponentially weighted mean of how long an admitted call holds its slot.
+        self._service_seconds = 0.0
+        self._admitted = {lane: 0 for lane in LANE_NAMES}
+        self._rejected = {"queue_full": 0, "timeout": 0, "evicted": 0}
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @contextmanager
+    def admit(self, lane: int = LANE_ANONYMOUS) -> Iterator[None]:
+        self.acquire(lane)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def aadmit(self, lane: int = LANE_ANONYMOUS) -> AsyncIterator[None]:
+        """`admit` for coroutines: waiting for a slot suspends the task, not a thread."""
+
+        await self.aacquire(lane)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def acquire(self, lane: int = LANE_ANONYMOUS) -> None:
+        if self.max_concurrency <= 0:
+            return
+        started = time.monotonic()
+        entry = self._enqueue(lane)
+        if entry is None:
+            return
+        entry[2].event.wait(self.timeout)
+        self._settle(entry, started)
+
+    async def aacquire(self, lane: int = LANE_ANONYMOUS) -> None:
+        if self.max_concurrency <= 0:
+            return
+        started = time.monotonic()
+        entry = self._enqueue(lane, asyncio.get_running_loop())
+        if entry is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(entry[2].future), self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # The client went away: give up the place in line, or the slot if it
+            # was handed over while the cancellation was in flight.
+            with self._lock:
+                if entry[2].state == "admitted":
+                    self._hand_off()
+                elif entry[2].state is None:
+                    entry[2].state = "cancelled"
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+            raise
+        self._settle(entry, started)
+
+    def _enqueue(self, lane: int, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[tuple]:
+        """Take a free slot (returns None) or join the queue (returns the entry)."""
+
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                self._record_admitted(lane, 0.0)
+                return None
+            if len(self._waiters) >= self.max_queue and not self._evict_below(lane):
+                self._rejected["queue_full"] += 1
+                raise AdmissionRejected("queue full", self._retry_after())
+            entry = (lane, next(self._sequence), _Waiter(lane, loop))
+            heapq.heappush(self._waiters, entry)
+            return entry
+
+    def _settle(self, entry: tuple, started: float) -> None:
+        lane, _, waiter = entry
+        with self._lock:
+            if waiter.state == "admitted":
+                self._record_admitted(lane, time.monotonic() - started)
+                return
+            if waiter.state is None:
+                waiter.state = "timeout"
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._rejected["timeout"] += 1
+            raise AdmissionRejected(waiter.state, self._retry_after())
+
+    def release(self, held_seconds: float = 0.0) -> None:
+        if self.max_concurrency <= 0:
+            return
+        with self._lock:
+            self._service_seconds = held_seconds if not self._service_seconds else (
+                0.8 * self._service_seconds + 0.2 * held_seconds
+            )
+            self._hand_off()
+
+    def _hand_off(self) -> None:
+        if self._waiters:
+            # Hand the slot straight to the next waiter; `_active` is unchanged.
+            _, _, waiter = heapq.heappop(self._waiters)
+            waiter.state = "admitted"
+            waiter.wake()
+        else:
+            self._active -= 1
+
+    def _evict_below(self, lane: int) -> bool:
+        """Reject the newest waiter of a lower-priority lane to make room for `lane`."""
+
+        if not self._waiters:
+            return False
+        victim = max(self._waiters, key=lambda entry: (entry[0], entry[1]))
+        if victim[0] <= lane:
+            return False
+        self._waiters.remove(victim)
+        heapq.heapify(self._waiters)
+        victim[2].state = "evicted"
+        victim[2].wake()
+        self._rejected["evicted"] += 1
+        return True
+
+    def _retry_after(self) -> int:
+        """Rough time for the current queue to drain, given the mean service time."""
+
+        if not self._service_seconds:
+            return max(1, math.ceil(self.timeout))
+        rounds = (len(self._waiters) + 1) / self.max_concurrency
+        return max(1, math.ceil(rounds * self._service_seconds))
+
+    def _record_admitted(self, lane: int, waited: float) -> None:
+        self._admitted[lane] = self._admitted.get(lane, 0) + 1
+        self._wait_buckets[bisect_left(WAIT_BUCKETS, waited)] += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            queued = {name: 0 for name in LANE_NAMES.values()}
+            for lane, _, _ in self._waiters:
+                queued[LANE_NAMES.get(lane, str(lane))] += 1
+            admitted = sum(self._admitted.values())
+            buckets = {f"le_{bound:g}": count for bound, count in zip(WAIT_BUCKETS, self._wait_buckets)}
+            buckets["le_inf"] = self._wait_buckets[-1]
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "in_flight": self._active,
+                "queue_depth": len(self._waiters),
+                "queued": queued,
+                "admitted": {LANE_NAMES.get(lane, str(lane)): count for lane, count in self._admitted.items()},
+                "rejected": dict(self._rejected),
+                "wait_seconds": {
+                    "count": admitted,
+                    "mean": self._wait_total / admitted if admitted else 0.0,
+                    "max": self._wait_max,
+                    "buckets": buckets,
+                },
+                "service_seconds_ewma": self._service_seconds,
+            }
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    max_concurrency=getattr(settings, "LLM_MAX_CONCURRENCY", 4),
+                    max_queue=getattr(settings, "LLM_QUEUE_MAX", 8),
+                    timeout=getattr(settings, "LLM_QUEUE_TIMEOUT_SECONDS", 15.0),
+                )
+    return _controller
+
+
+def reset_admission_controller() -> None:
+    global _controller
+    with _controller_lock:
+        _controller = None
+
+
+def request_lane(request) -> int:
+    user = getattr(request, "user", None)
+    return LANE_AUTHENTICATED if getattr(user, "is_authenticated", False) else LANE_ANONYMOUS
+
+
+register_metrics("llm_admission", lambda: get_admission_controller().snapshot())
+
+
+__all__ = [
+    "AdmissionController",
+    "AdmissionRejected",
+    "LANE_ANONYMOUS",
+    "LANE_AUTHENTICATED",
+    "get_admission_controller",
+    "request_lane",
+    "reset_admission_controller",
+]
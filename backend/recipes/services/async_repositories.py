@@ -0,0 +1,148 @@
+"""
+Supabase access for the async views, on the async Supabase client.
+
+Covers the queries the request path needs; independent queries run concurrently.
+Bulk walks (index rebuilds, exports, dedupe) stay on the sync `SupabaseRepository`,
+reachable as `.sync` for callers that hand such work to a thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Set
+
+from .fields import RECIPE_CARD_FIELDS, RECIPE_FIELDS, select_columns
+from .profile_cache import ProfileCache
+from .repositories import SupabaseRepository, favorite_recipes, history_record
+from .supabase_client import get_async_supabase_client
+
+if TYPE_CHECKING:  # pragma: no cover - imported lazily at runtime
+    from supabase import AsyncClient
+
+
+class AsyncSupabaseRepository:
+    def __init__(self, client: AsyncClient, profile_cache: Optional[ProfileCache] = None):
+        self.client = client
+        self.profile_cache = profile_cache or ProfileCache()
+        self._sync: Optional[SupabaseRepository] = None
+
+    @classmethod
+    async def create(cls) -> "AsyncSupabaseRepository":
+        return cls(await get_async_supabase_client())
+
+    @property
+    def sync(self) -> SupabaseRepository:
+        if self._sync is None:
+            self._sync = SupabaseRepository(profile_cache=self.profile_cache)
+        return self._sync
+
+    # Recipes -----------------------------------------------------------------
+    async def insert_recipe(self, recipe_data: Dict[str, Any], user_id: Optional[str]) -> Optional[str]:
+        response = await self.client.table("recipes").insert({**recipe_data, "created_by": user_id}).execute()
+        data = getattr(response, "data", None)
+        if not data:
+            return None
+        return data[0].get("id")
+
+    async def insert_recipe_batch(self, records: List[Dict[str, Any]], user_id: Optional[str]) -> List[Optional[str]]:
+        if not records:
+            return []
+        payload = [{**record, "created_by": user_id} for record in records]
+        response = await self.client.table("recipes").insert(payload).execute()
+        ids = [row.get("id") for row in (getattr(response, "data", None) or [])]
+        return ids + [None] * (len(records) - len(ids))
+
+    async def list_recipes(
+        self,
+        user_id: Optional[str],
+        scope: str = "mine",
+        limit: int = 20,
+        fields: Sequence[str] = RECIPE_CARD_FIELDS,
+    ) -> List[Dict[str, Any]]:
+        columns = select_columns(fields)
+        if scope == "favorites":
+            if not user_id:
+                return []
+            response = await (
+                self.client.table("favorites")
+                .select(f"recipe:recipes({columns})")
+                .eq("user_id", user_id)
+                .order("created_at", desc=True)
+                .limit(limit)
+                .execute()
+            )
+            return favorite_recipes(getattr(response, "data", []) or [])
+
+        query = self.client.table("recipes").select(columns).order("created_at", desc=True).limit(limit)
+        if scope == "mine" and user_id:
+            query = query.eq("created_by", user_id)
+        if not user_id:
+            response = await query.execute()
+            return getattr(response, "data", []) or []
+
+        # The favorite ids do not depend on which recipes come back.
+        response, favorite_ids = await asyncio.gather(query.execute(), self.get_favorite_ids(user_id))
+        records = getattr(response, "data", []) or []
+        for record in records:
+            record["is_favorite"] = record.get("id") in favorite_ids
+        return records
+
+    async def get_recipe(self, recipe_id: str, fields: Sequence[str] = RECIPE_FIELDS) -> Optional[Dict[str, Any]]:
+        response = await (
+            self.client.table("recipes")
+            .select(select_columns(fields))
+            .eq("id", recipe_id)
+            .maybe_single()
+            .execute()
+        )
+        return getattr(response, "data", None) or None
+
+    # Favorites ---------------------------------------------------------------
+    async def is_favorite(self, user_id: str, recipe_id: str) -> bool:
+        response = await (
+            self.client.table("favorites")
+            .select("recipe_id")
+            .eq("user_id", user_id)
+            .eq("recipe_id", recipe_id)
+            .limit(1)
+            .execute()
+        )
+        return bool(getattr(response, "data", None))
+
+    async def get_favorite_ids(self, user_id: str) -> Set[str]:
+        response = await self.client.table("favorites").select("recipe_id").eq("user_id", user_id).execute()
+        data = getattr(response, "data", []) or []
+        return {item.get("recipe_id") for item in data if item.get("recipe_id")}
+
+    # Search history ---------------------------------------------------------
+    async def log_search_history(
+        self,
+        user_id: Optional[str],
+        query_payload: Dict[str, Any],
+        generated_recipe_id: Optional[str],
+    ) -> Optional[str]:
+        if not user_id:
+            return None
+        response = await (
+            self.client.table("search_history")
+            .insert(history_record(user_id, query_payload, generated_recipe_id))
+            .execute()
+        )
+        data = getattr(response, "data", None)
+        if not data:
+            return None
+        return data[0].get("id")
+
+    # Profiles ---------------------------------------------------------------
+    async def get_profile(self, user_id: str) -> Dict[str, Any]:
+        cached = self.profile_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        response = await self.client.table("profiles").select("*").eq("id", user_id).maybe_single().execute()
+        profile = getattr(response, "data", {}) or {}
+        self.profile_cache.set(user_id, profile)
+        return profile
+
+
+__all__ = ["AsyncSupabaseRepository"]
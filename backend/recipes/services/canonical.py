@@ -0,0 +1,129 @@
+import hashlib
+import json
+import re
+from typing import Any, Dict, Iterable, List
+
+_WHITESPACE = re.compile(r"\s+")
+_NON_WORD = re.compile(r"[^\w\s-]")
+
+# Irregular or ambiguous forms that the suffix rules below would get wrong.
+INGREDIENT_ALIASES = {
+    "tomatoes": "tomato",
+    "potatoes": "potato",
+    "leaves": "leaf",
+    "chilies": "chili",
+    "chillies": "chili",
+    "chilli": "chili",
+    "scallions": "green onion",
+    "spring onion": "green onion",
+    "spring onions": "green onion",
+    "garbanzo beans": "chickpea",
+    "garbanzo bean": "chickpea",
+    "aubergine": "eggplant",
+    "courgette": "zucchini",
+    "coriander leaves": "cilantro",
+    "capsicum": "bell pepper",
+    "hass avocado": "avocado",
+    "molasses": "molasses",
+}
+
+_KEEP_TRAILING_S = ("ss", "us", "is")
+
+
+def _singularize(word: str) -> str:
+    if len(word) <= 3 or word.endswith(_KEEP_TRAILING_S):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "oes", "xes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def canonical_ingredient(name: Any) -> str:
+    """
+    Normalize an ingredient name into the key used for caching, indexing and dedupe.
+
+    Lowercases, strips punctuation, collapses whitespace, resolves known aliases and
+    singularizes the last word ("Cherry Tomatoes " -> "cherry tomato").
+    """
+
+    if not isinstance(name, str):
+        return ""
+    text = _WHITESPACE.sub(" ", _NON_WORD.sub(" ", name.lower())).strip()
+    if not text:
+        return ""
+    if text in INGREDIENT_ALIASES:
+        return INGREDIENT_ALIASES[text]
+    words = text.split(" ")
+    words[-1] = _singularize(words[-1])
+    text = " ".join(words)
+    return INGREDIENT_ALIASES.get(text, text)
+
+
+def canonical_ingredients(names: Iterable[Any]) -> List[str]:
+    """Canonicalize, drop empties and de-duplicate while keeping first-seen order."""
+
+    return list(dict.fromkeys(key for key in (canonical_ingredient(name) for name in names or []) if key))
+
+
+def canonical_title(title: Any) -> str:
+    if not isinstance(title, str):
+        return ""
+    return _WHITESPACE.sub(" ", title).strip()
+
+
+def recipe_dedupe_key(record: Dict[str, Any]) -> str:
+    """
+    Stable identity for a recipe: its normalized title plus sorted canonical ingredients.
+    """
+
+    names = sorted(canonical_ingredients(item.get("name") for item in record.get("ingredients") or []))
+    material = json.dumps([canonical_title(record.get("title")).lower(), names], separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def canonicalize_recipe(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn a validated recipe payload into the row shape stored in `recipes`.
+    """
+
+    ingredients = []
+    for item in data.get("ingredients") or []:
+        name = _WHITESPACE.sub(" ", str(item.get("name", ""))).strip()
+        if not name:
+            continue
+        ingredients.append({"name": name, "quantity": _WHITESPACE.sub(" ", str(item.get("quantity") or "")).strip()})
+
+    instructions = [
+        {"step": index, "description": _WHITESPACE.sub(" ", str(item.get("description", ""))).strip()}
+        for index, item in enumerate(sorted(data.get("instructions") or [], key=lambda item: item.get("step", 0)), start=1)
+    ]
+
+    record = {
+        "title": canonical_title(data.get("title")),
+        "description": (data.get("description") or "").strip(),
+        "servings": data.get("servings"),
+        "prep_time_minutes": data.get("prep_time_minutes"),
+        "cook_time_minutes": data.get("cook_time_minutes"),
+        "ingredients": ingredients,
+        "instructions": instructions,
+        "nutrition": data.get("nutrition") or {},
+        "shopping_list": list(dict.fromkeys(item.strip() for item in data.get("shopping_list") or [] if item.strip())),
+        "image_url": data.get("image_url") or None,
+        "source": data.get("source") or "import",
+        "model_version": data.get("model_version"),
+    }
+    record["dedupe_key"] = recipe_dedupe_key(record)
+    return record
+
+
+__all__ = [
+    "canonical_ingredient",
+    "canonical_ingredients",
+    "canonical_title",
+    "canonicalize_recipe",
+    "recipe_dedupe_key",
+]
@@ -0,0 +1,147 @@
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+_MEAT = {
+    "beef", "pork", "chicken", "turkey", "lamb", "bacon", "ham", "sausage", "veal", "duck",
+    "prosciutto", "salami", "chorizo", "pepperoni", "gelatin", "lard",
+}
+_SEAFOOD = {
+    "fish", "salmon", "tuna", "cod", "shrimp", "prawn", "anchovy", "sardine", "crab", "lobster",
+    "mussel", "clam", "oyster", "scallop", "squid", "tilapia", "fish sauce",
+}
+_DAIRY = {
+    "milk", "butter", "cheese", "cheddar", "mozzarella", "parmesan", "feta", "ricotta", "cream",
+    "yogurt", "ghee", "whey", "buttermilk", "sour cream", "cream cheese",
+}
+_EGG = {"egg", "mayonnaise"}
+_GLUTEN = {
+    "flour", "wheat", "bread", "pasta", "spaghetti", "penne", "noodle", "couscous", "barley", "rye",
+    "tortilla", "breadcrumb", "soy sauce", "seitan", "bulgur", "cracker",
+}
+_NUTS = {
+    "almond", "peanut", "cashew", "walnut", "pecan", "hazelnut", "pistachio", "macadamia",
+    "peanut butter", "almond milk",
+}
+_HIGH_CARB = {"sugar", "rice", "pasta", "bread", "potato", "flour", "honey", "oat", "tortilla", "couscous", "quinoa"}
+
+# Diet tag -> canonical ingredient terms that break it.
+DIET_EXCLUSIONS: Dict[str, FrozenSet[str]] = {
+    "vegan": frozenset(_MEAT | _SEAFOOD | _DAIRY | _EGG | {"honey"}),
+    "vegetarian": frozenset(_MEAT | _SEAFOOD),
+    "pescatarian": frozenset(_MEAT),
+    "dairy-free": frozenset(_DAIRY),
+    "gluten-free": frozenset(_GLUTEN),
+    "nut-free": frozenset(_NUTS),
+    "low-carb": frozenset(_HIGH_CARB),
+    "keto": frozenset(_HIGH_CARB),
+}
+
+DIET_ALIASES = {
+    "plant-based": "vegan",
+    "plant based": "vegan",
+    "veggie": "vegetarian",
+    "pescetarian": "pescatarian",
+    "lactose-free": "dairy-free",
+    "lactose free": "dairy-free",
+    "dairy free": "dairy-free",
+    "no dairy": "dairy-free",
+    "gluten free": "gluten-free",
+    "celiac": "gluten-free",
+    "coeliac": "gluten-free",
+    "nut free": "nut-free",
+    "low carb": "low-carb",
+    "ketogenic": "keto",
+}
+
+
+def normalize_diet(tag: str) -> Optional[str]:
+    """Map a free-text diet preference to a known diet key, or None if unknown."""
+
+    if not isinstance(tag, str):
+        return None
+    key = " ".join(tag.lower().replace("_", "-").split())
+    key = DIET_ALIASES.get(key, key)
+    return key if key in DIET_EXCLUSIONS else None
+
+
+def known_diets(tags: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(diet for diet in (normalize_diet(tag) for tag in tags or []) if diet))
+
+
+@lru_cache(maxsize=65536)
+def name_terms(name: str) -> Tuple[str, ...]:
+    """Every contiguous word run of a canonical name ("smoked salmon fillet" -> "salmon", ...)."""
+
+    words = name.split(" ")
+    return tuple(" ".join(words[start:end]) for start in range(len(words)) for end in range(start + 1, len(words) + 1))
+
+
+# Plant-based products named after the animal product they replace; the final
+# word ("butter", "milk", ...) is ignored when checking them.
+PLANT_BASED_EXCEPTIONS = frozenset(
+    {
+        "peanut butter", "almond butter", "cashew butter", "coconut milk", "almond milk", "oat milk",
+        "soy milk", "rice milk", "coconut cream", "vegan cheese", "vegan butter", "coconut yogurt",
+        "flax egg", "vegan mayonnaise", "vegan sausage",
+    }
+)
+
+# Substitutes named after what they replace, with the diets they are made for; the
+# final word is ignored only when checking those diets ("cauliflower rice" is still
+# not vegan-relevant, but is fine for keto).
+_GLUTEN_FREE_ONLY = frozenset({"gluten-free"})
+_LOW_CARB_ONLY = frozenset({"low-carb", "keto"})
+NAMED_SUBSTITUTES: Dict[str, FrozenSet[str]] = {
+    "gluten-free pasta": _GLUTEN_FREE_ONLY,
+    "gluten-free bread": _GLUTEN_FREE_ONLY,
+    "gluten-free flour": _GLUTEN_FREE_ONLY,
+    "gluten-free breadcrumb": _GLUTEN_FREE_ONLY,
+    "rice noodle": _GLUTEN_FREE_ONLY,
+    "rice cracker": _GLUTEN_FREE_ONLY,
+    "corn tortilla": _GLUTEN_FREE_ONLY,
+    "zucchini noodle": _GLUTEN_FREE_ONLY,
+    "almond flour": _GLUTEN_FREE_ONLY | _LOW_CARB_ONLY,
+    "cauliflower rice": _LOW_CARB_ONLY,
+}
+
+
+@lru_cache(maxsize=65536)
+def violates(diet: str, ingredient: str) -> bool:
+    """
+    True when the canonical `ingredient` is not allowed under `diet`.
+
+    Any whole-word run of the name counts ("smoked salmon fillet" breaks vegetarian).
+    """
+
+    forbidden = DIET_EXCLUSIONS.get(diet)
+    if not forbidden or not ingredient:
+        return False
+    if ingredient in PLANT_BASED_EXCEPTIONS or diet in NAMED_SUBSTITUTES.get(ingredient, ()):
+        ingredient = ingredient.rsplit(" ", 1)[0]
+    return any(term in forbidden for term in name_terms(ingredient))
+
+
+@lru_cache(maxsize=65536)
+def violated_diets(ingredient: str) -> FrozenSet[str]:
+    return frozenset(diet for diet in DIET_EXCLUSIONS if violates(diet, ingredient))
+
+
+def compatible_diets(ingredients: Iterable[str]) -> List[str]:
+    """Known diets that a recipe with these canonical ingredients satisfies."""
+
+    violated = set()
+    for name in ingredients:
+        if name:
+            violated |= violated_diets(name)
+    return [diet for diet in DIET_EXCLUSIONS if diet not in violated]
+
+
+__all__ = [
+    "DIET_EXCLUSIONS",
+    "compatible_diets",
+    "known_diets",
+    "name_terms",
+    "normalize_diet",
+    "violated_diets",
+    "violates",
+]
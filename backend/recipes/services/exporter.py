@@ -0,0 +1,117 @@
+import csv
+import io
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Sequence, Tuple
+
+EXPORT_DATASETS = ("recipes", "favorites", "history")
+EXPORT_FORMATS = ("ndjson", "csv")
+CSV_COLUMNS = ("dataset", "id", "created_at", "data")
+
+ExportRecord = Tuple[str, Dict[str, Any]]
+
+
+def iter_export_records(repo, user_id: str, datasets: Sequence[str], page_size: int = 500) -> Iterator[ExportRecord]:
+    """
+    Lazily chain keyset-paged walks over each requested dataset for one user.
+    """
+
+    sources = {
+        "recipes": repo.iter_recipes,
+        "favorites": repo.iter_favorites,
+        "history": repo.iter_history,
+    }
+    for dataset in datasets:
+        for row in sources[dataset](user_id, page_size=page_size):
+            yield dataset, row
+
+
+def iter_ndjson(records: Iterable[ExportRecord]) -> Iterator[bytes]:
+    for dataset, row in records:
+        yield (json.dumps({"dataset": dataset, "data": row}, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def iter_csv(records: Iterable[ExportRecord]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> bytes:
+        value = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+
+    writer.writerow(CSV_COLUMNS)
+    yield drain()
+    for dataset, row in records:
+        row_id = row.get("id") or row.get("recipe_id") or ""
+        writer.writerow(
+            (
+                dataset,
+                row_id,
+                row.get("created_at") or "",
+                json.dumps(row, default=str, separators=(",", ":")),
+            )
+        )
+        yield drain()
+
+
+def iter_chunked(chunks: Iterable[bytes], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Coalesce many small encoded rows into transport-sized chunks.
+    """
+
+    pending = []
+    size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield b"".join(pending)
+            pending = []
+            size = 0
+    if pending:
+        yield b"".join(pending)
+
+
+def iter_gzip(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(
+    repo,
+    user_id: str,
+    datasets: Sequence[str] = EXPORT_DATASETS,
+    output_format: str = "ndjson",
+    compress: bool = False,
+    page_size: int = 500,
+) -> Iterator[bytes]:
+    """
+    Build the export pipeline: keyset pages -> rows -> encoded lines -> chunks (-> gzip).
+
+    Every stage is a generator, so memory use is bounded by one page plus one chunk
+    regardless of how many rows the user has.
+    """
+
+    records = iter_export_records(repo, user_id, datasets, page_size=page_size)
+    encoded = iter_csv(records) if output_format == "csv" else iter_ndjson(records)
+    chunks = iter_chunked(encoded)
+    return iter_gzip(chunks) if compress else chunks
+
+
+def export_filename(output_format: str, compress: bool) -> str:
+    extension = "csv" if output_format == "csv" else "ndjson"
+    return f"recipes-export.{extension}{'.gz' if compress else ''}"
+
+
+__all__ = [
+    "EXPORT_DATASETS",
+    "EXPORT_FORMATS",
+    "export_filename",
+    "stream_export",
+]
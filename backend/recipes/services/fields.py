@@ -0,0 +1,51 @@
+"""
+Column projections for recipe reads.
+
+Listings default to the "card" projection - what a recipe tile shows - and the full
+set is served by the per-recipe endpoint. Projections are pushed down into the
+PostgREST `select`, so unrequested JSON columns are never read or shipped.
+"""
+
+from typing import Iterable, Tuple
+
+# Columns a client may request; internal columns (dedupe_key, image_prompt) are never exposed.
+RECIPE_FIELDS: Tuple[str, ...] = (
+    "id",
+    "title",
+    "description",
+    "servings",
+    "prep_time_minutes",
+    "cook_time_minutes",
+    "ingredients",
+    "instructions",
+    "nutrition",
+    "shopping_list",
+    "image_url",
+    "image_thumbnail_url",
+    "source",
+    "model_version",
+    "created_by",
+    "created_at",
+)
+
+RECIPE_CARD_FIELDS: Tuple[str, ...] = (
+    "id",
+    "title",
+    "description",
+    "servings",
+    "prep_time_minutes",
+    "cook_time_minutes",
+    "image_thumbnail_url",
+    "created_at",
+)
+
+RECIPE_PROJECTIONS = {"card": RECIPE_CARD_FIELDS, "full": RECIPE_FIELDS}
+
+
+def select_columns(fields: Iterable[str]) -> str:
+    """PostgREST column list; `id` is always included so rows can be addressed."""
+
+    return ",".join(dict.fromkeys(("id", *fields)))
+
+
+__all__ = ["RECIPE_CARD_FIELDS", "RECIPE_FIELDS", "RECIPE_PROJECTIONS", "select_columns"]
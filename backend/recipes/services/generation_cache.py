@@ -0,0 +1,101 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .canonical import canonical_ingredients
+from .scaling import rescale_recipe
+
+
+def canonical_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce a suggestion payload to the fields that change the generated recipe.
+
+    Ingredient lists are canonicalized and sorted so "Tomatoes, basil" and
+    "basil, tomato" hit the same cache entry.
+    """
+
+    return {
+        "ingredients": sorted(canonical_ingredients(payload.get("ingredients") or [])),
+        "diet_preferences": sorted({item.strip().lower() for item in payload.get("diet_preferences") or [] if item.strip()}),
+        "exclude_ingredients": sorted(canonical_ingredients(payload.get("exclude_ingredients") or [])),
+        "cuisine": (payload.get("cuisine") or "").strip().lower(),
+        "servings": payload.get("servings") or 2,
+        "calorie_target": payload.get("calorie_target") or None,
+        "notes": " ".join((payload.get("notes") or "").lower().split()),
+    }
+
+
+def payload_key(payload: Dict[str, Any], *, servings: bool = True, constraints: bool = True) -> str:
+    canonical = canonical_payload(payload)
+    if not servings:
+        del canonical["servings"]
+    if not constraints:
+        del canonical["diet_preferences"], canonical["exclude_ingredients"]
+    material = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class RecipeCache:
+    """
+    Cache of generated recipes keyed by the canonical suggestion payload.
+
+    Each recipe is also filed under the payload without its servings, so a request
+    that differs only in servings is answered by rescaling instead of generating, and
+    without servings, diet tags and exclusions, so one that adds a constraint can be
+    adapted by substitution.
+    """
+
+    key_prefix = "recipes:generated:"
+    any_servings_prefix = "recipes:generated:any-servings:"
+    unconstrained_prefix = "recipes:generated:unconstrained:"
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else getattr(settings, "GENERATION_CACHE_TTL_SECONDS", 86400)
+
+    def _key(self, payload: Dict[str, Any]) -> str:
+        return f"{self.key_prefix}{payload_key(payload)}"
+
+    def get(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return cache.get(self._key(payload))
+
+    def contains(self, payload: Dict[str, Any]) -> bool:
+        return cache.has_key(self._key(payload))
+
+    def get_rescaled(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """A recipe cached for the same request at another serving count, rescaled."""
+
+        recipe = cache.get(f"{self.any_servings_prefix}{payload_key(payload, servings=False)}")
+        if recipe is None:
+            return None
+        return rescale_recipe(recipe, payload.get("servings") or 2)
+
+    def get_unconstrained(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        The latest recipe cached for these ingredients under any diet tags and exclusions,
+        rescaled to the requested servings; it may break this payload's constraints.
+        """
+
+        recipe = cache.get(f"{self.unconstrained_prefix}{payload_key(payload, servings=False, constraints=False)}")
+        if recipe is None:
+            return None
+        return rescale_recipe(recipe, payload.get("servings") or 2)
+
+    def set(self, payload: Dict[str, Any], recipe: Dict[str, Any], adaptable: bool = True) -> None:
+        """
+        Cache `recipe` for `payload`. Adapted recipes pass `adaptable=False` so later
+        adaptations start from the original generation, not from a substitute.
+        """
+
+        entries = {
+            self._key(payload): recipe,
+            f"{self.any_servings_prefix}{payload_key(payload, servings=False)}": recipe,
+        }
+        if adaptable:
+            entries[f"{self.unconstrained_prefix}{payload_key(payload, servings=False, constraints=False)}"] = recipe
+        cache.set_many(entries, timeout=self.ttl)
+
+
+__all__ = ["RecipeCache", "canonical_payload", "payload_key"]
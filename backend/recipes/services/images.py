@@ -0,0 +1,304 @@
+"""
+Recipe images, produced off the request path.
+
+Saved recipes keep the model's `image_prompt` and start with a null `image_url`. A
+background worker (woken whenever new recipes are saved, and by
+`manage.py backfill_recipe_images`) walks those rows, renders each prompt through the
+configured provider and backfills `image_url` / `image_thumbnail_url`. A failed render
+is retried with exponential backoff and given up after `RECIPE_IMAGE_MAX_ATTEMPTS`.
+
+Renders are deduplicated by a hash of the normalized prompt (recorded in the
+`recipe_images` table), so recipes sharing a prompt share one image. Originals and
+WebP thumbnails are stored under keys derived from their own bytes, which makes every
+stored object immutable and safe to cache forever.
+"""
+
+import base64
+import hashlib
+import io
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class RenderedImage:
+    data: bytes
+    content_type: str = "image/png"
+
+
+# Providers -------------------------------------------------------------------
+class PlaceholderImageProvider:
+    """
+    Renders a gradient whose colours are derived from the prompt, without any
+    network calls or imaging libraries. Used in development and tests.
+    """
+
+    name = "placeholder"
+    size = 512
+
+    def render(self, prompt: str) -> RenderedImage:
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        top, bottom = digest[0:3], digest[3:6]
+        rows = []
+        for y in range(self.size):
+            mix = y / (self.size - 1)
+            pixel = bytes(round(a + (b - a) * mix) for a, b in zip(top, bottom))
+            rows.append(pixel * self.size)
+        return RenderedImage(_encode_png(self.size, self.size, rows))
+
+
+class OpenAIImageProvider:
+    name = "openai"
+
+    def __init__(self):
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.model = getattr(settings, "RECIPE_IMAGE_MODEL", "gpt-image-1")
+
+    def render(self, prompt: str) -> RenderedImage:
+        response = self.client.images.generate(model=self.model, prompt=prompt, size="1024x1024", n=1)
+        item = response.data[0]
+        if getattr(item, "b64_json", None):
+            return RenderedImage(base64.b64decode(item.b64_json))
+        import httpx
+
+        download = httpx.get(item.url, timeout=30)
+        download.raise_for_status()
+        return RenderedImage(download.content, download.headers.get("content-type", "image/png"))
+
+
+def _encode_png(width: int, height: int, rows) -> bytes:
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    raw = b"".join(b"\x00" + row for row in rows)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 9)) + chunk(b"IEND", b"")
+
+
+# Stores ----------------------------------------------------------------------
+class FileSystemImageStore:
+    """Writes objects under `RECIPE_IMAGE_ROOT`, served from `RECIPE_IMAGE_BASE_URL`."""
+
+    def __init__(self, root: Optional[str] = None, base_url: Optional[str] = None):
+        self.root = Path(root or settings.RECIPE_IMAGE_ROOT)
+        self.base_url = base_url or settings.RECIPE_IMAGE_BASE_URL
+
+    def put(self, key: str, data: bytes, content_type: str) -> str:
+        path = self.root / key
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+            os.replace(tmp, path)
+        return f"{self.base_url.rstrip('/')}/{key}"
+
+
+class SupabaseImageStore:
+    """Uploads objects to the public Supabase Storage bucket `RECIPE_IMAGE_BUCKET`."""
+
+    def __init__(self, client=None, bucket: Optional[str] = None):
+        from .supabase_client import get_supabase_client
+
+        self.bucket = (client or get_supabase_client()).storage.from_(
+            bucket or getattr(settings, "RECIPE_IMAGE_BUCKET", "recipe-images")
+        )
+
+    def put(self, key: str, data: bytes, content_type: str) -> str:
+        # Keys are content hashes, so an object never changes once written.
+        self.bucket.upload(
+            key,
+            data,
+            {"content-type": content_type, "cache-control": "31536000", "upsert": "true"},
+        )
+        return self.bucket.get_public_url(key)
+
+
+def content_key(prefix: str, data: bytes, content_type: str) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{prefix}/{digest[:2]}/{digest}.{EXTENSIONS.get(content_type, 'bin')}"
+
+
+def make_thumbnail(data: bytes, size: int) -> Optional[bytes]:
+    """A WebP at most `size` pixels on its longest side, or None without Pillow."""
+
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("Pillow is not installed; storing recipe images without thumbnails.")
+        return None
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((size, size))
+        output = io.BytesIO()
+        image.save(output, "WEBP", quality=80, method=4)
+    return output.getvalue()
+
+
+# Pipeline --------------------------------------------------------------------
+# Striped so two threads never render the same prompt at once in one process.
+_render_locks = [threading.Lock() for _ in range(32)]
+
+
+def normalize_prompt(prompt: str) -> str:
+    return _WHITESPACE.sub(" ", prompt).strip().lower()
+
+
+class ImagePipeline:
+    def __init__(self, repo, provider=None, store=None):
+        self.repo = repo
+        self.provider = provider or import_string(
+            getattr(settings, "RECIPE_IMAGE_PROVIDER", "recipes.services.images.PlaceholderImageProvider")
+        )()
+        self.store = store or import_string(
+            getattr(settings, "RECIPE_IMAGE_STORE", "recipes.services.images.FileSystemImageStore")
+        )()
+        self.thumbnail_size = getattr(settings, "RECIPE_IMAGE_THUMBNAIL_SIZE", 256)
+        self.retry_seconds = getattr(settings, "RECIPE_IMAGE_POLL_SECONDS", 60.0)
+        self.max_attempts = getattr(settings, "RECIPE_IMAGE_MAX_ATTEMPTS", 6)
+        self._seen: Dict[str, Dict[str, Any]] = {}
+        self.rendered = 0
+
+    def prompt_hash(self, prompt: str) -> str:
+        # The provider is part of the identity so switching providers re-renders.
+        return hashlib.sha256(f"{self.provider.name}:{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def image_for_prompt(self, prompt: str) -> Dict[str, Any]:
+        prompt_hash = self.prompt_hash(prompt)
+        if prompt_hash in self._seen:
+            return self._seen[prompt_hash]
+
+        with _render_locks[int(prompt_hash[:8], 16) % len(_render_locks)]:
+            image = self.repo.get_recipe_image(prompt_hash)
+            if image is None:
+                image = self._render(prompt, prompt_hash)
+        self._seen[prompt_hash] = image
+        return image
+
+    def _render(self, prompt: str, prompt_hash: str) -> Dict[str, Any]:
+        rendered = self.provider.render(prompt)
+        original_key = content_key("originals", rendered.data, rendered.content_type)
+        image = {
+            "prompt_hash": prompt_hash,
+            "provider": self.provider.name,
+            "content_type": rendered.content_type,
+            "original_key": original_key,
+            "image_url": self.store.put(original_key, rendered.data, rendered.content_type),
+            "thumbnail_key": None,
+            "thumbnail_url": None,
+        }
+        thumbnail = make_thumbnail(rendered.data, self.thumbnail_size)
+        if thumbnail is not None:
+            image["thumbnail_key"] = content_key("thumbnails", thumbnail, "image/webp")
+            image["thumbnail_url"] = self.store.put(image["thumbnail_key"], thumbnail, "image/webp")
+        self.repo.save_recipe_image(image)
+        self.rendered += 1
+        return image
+
+    def _retry_at(self, attempts: int) -> Optional[datetime]:
+        if attempts >= self.max_attempts:
+            return None
+        # One poll interval after the first failure, doubling after each one since.
+        delay = min(self.retry_seconds * 2 ** (attempts - 1), 86400)
+        return datetime.now(timezone.utc) + timedelta(seconds=delay)
+
+    def backfill(self, limit: Optional[int] = None) -> int:
+        """Fill in images for saved recipes that have a prompt but no image; returns rows updated."""
+
+        updated = 0
+        for row in self.repo.iter_recipes_missing_images():
+            if limit is not None and updated >= limit:
+                break
+            prompt = (row.get("image_prompt") or "").strip()
+            if not prompt:
+                continue
+            try:
+                image = self.image_for_prompt(prompt)
+            except Exception as exc:
+                logger.exception("Rendering image for recipe %s failed: %s", row.get("id"), exc)
+                attempts = int(row.get("image_attempts") or 0) + 1
+                self.repo.record_recipe_image_failure(row["id"], attempts, self._retry_at(attempts))
+                continue
+            self.repo.set_recipe_image(row["id"], image["image_url"], image.get("thumbnail_url"))
+            updated += 1
+        return updated
+
+
+class ImageBackfillWorker:
+    """
+    One daemon thread per process that runs `ImagePipeline.backfill` when woken and
+    every `RECIPE_IMAGE_POLL_SECONDS` after that.
+    """
+
+    def __init__(self, poll_seconds: float):
+        self._poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def wake(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="recipe-image-backfill", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self) -> None:
+        from .repositories import SupabaseRepository
+
+        while True:
+            self._wake.wait(self._poll_seconds)
+            self._wake.clear()
+            try:
+                ImagePipeline(SupabaseRepository()).backfill()
+            except Exception:  # pragma: no cover - keep the worker alive
+                logger.exception("Recipe image backfill failed.")
+
+
+_worker: Optional[ImageBackfillWorker] = None
+_worker_lock = threading.Lock()
+
+
+def request_image_backfill() -> None:
+    """Wake this process's image worker after new recipes were saved (if enabled)."""
+
+    global _worker
+    if not getattr(settings, "RECIPE_IMAGES_ENABLED", False):
+        return
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = ImageBackfillWorker(getattr(settings, "RECIPE_IMAGE_POLL_SECONDS", 60.0))
+    _worker.wake()
+
+
+__all__ = [
+    "FileSystemImageStore",
+    "ImagePipeline",
+    "OpenAIImageProvider",
+    "PlaceholderImageProvider",
+    "RenderedImage",
+    "SupabaseImageStore",
+    "make_thumbnail",
+    "request_image_backfill",
+]
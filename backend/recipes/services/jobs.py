@@ -0,0 +1,217 @@
+"""
+Asynchronous generation jobs.
+
+`submit_job` stores a `GenerationJob` row and hands its id to an in-process thread
+pool. The row is the durable queue: a worker claims it with a conditional UPDATE, so
+any number of threads or processes can race for the same job and only one runs it. A
+sweeper thread resubmits jobs that are due (deferred after an admission rejection, or
+left behind by a worker that died mid-run once their lease expires) and deletes jobs
+older than `GENERATION_JOB_TTL_SECONDS`.
+
+With `GENERATION_JOBS_EAGER` the job runs inline during `submit_job`, which is how the
+tests exercise the mode without threads or a broker.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Dict, Optional, Set
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import GenerationJob
+from ..throttling import record_llm_tokens_for
+from .admission import AdmissionRejected
+from .suggestions import plan_meals, suggest_recipe
+from .supabase_client import SupabaseConfigurationError
+
+logger = logging.getLogger(__name__)
+
+
+def submit_job(
+    kind: str,
+    payload: Dict[str, Any],
+    *,
+    user_id: Optional[str] = None,
+    lane: int = 1,
+    throttle_ident: str = "",
+) -> GenerationJob:
+    job = GenerationJob.objects.create(
+        kind=kind,
+        payload=payload,
+        user_id=user_id,
+        lane=lane,
+        throttle_ident=throttle_ident,
+        available_at=timezone.now(),
+    )
+    if getattr(settings, "GENERATION_JOBS_EAGER", False):
+        run_job(job.id)
+        job.refresh_from_db()
+    else:
+        get_job_pool().submit(job.id)
+    return job
+
+
+def claim_job(job_id) -> Optional[GenerationJob]:
+    """Atomically move a due job to `running`; None if another worker has it."""
+
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, "GENERATION_JOB_LEASE_SECONDS", 300))
+    claimable = Q(status=GenerationJob.Status.QUEUED, available_at__lte=now) | Q(
+        status=GenerationJob.Status.RUNNING, lease_expires_at__lt=now
+    )
+    job = GenerationJob.objects.filter(claimable, pk=job_id).first()
+    if job is None:
+        return None
+    claimed = GenerationJob.objects.filter(pk=job_id, status=job.status, attempts=job.attempts).update(
+        status=GenerationJob.Status.RUNNING,
+        lease_expires_at=now + lease,
+        attempts=job.attempts + 1,
+    )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def _repository():
+    if not settings.SUPABASE_URL:
+        return None
+    from .repositories import SupabaseRepository
+
+    try:
+        return SupabaseRepository()
+    except SupabaseConfigurationError:
+        return None
+
+
+def run_job(job_id) -> None:
+    job = claim_job(job_id)
+    if job is None:
+        return
+
+    payload = dict(job.payload)
+    try:
+        repo = _repository()
+        if job.kind == GenerationJob.Kind.MEAL_PLAN:
+            days = payload.pop("days")
+            result = plan_meals(repo, payload, days=days, user_id=job.user_id, lane=job.lane)
+        else:
+            mode = payload.pop("mode", "auto")
+            result = suggest_recipe(repo, payload, mode=mode, user_id=job.user_id, lane=job.lane)
+    except AdmissionRejected as exc:
+        if job.attempts < getattr(settings, "GENERATION_JOB_MAX_ATTEMPTS", 3):
+            # Back off instead of failing; the sweeper resubmits it once it is due.
+            _finish(
+                job,
+                status=GenerationJob.Status.QUEUED,
+                available_at=timezone.now() + timedelta(seconds=exc.retry_after),
+                lease_expires_at=None,
+            )
+        else:
+            _finish(job, status=GenerationJob.Status.FAILED, result_status=503, error=str(exc))
+        return
+    except Exception as exc:
+        logger.exception("Generation job %s failed: %s", job.id, exc)
+        _finish(job, status=GenerationJob.Status.FAILED, result_status=500, error=str(exc))
+        return
+
+    record_llm_tokens_for(job.throttle_ident, result.tokens)
+    _finish(
+        job,
+        status=GenerationJob.Status.SUCCEEDED if result.status < 400 else GenerationJob.Status.FAILED,
+        result=result.data,
+        result_status=result.status,
+        error=result.data.get("detail", "") if result.status >= 400 else "",
+    )
+
+
+def _finish(job: GenerationJob, **fields) -> None:
+    if fields["status"] != GenerationJob.Status.QUEUED:
+        fields["finished_at"] = timezone.now()
+    # Only the holder of this attempt may record its outcome.
+    GenerationJob.objects.filter(
+        pk=job.pk, status=GenerationJob.Status.RUNNING, attempts=job.attempts
+    ).update(**fields)
+
+
+def purge_expired_jobs(now=None) -> int:
+    now = now or timezone.now()
+    ttl = timedelta(seconds=getattr(settings, "GENERATION_JOB_TTL_SECONDS", 86400))
+    deleted, _ = GenerationJob.objects.filter(created_at__lt=now - ttl).delete()
+    return deleted
+
+
+class JobWorkerPool:
+    def __init__(self, workers: int, poll_seconds: float):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="generation-job")
+        self._poll_seconds = poll_seconds
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep_forever, name="generation-job-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def submit(self, job_id) -> None:
+        key = str(job_id)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._run, key)
+
+    def _run(self, job_id: str) -> None:
+        close_old_connections()
+        try:
+            run_job(job_id)
+        finally:
+            with self._lock:
+                self._pending.discard(job_id)
+            close_old_connections()
+
+    def sweep(self) -> None:
+        now = timezone.now()
+        due = GenerationJob.objects.filter(
+            Q(status=GenerationJob.Status.QUEUED, available_at__lte=now)
+            | Q(status=GenerationJob.Status.RUNNING, lease_expires_at__lt=now)
+        ).values_list("id", flat=True)[:100]
+        for job_id in due:
+            self.submit(job_id)
+        purge_expired_jobs(now)
+
+    def _sweep_forever(self) -> None:
+        while not self._stopped.wait(self._poll_seconds):
+            close_old_connections()
+            try:
+                self.sweep()
+            except Exception:  # pragma: no cover - keep the sweeper alive
+                logger.exception("Generation job sweep failed.")
+            finally:
+                close_old_connections()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self._executor.shutdown(wait=False)
+
+
+_pool: Optional[JobWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_job_pool() -> JobWorkerPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = JobWorkerPool(
+                    workers=getattr(settings, "GENERATION_JOB_WORKERS", 2),
+                    poll_seconds=getattr(settings, "GENERATION_JOB_POLL_SECONDS", 5.0),
+                )
+    return _pool
+
+
+__all__ = ["JobWorkerPool", "claim_job", "get_job_pool", "purge_expired_jobs", "run_job", "submit_job"]
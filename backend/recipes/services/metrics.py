@@ -0,0 +1,26 @@
+"""
+Process-local metrics exposed by `GET /api/metrics/`.
+
+Services register a callable returning a JSON-serialisable snapshot under a name;
+the endpoint calls each one. Numbers are per worker process.
+"""
+
+import threading
+from typing import Any, Callable, Dict
+
+_providers: Dict[str, Callable[[], Any]] = {}
+_providers_lock = threading.Lock()
+
+
+def register_metrics(name: str, provider: Callable[[], Any]) -> None:
+    with _providers_lock:
+        _providers[name] = provider
+
+
+def collect_metrics() -> Dict[str, Any]:
+    with _providers_lock:
+        providers = dict(_providers)
+    return {name: provider() for name, provider in sorted(providers.items())}
+
+
+__all__ = ["collect_metrics", "register_metrics"]
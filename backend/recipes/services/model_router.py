@@ -0,0 +1,251 @@
+"""
+Routes each generation to a model tier sized for the request.
+
+A request's complexity (0-1) is scored from the validated payload; the smallest tier
+whose `max_complexity` covers it is preferred. Every call's latency and outcome feed
+exponentially weighted averages per tier; a tier whose failure rate or latency
+exceeds its limits is treated as degraded and traffic moves to the next larger tier
+(or, failing that, a smaller one). A small share of requests still probes the
+degraded tier so it is picked again once it recovers.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from django.conf import settings
+
+from .metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIERS = (
+    {"name": "small", "model": "gpt-4o-mini", "max_tokens": 600, "max_complexity": 0.3},
+    {"name": "standard", "model": "gpt-4o-mini", "max_tokens": 1000, "max_complexity": 0.65},
+    {"name": "large", "model": "gpt-4o", "max_tokens": 1400, "max_complexity": 1.0},
+)
+# Outcomes a tier needs before its averages are trusted to mark it degraded.
+MIN_SAMPLES = 5
+# Completion tokens each model can return at most; a meal plan's budget (per-recipe
+# `max_tokens` times the recipe count) is clamped to it. Tiers on other models can set
+# `max_output_tokens`.
+MODEL_OUTPUT_LIMITS = {"gpt-4o": 16384, "gpt-4o-mini": 16384}
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    name: str
+    model: str
+    max_tokens: int
+    max_complexity: float = 1.0
+    temperature: float = 0.4
+    latency_slo: Optional[float] = None
+    max_output_tokens: Optional[int] = None
+
+    @property
+    def output_limit(self) -> Optional[int]:
+        return self.max_output_tokens or MODEL_OUTPUT_LIMITS.get(self.model)
+
+
+@dataclass(frozen=True)
+class Route:
+    tier: ModelTier
+    complexity: float
+    reason: str
+    max_tokens: int
+
+    @property
+    def model_version(self) -> str:
+        return f"{self.tier.model}:{self.tier.name}"
+
+
+def complexity_score(payload: Dict[str, Any]) -> float:
+    """
+    0 for "eggs, one serving"; approaches 1 for long ingredient lists with several
+    diets, exclusions, a cuisine, a calorie target and free-form notes.
+    """
+
+    score = 0.4 * min(len(payload.get("ingredients") or []) / 15, 1.0)
+    score += 0.15 * min(len(payload.get("diet_preferences") or []) / 3, 1.0)
+    score += 0.1 * min(len(payload.get("exclude_ingredients") or []) / 5, 1.0)
+    score += 0.1 * min(max((payload.get("servings") or 2) - 2, 0) / 6, 1.0)
+    score += 0.1 if payload.get("cuisine") else 0.0
+    score += 0.05 if payload.get("calorie_target") else 0.0
+    score += 0.1 * min(len(payload.get("notes") or "") / 200, 1.0)
+    return round(min(score, 1.0), 3)
+
+
+class _TierHealth:
+    __slots__ = ("latency", "failure", "requests", "failures", "routed")
+
+    def __init__(self):
+        self.latency = 0.0
+        self.failure = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.routed = 0
+
+
+def build_chat_model(tier: ModelTier, max_tokens: int):
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        logger.warning("OPENAI_API_KEY is not configured; using fallback recipe generator.")
+        return None
+
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(temperature=tier.temperature, model=tier.model, max_tokens=max_tokens, api_key=api_key)
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        tiers: Sequence[ModelTier],
+        llm_factory: Callable[[ModelTier, int], Any] = build_chat_model,
+        *,
+        alpha: float = 0.2,
+        failure_threshold: float = 0.5,
+        latency_slo: float = 20.0,
+        probe_rate: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        if not tiers:
+            raise ValueError("At least one model tier is required.")
+        self.tiers = sorted(tiers, key=lambda tier: tier.max_complexity)
+        self.clock = clock
+        self._llm_factory = llm_factory
+        self._alpha = alpha
+        self._failure_threshold = failure_threshold
+        self._latency_slo = latency_slo
+        self._probe_rate = probe_rate
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._health = {tier.name: _TierHealth() for tier in self.tiers}
+        self._reasons: Dict[str, int] = {}
+        self._llms: Dict[tuple, Any] = {}
+
+    def route(self, payload: Dict[str, Any], count: int = 1) -> Route:
+        complexity = complexity_score(payload)
+        preferred = next(
+            (index for index, tier in enumerate(self.tiers) if complexity <= tier.max_complexity),
+            len(self.tiers) - 1,
+        )
+        with self._lock:
+            index, reason = self._choose(preferred)
+            tier = self.tiers[index]
+            self._health[tier.name].routed += 1
+            self._reasons[reason] = self._reasons.get(reason, 0) + 1
+        max_tokens = tier.max_tokens * count
+        if tier.output_limit:
+            max_tokens = min(max_tokens, tier.output_limit)
+        return Route(tier=tier, complexity=complexity, reason=reason, max_tokens=max_tokens)
+
+    def _choose(self, preferred: int):
+        if not self._degraded(self.tiers[preferred]):
+            return preferred, "complexity"
+        if self._rng.random() < self._probe_rate:
+            return preferred, "probe"
+        # Prefer stepping up (better answers, more cost) before stepping down.
+        fallbacks = [*range(preferred + 1, len(self.tiers)), *range(preferred - 1, -1, -1)]
+        for index in fallbacks:
+            if not self._degraded(self.tiers[index]):
+                return index, f"avoid-{self.tiers[preferred].name}"
+        least_bad = min(
+            range(len(self.tiers)),
+            key=lambda index: (self._health[self.tiers[index].name].failure, self._health[self.tiers[index].name].latency),
+        )
+        return least_bad, "all-degraded"
+
+    def _degraded(self, tier: ModelTier) -> bool:
+        health = self._health[tier.name]
+        if health.requests < MIN_SAMPLES:
+            return False
+        slo = tier.latency_slo or self._latency_slo
+        return health.failure > self._failure_threshold or health.latency > slo
+
+    def llm_for(self, route: Route):
+        key = (route.tier.name, route.max_tokens)
+        if key not in self._llms:
+            self._llms[key] = self._llm_factory(route.tier, route.max_tokens)
+        return self._llms[key]
+
+    def record(self, route: Route, elapsed: float, ok: bool) -> None:
+        with self._lock:
+            health = self._health[route.tier.name]
+            if health.requests == 0:
+                health.latency = elapsed
+                health.failure = 0.0 if ok else 1.0
+            else:
+                health.latency += self._alpha * (elapsed - health.latency)
+                health.failure += self._alpha * ((0.0 if ok else 1.0) - health.failure)
+            health.requests += 1
+            health.failures += 0 if ok else 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tiers": {
+                    tier.name: {
+                        "model": tier.model,
+                        "max_tokens": tier.max_tokens,
+                        "max_complexity": tier.max_complexity,
+                        "routed": self._health[tier.name].routed,
+                        "requests": self._health[tier.name].requests,
+                        "failures": self._health[tier.name].failures,
+                        "latency_ewma_seconds": self._health[tier.name].latency,
+                        "failure_ewma": self._health[tier.name].failure,
+                        "degraded": self._degraded(tier),
+                    }
+                    for tier in self.tiers
+                },
+                "decisions": dict(self._reasons),
+            }
+
+
+def configured_tiers() -> List[ModelTier]:
+    raw = getattr(settings, "LLM_MODEL_TIERS", "")
+    return [ModelTier(**spec) for spec in (json.loads(raw) if raw else DEFAULT_TIERS)]
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter(
+                    configured_tiers(),
+                    failure_threshold=getattr(settings, "LLM_ROUTER_FAILURE_THRESHOLD", 0.5),
+                    latency_slo=getattr(settings, "LLM_ROUTER_LATENCY_SLO_SECONDS", 20.0),
+                    probe_rate=getattr(settings, "LLM_ROUTER_PROBE_RATE", 0.05),
+                )
+    return _router
+
+
+def reset_model_router() -> None:
+    global _router
+    with _router_lock:
+        _router = None
+
+
+register_metrics("llm_routing", lambda: get_model_router().snapshot())
+
+
+__all__ = [
+    "MODEL_OUTPUT_LIMITS",
+    "ModelRouter",
+    "ModelTier",
+    "Route",
+    "complexity_score",
+    "get_model_router",
+    "reset_model_router",
+]
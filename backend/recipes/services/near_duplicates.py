@@ -0,0 +1,178 @@
+"""
+MinHash signatures and an LSH banding index for spotting near-identical recipes.
+
+A recipe is reduced to a token set - its canonical ingredients plus the words of its
+title - and summarised by `NUM_PERM` MinHash values, whose agreement rate estimates
+the Jaccard similarity of two token sets. Signatures are split into `BANDS` bands;
+recipes sharing any whole band land in the same bucket, so only those few
+candidates are compared on insert. Entries may carry a scope, and a query only
+matches entries with the same scope.
+"""
+
+import hashlib
+import random
+import re
+import threading
+from array import array
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+
+from .canonical import canonical_ingredient, canonical_ingredients
+from .process_index import ProcessIndex
+from .quantities import parse_servings
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+# Fixed seed: signatures must agree across processes and restarts.
+_random = random.Random(0x5EED)
+_PERMUTATIONS = [(_random.randrange(1, _PRIME), _random.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_TITLE_WORD = re.compile(r"[a-z0-9]+")
+# Words that appear in generated titles regardless of what the dish is.
+TITLE_STOPWORDS = frozenset({"a", "and", "the", "with", "of", "in", "on", "style", "creative", "easy", "quick"})
+
+
+def recipe_tokens(record: Dict[str, Any]) -> Set[str]:
+    ingredients = canonical_ingredients(
+        item.get("name") if isinstance(item, dict) else item for item in record.get("ingredients") or []
+    )
+    tokens = {f"i:{name}" for name in ingredients}
+    title = record.get("title") if isinstance(record.get("title"), str) else ""
+    for word in _TITLE_WORD.findall(title.lower()):
+        if word not in TITLE_STOPWORDS:
+            tokens.add(f"t:{canonical_ingredient(word)}")
+    return tokens
+
+
+def minhash(tokens: Iterable[str]) -> array:
+    """`NUM_PERM` 32-bit MinHash values for a token set (all ones for an empty set)."""
+
+    hashes = [
+        int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        for token in tokens
+    ]
+    if not hashes:
+        return array("I", [_MASK] * NUM_PERM)
+    return array(
+        "I",
+        [min(((a * value + b) % _PRIME) & _MASK for value in hashes) for a, b in _PERMUTATIONS],
+    )
+
+
+def recipe_signature(record: Dict[str, Any]) -> array:
+    return minhash(recipe_tokens(record))
+
+
+def link_scope(owner: Optional[str], record: Dict[str, Any]) -> tuple:
+    """
+    New recipes are only linked to stored ones of the same creator and serving count,
+    so a saved id never points at another user's recipe or at different quantities.
+    """
+
+    return (owner, parse_servings(record.get("servings"), default=0))
+
+
+def similarity(left: array, right: array) -> float:
+    """Estimated Jaccard similarity: the share of positions where two signatures agree."""
+
+    return sum(1 for a, b in zip(left, right) if a == b) / NUM_PERM
+
+
+@dataclass(frozen=True)
+class NearDuplicate:
+    recipe_id: str
+    similarity: float
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = threshold if threshold is not None else getattr(settings, "NEAR_DUPLICATE_THRESHOLD", 0.8)
+        self._lock = threading.Lock()
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(BANDS)]
+        self._signatures: Dict[str, array] = {}
+        self._scopes: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, recipe_id: str) -> bool:
+        return str(recipe_id) in self._signatures
+
+    @staticmethod
+    def _band_keys(signature: array) -> List[bytes]:
+        raw = signature.tobytes()
+        width = ROWS * signature.itemsize
+        return [raw[band * width:(band + 1) * width] for band in range(BANDS)]
+
+    def add(self, recipe_id: Any, signature: array, scope: Any = None) -> None:
+        recipe_id = str(recipe_id)
+        with self._lock:
+            if recipe_id in self._signatures:
+                return
+            self._signatures[recipe_id] = signature
+            if scope is not None:
+                self._scopes[recipe_id] = scope
+            for band, key in enumerate(self._band_keys(signature)):
+                self._buckets[band].setdefault(key, []).append(recipe_id)
+
+    def query(
+        self, signature: array, threshold: Optional[float] = None, scope: Any = None
+    ) -> Optional[NearDuplicate]:
+        """The most similar indexed recipe in `scope` at or above `threshold`, if any."""
+
+        threshold = self.threshold if threshold is None else threshold
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(key, ()))
+        best = None
+        for recipe_id in candidates:
+            if self._scopes.get(recipe_id) != scope:
+                continue
+            score = similarity(signature, self._signatures[recipe_id])
+            if score >= threshold and (best is None or score > best.similarity):
+                best = NearDuplicate(recipe_id=recipe_id, similarity=score)
+        return best
+
+    def find(self, record: Dict[str, Any]) -> Optional[NearDuplicate]:
+        return self.query(recipe_signature(record))
+
+
+def build_near_duplicate_index(repo) -> NearDuplicateIndex:
+    index = NearDuplicateIndex()
+    for row in repo.iter_recipe_ingredients():
+        if row.get("id"):
+            index.add(row["id"], recipe_signature(row), link_scope(row.get("created_by"), row))
+    return index
+
+
+_near_duplicate_index = ProcessIndex(build_near_duplicate_index, "NEAR_DUPLICATE_INDEX_TTL_SECONDS")
+
+
+def get_near_duplicate_index(repo, *, wait: bool = True) -> Optional[NearDuplicateIndex]:
+    """
+    Process-wide index; with `wait=False` it is None until the background build has
+    finished (see `ProcessIndex`).
+    """
+
+    return _near_duplicate_index.get(repo, wait=wait)
+
+
+def reset_near_duplicate_index() -> None:
+    _near_duplicate_index.reset()
+
+
+__all__ = [
+    "NearDuplicate",
+    "NearDuplicateIndex",
+    "get_near_duplicate_index",
+    "link_scope",
+    "minhash",
+    "recipe_signature",
+    "reset_near_duplicate_index",
+]
@@ -0,0 +1,213 @@
+"""
+Deterministic nutrition from a compiled, memory-mapped nutrient table.
+
+The bundled `recipes/data/nutrients.csv` (values per 100 g) is compiled into a
+compact binary file: a fixed header, a float32 array of `FIELDS` per ingredient id,
+and a JSON name -> id index. Every worker maps the same file read-only, so the
+array pages are shared by the OS page cache instead of living in each heap.
+"""
+
+import csv
+import json
+import mmap
+import os
+import struct
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+from .canonical import canonical_ingredient
+from .quantities import Quantity, parse_quantity, parse_servings
+
+FIELDS = ("kcal", "protein_g", "carbs_g", "fats_g", "unit_grams", "density")
+MAGIC = b"NUTR"
+VERSION = 1
+# magic, version, field count, record count, index offset, index length
+HEADER = struct.Struct("<4sHHIQQ")
+
+DEFAULT_SOURCE = Path(__file__).resolve().parent.parent / "data" / "nutrients.csv"
+DEFAULT_UNIT_GRAMS = 100.0
+
+# Typical weights for units that say nothing about the ingredient itself.
+GENERIC_UNIT_GRAMS = {
+    "pinch": 0.36,
+    "can": 400.0,
+    "bunch": 100.0,
+    "handful": 30.0,
+    "package": 250.0,
+    "sprig": 1.0,
+    "stalk": 40.0,
+}
+
+
+def compile_nutrient_table(source: Path = DEFAULT_SOURCE, output: Optional[Path] = None) -> Path:
+    """
+    Compile the nutrient CSV into the binary table format and atomically replace `output`.
+    """
+
+    output = Path(output or default_table_path())
+    records = []
+    index: Dict[str, int] = {}
+    with Path(source).open("r", encoding="utf-8", newline="") as handle:
+        for row in csv.DictReader(handle):
+            name = canonical_ingredient(row["name"])
+            if not name or name in index:
+                continue
+            ingredient_id = len(records)
+            records.append(tuple(float(row.get(field) or 0.0) for field in FIELDS))
+            index[name] = ingredient_id
+            for alias in (row.get("aliases") or "").split(";"):
+                alias = canonical_ingredient(alias)
+                if alias and alias not in index:
+                    index[alias] = ingredient_id
+
+    array_bytes = struct.pack(f"<{len(records) * len(FIELDS)}f", *(value for record in records for value in record))
+    index_bytes = json.dumps(index, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    index_offset = HEADER.size + len(array_bytes)
+    header = HEADER.pack(MAGIC, VERSION, len(FIELDS), len(records), index_offset, len(index_bytes))
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output.with_suffix(f"{output.suffix}.{os.getpid()}.tmp")
+    with tmp_path.open("wb") as handle:
+        handle.write(header + array_bytes + index_bytes)
+    os.replace(tmp_path, output)
+    return output
+
+
+class NutrientTable:
+    """
+    Read-only view over a compiled table. Lookups index straight into the mapped array.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with self.path.open("rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, field_count, count, index_offset, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or field_count != len(FIELDS):
+            raise ValueError(f"{self.path} is not a compatible nutrient table.")
+        self.count = count
+        self._values = memoryview(self._map)[HEADER.size:HEADER.size + count * field_count * 4].cast("f")
+        self.index: Dict[str, int] = json.loads(self._map[index_offset:index_offset + index_length])
+        self.resolve = lru_cache(maxsize=8192)(self._resolve)
+
+    def _resolve(self, raw_name: Any) -> Optional[int]:
+        return self.lookup(canonical_ingredient(raw_name))
+
+    def lookup(self, name: str) -> Optional[int]:
+        """
+        Resolve a canonical ingredient name, falling back to its trailing words
+        ("smoked firm tofu" -> "firm tofu" -> "tofu").
+        """
+
+        words = name.split(" ")
+        for start in range(len(words)):
+            ingredient_id = self.index.get(" ".join(words[start:]))
+            if ingredient_id is not None:
+                return ingredient_id
+        return None
+
+    def row(self, ingredient_id: int) -> Tuple[float, ...]:
+        offset = ingredient_id * len(FIELDS)
+        return tuple(self._values[offset:offset + len(FIELDS)])
+
+
+def default_table_path() -> Path:
+    configured = getattr(settings, "NUTRIENT_TABLE_PATH", None)
+    return Path(configured) if configured else DEFAULT_SOURCE.with_suffix(".bin")
+
+
+_table: Optional[NutrientTable] = None
+_table_lock = threading.Lock()
+
+
+def get_nutrient_table() -> NutrientTable:
+    """
+    Map the compiled table once per process, compiling it first if it is missing or stale.
+    """
+
+    global _table
+    if _table is not None:
+        return _table
+    with _table_lock:
+        if _table is None:
+            path = default_table_path()
+            if not path.exists() or path.stat().st_mtime < DEFAULT_SOURCE.stat().st_mtime:
+                compile_nutrient_table(DEFAULT_SOURCE, path)
+            _table = NutrientTable(path)
+    return _table
+
+
+@lru_cache(maxsize=8192)
+def _grams(quantity_text: str, unit_grams: float, density: float) -> Optional[float]:
+    quantity = parse_quantity(quantity_text)
+    if not quantity.is_numeric:
+        return None
+    amount = quantity.amount
+    if quantity.max_amount is not None:
+        amount = (amount + quantity.max_amount) / 2
+    base = Quantity(amount=amount, unit=quantity.unit).to_base()
+    if base.unit == "g":
+        return base.amount
+    if base.unit == "ml":
+        return base.amount * (density or 1.0)
+    if base.unit in GENERIC_UNIT_GRAMS:
+        return amount * GENERIC_UNIT_GRAMS[base.unit]
+    return amount * (unit_grams or DEFAULT_UNIT_GRAMS)
+
+
+def compute_nutrition(
+    ingredients: Iterable[Dict[str, Any]],
+    servings: int = 1,
+    table: Optional[NutrientTable] = None,
+) -> Dict[str, Any]:
+    """
+    Sum per-serving calories and macros for `{name, quantity}` ingredient entries.
+
+    Entries without a numeric quantity ("to taste") or without a table match are
+    skipped; `coverage` reports the share of ingredients that contributed.
+    """
+
+    table = table or get_nutrient_table()
+    totals = [0.0, 0.0, 0.0, 0.0]
+    considered = 0
+    matched = 0
+    for item in ingredients or []:
+        if not isinstance(item, dict):
+            continue
+        considered += 1
+        name = item.get("name")
+        ingredient_id = table.resolve(name) if isinstance(name, str) else None
+        if ingredient_id is None:
+            continue
+        kcal, protein, carbs, fats, unit_grams, density = table.row(ingredient_id)
+        quantity = item.get("quantity")
+        grams = _grams(quantity if isinstance(quantity, str) else str(quantity or ""), unit_grams, density)
+        if grams is None:
+            continue
+        matched += 1
+        factor = grams / 100.0
+        totals[0] += kcal * factor
+        totals[1] += protein * factor
+        totals[2] += carbs * factor
+        totals[3] += fats * factor
+
+    servings = parse_servings(servings, default=1)
+    return {
+        "calories": round(totals[0] / servings),
+        "protein_g": round(totals[1] / servings, 1),
+        "carbs_g": round(totals[2] / servings, 1),
+        "fats_g": round(totals[3] / servings, 1),
+        "coverage": round(matched / considered, 2) if considered else 0.0,
+    }
+
+
+__all__ = [
+    "NutrientTable",
+    "compile_nutrient_table",
+    "compute_nutrition",
+    "get_nutrient_table",
+]
@@ -0,0 +1,442 @@
+"""
+In-memory inverted index from canonical ingredient to stored recipe ids.
+
+Posting lists are Roaring-style compressed bitmaps (see `Bitmap`), so diet tags
+and exclusions are applied as chunk-wise AND / AND NOT before any recipe is scored. Candidates are ranked by idf-weighted
+Jaccard similarity between the pantry and the recipe's ingredients.
+"""
+
+import bisect
+import math
+import threading
+from array import array
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from django.conf import settings
+
+from .canonical import canonical_ingredient
+from .diets import compatible_diets, name_terms, normalize_diet
+from .process_index import ProcessIndex
+
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+CHUNK_BYTES = (1 << CHUNK_BITS) // 8
+# Containers holding more values than this switch from a sorted array to a bitset,
+# the point at which the bitset becomes the smaller of the two (as in Roaring).
+ARRAY_MAX = 4096
+
+Container = Union[array, int]
+
+
+def _as_bits(container: Container) -> int:
+    if isinstance(container, int):
+        return container
+    buffer = bytearray(CHUNK_BYTES)
+    for value in container:
+        buffer[value >> 3] |= 1 << (value & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _values(container: Container) -> Iterator[int]:
+    if not isinstance(container, int):
+        yield from container
+        return
+    # bin() is reversed so the string index of every "1" is its bit position.
+    digits = bin(container)[:1:-1]
+    position = digits.find("1")
+    while position != -1:
+        yield position
+        position = digits.find("1", position + 1)
+
+
+# Set operations on one chunk. `left_view` / `right_view` return the little-endian
+# bytes of an int container, so array containers can be filtered by direct indexing.
+
+
+def _filter(values: array, view: bytes, keep: bool) -> array:
+    return array("H", [value for value in values if bool(view[value >> 3] >> (value & 7) & 1) is keep])
+
+
+def _and(left: Container, right: Container, left_view, right_view) -> Container:
+    if isinstance(left, int) and isinstance(right, int):
+        return left & right
+    if isinstance(left, int):
+        return _filter(right, left_view(), True)
+    if isinstance(right, int):
+        return _filter(left, right_view(), True)
+    small, large = sorted((left, right), key=len)
+    return array("H", sorted(set(small).intersection(large)))
+
+
+def _or(left: Container, right: Container, left_view, right_view) -> Container:
+    if isinstance(left, int) or isinstance(right, int) or len(left) + len(right) > ARRAY_MAX:
+        return _as_bits(left) | _as_bits(right)
+    return array("H", sorted(set(left).union(right)))
+
+
+def _and_not(left: Container, right: Container, left_view, right_view) -> Container:
+    if isinstance(left, int):
+        return left & ~_as_bits(right)
+    if isinstance(right, int):
+        return _filter(left, right_view(), False)
+    return array("H", sorted(set(left).difference(right)))
+
+
+class Bitmap:
+    """
+    Compressed set of non-negative ints: values are split into 65,536-wide chunks and
+    each chunk is a sorted `array('H')` while sparse or an int bitset once dense.
+    Empty chunks are dropped.
+    """
+
+    __slots__ = ("_chunks", "_views")
+
+    def __init__(self, chunks: Optional[Dict[int, Container]] = None):
+        self._chunks: Dict[int, Container] = chunks or {}
+        self._views: Dict[int, bytes] = {}
+
+    def add(self, value: int) -> None:
+        chunk, low = value >> CHUNK_BITS, value & CHUNK_MASK
+        container = self._chunks.get(chunk)
+        if container is None:
+            self._chunks[chunk] = array("H", [low])
+        elif isinstance(container, int):
+            self._chunks[chunk] = container | (1 << low)
+            self._views.pop(chunk, None)
+        elif not container or container[-1] < low:
+            # Slots are handed out in increasing order, so this is the common path.
+            container.append(low)
+            if len(container) > ARRAY_MAX:
+                self._chunks[chunk] = _as_bits(container)
+        elif low not in container:
+            container.insert(bisect.bisect_left(container, low), low)
+
+    def _view(self, chunk: int) -> bytes:
+        view = self._views.get(chunk)
+        if view is None:
+            view = self._views[chunk] = self._chunks[chunk].to_bytes(CHUNK_BYTES, "little")
+        return view
+
+    def __contains__(self, value: int) -> bool:
+        container = self._chunks.get(value >> CHUNK_BITS)
+        if container is None:
+            return False
+        low = value & CHUNK_MASK
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        position = bisect.bisect_left(container, low)
+        return position < len(container) and container[position] == low
+
+    def _combine(self, other: "Bitmap", operation, keep_unmatched: bool) -> "Bitmap":
+        chunks = {}
+        for chunk, container in self._chunks.items():
+            other_container = other._chunks.get(chunk)
+            if other_container is None:
+                if keep_unmatched:
+                    chunks[chunk] = container
+                continue
+            result = operation(
+                container,
+                other_container,
+                lambda chunk=chunk: self._view(chunk),
+                lambda chunk=chunk: other._view(chunk),
+            )
+            if result:
+                chunks[chunk] = result
+        return Bitmap(chunks)
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        small, large = sorted((self, other), key=lambda bitmap: len(bitmap._chunks))
+        return small._combine(large, _and, keep_unmatched=False)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        merged = self._combine(other, _or, keep_unmatched=True)
+        for chunk, container in other._chunks.items():
+            merged._chunks.setdefault(chunk, container)
+        return merged
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        """AND NOT."""
+
+        return self._combine(other, _and_not, keep_unmatched=True)
+
+    def __iter__(self) -> Iterator[int]:
+        for chunk in sorted(self._chunks):
+            base = chunk << CHUNK_BITS
+            for value in _values(self._chunks[chunk]):
+                yield base + value
+
+    def __len__(self) -> int:
+        return sum(
+            container.bit_count() if isinstance(container, int) else len(container)
+            for container in self._chunks.values()
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self._chunks)
+
+
+@dataclass(frozen=True)
+class PantryMatch:
+    recipe_id: str
+    score: float
+    missing: Tuple[str, ...]
+
+
+class PantryIndex:
+    """
+    Maps canonical ingredients, their word runs and diet tags to recipe bitmaps.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._slots: Dict[str, int] = {}
+        self._ingredients: List[Tuple[str, ...]] = []
+        self._sizes = array("B")
+        self._by_size: Dict[int, Bitmap] = {}
+        # Postings are keyed by every word run of an ingredient, so a pantry "tofu"
+        # finds recipes listing "firm tofu" and an excluded "peanut" drops "peanut butter".
+        self._terms: Dict[str, Bitmap] = {}
+        self._counts: Dict[str, int] = {}
+        self._diets: Dict[str, Bitmap] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, recipe_id: Any, ingredients: Iterable[Any]) -> bool:
+        """
+        Index a recipe's ingredients (dicts with a `name` or plain strings). Returns False
+        for recipes that are already indexed or have no usable ingredients.
+        """
+
+        names = tuple(dict.fromkeys(name for name in (_ingredient_name(item) for item in ingredients or []) if name))
+        if recipe_id is None or not names:
+            return False
+        recipe_id = str(recipe_id)
+        with self._lock:
+            if recipe_id in self._slots:
+                return False
+            slot = len(self._ids)
+            self._ids.append(recipe_id)
+            self._slots[recipe_id] = slot
+            self._ingredients.append(names)
+            self._sizes.append(min(len(names), 255))
+            self._by_size.setdefault(self._sizes[slot], Bitmap()).add(slot)
+            for term in dict.fromkeys(term for name in names for term in name_terms(name)):
+                self._terms.setdefault(term, Bitmap()).add(slot)
+                self._counts[term] = self._counts.get(term, 0) + 1
+            for diet in compatible_diets(names):
+                self._diets.setdefault(diet, Bitmap()).add(slot)
+        return True
+
+    def weight(self, name: str) -> float:
+        """Inverse document frequency: rare ingredients say more about a recipe."""
+
+        return math.log((len(self._ids) + 1) / (self._counts.get(name, 0) + 1)) + 1.0
+
+    def search(
+        self,
+        pantry: Sequence[str],
+        exclude: Sequence[str] = (),
+        diets: Sequence[str] = (),
+        min_score: float = 0.0,
+        limit: int = 5,
+    ) -> List[PantryMatch]:
+        """
+        Rank stored recipes by weighted Jaccard similarity to `pantry`.
+
+        A recipe ingredient counts as covered when a pantry item is one of its word
+        runs. Recipes that contain an excluded ingredient or break a diet tag are
+        removed before scoring. Diet tags the index does not understand yield no
+        matches, since compliance cannot be checked.
+        """
+
+        pantry_names = list(dict.fromkeys(name for name in (canonical_ingredient(item) for item in pantry) if name))
+        if not pantry_names or not self._ids:
+            return []
+
+        diet_bitmaps = []
+        for tag in diets or []:
+            diet = normalize_diet(tag)
+            if diet is None:
+                return []
+            diet_bitmaps.append(self._diets.get(diet, Bitmap()))
+        excluded_names = (canonical_ingredient(item) for item in exclude or [])
+        excluded = [self._terms[name] for name in excluded_names if name in self._terms]
+
+        weights = {name: self.weight(name) for name in pantry_names}
+        pantry_weight = sum(weights.values())
+
+        # Prefix filter: a recipe that shares none of the heaviest pantry ingredients
+        # cannot reach `min_score`, so only their postings are unioned.
+        candidates = Bitmap()
+        remaining = pantry_weight
+        for name in sorted(pantry_names, key=weights.__getitem__, reverse=True):
+            if remaining < min_score * pantry_weight:
+                break
+            posting = self._terms.get(name)
+            if posting:
+                candidates = candidates | posting
+            remaining -= weights[name]
+        for bitmap in diet_bitmaps:
+            candidates = candidates & bitmap
+        for bitmap in excluded:
+            candidates = candidates - bitmap
+        if not candidates:
+            return []
+
+        postings = {name: self._terms[name] & candidates for name in pantry_names if name in self._terms}
+        candidates = candidates & self._enough_matches(postings, weights, min_score)
+        if not candidates:
+            return []
+
+        # Exact covered weight per candidate, then the same bound per slot before the
+        # full score is computed.
+        common: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for name, posting in postings.items():
+            weight = weights[name]
+            for slot in posting & candidates:
+                common[slot] = common.get(slot, 0.0) + weight
+                matched[slot] = matched.get(slot, 0) + 1
+        sizes = self._sizes
+        threshold = min_score * pantry_weight
+        survivors = [
+            slot
+            for slot, covered_weight in common.items()
+            if covered_weight >= threshold + min_score * max(sizes[slot] - matched[slot], 0)
+        ]
+
+        pantry_set = set(pantry_names)
+        # Recipes share a small vocabulary, so per-name work is memoised for this call.
+        found_by_name: Dict[str, Tuple[str, ...]] = {}
+        weight_by_name: Dict[str, float] = {}
+        scored = []
+        for slot in survivors:
+            extra = 0.0
+            for name in self._ingredients[slot]:
+                found = found_by_name.get(name)
+                if found is None:
+                    found = found_by_name[name] = tuple(term for term in name_terms(name) if term in pantry_set)
+                if not found:
+                    if name not in weight_by_name:
+                        weight_by_name[name] = self.weight(name)
+                    extra += weight_by_name[name]
+            score = common[slot] / (pantry_weight + extra)
+            if score >= min_score:
+                scored.append((score, slot))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [
+            PantryMatch(
+                recipe_id=self._ids[slot],
+                score=round(score, 4),
+                missing=tuple(name for name in self._ingredients[slot] if not found_by_name[name]),
+            )
+            for score, slot in scored[:limit]
+        ]
+
+    def _enough_matches(self, postings: Dict[str, Bitmap], weights: Dict[str, float], min_score: float) -> Bitmap:
+        """
+        Recipes that share enough pantry items to possibly reach `min_score`.
+
+        Every unmatched recipe ingredient adds at least 1.0 (the minimum idf) to the
+        union, so a recipe of `size` ingredients sharing `m` pantry items scores at
+        most top_m / (pantry_weight + size - m), where top_m sums the m heaviest
+        pantry weights (assuming each pantry item covers one recipe ingredient).
+        `layers[k]` holds the recipes sharing more than k pantry items and is built
+        with bitmap ANDs/ORs, so nothing is enumerated here.
+        """
+
+        layers: List[Bitmap] = []
+        for posting in postings.values():
+            for k in reversed(range(len(layers))):
+                promoted = layers[k] & posting
+                if not promoted:
+                    continue
+                if k + 1 == len(layers):
+                    layers.append(promoted)
+                else:
+                    layers[k + 1] = layers[k + 1] | promoted
+            if layers:
+                layers[0] = layers[0] | posting
+            else:
+                layers.append(posting)
+
+        pantry_weight = sum(weights.values())
+        top = [0.0]
+        for weight in sorted(weights.values(), reverse=True):
+            top.append(top[-1] + weight)
+
+        result = Bitmap()
+        for size, recipes in self._by_size.items():
+            required = next(
+                (
+                    matches
+                    for matches in range(1, len(layers) + 1)
+                    if top[matches] >= min_score * (pantry_weight + max(size - matches, 0))
+                ),
+                None,
+            )
+            if required is not None:
+                result = result | (recipes & layers[required - 1])
+        return result
+
+    def best_match(self, payload: Dict[str, Any], threshold: Optional[float] = None) -> Optional[PantryMatch]:
+        """The highest-ranked recipe for a suggestion payload that clears `threshold`."""
+
+        if threshold is None:
+            threshold = getattr(settings, "PANTRY_REUSE_THRESHOLD", 0.6)
+        matches = self.search(
+            payload.get("ingredients") or [],
+            exclude=payload.get("exclude_ingredients") or [],
+            diets=payload.get("diet_preferences") or [],
+            min_score=threshold,
+            limit=1,
+        )
+        return matches[0] if matches else None
+
+
+_canonical = lru_cache(maxsize=65536)(canonical_ingredient)
+
+
+def _ingredient_name(item: Any) -> str:
+    if isinstance(item, dict):
+        item = item.get("name")
+    return _canonical(item) if isinstance(item, str) else ""
+
+
+def build_pantry_index(repo) -> PantryIndex:
+    index = PantryIndex()
+    for row in repo.iter_recipe_ingredients():
+        index.add(row.get("id"), row.get("ingredients"))
+    return index
+
+
+_pantry_index = ProcessIndex(build_pantry_index, "PANTRY_INDEX_TTL_SECONDS")
+
+
+def get_pantry_index(repo, *, wait: bool = True) -> Optional[PantryIndex]:
+    """
+    Process-wide index; see `ProcessIndex` for how it is built and refreshed. With
+    `wait=False` it is None until the background build has finished.
+    """
+
+    return _pantry_index.get(repo, wait=wait)
+
+
+def reset_pantry_index() -> None:
+    _pantry_index.reset()
+
+
+__all__ = [
+    "Bitmap",
+    "PantryIndex",
+    "PantryMatch",
+    "build_pantry_index",
+    "get_pantry_index",
+    "reset_pantry_index",
+]
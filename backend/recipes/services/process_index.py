@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+from django.conf import settings
+
+IndexT = TypeVar("IndexT")
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessIndex(Generic[IndexT]):
+    """
+    Holds one in-memory index per process, built from a repository on first use.
+
+    Callers add new rows to the returned index as they write them. Once the index is
+    older than the `ttl_setting` seconds it is rebuilt on a background thread, which
+    picks up rows written by other workers, while the current one keeps serving.
+
+    Request paths pass `wait=False`: the first build then also runs in the background
+    and they get None until it is done, instead of scanning the table themselves.
+    """
+
+    def __init__(self, build: Callable[[Any], IndexT], ttl_setting: str, default_ttl: int = 900):
+        self._build = build
+        self._ttl_setting = ttl_setting
+        self._default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._index: Optional[IndexT] = None
+        self._built_at = 0.0
+        self._rebuilding = False
+        # Bumped by `reset` so a build started before it does not store its result.
+        self._generation = 0
+
+    def get(self, repo, *, wait: bool = True) -> Optional[IndexT]:
+        if self._index is None and not wait:
+            self._start_rebuild(repo)
+            return None
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._build(repo)
+                    self._built_at = time.monotonic()
+            return self._index
+
+        ttl = getattr(settings, self._ttl_setting, self._default_ttl)
+        if time.monotonic() - self._built_at >= ttl:
+            self._start_rebuild(repo)
+        return self._index
+
+    def reset(self) -> None:
+        with self._lock:
+            self._index = None
+            self._generation += 1
+            self._rebuilding = False
+
+    def _start_rebuild(self, repo) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+            generation = self._generation
+
+        def rebuild():
+            try:
+                index = self._build(repo)
+                with self._lock:
+                    if generation == self._generation:
+                        self._index = index
+                        self._built_at = time.monotonic()
+            except Exception:
+                # The next request starts another attempt.
+                logger.exception("Building the %s index failed.", self._ttl_setting)
+            finally:
+                with self._lock:
+                    if generation == self._generation:
+                        self._rebuilding = False
+
+        threading.Thread(target=rebuild, name=f"{self._ttl_setting.lower()}-rebuild", daemon=True).start()
+
+
+__all__ = ["ProcessIndex"]
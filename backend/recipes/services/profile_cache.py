@@ -0,0 +1,72 @@
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class ProfileCache:
+    """
+    Per-user cache of Supabase profile rows backed by Django's cache framework.
+
+    Entries are written through by `SupabaseRepository.upsert_profile` and expire
+    after `PROFILE_CACHE_TTL_SECONDS`, so reads on the suggestion hot path never
+    need to reach PostgREST while the profile is warm.
+    """
+
+    key_prefix = "recipes:profile:"
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else getattr(settings, "PROFILE_CACHE_TTL_SECONDS", 300)
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.key_prefix}{user_id}"
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return cache.get(self._key(user_id))
+
+    def set(self, user_id: str, profile: Dict[str, Any]) -> None:
+        cache.set(self._key(user_id), dict(profile or {}), timeout=self.ttl)
+
+    def invalidate(self, user_id: str) -> None:
+        cache.delete(self._key(user_id))
+
+
+def _merge_unique(primary: List[str], extra: List[str]) -> List[str]:
+    merged = list(primary)
+    seen = {item.strip().lower() for item in primary if isinstance(item, str)}
+    for item in extra:
+        if not isinstance(item, str):
+            continue
+        key = item.strip().lower()
+        if key and key not in seen:
+            seen.add(key)
+            merged.append(item.strip())
+    return merged
+
+
+def apply_profile_preferences(payload: Dict[str, Any], profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge stored profile preferences into a validated suggestion payload.
+
+    Allergens become exclusions, stored diet preferences are unioned with the
+    request's, and the profile calorie target is used unless the request sets one.
+    """
+
+    if not profile:
+        return payload
+
+    merged = dict(payload)
+    merged["exclude_ingredients"] = _merge_unique(
+        payload.get("exclude_ingredients") or [],
+        profile.get("allergens") or [],
+    )
+    merged["diet_preferences"] = _merge_unique(
+        payload.get("diet_preferences") or [],
+        profile.get("diet_preferences") or [],
+    )
+    if not payload.get("calorie_target") and profile.get("calorie_target"):
+        merged["calorie_target"] = profile["calorie_target"]
+    return merged
+
+
+__all__ = ["ProfileCache", "apply_profile_preferences"]
@@ -0,0 +1,169 @@
+import math
+import re
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Any, Optional
+
+UNICODE_FRACTIONS = {
+    "½": "1/2",
+    "⅓": "1/3",
+    "⅔": "2/3",
+    "¼": "1/4",
+    "¾": "3/4",
+    "⅕": "1/5",
+    "⅛": "1/8",
+}
+
+# Spelled-out unit -> canonical unit symbol.
+UNIT_ALIASES = {
+    "g": "g", "gram": "g", "grams": "g", "gr": "g",
+    "kg": "kg", "kilogram": "kg", "kilograms": "kg",
+    "mg": "mg",
+    "ml": "ml", "milliliter": "ml", "milliliters": "ml", "millilitre": "ml", "millilitres": "ml",
+    "l": "l", "liter": "l", "liters": "l", "litre": "l", "litres": "l",
+    "tsp": "tsp", "teaspoon": "tsp", "teaspoons": "tsp",
+    "tbsp": "tbsp", "tablespoon": "tbsp", "tablespoons": "tbsp", "tbs": "tbsp",
+    "cup": "cup", "cups": "cup",
+    "oz": "oz", "ounce": "oz", "ounces": "oz",
+    "lb": "lb", "lbs": "lb", "pound": "lb", "pounds": "lb",
+    "clove": "clove", "cloves": "clove",
+    "pinch": "pinch", "pinches": "pinch",
+    "can": "can", "cans": "can",
+    "slice": "slice", "slices": "slice",
+    "piece": "piece", "pieces": "piece", "pc": "piece", "pcs": "piece",
+    "bunch": "bunch", "bunches": "bunch",
+    "handful": "handful", "handfuls": "handful",
+    "head": "head", "heads": "head",
+    "stalk": "stalk", "stalks": "stalk",
+    "sprig": "sprig", "sprigs": "sprig",
+    "package": "package", "packages": "package", "pack": "package",
+}
+
+# Units that convert into a shared base unit: unit -> (dimension, factor to base).
+CONVERSIONS = {
+    "mg": ("mass", 0.001),
+    "g": ("mass", 1.0),
+    "kg": ("mass", 1000.0),
+    "oz": ("mass", 28.3495),
+    "lb": ("mass", 453.592),
+    "ml": ("volume", 1.0),
+    "l": ("volume", 1000.0),
+    "tsp": ("volume", 4.92892),
+    "tbsp": ("volume", 14.7868),
+    "cup": ("volume", 240.0),
+}
+BASE_UNITS = {"mass": "g", "volume": "ml"}
+
+_NUMBER = r"\d+\s+\d+/\d+|\d+/\d+|\d+(?:[.,]\d+)?"
+_QUANTITY = re.compile(
+    rf"^\s*(?P<amount>{_NUMBER})(?:\s*(?:-|–|to)\s*(?P<max>{_NUMBER}))?\s*(?P<rest>.*)$",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class Quantity:
+    """
+    A parsed free-text quantity. `amount` is None for non-numeric entries such as "to taste".
+    """
+
+    amount: Optional[float]
+    unit: Optional[str] = None
+    max_amount: Optional[float] = None
+    note: str = ""
+
+    @property
+    def is_numeric(self) -> bool:
+        return self.amount is not None
+
+    def to_base(self) -> "Quantity":
+        """Convert mass/volume units to grams/millilitres; other units are returned unchanged."""
+
+        if self.amount is None or self.unit not in CONVERSIONS:
+            return self
+        dimension, factor = CONVERSIONS[self.unit]
+        return Quantity(
+            amount=self.amount * factor,
+            unit=BASE_UNITS[dimension],
+            max_amount=self.max_amount * factor if self.max_amount is not None else None,
+            note=self.note,
+        )
+
+
+def _to_number(text: str) -> float:
+    text = text.replace(",", ".").strip()
+    parts = text.split()
+    if len(parts) == 2:
+        return float(parts[0]) + float(Fraction(parts[1]))
+    return float(Fraction(text)) if "/" in text else float(text)
+
+
+def parse_quantity(text: Optional[str]) -> Quantity:
+    """
+    Parse strings like "200 g", "1 1/2 cups", "½ tsp", "2-3 cloves" or "to taste".
+    """
+
+    if not text or not isinstance(text, str):
+        return Quantity(amount=None)
+    normalized = text.strip()
+    for symbol, replacement in UNICODE_FRACTIONS.items():
+        normalized = re.sub(rf"(\d)\s*{symbol}", rf"\1 {replacement}", normalized)
+        normalized = normalized.replace(symbol, replacement)
+
+    match = _QUANTITY.match(normalized)
+    if not match:
+        return Quantity(amount=None, note=normalized)
+
+    amount = _to_number(match.group("amount"))
+    max_amount = _to_number(match.group("max")) if match.group("max") else None
+    rest = match.group("rest").strip()
+
+    unit = None
+    note = rest
+    if rest:
+        head, _, tail = rest.partition(" ")
+        candidate = head.lower().rstrip(".")
+        if candidate in UNIT_ALIASES:
+            unit = UNIT_ALIASES[candidate]
+            note = tail.strip()
+    return Quantity(amount=amount, unit=unit, max_amount=max_amount, note=note)
+
+
+def parse_servings(value: Any, default: int) -> int:
+    """
+    Whole servings from model or user input (4, 4.0, "4", "4 servings", "serves 4-6");
+    `default` when there is no positive number in it.
+    """
+
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, (int, float)):
+        amount = float(value)
+    else:
+        match = re.search(r"\d+(?:[.,]\d+)?", str(value or ""))
+        amount = float(match.group().replace(",", ".")) if match else 0.0
+    if not math.isfinite(amount) or round(amount) < 1:
+        return default
+    return int(round(amount))
+
+
+def format_amount(amount: float) -> str:
+    if abs(amount - round(amount)) < 0.01:
+        return str(int(round(amount)))
+    return f"{amount:.2f}".rstrip("0").rstrip(".")
+
+
+def format_quantity(quantity: Quantity) -> str:
+    if quantity.amount is None:
+        return quantity.note
+    text = format_amount(quantity.amount)
+    if quantity.max_amount is not None:
+        text = f"{text}-{format_amount(quantity.max_amount)}"
+    if quantity.unit:
+        text = f"{text} {quantity.unit}"
+    if quantity.note:
+        text = f"{text} {quantity.note}"
+    return text
+
+
+__all__ = ["Quantity", "format_quantity", "parse_quantity", "parse_servings"]
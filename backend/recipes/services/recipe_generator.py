@@ -1,13 +1,20 @@
+from __future__ import annotations
+
 import json
 import logging
-import os
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+from .admission import LANE_ANONYMOUS, get_admission_controller
+from .model_router import ModelRouter, Route, get_model_router
+from .nutrition import compute_nutrition
+from .quantities import parse_servings
 
-from langchain_openai import ChatOpenAI
+if TYPE_CHECKING:  # pragma: no cover - imported lazily at runtime
+    from langchain_openai import ChatOpenAI
 
 
-@dataclass
+@dataclass(slots=True)
 class GeneratedRecipe:
     title: str
     description: str
@@ -23,6 +30,101 @@ class GeneratedRecipe:
     source: str = "ai"
     model_version: Optional[str] = None
 
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "GeneratedRecipe":
+        """
+        Build from a cached dict or a stored row. Columns that are not recipe fields are
+        ignored; missing or null ones fall back to empty values.
+        """
+
+        values = {"title": "", "description": "", "servings": 2, "prep_time_minutes": 0, "cook_time_minutes": 0}
+        values.update((name, record[name]) for name in cls.__dataclass_fields__ if record.get(name) is not None)
+        return cls(**values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        The response / cache shape: every field, sharing (not copying) the nested
+        lists and dicts, unlike `dataclasses.asdict`'s recursive deep copy.
+        """
+
+        return {
+            "title": self.title,
+            "description": self.description,
+            "servings": self.servings,
+            "prep_time_minutes": self.prep_time_minutes,
+            "cook_time_minutes": self.cook_time_minutes,
+            "ingredients": self.ingredients,
+            "instructions": self.instructions,
+            "nutrition": self.nutrition,
+            "shopping_list": self.shopping_list,
+            "image_prompt": self.image_prompt,
+            "image_url": self.image_url,
+            "source": self.source,
+            "model_version": self.model_version,
+        }
+
+    def to_record(self) -> Dict[str, Any]:
+        """Columns persisted to the Supabase `recipes` table."""
+
+        return {
+            "title": self.title,
+            "description": self.description,
+            "servings": self.servings,
+            "prep_time_minutes": self.prep_time_minutes,
+            "cook_time_minutes": self.cook_time_minutes,
+            "ingredients": self.ingredients,
+            "instructions": self.instructions,
+            "nutrition": self.nutrition,
+            "image_url": self.image_url,
+            "image_prompt": self.image_prompt or None,
+            "source": self.source,
+            "model_version": self.model_version,
+            "shopping_list": self.shopping_list,
+        }
+
+
+class JSONObjectStream:
+    """
+    Incrementally extracts complete top-level JSON objects from streamed text.
+
+    Tracks brace depth outside of string literals, so objects are emitted as soon
+    as their closing brace arrives regardless of how the model splits lines.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> List[str]:
+        completed = []
+        for char in text:
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append("".join(self._buffer))
+                    self._buffer = []
+        return completed
+
 
 logger = logging.getLogger(__name__)
 
@@ -32,61 +134,210 @@ class RecipeGenerator:
     Generates recipe ideas using OpenAI via LangChain with a deterministic fallback.
     """
 
-    def __init__(self, llm: Optional[ChatOpenAI] = None):
-        self.llm = llm or self._build_llm()
+    def __init__(self, llm: Optional[ChatOpenAI] = None, lane: int = LANE_ANONYMOUS, router: Optional[ModelRouter] = None):
+        # An explicit `llm` bypasses routing; otherwise each call picks a model tier.
+        self.llm = llm
+        self.router = router
+        # Admission priority for LLM calls; see services.admission.
+        self.lane = lane
+        # Bookkeeping for the most recent `generate` call (one generator per request).
+        self.last_token_usage = 0
+        self.last_fallback_reason: Optional[str] = None
+        self.last_route: Optional[Route] = None
 
-    def _build_llm(self) -> Optional[ChatOpenAI]:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            logger.warning("OPENAI_API_KEY is not configured; using fallback recipe generator.")
-            return None
+    def _router(self) -> ModelRouter:
+        return self.router or get_model_router()
 
-        return ChatOpenAI(
-            temperature=0.4,
-            model="gpt-4o-mini",
-            max_tokens=800,
-            api_key=api_key,
-        )
+    def _select_llm(self, payload: Dict[str, Any], count: int = 1):
+        if self.llm is not None:
+            return self.llm, None
+        route = self._router().route(payload, count=count)
+        llm = self._router().llm_for(route)
+        return llm, (route if llm is not None else None)
+
+    def _record_route(self, route: Optional[Route], started: float, ok: bool, recipes: int = 1) -> None:
+        # The router's latency averages and SLOs are per recipe; a meal plan's
+        # completion is charged per recipe it was asked for.
+        if route is not None:
+            self._router().record(route, (self._router().clock() - started) / max(recipes, 1), ok)
 
     def generate(self, payload: Dict[str, Any]) -> GeneratedRecipe:
-        if not self.llm:
+        self.last_token_usage = 0
+        self.last_fallback_reason = None
+        llm, self.last_route = self._select_llm(payload)
+        if not llm:
             return self._fallback(payload, reason="llm-unavailable")
 
         prompt = self._build_prompt(payload)
-        try:
-            response = self.llm.invoke(prompt)
-            content = getattr(response, "content", response)
-            if isinstance(content, list):
-                content = "".join(chunk.get("text", "") for chunk in content if isinstance(chunk, dict))
-            content = self._normalize_model_output(content)
-            data = json.loads(content)
-            return self._from_model_payload(data)
-        except Exception as exc:
-            logger.exception("OpenAI recipe generation failed: %s", exc)
-            return self._fallback(payload, reason=str(exc))
+        with get_admission_controller().admit(self.lane):
+            started = self._router().clock()
+            try:
+                recipe = self._recipe_from_response(llm.invoke(prompt))
+            except Exception as exc:
+                self._record_route(self.last_route, started, ok=False)
+                logger.exception("OpenAI recipe generation failed: %s", exc)
+                return self._fallback(payload, reason=str(exc))
+            self._record_route(self.last_route, started, ok=True)
+            return recipe
+
+    async def agenerate(self, payload: Dict[str, Any]) -> GeneratedRecipe:
+        """`generate` for the async views: the completion is awaited with `ainvoke`."""
+
+        self.last_token_usage = 0
+        self.last_fallback_reason = None
+        llm, self.last_route = self._select_llm(payload)
+        if not llm:
+            return self._fallback(payload, reason="llm-unavailable")
+
+        prompt = self._build_prompt(payload)
+        async with get_admission_controller().aadmit(self.lane):
+            started = self._router().clock()
+            try:
+                recipe = self._recipe_from_response(await llm.ainvoke(prompt))
+            except Exception as exc:
+                self._record_route(self.last_route, started, ok=False)
+                logger.exception("OpenAI recipe generation failed: %s", exc)
+                return self._fallback(payload, reason=str(exc))
+            self._record_route(self.last_route, started, ok=True)
+            return recipe
+
+    def _recipe_from_response(self, response: Any) -> GeneratedRecipe:
+        self.last_token_usage = self._token_usage(response)
+        data = json.loads(self._normalize_model_output(self._chunk_text(response)))
+        return self._from_model_payload(data)
+
+    def _chunk_text(self, chunk: Any) -> str:
+        content = getattr(chunk, "content", chunk)
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return content if isinstance(content, str) else str(content or "")
+
+    def iter_meal_plan(self, payload: Dict[str, Any], count: int) -> Iterator[GeneratedRecipe]:
+        """
+        Generate `count` distinct recipes from a single streamed completion.
+
+        Each recipe is yielded as soon as its JSON object is complete. Any recipes the
+        model fails to deliver are filled in by the offline fallback.
+        """
+
+        self.last_token_usage = 0
+        self.last_fallback_reason = None
+        produced = 0
+        llm, self.last_route = self._select_llm(payload, count=count)
+
+        if llm:
+            prompt = self._build_meal_plan_prompt(payload, count)
+            parser = JSONObjectStream()
+            with get_admission_controller().admit(self.lane):
+                started = self._router().clock()
+                try:
+                    for chunk in llm.stream(prompt):
+                        for recipe in self._recipes_from_chunk(parser, chunk):
+                            yield recipe
+                            produced += 1
+                            if produced >= count:
+                                self._record_route(self.last_route, started, ok=True, recipes=count)
+                                return
+                except Exception as exc:
+                    logger.exception("OpenAI meal plan generation failed: %s", exc)
+                    self.last_fallback_reason = str(exc)
+                self._record_route(self.last_route, started, ok=self.last_fallback_reason is None, recipes=count)
+
+        reason = self.last_fallback_reason or ("llm-unavailable" if not llm else "meal-plan-incomplete")
+        for _ in range(produced, count):
+            yield self._fallback(payload, reason=reason)
+
+    def generate_meal_plan(self, payload: Dict[str, Any], count: int) -> List[GeneratedRecipe]:
+        return list(self.iter_meal_plan(payload, count))
+
+    async def agenerate_meal_plan(self, payload: Dict[str, Any], count: int) -> List[GeneratedRecipe]:
+        """`generate_meal_plan` for the async views, consuming the completion with `astream`."""
+
+        self.last_token_usage = 0
+        self.last_fallback_reason = None
+        recipes: List[GeneratedRecipe] = []
+        llm, self.last_route = self._select_llm(payload, count=count)
+
+        if llm:
+            parser = JSONObjectStream()
+            async with get_admission_controller().aadmit(self.lane):
+                started = self._router().clock()
+                try:
+                    async for chunk in llm.astream(self._build_meal_plan_prompt(payload, count)):
+                        recipes.extend(self._recipes_from_chunk(parser, chunk))
+                        if len(recipes) >= count:
+                            break
+                except Exception as exc:
+                    logger.exception("OpenAI meal plan generation failed: %s", exc)
+                    self.last_fallback_reason = str(exc)
+                self._record_route(self.last_route, started, ok=self.last_fallback_reason is None, recipes=count)
+
+        recipes = recipes[:count]
+        reason = self.last_fallback_reason or ("llm-unavailable" if not llm else "meal-plan-incomplete")
+        recipes.extend(self._fallback(payload, reason=reason) for _ in range(len(recipes), count))
+        return recipes
+
+    def _recipes_from_chunk(self, parser: JSONObjectStream, chunk: Any) -> List[GeneratedRecipe]:
+        self.last_token_usage += self._token_usage(chunk)
+        recipes = []
+        for raw in parser.feed(self._chunk_text(chunk)):
+            try:
+                data = json.loads(raw)
+            except json.JSONDecodeError:
+                logger.warning("Skipping malformed meal plan entry.")
+                continue
+            recipes.append(self._from_model_payload(data))
+        return recipes
+
+    def _build_meal_plan_prompt(self, payload: Dict[str, Any], count: int) -> str:
+        return (
+            "You are an experienced private chef and nutritionist planning a week of meals. "
+            f"Generate {count} distinct recipes that share ingredients where sensible to reduce waste. "
+            "Output one compact JSON object per line (JSON Lines) and nothing else. Each object has keys: "
+            "title, description, servings, prep_time_minutes, cook_time_minutes, "
+            "ingredients (list of {name, quantity} with metric quantities), instructions (list of {step, description}), "
+            "shopping_list (list of strings) and image_prompt. "
+            f"Use the following context for every recipe:\n{self._prompt_context(payload)}"
+            "Return ONLY the JSON lines with no commentary or code fences."
+        )
 
     def _build_prompt(self, payload: Dict[str, Any]) -> str:
+        return (
+            "You are an experienced private chef and nutritionist. "
+            "Generate a JSON response with keys: title, description, servings, prep_time_minutes, "
+            "cook_time_minutes, ingredients (list of {name, quantity} with metric quantities), "
+            "instructions (list of {step, description}), shopping_list (list of strings) and image_prompt. "
+            f"Use the following context:\n"
+            f"{self._prompt_context(payload)}"
+            "Ensure the JSON is valid and concise. Return ONLY the JSON object with no commentary or code fences."
+        )
+
+    def _prompt_context(self, payload: Dict[str, Any]) -> str:
         ingredients = ", ".join(payload.get("ingredients", []))
         diet = ", ".join(payload.get("diet_preferences", [])) or "no specific diet"
         exclude = ", ".join(payload.get("exclude_ingredients", [])) or "none"
         cuisine = payload.get("cuisine") or "chef's choice"
         servings = payload.get("servings", 2)
+        calorie_target = payload.get("calorie_target")
+        calorie_line = (
+            f"- Calorie target per serving: about {calorie_target} kcal\n" if calorie_target else ""
+        )
 
         return (
-            "You are an experienced private chef and nutritionist. "
-            "Generate a JSON response with keys: title, description, servings, prep_time_minutes, "
-            "cook_time_minutes, ingredients (list of {name, quantity}), instructions (list of {step, description}), "
-            "nutrition (calories, protein_g, carbs_g, fats_g), shopping_list (list of strings) and image_prompt. "
-            f"Use the following context:\n"
             f"- Ingredients available: {ingredients}\n"
             f"- Dietary preferences: {diet}\n"
             f"- Exclude ingredients: {exclude}\n"
             f"- Cuisine inspiration: {cuisine}\n"
             f"- Desired servings: {servings}\n"
-            "Ensure the JSON is valid and concise. Return ONLY the JSON object with no commentary or code fences."
+            f"{calorie_line}"
         )
 
+    def _token_usage(self, response: Any) -> int:
+        usage = getattr(response, "usage_metadata", None) or {}
+        return int(usage.get("total_tokens") or 0)
+
     def _fallback(self, payload: Dict[str, Any], reason: str = "fallback-offline") -> GeneratedRecipe:
+        self.last_fallback_reason = reason
         ingredients = payload.get("ingredients", [])
         title = f"Creative {', '.join(ingredients[:2])} Bowl" if ingredients else "AI Pantry Bowl"
         instructions = [
@@ -94,23 +345,26 @@ class RecipeGenerator:
             {"step": 2, "description": "Sauté aromatics, add remaining ingredients, and cook until tender."},
             {"step": 3, "description": "Season to taste, plate, and garnish with herbs or seeds."},
         ]
-        nutrition = {
-            "calories": 450,
-            "protein_g": 24,
-            "carbs_g": 40,
-            "fats_g": 18,
-        }
-        shopping_list = [fresh for fresh in ingredients if fresh.lower() not in {"salt", "pepper"}]
+        servings = payload.get("servings", 2)
+        pantry_staples = {"salt", "pepper"}
+        recipe_ingredients = [
+            {
+                "name": item,
+                "quantity": "to taste" if item.lower() in pantry_staples else f"{100 * servings} g",
+            }
+            for item in ingredients
+        ]
+        shopping_list = [fresh for fresh in ingredients if fresh.lower() not in pantry_staples]
 
         return GeneratedRecipe(
             title=title,
             description="A comforting dish generated offline because the AI model is unavailable.",
-            servings=payload.get("servings", 2),
+            servings=servings,
             prep_time_minutes=15,
             cook_time_minutes=20,
-            ingredients=[{"name": item, "quantity": "as needed"} for item in ingredients],
+            ingredients=recipe_ingredients,
             instructions=instructions,
-            nutrition=nutrition,
+            nutrition=compute_nutrition(recipe_ingredients, servings),
             shopping_list=shopping_list,
             image_prompt=f"Studio photo of {title}, vibrant lighting",
             model_version=reason,
@@ -127,19 +381,26 @@ class RecipeGenerator:
         return normalized
 
     def _from_model_payload(self, data: Dict[str, Any]) -> GeneratedRecipe:
+        # Models sometimes answer "4 servings"; a bad count must not discard the recipe.
+        servings = parse_servings(data.get("servings"), default=2)
+        ingredients = data.get("ingredients") or []
+        nutrition = compute_nutrition(ingredients, servings)
+        if not nutrition["coverage"] and data.get("nutrition"):
+            # Nothing matched the nutrient table; keep whatever the model volunteered.
+            nutrition = data["nutrition"]
         return GeneratedRecipe(
             title=data.get("title", "AI Crafted Dish"),
             description=data.get("description", ""),
-            servings=data.get("servings", 2),
+            servings=servings,
             prep_time_minutes=data.get("prep_time_minutes", 15),
             cook_time_minutes=data.get("cook_time_minutes", 20),
-            ingredients=data.get("ingredients") or [],
+            ingredients=ingredients,
             instructions=data.get("instructions") or [],
-            nutrition=data.get("nutrition") or {},
+            nutrition=nutrition,
             shopping_list=data.get("shopping_list") or [],
             image_prompt=data.get("image_prompt", ""),
             image_url=data.get("image_url"),
-            model_version=data.get("model_version", "openai"),
+            model_version=self.last_route.model_version if self.last_route else data.get("model_version", "openai"),
         )
 
 
@@ -1,19 +1,54 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Set
-
-from supabase import Client
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
+from .fields import RECIPE_CARD_FIELDS, RECIPE_FIELDS, select_columns
+from .generation_cache import canonical_payload
+from .profile_cache import ProfileCache
 from .supabase_client import get_supabase_client, SupabaseConfigurationError
 
+if TYPE_CHECKING:  # pragma: no cover - imported lazily at runtime
+    from supabase import Client
+
+
+def favorite_recipes(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Flatten `favorites` rows selected as `recipe:recipes(...)` into recipe records."""
+
+    favorites = []
+    for row in rows:
+        recipe = row.get("recipe") or {}
+        if recipe:
+            recipe["is_favorite"] = True
+            favorites.append(recipe)
+    return favorites
+
+
+def history_record(user_id: str, query_payload: Dict[str, Any], generated_recipe_id: Optional[str]) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "query": query_payload.get("notes") or ", ".join(query_payload.get("ingredients", [])),
+        "ingredients": query_payload.get("ingredients"),
+        "diet_preferences": query_payload.get("diet_preferences"),
+        "payload": canonical_payload(query_payload),
+        "generated_recipe_id": generated_recipe_id,
+    }
+
+
+def current_month_start() -> datetime:
+    """Lower bound of the current `search_history` partition (months are UTC)."""
+
+    return datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
 
 class SupabaseRepository:
     """
     Data access helper that encapsulates Supabase table interactions.
     """
 
-    def __init__(self, client: Optional[Client] = None):
+    def __init__(self, client: Optional[Client] = None, profile_cache: Optional[ProfileCache] = None):
         self.client = client or get_supabase_client()
+        self.profile_cache = profile_cache or ProfileCache()
 
     # Recipes -----------------------------------------------------------------
     def insert_recipe(self, recipe_data: Dict[str, Any], user_id: Optional[str]) -> Optional[str]:
@@ -27,30 +62,60 @@ class SupabaseRepository:
             return None
         return data[0].get("id")
 
-    def list_recipes(self, user_id: Optional[str], scope: str = "mine", limit: int = 20) -> List[Dict[str, Any]]:
+    def insert_recipe_batch(self, records: List[Dict[str, Any]], user_id: Optional[str]) -> List[Optional[str]]:
+        """
+        Insert several new recipes with one multi-row insert; ids are returned in input order.
+        """
+
+        if not records:
+            return []
+        payload = [{**record, "created_by": user_id} for record in records]
+        response = self.client.table("recipes").insert(payload).execute()
+        data = getattr(response, "data", None) or []
+        ids = [row.get("id") for row in data]
+        return ids + [None] * (len(records) - len(ids))
+
+    def insert_recipes(self, records: List[Dict[str, Any]], user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Insert many recipes in one request, skipping rows whose `dedupe_key` already exists.
+
+        Returns the rows that were actually inserted.
+        """
+
+        if not records:
+            return []
+        payload = [{**record, "created_by": user_id} for record in records]
+        response = (
+            self.client.table("recipes")
+            .upsert(payload, on_conflict="dedupe_key", ignore_duplicates=True)
+            .execute()
+        )
+        return getattr(response, "data", []) or []
+
+    def list_recipes(
+        self,
+        user_id: Optional[str],
+        scope: str = "mine",
+        limit: int = 20,
+        fields: Sequence[str] = RECIPE_CARD_FIELDS,
+    ) -> List[Dict[str, Any]]:
+        columns = select_columns(fields)
         if scope == "favorites":
             if not user_id:
                 return []
             response = (
                 self.client.table("favorites")
-                .select("recipe:recipes(*)")
+                .select(f"recipe:recipes({columns})")
                 .eq("user_id", user_id)
                 .order("created_at", desc=True)
                 .limit(limit)
                 .execute()
             )
-            rows = getattr(response, "data", []) or []
-            favorites = []
-            for row in rows:
-                recipe = row.get("recipe") or {}
-                if recipe:
-                    recipe["is_favorite"] = True
-                    favorites.append(recipe)
-            return favorites
+            return favorite_recipes(getattr(response, "data", []) or [])
 
         query = (
             self.client.table("recipes")
-            .select("*")
+            .select(columns)
             .order("created_at", desc=True)
             .limit(limit)
         )
@@ -66,6 +131,211 @@ class SupabaseRepository:
 
         return records
 
+    def search_recipes(
+        self,
+        user_id: Optional[str],
+        query: str,
+        scope: str = "mine",
+        limit: int = 20,
+        fields: Sequence[str] = RECIPE_CARD_FIELDS,
+        after: Optional[Tuple[float, str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[float, str]]]:
+        """
+        One page of ranked matches for `query` and the (rank, id) key of the next page.
+
+        `search_recipes` (recipes/sql/0005_recipe_search.sql) ranks ids through the GIN
+        indexes; the requested columns are then read by id, so the projection stays the
+        same as `list_recipes`.
+        """
+
+        if scope in ("mine", "favorites") and not user_id:
+            return [], None
+        after_rank, after_id = after if after else (None, None)
+        response = self.client.rpc(
+            "search_recipes",
+            {
+                "search_query": query,
+                "search_scope": scope,
+                "requesting_user": user_id,
+                "after_rank": after_rank,
+                "after_id": after_id,
+                "page_size": limit,
+            },
+        ).execute()
+        ranked = getattr(response, "data", []) or []
+        if not ranked:
+            return [], None
+
+        ids = [row["id"] for row in ranked]
+        response = self.client.table("recipes").select(select_columns(fields)).in_("id", ids).execute()
+        by_id = {row.get("id"): row for row in getattr(response, "data", []) or []}
+        records = []
+        for row in ranked:
+            record = by_id.get(row["id"])
+            if record is not None:
+                record["rank"] = row["rank"]
+                records.append(record)
+
+        if user_id:
+            # Only this page's ids: search-as-you-type reads a page per keystroke.
+            favorite_ids = set(ids) if scope == "favorites" else self.get_favorite_ids(user_id, ids)
+            for record in records:
+                record["is_favorite"] = record.get("id") in favorite_ids
+
+        last = ranked[-1]
+        return records, ((last["rank"], last["id"]) if len(ranked) == limit else None)
+
+    def iter_recipes(self, user_id: str, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        return self._iter_keyset("recipes", {"created_by": user_id}, key="id", page_size=page_size)
+
+    def iter_recipe_ingredients(self, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Walk every stored recipe, fetching only what the in-memory indexes need.
+        """
+
+        return self._iter_keyset(
+            "recipes",
+            {},
+            key="id",
+            columns="id,title,ingredients,servings,created_by,created_at",
+            page_size=page_size,
+        )
+
+    def get_recipe(self, recipe_id: str, fields: Sequence[str] = RECIPE_FIELDS) -> Optional[Dict[str, Any]]:
+        response = (
+            self.client.table("recipes")
+            .select(select_columns(fields))
+            .eq("id", recipe_id)
+            .maybe_single()
+            .execute()
+        )
+        return getattr(response, "data", None) or None
+
+    def iter_recipes_missing_images(self, page_size: int = 200) -> Iterator[Dict[str, Any]]:
+        return self._iter_keyset(
+            "recipes",
+            {},
+            key="id",
+            columns="id,image_prompt,image_attempts",
+            page_size=page_size,
+            null_columns=("image_url",),
+            not_null_columns=("image_prompt",),
+            # Rows whose last render failed wait for their backoff (sql/0007).
+            any_of=f'image_retry_at.is.null,image_retry_at.lte."{datetime.now(timezone.utc).isoformat()}"',
+        )
+
+    def record_recipe_image_failure(self, recipe_id: str, attempts: int, retry_at: Optional[datetime]) -> None:
+        """Back a failed render off until `retry_at`; None stops retrying it."""
+
+        (
+            self.client.table("recipes")
+            .update({"image_attempts": attempts, "image_retry_at": retry_at.isoformat() if retry_at else "infinity"})
+            .eq("id", recipe_id)
+            .execute()
+        )
+
+    def set_recipe_image(self, recipe_id: str, image_url: str, thumbnail_url: Optional[str]) -> None:
+        (
+            self.client.table("recipes")
+            .update({"image_url": image_url, "image_thumbnail_url": thumbnail_url})
+            .eq("id", recipe_id)
+            .execute()
+        )
+
+    def get_recipe_image(self, prompt_hash: str) -> Optional[Dict[str, Any]]:
+        response = (
+            self.client.table("recipe_images")
+            .select("*")
+            .eq("prompt_hash", prompt_hash)
+            .maybe_single()
+            .execute()
+        )
+        return getattr(response, "data", None) or None
+
+    def save_recipe_image(self, image: Dict[str, Any]) -> None:
+        # A concurrent render of the same prompt may have won; either row is fine.
+        (
+            self.client.table("recipe_images")
+            .upsert(image, on_conflict="prompt_hash", ignore_duplicates=True)
+            .execute()
+        )
+
+    def merge_duplicate_recipes(self, canonical_id: str, duplicate_ids: List[str]) -> None:
+        """
+        Point favorites and search history at `canonical_id`, then delete the duplicates.
+        Callers only merge recipes with the same `created_by`.
+        """
+
+        if not duplicate_ids:
+            return
+        response = (
+            self.client.table("favorites")
+            .select("user_id")
+            .in_("recipe_id", duplicate_ids)
+            .execute()
+        )
+        users = {row.get("user_id") for row in (getattr(response, "data", []) or []) if row.get("user_id")}
+        if users:
+            (
+                self.client.table("favorites")
+                .upsert(
+                    [{"user_id": user_id, "recipe_id": canonical_id} for user_id in sorted(users)],
+                    on_conflict="user_id,recipe_id",
+                    ignore_duplicates=True,
+                )
+                .execute()
+            )
+        (
+            self.client.table("search_history")
+            .update({"generated_recipe_id": canonical_id})
+            .in_("generated_recipe_id", duplicate_ids)
+            .execute()
+        )
+        # Favorites of the duplicates go with them via `on delete cascade`.
+        self.client.table("recipes").delete().in_("id", duplicate_ids).execute()
+
+    # Keyset paging -------------------------------------------------------------
+    def _iter_keyset(
+        self,
+        table: str,
+        filters: Dict[str, Any],
+        key: str,
+        columns: str = "*",
+        page_size: int = 500,
+        since: Optional[str] = None,
+        null_columns: Sequence[str] = (),
+        not_null_columns: Sequence[str] = (),
+        any_of: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Walk a table in `key` order one page at a time, holding at most one page in memory.
+
+        Each page is fetched with `key > last_seen` rather than an offset, so the
+        cost per page stays constant however deep the walk goes.
+        """
+
+        last_key = None
+        while True:
+            query = self.client.table(table).select(columns)
+            for column, value in filters.items():
+                query = query.eq(column, value)
+            for column in null_columns:
+                query = query.is_(column, "null")
+            for column in not_null_columns:
+                query = query.not_.is_(column, "null")
+            if any_of is not None:
+                query = query.or_(any_of)
+            if since is not None:
+                query = query.gte("created_at", since)
+            if last_key is not None:
+                query = query.gt(key, last_key)
+            response = query.order(key).limit(page_size).execute()
+            rows = getattr(response, "data", []) or []
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_key = rows[-1].get(key)
+
     # Favorites ---------------------------------------------------------------
     def set_favorite(self, user_id: str, recipe_id: str, add: bool = True) -> None:
         if add:
@@ -82,6 +352,66 @@ class SupabaseRepository:
                 .execute()
             )
 
+    def set_favorites_bulk(
+        self,
+        user_id: str,
+        add_ids: List[str],
+        remove_ids: List[str],
+    ) -> List[Dict[str, str]]:
+        """
+        Apply many favorite changes with one multi-row upsert and one `in` delete.
+
+        Returns one outcome per distinct (action, recipe id) pair; ids listed under
+        both actions are reported as conflicts and left untouched.
+        """
+
+        add_ids = list(dict.fromkeys(add_ids))
+        remove_ids = list(dict.fromkeys(remove_ids))
+        conflicts = set(add_ids) & set(remove_ids)
+        add_ids = [recipe_id for recipe_id in add_ids if recipe_id not in conflicts]
+        remove_ids = [recipe_id for recipe_id in remove_ids if recipe_id not in conflicts]
+
+        outcomes: Dict[tuple, str] = {}
+
+        if add_ids:
+            response = (
+                self.client.table("recipes")
+                .select("id")
+                .in_("id", add_ids)
+                .execute()
+            )
+            known = {row.get("id") for row in (getattr(response, "data", []) or [])}
+            rows = [{"user_id": user_id, "recipe_id": recipe_id} for recipe_id in add_ids if recipe_id in known]
+            if rows:
+                (
+                    self.client.table("favorites")
+                    .upsert(rows, on_conflict="user_id,recipe_id")
+                    .execute()
+                )
+            for recipe_id in add_ids:
+                outcomes[("add", recipe_id)] = "added" if recipe_id in known else "not_found"
+
+        if remove_ids:
+            response = (
+                self.client.table("favorites")
+                .delete()
+                .eq("user_id", user_id)
+                .in_("recipe_id", remove_ids)
+                .execute()
+            )
+            removed = {row.get("recipe_id") for row in (getattr(response, "data", []) or [])}
+            for recipe_id in remove_ids:
+                outcomes[("remove", recipe_id)] = "removed" if recipe_id in removed else "not_favorited"
+
+        for recipe_id in sorted(conflicts):
+            outcomes[("add", recipe_id)] = "conflict"
+            outcomes[("remove", recipe_id)] = "conflict"
+
+        return [
+            {"recipe_id": recipe_id, "action": action, "status": outcome}
+            for (action, recipe_id), outcome in outcomes.items()
+        ]
+
     # Search history ---------------------------------------------------------
     def log_search_history(
         self,
@@ -92,14 +422,7 @@ class SupabaseRepository:
         if not user_id:
             return None
 
-        payload = {
-            "user_id": user_id,
-            "query": query_payload.get("notes") or ", ".join(query_payload.get("ingredients", [])),
-            "ingredients": query_payload.get("ingredients"),
-            "diet_preferences": query_payload.get("diet_preferences"),
-            "generated_recipe_id": generated_recipe_id,
-        }
-
+        payload = history_record(user_id, query_payload, generated_recipe_id)
         response = self.client.table("search_history").insert(payload).execute()
         data = getattr(response, "data", None)
         if not data:
@@ -107,41 +430,116 @@ class SupabaseRepository:
         return data[0].get("id")
 
     def list_history(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Newest entries first. The current month is read on its own so the planner prunes
+        to one partition; older partitions are only touched when it comes up short.
+        """
+
+        month_start = current_month_start().isoformat()
+        history = self._history_page(user_id, limit, gte=month_start)
+        if len(history) < limit:
+            history += self._history_page(user_id, limit - len(history), lt=month_start)
+        return history
+
+    def _history_page(self, user_id: str, limit: int, **bounds: str) -> List[Dict[str, Any]]:
+        query = self.client.table("search_history").select("*").eq("user_id", user_id)
+        for operator, value in bounds.items():
+            query = getattr(query, operator)("created_at", value)
+        response = query.order("created_at", desc=True).limit(limit).execute()
+        return getattr(response, "data", []) or []
+
+    def get_history_rollups(self, user_id: str) -> List[Dict[str, Any]]:
+        """Per-month aggregates of the history `compact_search_history` has dropped."""
+
         response = (
-            self.client.table("search_history")
-            .select("*")
+            self.client.table("search_history_rollups")
+            .select("month,searches,ingredient_counts,diet_counts")
             .eq("user_id", user_id)
-            .order("created_at", desc=True)
-            .limit(limit)
+            .order("month", desc=True)
             .execute()
         )
         return getattr(response, "data", []) or []
 
-    def get_favorite_ids(self, user_id: str) -> Set[str]:
+    def compact_search_history(self, retain_months: int, months_ahead: int) -> List[Dict[str, Any]]:
+        response = self.client.rpc(
+            "compact_search_history",
+            {"retain_months": retain_months, "months_ahead": months_ahead},
+        ).execute()
+        return getattr(response, "data", []) or []
+
+    def list_search_history_partitions(self) -> List[Dict[str, Any]]:
+        response = self.client.rpc("search_history_partitions", {}).execute()
+        return getattr(response, "data", []) or []
+
+    def iter_history(self, user_id: str, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        return self._iter_keyset("search_history", {"user_id": user_id}, key="id", page_size=page_size)
+
+    def iter_search_payloads(self, since: Optional[str] = None, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Walk every user's search history, fetching only the fields that shape a prompt.
+        """
+
+        return self._iter_keyset(
+            "search_history",
+            {},
+            key="id",
+            columns="id,ingredients,diet_preferences,payload",
+            page_size=page_size,
+            since=since,
+        )
+
+    def iter_favorites(self, user_id: str, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        return self._iter_keyset("favorites", {"user_id": user_id}, key="recipe_id", page_size=page_size)
+
+    def is_favorite(self, user_id: str, recipe_id: str) -> bool:
         response = (
             self.client.table("favorites")
             .select("recipe_id")
             .eq("user_id", user_id)
+            .eq("recipe_id", recipe_id)
+            .limit(1)
             .execute()
         )
+        return bool(getattr(response, "data", None))
+
+    def get_favorite_ids(self, user_id: str, recipe_ids: Optional[Sequence[str]] = None) -> Set[str]:
+        """The user's favorite recipe ids, or only those among `recipe_ids` when given."""
+
+        query = self.client.table("favorites").select("recipe_id").eq("user_id", user_id)
+        if recipe_ids is not None:
+            if not recipe_ids:
+                return set()
+            query = query.in_("recipe_id", list(recipe_ids))
+        response = query.execute()
         data = getattr(response, "data", []) or []
         return {item.get("recipe_id") for item in data if item.get("recipe_id")}
 
     # Profiles ---------------------------------------------------------------
     def get_profile(self, user_id: str) -> Dict[str, Any]:
+        cached = self.profile_cache.get(user_id)
+        if cached is not None:
+            return cached
+
         response = (
             self.client.table("profiles")
             .select("*")
             .eq("id", user_id)
-            .single()
+            .maybe_single()
             .execute()
         )
-        return getattr(response, "data", {}) or {}
+        profile = getattr(response, "data", {}) or {}
+        self.profile_cache.set(user_id, profile)
+        return profile
 
     def upsert_profile(self, user_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
         payload = {"id": user_id, **data}
         response = self.client.table("profiles").upsert(payload).select("*").single().execute()
-        return getattr(response, "data", {}) or {}
+        profile = getattr(response, "data", {}) or {}
+        if profile:
+            self.profile_cache.set(user_id, profile)
+        else:
+            self.profile_cache.invalidate(user_id)
+        return profile
 
 
 __all__ = ["SupabaseRepository", "SupabaseConfigurationError"]
@@ -0,0 +1,230 @@
+"""
+Rescale a recipe to a different number of servings without asking the model again.
+
+Ingredient quantities are parsed with `parse_quantity`, multiplied, moved to a more
+readable unit of the same system when they outgrow or undershoot their own (6 tsp ->
+2 tbsp, 1500 g -> 1.5 kg) and rounded to what a kitchen measures: whole grams above
+10 g, quarter spoons and cups, half pieces. A unit change that rounding would make
+noticeably less exact is skipped (4 tsp stays 4 tsp rather than 1 1/4 tbsp). Counted
+items read in the singular at one or less ("3 eggs" / 3 -> "1 egg") and in the plural
+above it ("1 egg" * 3 -> "3 eggs"). Entries without a
+number ("to taste", "for garnish") are left as written. Nutrition is per serving, so it
+is only recomputed from the rescaled quantities when it came from the nutrient table.
+"""
+
+from fractions import Fraction
+from typing import Any, Dict, List, Optional, Tuple
+
+from .nutrition import compute_nutrition
+from .quantities import Quantity, format_amount, parse_quantity, parse_servings
+
+# Ladders a scaled amount may move along: (unit, size in the smallest unit of the
+# ladder, smallest amount expressed in that unit).
+_LADDERS = (
+    (("mg", 0.001, 0.0), ("g", 1.0, 1.0), ("kg", 1000.0, 1.0)),
+    (("ml", 1.0, 0.0), ("l", 1000.0, 1.0)),
+    (("tsp", 1.0, 0.0), ("tbsp", 3.0, 1.0), ("cup", 48.0, 0.25)),
+    (("oz", 1.0, 0.0), ("lb", 16.0, 1.0)),
+)
+_LADDER_OF = {unit: ladder for ladder in _LADDERS for unit, _, _ in ladder}
+
+# Units measured with spoons, cups or by the piece round to a fraction rather than a decimal.
+_FRACTION_STEPS = {"tsp": Fraction(1, 8), "tbsp": Fraction(1, 4), "cup": Fraction(1, 4), "oz": Fraction(1, 4), "lb": Fraction(1, 4)}
+_PIECE_STEP = Fraction(1, 2)
+_DECIMAL_UNITS = {"mg", "g", "kg", "ml", "l"}
+
+# A unit change may cost at most this relative rounding error over staying put.
+_CONVERSION_TOLERANCE = 0.05
+
+# Irregular plurals of counted items; regular ones are handled by `_singular` and `_plural`.
+_IRREGULAR_SINGULARS = {"leaves": "leaf", "loaves": "loaf", "halves": "half", "knives": "knife", "teeth": "tooth"}
+_IRREGULAR_PLURALS = {singular: plural for plural, singular in _IRREGULAR_SINGULARS.items()}
+_O_PLURALS = {"tomato", "potato", "mango", "echo"}
+# Items sometimes counted without a unit that have no plural ("2 garlic" is two heads).
+_UNCOUNTABLE = {"garlic", "ginger", "lettuce", "celery", "broccoli", "cauliflower", "spinach", "kale", "fish", "tofu"}
+
+_PLURALS = {
+    "cup": "cups", "clove": "cloves", "pinch": "pinches", "can": "cans", "slice": "slices",
+    "piece": "pieces", "bunch": "bunches", "handful": "handfuls", "head": "heads",
+    "stalk": "stalks", "sprig": "sprigs", "package": "packages",
+}
+
+
+def _convert(unit: Optional[str], amounts: List[float]) -> Tuple[Optional[str], List[float]]:
+    ladder = _LADDER_OF.get(unit)
+    if ladder is None:
+        return unit, amounts
+    size = next(size for name, size, _ in ladder if name == unit)
+    smallest = [amount * size for amount in amounts]
+    # The largest unit in which the (lower) amount still reads as at least its minimum.
+    for name, step_size, minimum in reversed(ladder):
+        if smallest[0] / step_size >= minimum or name == ladder[0][0]:
+            return name, [amount / step_size for amount in smallest]
+    return unit, amounts  # pragma: no cover - the smallest unit always matches
+
+
+def _round(amount: float, unit: Optional[str]) -> float:
+    if unit in _DECIMAL_UNITS:
+        if unit in {"g", "ml"}:
+            if amount >= 100:
+                return float(round(amount / 5) * 5)
+            if amount >= 10:
+                return float(round(amount))
+        return round(amount, 2 if unit in {"kg", "l"} else 1)
+    step = _FRACTION_STEPS.get(unit, _PIECE_STEP)
+    rounded = Fraction(round(Fraction(amount) / step)) * step
+    return float(max(rounded, step))
+
+
+def _format(amount: float, unit: Optional[str]) -> str:
+    if unit in _DECIMAL_UNITS:
+        return format_amount(amount)
+    value = Fraction(amount).limit_denominator(8)
+    whole, remainder = divmod(value.numerator, value.denominator)
+    if not remainder:
+        return str(whole)
+    fraction = f"{remainder}/{value.denominator}"
+    return f"{whole} {fraction}" if whole else fraction
+
+
+def scale_quantity(text: Optional[str], factor: float) -> Optional[str]:
+    """
+    Multiply a free-text quantity such as "1 1/2 cups" or "2-3 cloves" by `factor`.
+
+    Non-numeric quantities are returned unchanged.
+    """
+
+    quantity = parse_quantity(text)
+    if not quantity.is_numeric or factor == 1:
+        return text
+    return format_scaled(_scaled(quantity, factor))
+
+
+def _rounding_error(exact: List[float], unit: Optional[str]) -> Tuple[List[float], float]:
+    rounded = [_round(amount, unit) for amount in exact]
+    return rounded, max(abs(value - amount) / amount for value, amount in zip(rounded, exact) if amount)
+
+
+def _scaled(quantity: Quantity, factor: float) -> Quantity:
+    exact = [quantity.amount * factor]
+    if quantity.max_amount is not None:
+        exact.append(quantity.max_amount * factor)
+    unit, converted = _convert(quantity.unit, exact)
+    amounts, error = _rounding_error(converted, unit)
+    if unit != quantity.unit:
+        kept, kept_error = _rounding_error(exact, quantity.unit)
+        if error > _CONVERSION_TOLERANCE and kept_error < error:
+            unit, amounts = quantity.unit, kept
+    return Quantity(
+        amount=amounts[0],
+        unit=unit,
+        max_amount=amounts[1] if len(amounts) > 1 and amounts[1] != amounts[0] else None,
+        note=quantity.note,
+    )
+
+
+def _singular(word: str) -> str:
+    lower = word.lower()
+    if lower in _IRREGULAR_SINGULARS:
+        singular = _IRREGULAR_SINGULARS[lower]
+    elif lower.endswith("ies") and len(lower) > 4:
+        singular = lower[:-3] + "y"
+    elif lower.endswith(("oes", "ches", "shes", "xes", "sses")):
+        singular = lower[:-2]
+    elif lower.endswith("s") and not lower.endswith(("ss", "us", "is")):
+        singular = lower[:-1]
+    else:
+        return word
+    return singular.capitalize() if word[:1].isupper() else singular
+
+
+def _plural(word: str) -> str:
+    lower = word.lower()
+    # Already plural ("eggs") or without a plural ("garlic", "asparagus").
+    if lower.endswith("s") or lower in _UNCOUNTABLE or _singular(word) != word:
+        return word
+    if lower in _IRREGULAR_PLURALS:
+        plural = _IRREGULAR_PLURALS[lower]
+    elif lower.endswith("y") and lower[-2:-1] not in "aeiou":
+        plural = lower[:-1] + "ies"
+    elif lower.endswith(("ch", "sh", "x", "z")) or lower in _O_PLURALS:
+        plural = lower + "es"
+    else:
+        plural = lower + "s"
+    return plural.capitalize() if word[:1].isupper() else plural
+
+
+def _inflect_note(note: str, inflect) -> str:
+    """Inflect the item in a note such as "large eggs" or "onions, diced"."""
+
+    cut = min((index for index in (note.find(","), note.find("(")) if index >= 0), default=len(note))
+    head = note[:cut].rstrip()
+    words = head.split(" ")
+    if not words[-1]:
+        return note
+    words[-1] = inflect(words[-1])
+    return " ".join(words) + note[len(head):]
+
+
+def _singular_note(note: str) -> str:
+    return _inflect_note(note, _singular)
+
+
+def _plural_note(note: str) -> str:
+    return _inflect_note(note, _plural)
+
+
+def format_scaled(quantity: Quantity) -> str:
+    text = _format(quantity.amount, quantity.unit)
+    if quantity.max_amount is not None:
+        text = f"{text}-{_format(quantity.max_amount, quantity.unit)}"
+    upper = quantity.max_amount if quantity.max_amount is not None else quantity.amount
+    if quantity.unit:
+        text = f"{text} {_PLURALS.get(quantity.unit, quantity.unit) if upper > 1 else quantity.unit}"
+    if quantity.note:
+        # "1 cup tomatoes" reads fine; a counted item ("1 eggs", "3 egg") does not.
+        note = quantity.note
+        if not quantity.unit:
+            note = _singular_note(note) if upper <= 1 else _plural_note(note)
+        text = f"{text} {note}"
+    return text
+
+
+def readable_quantity(quantity: Quantity) -> str:
+    """`quantity` in the unit and rounding a scaled one would use ("30 tsp" -> "10 tbsp")."""
+
+    return format_scaled(_scaled(quantity, 1.0))
+
+
+def rescale_recipe(recipe: Dict[str, Any], servings: int) -> Dict[str, Any]:
+    """
+    Return a copy of a recipe record (stored row or cached `GeneratedRecipe` dict)
+    scaled to `servings`; the input is not modified.
+    """
+
+    # Rows stored before servings were parsed may hold text such as "4 servings".
+    original = parse_servings(recipe.get("servings"), default=0)
+    if not original or original == servings:
+        return recipe
+    factor = servings / original
+
+    ingredients = [
+        {**item, "quantity": scale_quantity(item.get("quantity"), factor)} if isinstance(item, dict) else item
+        for item in recipe.get("ingredients") or []
+    ]
+    scaled = {
+        **recipe,
+        "servings": servings,
+        "ingredients": ingredients,
+        "shopping_list": [
+            scale_quantity(entry, factor) if isinstance(entry, str) else entry
+            for entry in recipe.get("shopping_list") or []
+        ],
+    }
+    nutrition = recipe.get("nutrition") or {}
+    if nutrition.get("coverage"):
+        scaled["nutrition"] = compute_nutrition(ingredients, servings)
+    return scaled
+
+
+__all__ = ["readable_quantity", "rescale_recipe", "scale_quantity"]
@@ -0,0 +1,93 @@
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .canonical import canonical_ingredient
+from .quantities import CONVERSIONS, Quantity, parse_quantity
+from .scaling import readable_quantity
+
+# Spoons and cups, and ounces and pounds, are summed in grams/millilitres like any other
+# amount but shown in their own units again when nothing metric was added to them.
+_KITCHEN_UNITS = {"tsp": "tsp", "tbsp": "tsp", "cup": "tsp", "oz": "oz", "lb": "oz"}
+
+
+class _Line:
+    """Running totals for one canonical ingredient across several recipes."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.amounts: Dict[Optional[str], float] = {}
+        self.sources: Dict[Optional[str], Set[Optional[str]]] = {}
+        self.notes: List[str] = []
+        self.recipes = 0
+
+    def add(self, quantity: Quantity) -> None:
+        if quantity.is_numeric:
+            base = quantity.to_base()
+            # Ranges are summed at their upper bound so the list never comes up short.
+            amount = base.max_amount if base.max_amount is not None else base.amount
+            self.amounts[base.unit] = self.amounts.get(base.unit, 0.0) + amount
+            self.sources.setdefault(base.unit, set()).add(_KITCHEN_UNITS.get(quantity.unit, base.unit))
+        elif quantity.note and quantity.note not in self.notes:
+            self.notes.append(quantity.note)
+
+    def _readable(self, unit: Optional[str], amount: float) -> str:
+        sources = self.sources[unit]
+        if len(sources) == 1 and unit not in sources:
+            unit = next(iter(sources))
+            amount /= CONVERSIONS[unit][1]
+        return readable_quantity(Quantity(amount=amount, unit=unit))
+
+    def quantity_text(self) -> str:
+        parts = [
+            self._readable(unit, amount)
+            for unit, amount in sorted(self.amounts.items(), key=lambda item: item[0] or "")
+        ]
+        if not parts:
+            parts = self.notes[:1]
+        return " + ".join(parts)
+
+
+def consolidate_shopping_list(recipes: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge the ingredients and shopping lists of several recipes into one list.
+
+    Ingredients are grouped by canonical name; numeric quantities are converted to
+    grams/millilitres where possible, summed per unit and shown in a unit and rounding
+    a kitchen measures (spoons and cups stay spoons and cups). Shopping-list entries
+    that do not match an ingredient are kept once, without a quantity.
+    """
+
+    lines: Dict[str, _Line] = {}
+
+    def line_for(name: str) -> Optional[_Line]:
+        key = canonical_ingredient(name)
+        if not key:
+            return None
+        if key not in lines:
+            lines[key] = _Line(key)
+        return lines[key]
+
+    for recipe in recipes:
+        seen = set()
+        for item in recipe.get("ingredients") or []:
+            if not isinstance(item, dict):
+                continue
+            line = line_for(str(item.get("name", "")))
+            if line is None:
+                continue
+            line.add(parse_quantity(item.get("quantity")))
+            if line.name not in seen:
+                line.recipes += 1
+                seen.add(line.name)
+        for entry in recipe.get("shopping_list") or []:
+            line = line_for(str(entry))
+            if line is not None and line.name not in seen:
+                line.recipes += 1
+                seen.add(line.name)
+
+    return [
+        {"name": line.name, "quantity": line.quantity_text(), "recipes": line.recipes}
+        for line in sorted(lines.values(), key=lambda line: line.name)
+    ]
+
+
+__all__ = ["consolidate_shopping_list"]
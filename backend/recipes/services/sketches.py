@@ -0,0 +1,101 @@
+import hashlib
+import heapq
+from array import array
+from typing import Any, Dict, Hashable, List, Tuple
+
+
+class CountMinSketch:
+    """
+    Fixed-memory frequency estimator; estimates never undercount.
+
+    With width w and depth d the overestimate is at most 2N/w with
+    probability 1 - 2^-d, where N is the total number of items added.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 5):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._rows = [array("Q", bytes(8 * width)) for _ in range(depth)]
+
+    def _indexes(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for row in range(self.depth):
+            yield row, (h1 + row * h2) % self.width
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Add `count` occurrences and return the updated estimate."""
+
+        self.total += count
+        estimate = None
+        for row, index in self._indexes(key):
+            self._rows[row][index] += count
+            value = self._rows[row][index]
+            estimate = value if estimate is None else min(estimate, value)
+        return estimate or 0
+
+    def estimate(self, key: str) -> int:
+        return min(self._rows[row][index] for row, index in self._indexes(key))
+
+
+class HeavyHitters:
+    """
+    Top-k tracker over a stream: a count-min sketch for counts plus a bounded
+    candidate set, so memory is O(width * depth + k) however many distinct keys arrive.
+
+    `payloads` keeps one representative value per tracked key (e.g. the original
+    request payload) so callers can act on the winners.
+    """
+
+    def __init__(self, k: int = 100, width: int = 4096, depth: int = 5):
+        self.k = k
+        self.sketch = CountMinSketch(width=width, depth=depth)
+        self.counts: Dict[Hashable, int] = {}
+        self.payloads: Dict[Hashable, Any] = {}
+        self._heap: List[Tuple[int, Hashable]] = []
+
+    @property
+    def total(self) -> int:
+        return self.sketch.total
+
+    def add(self, key: str, payload: Any = None) -> None:
+        estimate = self.sketch.add(key)
+        if key in self.counts:
+            self.counts[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+            if len(self._heap) > 4 * self.k:
+                self._heap = [(count, tracked) for tracked, count in self.counts.items()]
+                heapq.heapify(self._heap)
+            return
+        if len(self.counts) < self.k:
+            self._track(key, estimate, payload)
+            return
+
+        floor_count, floor_key = self._floor()
+        if estimate > floor_count:
+            del self.counts[floor_key]
+            self.payloads.pop(floor_key, None)
+            self._track(key, estimate, payload)
+
+    def _track(self, key: str, estimate: int, payload: Any) -> None:
+        self.counts[key] = estimate
+        self.payloads[key] = payload
+        heapq.heappush(self._heap, (estimate, key))
+
+    def _floor(self) -> Tuple[int, Hashable]:
+        # Lazily drop heap entries that are stale (key evicted or count since raised).
+        while self._heap:
+            count, key = self._heap[0]
+            if self.counts.get(key) == count:
+                return count, key
+            heapq.heappop(self._heap)
+        raise LookupError("No tracked keys")  # pragma: no cover - only reachable with k == 0
+
+    def top(self, n: int) -> List[Tuple[Hashable, int, Any]]:
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+        return [(key, count, self.payloads.get(key)) for key, count in ranked]
+
+
+__all__ = ["CountMinSketch", "HeavyHitters"]
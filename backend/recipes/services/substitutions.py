@@ -0,0 +1,327 @@
+"""
+Adapt an existing recipe to extra exclusions or diet tags by substituting ingredients.
+
+`SUBSTITUTIONS` is a weighted graph: an edge `source -> (target, weight, ratio)` says
+`target` replaces `source` at `ratio` times the quantity, and `weight` (0-1) is how
+close the result stays to the original dish. The graph is compiled once per process
+into candidate lists per source, direct and two-hop, sorted by weight and annotated
+with a bitmask of the diets each candidate breaks (from `diets.py`), so adapting a
+recipe is a handful of dict lookups and mask tests per ingredient.
+
+An adaptation's confidence is the product of the weights used; callers decide which
+confidence is good enough to skip generation.
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .canonical import canonical_ingredient
+from .diets import DIET_EXCLUSIONS, name_terms, normalize_diet, violated_diets
+from .nutrition import compute_nutrition
+from .scaling import scale_quantity
+
+# source -> [(target, weight, quantity ratio)]
+SUBSTITUTIONS: Dict[str, List[Tuple[str, float, float]]] = {
+    # Dairy
+    "butter": [("vegan butter", 0.95, 1.0), ("coconut oil", 0.85, 1.0), ("olive oil", 0.8, 0.75)],
+    "milk": [("oat milk", 0.95, 1.0), ("soy milk", 0.9, 1.0), ("almond milk", 0.85, 1.0)],
+    "cream": [("coconut cream", 0.85, 1.0)],
+    "sour cream": [("coconut yogurt", 0.8, 1.0)],
+    "yogurt": [("coconut yogurt", 0.85, 1.0)],
+    "buttermilk": [("soy milk", 0.75, 1.0)],
+    "ghee": [("coconut oil", 0.85, 1.0), ("butter", 0.9, 1.0)],
+    "cheese": [("vegan cheese", 0.85, 1.0), ("nutritional yeast", 0.7, 0.25)],
+    "parmesan": [("nutritional yeast", 0.8, 0.5), ("vegan cheese", 0.75, 1.0)],
+    "mozzarella": [("vegan cheese", 0.85, 1.0)],
+    "cheddar": [("vegan cheese", 0.85, 1.0)],
+    "feta": [("vegan cheese", 0.75, 1.0), ("tofu", 0.65, 1.0)],
+    "ricotta": [("tofu", 0.7, 1.0)],
+    "cream cheese": [("vegan cheese", 0.75, 1.0)],
+    # Eggs and honey
+    "egg": [("flax egg", 0.8, 1.0), ("tofu", 0.6, 1.0)],
+    "mayonnaise": [("vegan mayonnaise", 0.95, 1.0)],
+    "honey": [("maple syrup", 0.95, 1.0), ("agave", 0.9, 1.0), ("erythritol", 0.7, 1.0)],
+    # Meat
+    "chicken": [("turkey", 0.9, 1.0), ("tofu", 0.8, 1.0), ("chickpea", 0.7, 1.0)],
+    "turkey": [("chicken", 0.9, 1.0), ("tofu", 0.75, 1.0)],
+    "beef": [("lamb", 0.8, 1.0), ("mushroom", 0.7, 1.0), ("lentil", 0.7, 1.0)],
+    "lamb": [("beef", 0.8, 1.0), ("eggplant", 0.6, 1.0)],
+    "pork": [("chicken", 0.85, 1.0), ("jackfruit", 0.7, 1.0)],
+    "bacon": [("smoked tempeh", 0.7, 1.0)],
+    "ham": [("smoked tofu", 0.65, 1.0)],
+    "sausage": [("vegan sausage", 0.85, 1.0)],
+    "gelatin": [("agar", 0.9, 0.5)],
+    "chicken broth": [("vegetable broth", 0.85, 1.0)],
+    "chicken stock": [("vegetable stock", 0.85, 1.0)],
+    "beef broth": [("mushroom broth", 0.8, 1.0), ("vegetable broth", 0.75, 1.0)],
+    "beef stock": [("mushroom stock", 0.8, 1.0), ("vegetable stock", 0.75, 1.0)],
+    # Seafood
+    "fish": [("tofu", 0.65, 1.0)],
+    "salmon": [("cod", 0.8, 1.0), ("tofu", 0.6, 1.0)],
+    "cod": [("tilapia", 0.9, 1.0), ("tofu", 0.65, 1.0)],
+    "tuna": [("chickpea", 0.75, 1.0)],
+    "shrimp": [("scallop", 0.8, 1.0), ("tofu", 0.65, 1.0)],
+    "anchovy": [("caper", 0.7, 1.0)],
+    "fish sauce": [("soy sauce", 0.85, 1.0), ("tamari", 0.85, 1.0)],
+    "fish stock": [("vegetable stock", 0.75, 1.0)],
+    # Gluten
+    "flour": [("gluten-free flour", 0.85, 1.0), ("almond flour", 0.75, 1.0)],
+    "pasta": [("gluten-free pasta", 0.9, 1.0), ("zucchini noodle", 0.7, 1.5)],
+    "spaghetti": [("gluten-free pasta", 0.9, 1.0), ("zucchini noodle", 0.7, 1.5)],
+    "penne": [("gluten-free pasta", 0.9, 1.0)],
+    "noodle": [("rice noodle", 0.9, 1.0), ("zucchini noodle", 0.7, 1.5)],
+    "bread": [("gluten-free bread", 0.9, 1.0)],
+    "breadcrumb": [("gluten-free breadcrumb", 0.9, 1.0), ("almond flour", 0.7, 1.0)],
+    "tortilla": [("corn tortilla", 0.9, 1.0)],
+    "cracker": [("rice cracker", 0.85, 1.0)],
+    "soy sauce": [("tamari", 0.95, 1.0)],
+    "couscous": [("quinoa", 0.85, 1.0), ("cauliflower rice", 0.75, 1.0)],
+    "bulgur": [("quinoa", 0.85, 1.0)],
+    "barley": [("brown rice", 0.8, 1.0)],
+    "seitan": [("tofu", 0.8, 1.0)],
+    # Nuts
+    "peanut": [("sunflower seed", 0.8, 1.0)],
+    "peanut butter": [("tahini", 0.8, 1.0)],
+    "almond": [("sunflower seed", 0.8, 1.0), ("pumpkin seed", 0.8, 1.0)],
+    "almond milk": [("oat milk", 0.95, 1.0)],
+    "cashew": [("sunflower seed", 0.75, 1.0)],
+    "walnut": [("pumpkin seed", 0.75, 1.0)],
+    "pecan": [("pumpkin seed", 0.75, 1.0)],
+    "hazelnut": [("pumpkin seed", 0.7, 1.0)],
+    "pistachio": [("pumpkin seed", 0.7, 1.0)],
+    # Carbohydrates
+    "rice": [("cauliflower rice", 0.8, 1.0)],
+    "quinoa": [("cauliflower rice", 0.7, 1.0)],
+    "potato": [("cauliflower", 0.7, 1.0)],
+    "sugar": [("erythritol", 0.75, 1.0)],
+}
+
+# Words that name a cut, form or preparation of an ingredient. A name made of a source
+# and only these ("boneless chicken thigh", "unsalted butter") takes the source's
+# substitute; any other extra word ("butter bean", "chicken broth" without its own
+# edge) makes it a different ingredient, which is not substituted.
+DESCRIPTORS = frozenset(
+    {
+        "boneless", "skinless", "breast", "thigh", "drumstick", "wing", "leg", "loin", "fillet",
+        "mince", "minced", "ground", "diced", "chopped", "sliced", "shredded", "grated", "cubed",
+        "fresh", "frozen", "whole", "raw", "cooked", "large", "small", "medium", "lean", "plain",
+        "unsalted", "salted", "softened", "melted", "cold", "heavy", "light", "low", "reduced",
+        "sodium", "fat", "full", "free", "range", "organic", "firm", "extra", "virgin",
+    }
+)
+
+_DIET_BITS = {diet: 1 << position for position, diet in enumerate(DIET_EXCLUSIONS)}
+
+
+@dataclass(frozen=True)
+class _Candidate:
+    name: str
+    weight: float
+    ratio: float
+    breaks: int  # bitmask of diets the candidate violates
+
+
+@dataclass(frozen=True)
+class Substitution:
+    original: str
+    replacement: str
+    weight: float
+
+
+@dataclass
+class Adaptation:
+    recipe: Dict[str, Any]
+    confidence: float
+    substitutions: List[Substitution] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "confidence": self.confidence,
+            "substitutions": [
+                {"original": item.original, "replacement": item.replacement, "weight": item.weight}
+                for item in self.substitutions
+            ],
+        }
+
+
+def _diet_mask(diets: Iterable[str]) -> int:
+    mask = 0
+    for diet in diets:
+        mask |= _DIET_BITS[diet]
+    return mask
+
+
+@lru_cache(maxsize=1)
+def _graph() -> Dict[str, Tuple[_Candidate, ...]]:
+    """Direct and two-hop candidates per source, best first."""
+
+    graph = {}
+    for source, edges in SUBSTITUTIONS.items():
+        best: Dict[str, Tuple[float, float]] = {}
+        for target, weight, ratio in edges:
+            hops = [(target, weight, ratio)] + [
+                (second, weight * second_weight, ratio * second_ratio)
+                for second, second_weight, second_ratio in SUBSTITUTIONS.get(target, ())
+            ]
+            for name, path_weight, path_ratio in hops:
+                if name != source and path_weight > best.get(name, (0.0, 1.0))[0]:
+                    best[name] = (path_weight, path_ratio)
+        graph[source] = tuple(
+            _Candidate(name, round(weight, 4), ratio, _diet_mask(violated_diets(name)))
+            for name, (weight, ratio) in sorted(best.items(), key=lambda item: (-item[1][0], item[0]))
+        )
+    return graph
+
+
+def _is_excluded(name: str, excluded: frozenset) -> bool:
+    return any(term in excluded for term in name_terms(name))
+
+
+@lru_cache(maxsize=4096)
+def _rename_pattern(names: Tuple[str, ...]) -> "re.Pattern[str]":
+    # Longest first, so "chicken broth" wins over "chicken" at the same position.
+    alternatives = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    return re.compile(rf"\b({alternatives})(?:e?s)?\b", re.IGNORECASE)
+
+
+def _matching_case(found: str, replacement: str, heading: bool) -> str:
+    if found.isupper() and len(found) > 1:
+        return replacement.upper()
+    if heading:
+        return replacement.title()
+    if found[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+def _replace(text: Any, renames: Dict[str, Optional[str]]) -> Any:
+    """
+    Apply `renames` (lower-cased name -> replacement) in one pass, so replaced text is
+    never matched again. Names mapped to None are kept as they are; they stop a
+    shorter name inside them from being renamed.
+    """
+
+    if not isinstance(text, str) or not text:
+        return text
+    # Title-cased text ("Garlic Butter Chicken") keeps every replaced word capitalised.
+    heading = text.istitle()
+
+    def rename(match: "re.Match[str]") -> str:
+        replacement = renames.get(match.group(1).lower())
+        if replacement is None:
+            return match.group(0)
+        return _matching_case(match.group(0), replacement, heading)
+
+    return _rename_pattern(tuple(renames)).sub(rename, text)
+
+
+def _source(name: str, graph: Dict[str, Tuple[_Candidate, ...]]) -> Optional[str]:
+    """The longest word run of `name` with a substitute, if the rest only describes it."""
+
+    source = next((term for term in sorted(name_terms(name), key=len, reverse=True) if term in graph), None)
+    if source is None:
+        return None
+    words = name.split(" ")
+    width = len(source.split(" "))
+    start = next(start for start in range(len(words)) if " ".join(words[start:start + width]) == source)
+    extra = words[:start] + words[start + width:]
+    return source if all(word in DESCRIPTORS for word in extra) else None
+
+
+def adapt_recipe(
+    recipe: Dict[str, Any],
+    diets: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+) -> Optional[Adaptation]:
+    """
+    Rewrite `recipe` so no ingredient breaks `diets` or matches `exclude`.
+
+    Ingredients, instruction text, title, description, image prompt and shopping list
+    are rewritten; quantities follow each substitution's ratio. Returns None when a
+    diet tag is unknown or an offending ingredient has no acceptable substitute. A
+    recipe that already complies comes back unchanged with confidence 1.0.
+    """
+
+    known = []
+    for tag in diets or []:
+        diet = normalize_diet(tag)
+        if diet is None:
+            return None
+        known.append(diet)
+    mask = _diet_mask(known)
+    excluded = frozenset(name for name in (canonical_ingredient(item) for item in exclude or []) if name)
+    graph = _graph()
+
+    confidence = 1.0
+    substitutions: List[Substitution] = []
+    renames: Dict[str, Optional[str]] = {}
+    kept: List[str] = []
+    ingredients = []
+    for item in recipe.get("ingredients") or []:
+        if not isinstance(item, dict):
+            ingredients.append(item)
+            continue
+        name = canonical_ingredient(item.get("name"))
+        if not name or not (_diet_mask(violated_diets(name)) & mask or _is_excluded(name, excluded)):
+            ingredients.append(item)
+            kept += [str(item.get("name") or "").lower(), name or ""]
+            continue
+
+        source = _source(name, graph)
+        candidate = next(
+            (
+                candidate
+                for candidate in graph.get(source, ())
+                if not candidate.breaks & mask and not _is_excluded(candidate.name, excluded)
+            ),
+            None,
+        )
+        if candidate is None:
+            return None
+
+        confidence *= candidate.weight
+        substitutions.append(Substitution(str(item.get("name")), candidate.name, candidate.weight))
+        for original in (str(item.get("name")).lower(), name, source):
+            renames.setdefault(original, candidate.name)
+        quantity = item.get("quantity")
+        ingredients.append(
+            {
+                **item,
+                "name": candidate.name,
+                "quantity": scale_quantity(quantity, candidate.ratio) if candidate.ratio != 1 else quantity,
+            }
+        )
+
+    if not substitutions:
+        return Adaptation(recipe=recipe, confidence=1.0)
+    # Text about the ingredients that stay ("chicken broth") is not rewritten by a
+    # substitution of a shorter name inside it ("chicken").
+    for original in kept:
+        if original:
+            renames.setdefault(original, None)
+
+    adapted = {
+        **recipe,
+        "title": _replace(recipe.get("title"), renames),
+        "description": _replace(recipe.get("description"), renames),
+        "image_prompt": _replace(recipe.get("image_prompt"), renames),
+        "image_url": None,
+        "ingredients": ingredients,
+        "instructions": [
+            {**step, "description": _replace(step.get("description"), renames)} if isinstance(step, dict) else step
+            for step in recipe.get("instructions") or []
+        ],
+        "shopping_list": list(
+            dict.fromkeys(_replace(entry, renames) for entry in recipe.get("shopping_list") or [])
+        ),
+        "source": "adapted",
+    }
+    nutrition = recipe.get("nutrition") or {}
+    if nutrition.get("coverage"):
+        adapted["nutrition"] = compute_nutrition(ingredients, recipe.get("servings") or 1)
+    return Adaptation(recipe=adapted, confidence=round(confidence, 4), substitutions=substitutions)
+
+
+__all__ = ["Adaptation", "DESCRIPTORS", "SUBSTITUTIONS", "Substitution", "adapt_recipe"]
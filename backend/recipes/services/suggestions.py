@@ -0,0 +1,450 @@
+"""
+The suggestion and meal-plan pipelines shared by the HTTP views and generation jobs.
+
+Each returns a `SuggestionResult` holding the response status and body plus the LLM
+tokens spent, so callers decide how to deliver it and whom to charge. Overload from
+admission control surfaces as `AdmissionRejected`.
+"""
+
+import asyncio
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.signals import request_started
+
+from .admission import LANE_ANONYMOUS
+from .generation_cache import RecipeCache
+from .images import request_image_backfill
+from .near_duplicates import NearDuplicateIndex, get_near_duplicate_index, link_scope, recipe_signature
+from .pantry_index import get_pantry_index
+from .profile_cache import apply_profile_preferences
+from .recipe_generator import GeneratedRecipe, RecipeGenerator
+from .scaling import rescale_recipe
+from .substitutions import Adaptation, adapt_recipe
+from .shopping_list import consolidate_shopping_list
+
+
+@dataclass
+class SuggestionResult:
+    status: int
+    data: Dict[str, Any]
+    tokens: int = 0
+
+
+def _supabase_status(repo) -> str:
+    if repo:
+        return "connected"
+    return "misconfigured" if settings.SUPABASE_URL else "unconfigured"
+
+
+def _has_constraints(payload: Dict[str, Any]) -> bool:
+    return bool(payload.get("diet_preferences") or payload.get("exclude_ingredients"))
+
+
+def _adaptation(recipe: Optional[Dict[str, Any]], payload: Dict[str, Any]) -> Optional[Adaptation]:
+    """`recipe` rewritten for the payload's diets and exclusions, if confident enough."""
+
+    if not recipe:
+        return None
+    adaptation = adapt_recipe(
+        rescale_recipe(recipe, payload.get("servings") or recipe.get("servings")),
+        payload.get("diet_preferences") or [],
+        payload.get("exclude_ingredients") or [],
+    )
+    if adaptation is None or adaptation.confidence < getattr(settings, "SUBSTITUTION_MIN_CONFIDENCE", 0.6):
+        return None
+    return adaptation
+
+
+def _relaxed_match(pantry_index, payload: Dict[str, Any]):
+    """The best stored recipe for the pantry alone, ignoring diet tags and exclusions."""
+
+    if pantry_index is None:
+        return None
+    return pantry_index.best_match({**payload, "diet_preferences": [], "exclude_ingredients": []})
+
+
+def _adaptation_summary(adaptation: Optional[Adaptation]) -> Optional[Dict[str, Any]]:
+    if adaptation is None:
+        return None
+    return {**adaptation.to_dict(), "adapted_from": adaptation.recipe.get("id")}
+
+
+# Pipeline steps ------------------------------------------------------------------
+# Everything below that does no I/O is shared by the sync and async drivers, which
+# only differ in how they call the repository and the model.
+def _pantry_match(pantry_index, payload: Dict[str, Any]):
+    return pantry_index.best_match(payload) if pantry_index is not None else None
+
+
+def _reused(payload: Dict[str, Any], match, stored: Dict[str, Any], history_entry_id) -> SuggestionResult:
+    return SuggestionResult(
+        200,
+        {
+            "recipe": rescale_recipe(stored, payload.get("servings") or stored.get("servings")),
+            "cache": "miss",
+            "reused": True,
+            "match_score": match.score,
+            "missing_ingredients": list(match.missing),
+            "supabase": "connected",
+            "saved_recipe_id": match.recipe_id,
+            "history_entry_id": history_entry_id,
+        },
+    )
+
+
+def _reuse_refusal(mode: str, repo, pantry_index) -> Optional[SuggestionResult]:
+    """`mode=reuse` found nothing to reuse; it never falls through to the model."""
+
+    if mode != "reuse":
+        return None
+    if repo is None:
+        return SuggestionResult(503, {"detail": "Reusing stored recipes requires Supabase to be configured."})
+    if pantry_index is None:
+        return SuggestionResult(503, {"detail": "The stored recipe index is still loading; try again shortly."})
+    return SuggestionResult(404, {"detail": "No stored recipe matches these ingredients closely enough."})
+
+
+@dataclass
+class _Suggestion:
+    """
+    A suggestion in progress: the recipe answered from the generation cache, adapted
+    from a near match, or (once the driver has called the model) generated.
+    """
+
+    payload: Dict[str, Any]
+    recipe_cache: RecipeCache
+    recipe: Optional[GeneratedRecipe] = None
+    cache_status: str = "miss"
+    adaptation: Optional[Adaptation] = None
+    # A stored recipe the driver should fetch and pass to `adapt`.
+    relaxed_recipe_id: Optional[str] = None
+    tokens: int = 0
+
+    @classmethod
+    def from_cache(cls, payload: Dict[str, Any], pantry_index) -> "_Suggestion":
+        suggestion = cls(payload, RecipeCache())
+        cached, status = suggestion.recipe_cache.get(payload), "hit"
+        if cached is None:
+            cached, status = suggestion.recipe_cache.get_rescaled(payload), "rescaled"
+        if cached is not None:
+            suggestion.recipe, suggestion.cache_status = GeneratedRecipe(**cached), status
+        elif _has_constraints(payload):
+            suggestion.adapt(suggestion.recipe_cache.get_unconstrained(payload))
+            relaxed = _relaxed_match(pantry_index, payload) if suggestion.recipe is None else None
+            suggestion.relaxed_recipe_id = relaxed.recipe_id if relaxed else None
+        return suggestion
+
+    def adapt(self, source: Optional[Dict[str, Any]]) -> None:
+        adaptation = _adaptation(source, self.payload)
+        if adaptation is None:
+            return
+        self.adaptation = adaptation
+        self.recipe = GeneratedRecipe.from_record(adaptation.recipe)
+        self.cache_status = "adapted"
+        self.recipe_cache.set(self.payload, self.recipe.to_dict(), adaptable=False)
+
+    def generated(self, recipe: GeneratedRecipe, generator: RecipeGenerator) -> None:
+        self.recipe = recipe
+        self.tokens = generator.last_token_usage
+        if generator.last_fallback_reason is None:
+            self.recipe_cache.set(self.payload, recipe.to_dict())
+
+    def stored(self, pantry_index, saved_recipe_id: Optional[str], duplicate_of: Optional[str]) -> None:
+        if pantry_index is not None and saved_recipe_id and not duplicate_of:
+            pantry_index.add(saved_recipe_id, self.recipe.ingredients)
+
+    def result(self, repo, saved_recipe_id=None, duplicate_of=None, history_entry_id=None) -> SuggestionResult:
+        return SuggestionResult(
+            201,
+            {
+                "recipe": self.recipe.to_dict(),
+                "cache": self.cache_status,
+                "reused": False,
+                "match_score": None,
+                "adaptation": _adaptation_summary(self.adaptation),
+                "supabase": _supabase_status(repo),
+                "saved_recipe_id": saved_recipe_id,
+                "duplicate_of": duplicate_of,
+                "history_entry_id": history_entry_id,
+            },
+            self.tokens,
+        )
+
+
+def _meal_plan_result(
+    repo, recipes: List[GeneratedRecipe], tokens: int, saved_recipe_ids=None, duplicate_of=None, history_entry_id=None
+) -> SuggestionResult:
+    recipe_dicts = [recipe.to_dict() for recipe in recipes]
+    return SuggestionResult(
+        201,
+        {
+            "recipes": recipe_dicts,
+            "shopping_list": consolidate_shopping_list(recipe_dicts),
+            "supabase": _supabase_status(repo),
+            "saved_recipe_ids": saved_recipe_ids or [None] * len(recipes),
+            "duplicate_of": duplicate_of or [None] * len(recipes),
+            "history_entry_id": history_entry_id,
+        },
+        tokens,
+    )
+
+
+def _first_saved_id(saved_recipe_ids: List[Optional[str]]) -> Optional[str]:
+    return next((recipe_id for recipe_id in saved_recipe_ids if recipe_id), None)
+
+
+class _StoragePlan:
+    """
+    Decides which generated recipes need inserting: each near-duplicate of a stored
+    recipe (or of an earlier one in the same batch) with the same `link_scope` is
+    linked to the existing id instead. Without `duplicate_index` (still being built)
+    only the batch itself is deduplicated.
+    """
+
+    def __init__(
+        self, duplicate_index: Optional[NearDuplicateIndex], recipes: List[GeneratedRecipe], user_id: Optional[str]
+    ):
+        if duplicate_index is None:
+            duplicate_index = NearDuplicateIndex()
+        self.duplicate_index = duplicate_index
+        self.records = [recipe.to_record() for recipe in recipes]
+        self.signatures = [recipe_signature(record) for record in self.records]
+        self.scopes = [link_scope(user_id, record) for record in self.records]
+        self.saved_ids: list = [None] * len(self.records)
+        self.duplicate_of: list = [None] * len(self.records)
+        self.batch_links = {}
+        self.new_positions = []
+
+        batch_index = NearDuplicateIndex(threshold=duplicate_index.threshold)
+        for position, (signature, scope) in enumerate(zip(self.signatures, self.scopes)):
+            match = duplicate_index.query(signature, scope=scope)
+            if match:
+                self.saved_ids[position] = self.duplicate_of[position] = match.recipe_id
+                continue
+            batch_match = batch_index.query(signature, scope=scope)
+            if batch_match:
+                self.batch_links[position] = int(batch_match.recipe_id)
+                continue
+            batch_index.add(position, signature, scope)
+            self.new_positions.append(position)
+
+    def new_records(self) -> List[Dict[str, Any]]:
+        return [self.records[position] for position in self.new_positions]
+
+    def finish(self, inserted: List[Optional[str]]):
+        for position, recipe_id in zip(self.new_positions, inserted):
+            self.saved_ids[position] = recipe_id
+            if recipe_id:
+                self.duplicate_index.add(recipe_id, self.signatures[position], self.scopes[position])
+        if any(inserted):
+            request_image_backfill()
+        for position, original in self.batch_links.items():
+            self.saved_ids[position] = self.duplicate_of[position] = self.saved_ids[original]
+        return self.saved_ids, self.duplicate_of
+
+
+# Sync drivers --------------------------------------------------------------------
+def suggest_recipe(
+    repo,
+    payload: Dict[str, Any],
+    *,
+    mode: str = "auto",
+    user_id: Optional[str] = None,
+    lane: int = LANE_ANONYMOUS,
+) -> SuggestionResult:
+    if repo and user_id:
+        payload = apply_profile_preferences(payload, repo.get_profile(user_id))
+
+    pantry_index = get_pantry_index(repo, wait=False) if repo and mode != "generate" else None
+    match = _pantry_match(pantry_index, payload)
+    stored = repo.get_recipe(match.recipe_id) if match else None
+    if stored:
+        return _reused(payload, match, stored, repo.log_search_history(user_id, payload, match.recipe_id))
+    refusal = _reuse_refusal(mode, repo, pantry_index)
+    if refusal:
+        return refusal
+
+    suggestion = _Suggestion.from_cache(payload, pantry_index)
+    if suggestion.relaxed_recipe_id:
+        suggestion.adapt(repo.get_recipe(suggestion.relaxed_recipe_id))
+    if suggestion.recipe is None:
+        generator = RecipeGenerator(lane=lane)
+        suggestion.generated(generator.generate(payload), generator)
+
+    if not repo:
+        return suggestion.result(repo)
+    [saved_recipe_id], [duplicate_of] = store_recipes(repo, [suggestion.recipe], user_id)
+    history_entry_id = repo.log_search_history(user_id, payload, saved_recipe_id)
+    suggestion.stored(pantry_index, saved_recipe_id, duplicate_of)
+    return suggestion.result(repo, saved_recipe_id, duplicate_of, history_entry_id)
+
+
+def plan_meals(
+    repo,
+    payload: Dict[str, Any],
+    *,
+    days: int,
+    user_id: Optional[str] = None,
+    lane: int = LANE_ANONYMOUS,
+) -> SuggestionResult:
+    if repo and user_id:
+        payload = apply_profile_preferences(payload, repo.get_profile(user_id))
+
+    generator = RecipeGenerator(lane=lane)
+    recipes = generator.generate_meal_plan(payload, days)
+    if not repo:
+        return _meal_plan_result(repo, recipes, generator.last_token_usage)
+    saved_recipe_ids, duplicate_of = store_recipes(repo, recipes, user_id)
+    history_entry_id = repo.log_search_history(user_id, payload, _first_saved_id(saved_recipe_ids))
+    return _meal_plan_result(repo, recipes, generator.last_token_usage, saved_recipe_ids, duplicate_of, history_entry_id)
+
+
+def store_recipes(repo, recipes: List[GeneratedRecipe], user_id: Optional[str]):
+    """
+    Persist generated recipes, linking near-duplicates to existing ids instead of
+    inserting them.
+
+    Returns the saved id and the id it duplicates (or None) for every recipe.
+    """
+
+    plan = _StoragePlan(get_near_duplicate_index(repo, wait=False), recipes, user_id)
+    records = plan.new_records()
+    if len(records) == 1:
+        inserted = [repo.insert_recipe(records[0], user_id=user_id)]
+    elif records:
+        inserted = repo.insert_recipe_batch(records, user_id=user_id)
+    else:
+        inserted = []
+    return plan.finish(inserted)
+
+
+# Async drivers -------------------------------------------------------------------
+# The same flows for the async views, on an `AsyncSupabaseRepository`. The in-memory
+# indexes are still (re)built from the sync repository, on a worker thread.
+async def asuggest_recipe(
+    repo,
+    payload: Dict[str, Any],
+    *,
+    mode: str = "auto",
+    user_id: Optional[str] = None,
+    lane: int = LANE_ANONYMOUS,
+) -> SuggestionResult:
+    # The profile and the pantry index do not depend on each other.
+    profile, pantry_index = await asyncio.gather(
+        repo.get_profile(user_id) if repo and user_id else _none(),
+        asyncio.to_thread(get_pantry_index, repo.sync, wait=False) if repo and mode != "generate" else _none(),
+    )
+    if profile is not None:
+        payload = apply_profile_preferences(payload, profile)
+
+    match = _pantry_match(pantry_index, payload)
+    stored = await repo.get_recipe(match.recipe_id) if match else None
+    if stored:
+        return _reused(payload, match, stored, await repo.log_search_history(user_id, payload, match.recipe_id))
+    refusal = _reuse_refusal(mode, repo, pantry_index)
+    if refusal:
+        return refusal
+
+    suggestion = _Suggestion.from_cache(payload, pantry_index)
+    if suggestion.relaxed_recipe_id:
+        suggestion.adapt(await repo.get_recipe(suggestion.relaxed_recipe_id))
+    if suggestion.recipe is None:
+        generator = RecipeGenerator(lane=lane)
+        suggestion.generated(await generator.agenerate(payload), generator)
+
+    if not repo:
+        return suggestion.result(repo)
+    [saved_recipe_id], [duplicate_of] = await astore_recipes(repo, [suggestion.recipe], user_id)
+    # The history row references the saved recipe, so it has to wait for the insert.
+    history_entry_id = await repo.log_search_history(user_id, payload, saved_recipe_id)
+    suggestion.stored(pantry_index, saved_recipe_id, duplicate_of)
+    return suggestion.result(repo, saved_recipe_id, duplicate_of, history_entry_id)
+
+
+async def aplan_meals(
+    repo,
+    payload: Dict[str, Any],
+    *,
+    days: int,
+    user_id: Optional[str] = None,
+    lane: int = LANE_ANONYMOUS,
+) -> SuggestionResult:
+    if repo and user_id:
+        payload = apply_profile_preferences(payload, await repo.get_profile(user_id))
+
+    generator = RecipeGenerator(lane=lane)
+    recipes = await generator.agenerate_meal_plan(payload, days)
+    if not repo:
+        return _meal_plan_result(repo, recipes, generator.last_token_usage)
+    saved_recipe_ids, duplicate_of = await astore_recipes(repo, recipes, user_id)
+    history_entry_id = await repo.log_search_history(user_id, payload, _first_saved_id(saved_recipe_ids))
+    return _meal_plan_result(repo, recipes, generator.last_token_usage, saved_recipe_ids, duplicate_of, history_entry_id)
+
+
+async def astore_recipes(repo, recipes: List[GeneratedRecipe], user_id: Optional[str]):
+    plan = _StoragePlan(await asyncio.to_thread(get_near_duplicate_index, repo.sync, wait=False), recipes, user_id)
+    records = plan.new_records()
+    if len(records) == 1:
+        inserted = [await repo.insert_recipe(records[0], user_id=user_id)]
+    elif records:
+        inserted = await repo.insert_recipe_batch(records, user_id=user_id)
+    else:
+        inserted = []
+    return plan.finish(inserted)
+
+
+async def _none():
+    return None
+
+
+_warmed_pid: Optional[int] = None
+_warm_lock = threading.Lock()
+
+
+def warm_indexes() -> None:
+    """
+    Have each process build its in-memory indexes from its first request on. The WSGI
+    and ASGI entry points call this at import, where it only connects a receiver:
+    creating the Supabase client there would slow every cold start, and threads
+    started before `gunicorn --preload` forks do not survive into the workers. Until
+    the indexes are ready, requests skip pantry reuse and near-duplicate linking.
+    """
+
+    request_started.connect(_warm_on_first_request, dispatch_uid="recipes.warm_indexes")
+
+
+def _warm_on_first_request(**kwargs) -> None:
+    global _warmed_pid
+    with _warm_lock:
+        if _warmed_pid == os.getpid():
+            return
+        _warmed_pid = os.getpid()
+    threading.Thread(target=_start_index_builds, name="warm-indexes", daemon=True).start()
+
+
+def _start_index_builds() -> None:
+    from .repositories import SupabaseRepository
+    from .supabase_client import SupabaseConfigurationError
+
+    try:
+        repo = SupabaseRepository()
+    except SupabaseConfigurationError:
+        return
+    get_pantry_index(repo, wait=False)
+    get_near_duplicate_index(repo, wait=False)
+
+
+__all__ = [
+    "SuggestionResult",
+    "aplan_meals",
+    "astore_recipes",
+    "asuggest_recipe",
+    "plan_meals",
+    "store_recipes",
+    "suggest_recipe",
+    "warm_indexes",
+]
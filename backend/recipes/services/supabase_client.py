@@ -1,8 +1,14 @@
+from __future__ import annotations
+
+import asyncio
+import weakref
 from functools import lru_cache
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
 
 from django.conf import settings
-from supabase import Client, create_client
+
+if TYPE_CHECKING:  # pragma: no cover - imported lazily at runtime
+    from supabase import AsyncClient, Client
 
 
 class SupabaseConfigurationError(RuntimeError):
@@ -21,6 +27,36 @@ def get_supabase_client(service_role: bool = True) -> Client:
         Supabase Client instance.
     """
 
+    url, key = _credentials(service_role)
+
+    from supabase import create_client
+
+    return create_client(url, key)
+
+
+# Async clients hold an HTTP connection pool bound to the event loop that created it.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[bool, AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def get_async_supabase_client(service_role: bool = True) -> AsyncClient:
+    """
+    The async counterpart of `get_supabase_client`, shared by everything running on
+    the current event loop.
+    """
+
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    if service_role not in clients:
+        url, key = _credentials(service_role)
+
+        from supabase import acreate_client
+
+        clients[service_role] = await acreate_client(url, key)
+    return clients[service_role]
+
+
+def _credentials(service_role: bool) -> Tuple[str, str]:
     url: Optional[str] = getattr(settings, "SUPABASE_URL", None)
     key: Optional[str]
 
@@ -34,7 +70,4 @@ def get_supabase_client(service_role: bool = True) -> Client:
             "Supabase URL or API key is not configured. "
             "Ensure SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY/ANON_KEY are set."
         )
-
-    return create_client(url, key)
-
-
+    return url, key
@@ -0,0 +1,218 @@
+"""
+Compiled request validation for the generation endpoints.
+
+A DRF serializer walks every field through several layers of method calls, error
+wrapping and validator objects on each request. `CompiledSerializer` reads the
+serializer's declared fields once and builds one flat check per field, so a
+well-formed payload is validated and normalised in a single pass over a plain dict.
+
+The compiled checks only ever accept what the serializer would accept. Anything they
+cannot vouch for - a malformed or unusual value, a field type or validator they do not
+know - is handed to the serializer itself, so error responses stay exactly as before.
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from django.core import validators as django_validators
+from rest_framework import fields as drf_fields
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+# Validators DRF attaches from field arguments; the compiled checks re-implement them.
+_BUILTIN_VALIDATORS = (
+    django_validators.MaxLengthValidator,
+    django_validators.MinLengthValidator,
+    django_validators.MaxValueValidator,
+    django_validators.MinValueValidator,
+    drf_fields.ProhibitNullCharactersValidator,
+    drf_fields.ProhibitSurrogateCharactersValidator,
+)
+
+
+class _Fallback(Exception):
+    """The compiled checks cannot vouch for a value; the serializer decides."""
+
+
+class _Unsupported(Exception):
+    """A field the compiler does not know how to check."""
+
+
+def _check_validators(field) -> None:
+    for validator in field.validators:
+        if not isinstance(validator, _BUILTIN_VALIDATORS):
+            raise _Unsupported(f"{type(validator).__name__} on {field.field_name or field}")
+
+
+def _compile_char(field) -> Callable[[Any], Any]:
+    _check_validators(field)
+    allow_blank, trim = field.allow_blank, field.trim_whitespace
+    max_length, min_length = field.max_length, field.min_length
+
+    def check(value):
+        if type(value) is not str:
+            raise _Fallback
+        if trim:
+            value = value.strip()
+        if not value:
+            if allow_blank:
+                return ""
+            raise _Fallback
+        if max_length is not None and len(value) > max_length:
+            raise _Fallback
+        if min_length is not None and len(value) < min_length:
+            raise _Fallback
+        if not value.isascii():
+            # Lone surrogates (valid JSON escapes) cannot be encoded; DRF rejects them.
+            try:
+                value.encode("utf-8")
+            except UnicodeEncodeError:
+                raise _Fallback from None
+        if "\x00" in value:
+            raise _Fallback
+        return value
+
+    return check
+
+
+def _compile_integer(field) -> Callable[[Any], Any]:
+    _check_validators(field)
+    min_value, max_value = field.min_value, field.max_value
+
+    def check(value):
+        # bool is an int subclass but DRF rejects it; floats and numeric strings are
+        # left to DRF's own coercion.
+        if type(value) is not int:
+            raise _Fallback
+        if min_value is not None and value < min_value:
+            raise _Fallback
+        if max_value is not None and value > max_value:
+            raise _Fallback
+        return value
+
+    return check
+
+
+def _compile_choice(field) -> Callable[[Any], Any]:
+    _check_validators(field)
+    choices = dict(field.choice_strings_to_values)
+
+    def check(value):
+        if type(value) is not str or value not in choices:
+            raise _Fallback
+        return choices[value]
+
+    return check
+
+
+def _compile_list(field) -> Callable[[Any], Any]:
+    _check_validators(field)
+    child = _compile_value(field.child)
+    allow_empty = field.allow_empty
+    max_length, min_length = field.max_length, field.min_length
+
+    def check(value):
+        if type(value) is not list:
+            raise _Fallback
+        if not value and not allow_empty:
+            raise _Fallback
+        if max_length is not None and len(value) > max_length:
+            raise _Fallback
+        if min_length is not None and len(value) < min_length:
+            raise _Fallback
+        return [child(item) for item in value]
+
+    return check
+
+
+# Exact types only: subclasses (EmailField, URLField, ...) add behaviour of their own.
+_COMPILERS = {
+    serializers.CharField: _compile_char,
+    serializers.IntegerField: _compile_integer,
+    serializers.ChoiceField: _compile_choice,
+    serializers.ListField: _compile_list,
+}
+
+
+def _compile_value(field) -> Callable[[Any], Any]:
+    compiler = _COMPILERS.get(type(field))
+    if compiler is None:
+        raise _Unsupported(type(field).__name__)
+    return compiler(field)
+
+
+def _compile_field(name: str, field) -> Tuple[str, Callable[[Any], Any], bool, Any, bool]:
+    if field.read_only or field.source != name:
+        raise _Unsupported(name)
+    return name, _compile_value(field), field.required, field.default, field.allow_null
+
+
+class CompiledSerializer:
+    """
+    Validates request payloads against `serializer_class`, returning `validated_data`
+    as a plain dict or raising the serializer's own `ValidationError`.
+    """
+
+    def __init__(self, serializer_class: Type[serializers.Serializer]):
+        self.serializer_class = serializer_class
+        self._plan: Optional[List[Tuple[str, Callable[[Any], Any], bool, Any, bool]]] = None
+        self._compiled = False
+        self._lock = threading.Lock()
+
+    @property
+    def compiled(self) -> bool:
+        """Whether payloads get the fast path (False when a field is unsupported)."""
+
+        self._compile()
+        return self._plan is not None
+
+    def _compile(self) -> None:
+        if self._compiled:
+            return
+        with self._lock:
+            if self._compiled:
+                return
+            serializer = self.serializer_class()
+            try:
+                if any(hasattr(serializer, f"validate_{name}") for name in serializer.fields):
+                    raise _Unsupported("field-level validate_* hooks")
+                if serializer.get_validators():
+                    raise _Unsupported("serializer-level validators")
+                self._plan = [_compile_field(name, field) for name, field in serializer.fields.items()]
+            except _Unsupported:
+                self._plan = None
+            self._compiled = True
+
+    def validate(self, data) -> Dict[str, Any]:
+        self._compile()
+        if self._plan is not None and type(data) is dict:
+            try:
+                return self._validate_fast(data)
+            except (_Fallback, serializers.ValidationError):
+                pass
+        serializer = self.serializer_class(data=data)
+        serializer.is_valid(raise_exception=True)
+        return dict(serializer.validated_data)
+
+    def _validate_fast(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        attrs: Dict[str, Any] = {}
+        for name, check, required, default, allow_null in self._plan:
+            value = data.get(name, empty)
+            if value is empty:
+                if required:
+                    raise _Fallback
+                if default is empty:
+                    continue
+                attrs[name] = default() if callable(default) else default
+            elif value is None:
+                if not allow_null:
+                    raise _Fallback
+                attrs[name] = None
+            else:
+                attrs[name] = check(value)
+        # Cross-field rules still run through the serializer's own `validate`; if it
+        # raises, the slow path reproduces the error in DRF's usual shape.
+        return self.serializer_class(data=data).validate(attrs)
+
+
+__all__ = ["CompiledSerializer"]
@@ -0,0 +1,8 @@
+-- Content identity for recipes so bulk imports can skip rows that already exist.
+-- The key is sha256 over the normalized title and sorted canonical ingredient names
+-- (see recipes/services/canonical.py). Existing rows keep a null key; nulls never conflict.
+alter table public.recipes
+    add column if not exists dedupe_key text;
+
+create unique index if not exists recipes_dedupe_key_idx
+    on public.recipes (dedupe_key);
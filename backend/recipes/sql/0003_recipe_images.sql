@@ -0,0 +1,32 @@
+-- Recipe images rendered off the request path (see recipes/services/images.py).
+-- Recipes keep the model's image prompt; the backfill worker finds rows that have a
+-- prompt but no image through the partial index and fills in both URLs.
+alter table public.recipes
+    add column if not exists image_prompt text,
+    add column if not exists image_thumbnail_url text;
+
+create index if not exists recipes_missing_image_idx
+    on public.recipes (id)
+    where image_url is null and image_prompt is not null;
+
+-- One row per rendered prompt (sha256 of provider + normalized prompt), so recipes
+-- sharing a prompt share an image. Keys are content hashes of the stored objects.
+create table if not exists public.recipe_images (
+    prompt_hash text primary key,
+    provider text not null,
+    content_type text not null,
+    original_key text not null,
+    image_url text not null,
+    thumbnail_key text,
+    thumbnail_url text,
+    created_at timestamptz default timezone('utc', now()) not null
+);
+
+alter table public.recipe_images
+    enable row level security;
+
+drop policy if exists "Allow read access to recipe images" on public.recipe_images;
+create policy "Allow read access to recipe images"
+    on public.recipe_images
+    for select
+    using (true);
@@ -0,0 +1,249 @@
+-- Monthly range partitions for search_history, per-user rollups of expired months and
+-- the functions `manage.py compact_search_history` calls through the repository.
+--
+-- Partitions live in the `history_partitions` schema, which PostgREST does not expose;
+-- every read goes through `public.search_history` and its row-level security. Rows for
+-- a month without a partition land in the default partition and are moved out when
+-- that month's partition is created.
+create schema if not exists history_partitions;
+
+-- Per-user aggregates of compacted months, read by the recommender.
+create table if not exists public.search_history_rollups (
+    user_id uuid references auth.users (id) on delete cascade not null,
+    month date not null,
+    searches integer not null default 0,
+    ingredient_counts jsonb not null default '{}'::jsonb,
+    diet_counts jsonb not null default '{}'::jsonb,
+    primary key (user_id, month)
+);
+
+alter table public.search_history_rollups
+    enable row level security;
+
+drop policy if exists "Users can read their search history rollups" on public.search_history_rollups;
+create policy "Users can read their search history rollups"
+    on public.search_history_rollups
+    for select
+    using (auth.uid() = user_id);
+
+create or replace function public.ensure_search_history_partition(month date)
+returns text
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    starts timestamptz := date_trunc('month', month::timestamp) at time zone 'utc';
+    ends timestamptz := (date_trunc('month', month::timestamp) + interval '1 month') at time zone 'utc';
+    partition_name text := format('search_history_y%sm%s', to_char(month, 'YYYY'), to_char(month, 'MM'));
+begin
+    if to_regclass(format('history_partitions.%I', partition_name)) is not null then
+        return partition_name;
+    end if;
+    execute format(
+        'create table history_partitions.%I (like public.search_history including defaults including constraints)',
+        partition_name
+    );
+    execute format('alter table history_partitions.%I enable row level security', partition_name);
+    -- Rows that fell into the default partition while this month had none.
+    if to_regclass('history_partitions.search_history_default') is not null then
+        execute format(
+            'with moved as (
+                 delete from history_partitions.search_history_default
+                 where created_at >= %L and created_at < %L
+                 returning *
+             )
+             insert into history_partitions.%I select * from moved',
+            starts, ends, partition_name
+        );
+    end if;
+    execute format(
+        'alter table public.search_history attach partition history_partitions.%I for values from (%L) to (%L)',
+        partition_name, starts, ends
+    );
+    return partition_name;
+end;
+$$;
+
+-- One-time conversion of the plain table: partitions for every month present, then a copy.
+do $$
+declare
+    month date;
+begin
+    if exists (
+        select 1
+        from pg_class c
+        join pg_namespace n on n.oid = c.relnamespace
+        where n.nspname = 'public' and c.relname = 'search_history' and c.relkind = 'r'
+    ) then
+        alter table public.search_history rename to search_history_unpartitioned;
+
+        create table public.search_history (
+            id uuid not null default gen_random_uuid(),
+            user_id uuid references auth.users (id) on delete cascade,
+            query text not null,
+            ingredients jsonb default '[]'::jsonb,
+            diet_preferences jsonb default '[]'::jsonb,
+            generated_recipe_id uuid references public.recipes (id),
+            created_at timestamptz default timezone('utc', now()) not null,
+            primary key (id, created_at)
+        ) partition by range (created_at);
+
+        create table history_partitions.search_history_default
+            partition of public.search_history default;
+        alter table history_partitions.search_history_default
+            enable row level security;
+
+        for month in
+            select distinct date_trunc('month', created_at at time zone 'utc')::date
+            from public.search_history_unpartitioned
+        loop
+            perform public.ensure_search_history_partition(month);
+        end loop;
+
+        insert into public.search_history
+        select id, user_id, query, ingredients, diet_preferences, generated_recipe_id, created_at
+        from public.search_history_unpartitioned;
+
+        drop table public.search_history_unpartitioned;
+    end if;
+end;
+$$;
+
+-- Serves history listings and the recommender; created on every partition.
+create index if not exists search_history_user_created_idx
+    on public.search_history (user_id, created_at desc);
+
+alter table public.search_history
+    enable row level security;
+
+drop policy if exists "Users can manage their search history" on public.search_history;
+create policy "Users can manage their search history"
+    on public.search_history
+    for all
+    using (auth.uid() = user_id)
+    with check (auth.uid() = user_id);
+
+create or replace function public.search_history_partitions()
+returns table (partition_name text, month date, estimated_rows bigint)
+language sql
+security definer
+set search_path = public
+as $$
+    select
+        c.relname::text,
+        to_date(substring(c.relname from 'y(\d{4})m(\d{2})$'), 'YYYYMM'),
+        greatest(c.reltuples, 0)::bigint
+    from pg_inherits i
+    join pg_class c on c.oid = i.inhrelid
+    where i.inhparent = 'public.search_history'::regclass
+      and c.relname ~ '^search_history_y\d{4}m\d{2}$'
+    order by 2;
+$$;
+
+-- Rolls every partition older than `retain_months` whole months into
+-- search_history_rollups, drops it, and makes sure partitions exist from the current
+-- month to `months_ahead` months out. Safe to rerun: a month's rollup is replaced.
+create or replace function public.compact_search_history(retain_months integer, months_ahead integer default 3)
+returns table (partition_name text, month date, users integer, searches bigint)
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    current_month date := date_trunc('month', now() at time zone 'utc')::date;
+    cutoff date := (date_trunc('month', now() at time zone 'utc') - make_interval(months => retain_months))::date;
+    stray date;
+    expired record;
+    offset_months integer;
+begin
+    if retain_months < 1 then
+        raise exception 'retain_months must be at least 1';
+    end if;
+
+    -- Expired rows stranded in the default partition get a partition of their own first.
+    for stray in
+        select distinct date_trunc('month', created_at at time zone 'utc')::date
+        from history_partitions.search_history_default
+        where created_at < cutoff::timestamp at time zone 'utc'
+    loop
+        perform public.ensure_search_history_partition(stray);
+    end loop;
+
+    for expired in
+        select p.partition_name, p.month from public.search_history_partitions() p where p.month < cutoff
+    loop
+        execute format(
+            $rollup$
+            with per_user as (
+                select user_id, count(*) as searches
+                from history_partitions.%1$I
+                where user_id is not null
+                group by user_id
+            ),
+            ingredient_counts as (
+                select user_id, jsonb_object_agg(name, uses) as counts
+                from (
+                    select h.user_id, lower(btrim(item.name)) as name, count(*) as uses
+                    from history_partitions.%1$I h
+                    cross join lateral jsonb_array_elements_text(
+                        case when jsonb_typeof(h.ingredients) = 'array' then h.ingredients else '[]'::jsonb end
+                    ) as item(name)
+                    where h.user_id is not null and btrim(item.name) <> ''
+                    group by 1, 2
+                ) named
+                group by user_id
+            ),
+            diet_counts as (
+                select user_id, jsonb_object_agg(name, uses) as counts
+                from (
+                    select h.user_id, lower(btrim(item.name)) as name, count(*) as uses
+                    from history_partitions.%1$I h
+                    cross join lateral jsonb_array_elements_text(
+                        case when jsonb_typeof(h.diet_preferences) = 'array' then h.diet_preferences else '[]'::jsonb end
+                    ) as item(name)
+                    where h.user_id is not null and btrim(item.name) <> ''
+                    group by 1, 2
+                ) named
+                group by user_id
+            )
+            insert into public.search_history_rollups (user_id, month, searches, ingredient_counts, diet_counts)
+            select p.user_id, %2$L::date, p.searches, coalesce(i.counts, '{}'::jsonb), coalesce(d.counts, '{}'::jsonb)
+            from per_user p
+            left join ingredient_counts i using (user_id)
+            left join diet_counts d using (user_id)
+            on conflict (user_id, month) do update
+                set searches = excluded.searches,
+                    ingredient_counts = excluded.ingredient_counts,
+                    diet_counts = excluded.diet_counts
+            $rollup$,
+            expired.partition_name, expired.month
+        );
+
+        partition_name := expired.partition_name;
+        month := expired.month;
+        select count(*), coalesce(sum(r.searches), 0)
+            into users, searches
+            from public.search_history_rollups r
+            where r.month = expired.month;
+        -- Dropping a partition is a catalog change, not a delete: no dead tuples, no vacuum.
+        execute format('drop table history_partitions.%I', expired.partition_name);
+        return next;
+    end loop;
+
+    for offset_months in 0..greatest(months_ahead, 0) loop
+        perform public.ensure_search_history_partition((current_month + make_interval(months => offset_months))::date);
+    end loop;
+end;
+$$;
+
+revoke execute on function public.ensure_search_history_partition(date) from public, anon, authenticated;
+revoke execute on function public.search_history_partitions() from public, anon, authenticated;
+revoke execute on function public.compact_search_history(integer, integer) from public, anon, authenticated;
+grant execute on function public.ensure_search_history_partition(date) to service_role;
+grant execute on function public.search_history_partitions() to service_role;
+grant execute on function public.compact_search_history(integer, integer) to service_role;
+
+-- Partitions for this month and the next three, so inserts never hit the default.
+select public.ensure_search_history_partition((date_trunc('month', now() at time zone 'utc') + make_interval(months => ahead))::date)
+from generate_series(0, 3) as ahead;
@@ -0,0 +1,125 @@
+-- Full-text and typo-tolerant recipe search (GET /api/recipes/search/).
+--
+-- `search_vector` is a stored generated column, so it is kept current by every insert
+-- and update without triggers. Titles weigh more than descriptions. Trigram indexes on
+-- the title catch misspellings and half-typed words that the English stemmer cannot.
+create extension if not exists pg_trgm;
+
+alter table public.recipes
+    add column if not exists search_vector tsvector
+    generated always as (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) stored;
+
+create index if not exists recipes_search_vector_idx
+    on public.recipes using gin (search_vector);
+
+create index if not exists recipes_title_trgm_idx
+    on public.recipes using gin (title gin_trgm_ops);
+
+-- Scoped listings and "mine" searches filter on the creator.
+create index if not exists recipes_created_by_idx
+    on public.recipes (created_by, created_at desc);
+
+-- One page of matches, best first. A row matches on the stemmed text or when the query
+-- is close to whole words of the title (`<<%`: strict_word_similarity at or above
+-- pg_trgm's default 0.5, which still catches "chiken" for "chicken"; `<%` needs 0.6
+-- and missed it); rank adds the two scores. Pages are keyed on
+-- (rank, id) rather than an offset: pass the last row's values as after_rank/after_id.
+-- Each scope is its own branch behind a test of `search_scope`, so only one runs:
+-- "mine" starts from the creator index and "favorites" from the caller's favorites
+-- instead of ranking every public match first. A common word matches a large share of
+-- all public recipes, so the public branch ranks a bounded pool instead: the first 400
+-- rows each index returns for the stemmed text and for the title trigrams, so a
+-- public search stops reading after 800 rows however many match, and its results end
+-- there. (Ordering the trigram matches by distance through a GiST index picks a
+-- better pool but has to walk most of the index when no title is a close match,
+-- e.g. for misspellings.) The planner settings keep each capped branch on its GIN
+-- index, which only serves bitmap scans: a plan that cannot see the query text guesses
+-- how many rows match, and when it guesses high it walks the table or its primary key
+-- until 400 rows match instead, which for a rare query is most of it. (They only
+-- discourage those paths; without the indexes the planner still falls back to them.)
+-- Without SECURITY DEFINER, so row-level security applies as for any read.
+create or replace function public.search_recipes(
+    search_query text,
+    search_scope text default 'public',
+    requesting_user uuid default null,
+    after_rank real default null,
+    after_id uuid default null,
+    page_size integer default 20
+)
+returns table (id uuid, rank real)
+language sql
+stable
+set enable_seqscan = off
+set enable_indexscan = off
+as $$
+    select matched.id, matched.rank
+    from (
+        select pool.id, pool.rank
+        from (
+            (
+                select
+                    r.id,
+                    (
+                        ts_rank_cd(r.search_vector, websearch_to_tsquery('english', search_query))
+                        + strict_word_similarity(search_query, r.title)
+                    )::real as rank
+                from public.recipes r
+                where search_scope not in ('mine', 'favorites')
+                    and search_query <<% r.title
+                limit 400
+            )
+            union
+            (
+                select
+                    r.id,
+                    (
+                        ts_rank_cd(r.search_vector, websearch_to_tsquery('english', search_query))
+                        + strict_word_similarity(search_query, r.title)
+                    )::real
+                from public.recipes r
+                where search_scope not in ('mine', 'favorites')
+                    and r.search_vector @@ websearch_to_tsquery('english', search_query)
+                limit 400
+            )
+        ) pool
+        union all
+        select
+            r.id,
+            (
+                ts_rank_cd(r.search_vector, websearch_to_tsquery('english', search_query))
+                + strict_word_similarity(search_query, r.title)
+            )::real
+        from public.recipes r
+        where search_scope = 'mine'
+            and r.created_by = requesting_user
+            and (
+                r.search_vector @@ websearch_to_tsquery('english', search_query)
+                or search_query <<% r.title
+            )
+        union all
+        select
+            r.id,
+            (
+                ts_rank_cd(r.search_vector, websearch_to_tsquery('english', search_query))
+                + strict_word_similarity(search_query, r.title)
+            )::real
+        from public.favorites f
+        join public.recipes r on r.id = f.recipe_id
+        where search_scope = 'favorites'
+            and f.user_id = requesting_user
+            and (
+                r.search_vector @@ websearch_to_tsquery('english', search_query)
+                or search_query <<% r.title
+            )
+    ) matched
+    where after_rank is null
+       or (matched.rank, matched.id) < (after_rank, after_id)
+    order by matched.rank desc, matched.id desc
+    limit page_size;
+$$;
+
+revoke execute on function public.search_recipes(text, text, uuid, real, uuid, integer) from public, anon;
+grant execute on function public.search_recipes(text, text, uuid, real, uuid, integer) to authenticated, service_role;
@@ -0,0 +1,7 @@
+-- The canonical suggestion payload behind each search, after profile preferences were
+-- merged in (see recipes/services/generation_cache.py). `manage.py prewarm_recipe_cache`
+-- warms exactly these payloads so warmed entries share keys with live requests. Older
+-- rows keep a null payload. Adding the column to the partitioned parent adds it to
+-- every partition.
+alter table public.search_history
+    add column if not exists payload jsonb;
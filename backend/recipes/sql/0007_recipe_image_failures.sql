@@ -0,0 +1,8 @@
+-- Failed image renders (see recipes/services/images.py). Each failure bumps
+-- `image_attempts` and pushes `image_retry_at` out with exponential backoff; the
+-- backfill worker skips rows whose retry time has not come. After
+-- RECIPE_IMAGE_MAX_ATTEMPTS failures the retry time is 'infinity' and the row is left
+-- alone; reset both columns to render it again.
+alter table public.recipes
+    add column if not exists image_attempts integer not null default 0,
+    add column if not exists image_retry_at timestamptz;
@@ -1,5 +1,14 @@
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
 import jwt
-from django.test import override_settings
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APITestCase
 from unittest import mock
@@ -59,6 +68,124 @@ class RecipeListViewTests(AuthenticatedAPITestMixin, APITestCase):
         response = self.client.get("/api/recipes/")
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_lists_default_to_the_card_projection(self, mock_repo):
+        from recipes.services.fields import RECIPE_CARD_FIELDS
+
+        mock_repo.return_value.list_recipes.return_value = []
+        self.client.get("/api/recipes/", **self.auth_headers())
+        self.assertEqual(mock_repo.return_value.list_recipes.call_args.kwargs["fields"], RECIPE_CARD_FIELDS)
+
+        self.client.get("/api/recipes/?fields=title,nutrition,title", **self.auth_headers())
+        self.assertEqual(mock_repo.return_value.list_recipes.call_args.kwargs["fields"], ("title", "nutrition"))
+
+        response = self.client.get("/api/recipes/?fields=title,dedupe_key", **self.auth_headers())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_projection_is_pushed_into_the_select(self):
+        from recipes.services import SupabaseRepository
+
+        client = mock.MagicMock()
+        repo = SupabaseRepository(client=client)
+        repo.list_recipes("user-1", scope="favorites", fields=("title",))
+        client.table.return_value.select.assert_called_with("recipe:recipes(id,title)")
+
+        client.reset_mock()
+        repo.list_recipes("user-1", scope="public")
+        columns = client.table.return_value.select.call_args_list[0].args[0]
+        self.assertNotIn("instructions", columns)
+        self.assertIn("image_thumbnail_url", columns)
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_detail_returns_the_full_recipe(self, mock_repo):
+        recipe_id = "7d1f4c1e-8a63-4f3a-9d43-5d1e0c1b2a10"
+        mock_repo.return_value.get_recipe.return_value = {"id": recipe_id, "instructions": [{"step": 1}]}
+        mock_repo.return_value.is_favorite.return_value = True
+
+        response = self.client.get(f"/api/recipes/{recipe_id}/", **self.auth_headers())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json()["recipe"]["is_favorite"])
+
+        mock_repo.return_value.get_recipe.return_value = None
+        response = self.client.get(f"/api/recipes/{recipe_id}/", **self.auth_headers())
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_rescale_returns_the_recipe_for_new_servings(self, mock_repo):
+        recipe_id = "7d1f4c1e-8a63-4f3a-9d43-5d1e0c1b2a10"
+        mock_repo.return_value.get_recipe.return_value = {
+            "id": recipe_id,
+            "servings": 2,
+            "ingredients": [{"name": "rice", "quantity": "1 cup"}],
+            "shopping_list": ["1 lime"],
+        }
+
+        response = self.client.get(f"/api/recipes/{recipe_id}/rescale/?servings=6", **self.auth_headers())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["original_servings"], 2)
+        self.assertEqual(response.json()["recipe"]["ingredients"][0]["quantity"], "3 cups")
+        self.assertEqual(response.json()["recipe"]["shopping_list"], ["3 limes"])
+
+        response = self.client.get(f"/api/recipes/{recipe_id}/rescale/?servings=0", **self.auth_headers())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SUPABASE_JWT_SECRET="test-secret", SUPABASE_URL="https://example.supabase.co")
+class RecipeSearchTests(AuthenticatedAPITestMixin, APITestCase):
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_search_pages_with_an_opaque_cursor(self, mock_repo):
+        recipe_id = "7d1f4c1e-8a63-4f3a-9d43-5d1e0c1b2a10"
+        mock_repo.return_value.search_recipes.return_value = ([{"id": recipe_id, "rank": 0.75}], (0.75, recipe_id))
+
+        response = self.client.get("/api/recipes/search/?q=chiken&scope=public", **self.auth_headers())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        cursor = response.json()["next_cursor"]
+        kwargs = mock_repo.return_value.search_recipes.call_args.kwargs
+        self.assertEqual((kwargs["query"], kwargs["scope"], kwargs["after"]), ("chiken", "public", None))
+
+        mock_repo.return_value.search_recipes.return_value = ([], None)
+        response = self.client.get(f"/api/recipes/search/?q=chiken&cursor={cursor}", **self.auth_headers())
+        self.assertIsNone(response.json()["next_cursor"])
+        self.assertEqual(mock_repo.return_value.search_recipes.call_args.kwargs["after"], (0.75, recipe_id))
+
+        for query in ("q=chiken&cursor=not-a-cursor", "q=c", ""):
+            response = self.client.get(f"/api/recipes/search/?{query}", **self.auth_headers())
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_repository_keeps_rank_order_and_projection(self):
+        from recipes.services import SupabaseRepository
+
+        client = mock.MagicMock()
+        client.rpc.return_value.execute.return_value = mock.Mock(
+            data=[{"id": "b", "rank": 0.9}, {"id": "a", "rank": 0.4}]
+        )
+        client.table.return_value.select.return_value.in_.return_value.execute.return_value = mock.Mock(
+            data=[{"id": "a", "title": "Chicken Curry"}, {"id": "b", "title": "Chicken Tacos"}]
+        )
+        repo = SupabaseRepository(client=client)
+        with mock.patch.object(repo, "get_favorite_ids", return_value={"a"}) as favorite_ids:
+            records, after = repo.search_recipes("user-1", "chicken", scope="mine", limit=2, fields=("title",), after=(1.2, "c"))
+        favorite_ids.assert_called_once_with("user-1", ["b", "a"])
+
+        params = client.rpc.call_args.args[1]
+        self.assertEqual((params["after_rank"], params["after_id"], params["requesting_user"]), (1.2, "c", "user-1"))
+        client.table.return_value.select.assert_called_with("id,title")
+        self.assertEqual([(r["id"], r["rank"], r["is_favorite"]) for r in records], [("b", 0.9, False), ("a", 0.4, True)])
+        self.assertEqual(after, (0.4, "a"))
+
+        self.assertEqual(SupabaseRepository(client=client).search_recipes(None, "chicken", scope="favorites"), ([], None))
+
+    def test_favorite_ids_can_be_limited_to_a_page(self):
+        from recipes.services import SupabaseRepository
+
+        client = mock.MagicMock()
+        query = client.table.return_value.select.return_value.eq.return_value
+        query.in_.return_value.execute.return_value = mock.Mock(data=[{"recipe_id": "a"}])
+        repo = SupabaseRepository(client=client)
+
+        self.assertEqual(repo.get_favorite_ids("user-1", ["a", "b"]), {"a"})
+        query.in_.assert_called_once_with("recipe_id", ["a", "b"])
+        self.assertEqual(repo.get_favorite_ids("user-1", []), set())
 
 @override_settings(SUPABASE_JWT_SECRET="test-secret", SUPABASE_URL="https://example.supabase.co")
 class SearchHistoryViewTests(AuthenticatedAPITestMixin, APITestCase):
@@ -69,6 +196,71 @@ class SearchHistoryViewTests(AuthenticatedAPITestMixin, APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()["history"][0]["query"], "tofu")
 
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_recommendations_count_compacted_months(self, mock_repo):
+        mock_repo.return_value.list_history.return_value = [{"ingredients": ["Tofu", "rice"]}]
+        mock_repo.return_value.get_history_rollups.return_value = [
+            {"month": "2025-01-01", "searches": 5, "ingredient_counts": {"rice": 4, "lentils": 2}},
+        ]
+        response = self.client.get("/api/recommendations/", **self.auth_headers())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["suggestions"], ["rice", "lentils", "tofu"])
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_recommendations_weigh_rollups_within_the_same_window_of_searches(self, mock_repo):
+        # 90 recent searches leave room for 10 more: half of February, none of January.
+        mock_repo.return_value.list_history.return_value = [{"ingredients": ["tofu"]}] * 60 + [
+            {"ingredients": ["rice"]}
+        ] * 30
+        mock_repo.return_value.get_history_rollups.return_value = [
+            {"month": "2025-02-01", "searches": 20, "ingredient_counts": {"rice": 20, "lentils": 50}},
+            {"month": "2025-01-01", "searches": 400, "ingredient_counts": {"beans": 400}},
+        ]
+        response = self.client.get("/api/recommendations/", **self.auth_headers())
+        self.assertEqual(response.json()["suggestions"], ["tofu", "rice", "lentils"])
+
+
+class SearchHistoryRetentionTests(SimpleTestCase):
+    def _history_pages(self, current, older):
+        from recipes.services import SupabaseRepository
+
+        client = mock.MagicMock()
+        filtered = client.table.return_value.select.return_value.eq.return_value
+        filtered.gte.return_value.order.return_value.limit.return_value.execute.return_value.data = current
+        filtered.lt.return_value.order.return_value.limit.return_value.execute.return_value.data = older
+        return SupabaseRepository(client=client), filtered
+
+    def test_list_history_stays_in_current_month_when_it_fills_the_page(self):
+        from recipes.services.repositories import current_month_start
+
+        repo, filtered = self._history_pages([{"id": "a"}, {"id": "b"}], [{"id": "c"}])
+        self.assertEqual(repo.list_history("user-1", limit=2), [{"id": "a"}, {"id": "b"}])
+        filtered.gte.assert_called_once_with("created_at", current_month_start().isoformat())
+        filtered.lt.assert_not_called()
+
+    def test_list_history_falls_back_to_older_partitions(self):
+        repo, filtered = self._history_pages([{"id": "a"}], [{"id": "c"}])
+        self.assertEqual(repo.list_history("user-1", limit=3), [{"id": "a"}, {"id": "c"}])
+        filtered.lt.return_value.order.return_value.limit.assert_called_once_with(2)
+
+    @mock.patch("recipes.management.commands.compact_search_history.SupabaseRepository")
+    def test_compaction_command_uses_retention_setting(self, mock_repo):
+        from io import StringIO
+
+        from django.core.management import CommandError, call_command
+
+        mock_repo.return_value.compact_search_history.return_value = [
+            {"partition_name": "search_history_y2025m01", "month": "2025-01-01", "users": 3, "searches": 40},
+        ]
+        out = StringIO()
+        with self.settings(SEARCH_HISTORY_RETENTION_MONTHS=4, SEARCH_HISTORY_PARTITIONS_AHEAD=2):
+            call_command("compact_search_history", stdout=out)
+        mock_repo.return_value.compact_search_history.assert_called_once_with(4, 2)
+        self.assertIn("40 searches rolled up for 3 users", out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command("compact_search_history", retain_months=0, stdout=out)
+
 
 @override_settings(SUPABASE_JWT_SECRET="test-secret", SUPABASE_URL="https://example.supabase.co")
 class FavoriteToggleViewTests(AuthenticatedAPITestMixin, APITestCase):
@@ -81,6 +273,91 @@ class FavoriteToggleViewTests(AuthenticatedAPITestMixin, APITestCase):
         mock_repo.return_value.set_favorite.assert_called_once()
 
 
+@override_settings(SUPABASE_JWT_SECRET="test-secret", SUPABASE_URL="https://example.supabase.co")
+class IdempotencyTests(AuthenticatedAPITestMixin, APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        from recipes.idempotency import reset_idempotency_store
+
+        cache.clear()
+        reset_idempotency_store()
+        self.addCleanup(reset_idempotency_store)
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_retry_replays_the_first_response(self, mock_repo):
+        payload = {"recipe_id": "11111111-1111-1111-1111-111111111111", "action": "add"}
+        headers = {**self.auth_headers(), "HTTP_IDEMPOTENCY_KEY": "fav-1"}
+
+        first = self.client.post("/api/favorites/", payload, format="json", **headers)
+        retry = self.client.post("/api/favorites/", payload, format="json", **headers)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        mock_repo.return_value.set_favorite.assert_called_once()
+
+        changed = self.client.post("/api/favorites/", {**payload, "action": "remove"}, format="json", **headers)
+        self.assertEqual(changed.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        # Keys are per caller.
+        other = self.client.post(
+            "/api/favorites/", payload, format="json", **{**self.auth_headers("user-456"), "HTTP_IDEMPOTENCY_KEY": "fav-1"}
+        )
+        self.assertNotIn("Idempotent-Replayed", other)
+        self.assertEqual(mock_repo.return_value.set_favorite.call_count, 2)
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_server_errors_are_not_recorded(self, mock_repo):
+        from recipes.services import SupabaseConfigurationError
+
+        mock_repo.side_effect = [SupabaseConfigurationError("down"), mock.DEFAULT]
+        payload = {"recipe_id": "11111111-1111-1111-1111-111111111111", "action": "add"}
+        headers = {**self.auth_headers(), "HTTP_IDEMPOTENCY_KEY": "fav-2"}
+
+        self.assertEqual(
+            self.client.post("/api/favorites/", payload, format="json", **headers).status_code,
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+        response = self.client.post("/api/favorites/", payload, format="json", **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Idempotent-Replayed", response)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_concurrent_retry_gets_409_while_the_original_runs(self, mock_repo):
+        from recipes.idempotency import get_idempotency_store, request_hash
+
+        payload = {"recipe_id": "11111111-1111-1111-1111-111111111111", "action": "add"}
+        request = mock.Mock(method="POST", path="/api/favorites/", META={}, data=payload)
+        get_idempotency_store().begin("user:user-123", "fav-3", request_hash(request))
+
+        response = self.client.post(
+            "/api/favorites/", payload, format="json", **{**self.auth_headers(), "HTTP_IDEMPOTENCY_KEY": "fav-3"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response["Retry-After"], "1")
+        mock_repo.return_value.set_favorite.assert_not_called()
+
+    def test_stores_lock_replay_and_recover_lapsed_locks(self):
+        from datetime import timedelta
+
+        from recipes.idempotency import CacheIdempotencyStore, DatabaseIdempotencyStore
+        from recipes.models import IdempotencyRecord
+
+        for store in (DatabaseIdempotencyStore(), CacheIdempotencyStore()):
+            self.assertEqual(store.begin("user:u", "k", "hash-a").state, "started")
+            self.assertEqual(store.begin("user:u", "k", "hash-a").state, "in_progress")
+            store.complete("user:u", "k", "hash-a", 201, {"ok": True}, {"Location": "/x"})
+            outcome = store.begin("user:u", "k", "hash-a")
+            self.assertEqual((outcome.state, outcome.status, outcome.body), ("completed", 201, {"ok": True}))
+            self.assertEqual(store.begin("user:u", "k", "hash-b").state, "mismatch")
+
+        store = DatabaseIdempotencyStore()
+        store.begin("user:u", "crashed", "hash-a")
+        IdempotencyRecord.objects.filter(key="crashed").update(locked_until=IdempotencyRecord.objects.get(key="crashed").created_at - timedelta(seconds=1))
+        self.assertEqual(store.begin("user:u", "crashed", "hash-a").state, "started")
+
+
 @override_settings(
     SUPABASE_SERVICE_ROLE_KEY="test-secret",
     SUPABASE_URL="https://example.supabase.co",
@@ -101,3 +378,1735 @@ class RegistrationViewTests(APITestCase):
         response = self.client.post("/api/auth/register/", payload, format="json")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         mock_client.return_value.auth.admin.create_user.assert_called_once()
+
+
+@override_settings(SUPABASE_JWT_SECRET="test-secret", SUPABASE_URL="https://example.supabase.co")
+class ProfileAwareSuggestionTests(AuthenticatedAPITestMixin, APITestCase):
+    def setUp(self):
+        from recipes.services import reset_near_duplicate_index, reset_pantry_index
+
+        reset_pantry_index()
+        reset_near_duplicate_index()
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_profile_preferences_are_merged_into_payload(self, mock_repo):
+        mock_repo.return_value.get_profile.return_value = {
+            "allergens": ["peanuts"],
+            "diet_preferences": ["vegan"],
+            "calorie_target": 600,
+        }
+        mock_repo.return_value.insert_recipe.return_value = None
+        mock_repo.return_value.log_search_history.return_value = None
+        with mock.patch("recipes.services.suggestions.RecipeGenerator") as mock_generator:
+            from recipes.services import RecipeGenerator
+
+            mock_generator.return_value.generate.side_effect = lambda payload: RecipeGenerator(llm=None)._fallback(payload)
+            payload = {"ingredients": ["tofu"], "exclude_ingredients": ["cilantro"]}
+            response = self.client.post("/api/suggestions/", payload, format="json", **self.auth_headers())
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        merged = mock_generator.return_value.generate.call_args.args[0]
+        self.assertEqual(merged["exclude_ingredients"], ["cilantro", "peanuts"])
+        self.assertEqual(merged["diet_preferences"], ["vegan"])
+        self.assertEqual(merged["calorie_target"], 600)
+
+
+class ProfileCacheTests(APITestCase):
+    def test_upsert_profile_writes_through_cache(self):
+        from recipes.services import SupabaseRepository
+
+        client = mock.MagicMock()
+        client.table.return_value.upsert.return_value.select.return_value.single.return_value.execute.return_value.data = {
+            "id": "user-1",
+            "allergens": ["milk"],
+        }
+        repo = SupabaseRepository(client=client)
+        repo.upsert_profile("user-1", {"allergens": ["milk"]})
+
+        client.table.reset_mock()
+        profile = repo.get_profile("user-1")
+        self.assertEqual(profile["allergens"], ["milk"])
+        client.table.assert_not_called()
+
+
+class ColdStartBudgetTests(SimpleTestCase):
+    # Upper bound for importing config.wsgi plus the URLconf in a fresh interpreter.
+    budget_seconds = 1.5
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import config.wsgi, config.urls\n"
+        "elapsed = time.perf_counter() - start\n"
+        "heavy = [m for m in ('langchain_openai', 'supabase') if m in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))\n"
+    )
+
+    def run_import(self, **env):
+        result = subprocess.run(
+            [sys.executable, "-c", self.script],
+            cwd=str(settings.BASE_DIR),
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, **env},
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_wsgi_import_stays_within_budget(self):
+        report = self.run_import()
+        self.assertEqual(report["heavy"], [])
+        self.assertLess(report["elapsed"], self.budget_seconds)
+
+    def test_wsgi_import_does_not_connect_to_a_configured_supabase(self):
+        report = self.run_import(
+            SUPABASE_URL="https://example.supabase.co",
+            SUPABASE_SERVICE_ROLE_KEY="service-key",
+            SUPABASE_ANON_KEY="anon-key",
+        )
+        self.assertEqual(report["heavy"], [])
+        self.assertLess(report["elapsed"], self.budget_seconds)
+
+    def test_indexes_are_warmed_once_per_process_from_the_first_request(self):
+        from django.core.signals import request_started
+
+        from recipes.services import suggestions
+
+        self.addCleanup(request_started.disconnect, dispatch_uid="recipes.warm_indexes")
+        with mock.patch.object(suggestions, "_warmed_pid", None), mock.patch.object(
+            suggestions.threading, "Thread"
+        ) as thread:
+            suggestions.warm_indexes()
+            thread.assert_not_called()
+            request_started.send(sender=None)
+            request_started.send(sender=None)
+        thread.assert_called_once_with(target=suggestions._start_index_builds, name="warm-indexes", daemon=True)
+
+
+@override_settings(
+    SUPABASE_JWT_SECRET="test-secret",
+    SUPABASE_URL="https://example.supabase.co",
+    FAVORITES_BULK_MAX_ITEMS=3,
+)
+class FavoriteBulkViewTests(AuthenticatedAPITestMixin, APITestCase):
+    add_id = "11111111-1111-1111-1111-111111111111"
+    remove_id = "22222222-2222-2222-2222-222222222222"
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_bulk_favorites_returns_per_item_outcomes(self, mock_repo):
+        mock_repo.return_value.set_favorites_bulk.return_value = [
+            {"recipe_id": self.add_id, "action": "add", "status": "added"},
+            {"recipe_id": self.remove_id, "action": "remove", "status": "removed"},
+        ]
+        payload = {"add": [self.add_id], "remove": [self.remove_id]}
+        response = self.client.post("/api/favorites/bulk/", payload, format="json", **self.auth_headers())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["added"], 1)
+        self.assertEqual(response.json()["removed"], 1)
+        mock_repo.return_value.set_favorites_bulk.assert_called_once_with("user-123", [self.add_id], [self.remove_id])
+
+    def test_rejects_batches_over_the_cap(self):
+        payload = {"add": [self.add_id] * 4}
+        response = self.client.post("/api/favorites/bulk/", payload, format="json", **self.auth_headers())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_repository_issues_one_upsert_and_one_delete(self):
+        from recipes.services import SupabaseRepository
+
+        client = mock.MagicMock()
+        recipes_table = mock.MagicMock()
+        favorites_table = mock.MagicMock()
+        client.table.side_effect = lambda name: recipes_table if name == "recipes" else favorites_table
+        recipes_table.select.return_value.in_.return_value.execute.return_value.data = [{"id": self.add_id}]
+        favorites_table.delete.return_value.eq.return_value.in_.return_value.execute.return_value.data = []
+
+        repo = SupabaseRepository(client=client)
+        results = repo.set_favorites_bulk("user-1", [self.add_id, self.add_id], [self.remove_id])
+
+        favorites_table.upsert.assert_called_once_with(
+            [{"user_id": "user-1", "recipe_id": self.add_id}],
+            on_conflict="user_id,recipe_id",
+        )
+        favorites_table.delete.assert_called_once()
+        self.assertEqual(
+            [item["status"] for item in results],
+            ["added", "not_favorited"],
+        )
+
+
+@override_settings(SUPABASE_JWT_SECRET="test-secret", SUPABASE_URL="https://example.supabase.co")
+class ExportViewTests(AuthenticatedAPITestMixin, APITestCase):
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_streams_ndjson_for_requested_datasets(self, mock_repo):
+        mock_repo.return_value.iter_recipes.return_value = iter([{"id": "r1", "title": "Soup"}])
+        mock_repo.return_value.iter_history.return_value = iter([{"id": "h1", "query": "tofu"}])
+        response = self.client.get("/api/export/?datasets=recipes,history", **self.auth_headers())
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["dataset"] for line in lines], ["recipes", "history"])
+        mock_repo.return_value.iter_favorites.assert_not_called()
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_gzip_csv_export(self, mock_repo):
+        import gzip
+
+        mock_repo.return_value.iter_favorites.return_value = iter([{"recipe_id": "r1", "created_at": "2024-01-01"}])
+        response = self.client.get("/api/export/?datasets=favorites&output=csv&gzip=true", **self.auth_headers())
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        body = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertTrue(body.startswith("dataset,id,created_at,data"))
+        self.assertIn("favorites,r1,2024-01-01", body)
+
+    def test_keyset_iteration_pages_by_key(self):
+        from recipes.services import SupabaseRepository
+
+        pages = [[{"id": "a"}, {"id": "b"}], [{"id": "c"}]]
+        client = mock.MagicMock()
+        query = client.table.return_value.select.return_value.eq.return_value
+        query.gt.return_value = query
+        query.order.return_value.limit.return_value.execute.side_effect = [
+            mock.Mock(data=page) for page in pages
+        ]
+
+        rows = list(SupabaseRepository(client=client).iter_recipes("user-1", page_size=2))
+
+        self.assertEqual([row["id"] for row in rows], ["a", "b", "c"])
+        query.gt.assert_called_once_with("id", "b")
+
+
+class ImportRecipesCommandTests(SimpleTestCase):
+    def _write_source(self, directory):
+        from pathlib import Path
+
+        rows = [
+            {"title": "Tofu Bowl", "ingredients": [{"name": "Tofu", "quantity": "200 g"}]},
+            {"title": " Tofu  Bowl", "ingredients": [{"name": "tofu ", "quantity": "200g"}]},
+            {"title": "Missing ingredients"},
+        ]
+        path = Path(directory) / "recipes.jsonl"
+        path.write_text("\n".join(json.dumps(row) for row in rows), encoding="utf-8")
+        return path
+
+    @mock.patch("recipes.management.commands.import_recipes.SupabaseRepository")
+    def test_imports_canonical_rows_and_writes_checkpoint(self, mock_repo):
+        import tempfile
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        mock_repo.return_value.insert_recipes.side_effect = lambda records, user_id=None: records
+        with tempfile.TemporaryDirectory() as directory:
+            source = self._write_source(directory)
+            out = StringIO()
+            call_command("import_recipes", str(source), workers=0, chunk_size=2, stdout=out, stderr=StringIO())
+            checkpoint = json.loads((source.parent / "recipes.jsonl.checkpoint.json").read_text())
+
+        inserted = [record for call in mock_repo.return_value.insert_recipes.call_args_list for record in call.args[0]]
+        self.assertEqual(len(inserted), 1)
+        self.assertEqual(inserted[0]["title"], "Tofu Bowl")
+        self.assertEqual(len(inserted[0]["dedupe_key"]), 64)
+        self.assertEqual(checkpoint["completed_chunks"], 2)
+        self.assertIn("rows/sec", out.getvalue())
+        self.assertIn("1 inserted, 1 duplicates, 1 invalid", out.getvalue())
+
+
+@override_settings(SUPABASE_URL=None)
+class GenerationCacheTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        from recipes.throttling import reset_bucket_store
+
+        cache.clear()
+        reset_bucket_store()
+        self.addCleanup(reset_bucket_store)
+
+    @mock.patch("recipes.services.suggestions.RecipeGenerator")
+    def test_equivalent_payloads_are_served_from_cache(self, mock_generator):
+        from recipes.services import RecipeGenerator
+
+        mock_generator.return_value.generate.side_effect = lambda payload: RecipeGenerator(llm=None)._fallback(payload)
+        mock_generator.return_value.last_fallback_reason = None
+
+        first = self.client.post("/api/suggestions/", {"ingredients": ["Tomatoes", "basil"]}, format="json")
+        second = self.client.post("/api/suggestions/", {"ingredients": ["basil ", "tomato"]}, format="json")
+
+        self.assertEqual(first.json()["cache"], "miss")
+        self.assertEqual(second.json()["cache"], "hit")
+        self.assertEqual(second.json()["recipe"]["title"], first.json()["recipe"]["title"])
+        mock_generator.return_value.generate.assert_called_once()
+
+    @mock.patch("recipes.services.suggestions.RecipeGenerator")
+    def test_added_diet_is_adapted_from_cache(self, mock_generator):
+        from recipes.services import RecipeGenerator
+
+        mock_generator.return_value.generate.side_effect = lambda payload: RecipeGenerator(llm=None)._fallback(payload)
+        mock_generator.return_value.last_fallback_reason = None
+
+        self.client.post("/api/suggestions/", {"ingredients": ["chicken", "rice"]}, format="json")
+        response = self.client.post(
+            "/api/suggestions/",
+            {"ingredients": ["chicken", "rice"], "diet_preferences": ["vegan"]},
+            format="json",
+        )
+
+        data = response.json()
+        self.assertEqual(data["cache"], "adapted")
+        self.assertIn("tofu", [item["name"] for item in data["recipe"]["ingredients"]])
+        self.assertEqual(data["adaptation"]["substitutions"][0]["original"], "chicken")
+        mock_generator.return_value.generate.assert_called_once()
+
+    @mock.patch("recipes.services.suggestions.RecipeGenerator")
+    def test_servings_only_change_is_rescaled_from_cache(self, mock_generator):
+        from recipes.services import RecipeGenerator
+
+        mock_generator.return_value.generate.side_effect = lambda payload: RecipeGenerator(llm=None)._fallback(payload)
+        mock_generator.return_value.last_fallback_reason = None
+
+        first = self.client.post("/api/suggestions/", {"ingredients": ["tofu"], "servings": 2}, format="json")
+        second = self.client.post("/api/suggestions/", {"ingredients": ["tofu"], "servings": 6}, format="json")
+
+        self.assertEqual(first.json()["recipe"]["ingredients"][0]["quantity"], "200 g")
+        self.assertEqual(second.json()["cache"], "rescaled")
+        self.assertEqual(second.json()["recipe"]["servings"], 6)
+        self.assertEqual(second.json()["recipe"]["ingredients"][0]["quantity"], "600 g")
+        mock_generator.return_value.generate.assert_called_once()
+
+
+class HeavyHittersTests(SimpleTestCase):
+    def test_tracks_most_frequent_keys_in_bounded_memory(self):
+        from recipes.services.sketches import HeavyHitters
+
+        hitters = HeavyHitters(k=3, width=256, depth=4)
+        stream = ["tofu"] * 50 + ["egg"] * 30 + ["rice"] * 20 + [f"rare-{i}" for i in range(200)]
+        for key in stream:
+            hitters.add(key, payload={"key": key})
+
+        top = hitters.top(3)
+        self.assertEqual([key for key, _, _ in top], ["tofu", "egg", "rice"])
+        self.assertGreaterEqual(top[0][1], 50)
+        self.assertLessEqual(len(hitters.counts), 3)
+
+
+class PrewarmRecipeCacheCommandTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+
+    @mock.patch("recipes.management.commands.prewarm_recipe_cache.RecipeGenerator")
+    @mock.patch("recipes.management.commands.prewarm_recipe_cache.SupabaseRepository")
+    def test_warms_popular_payloads_within_budget(self, mock_repo, mock_generator):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from recipes.services import RecipeCache, RecipeGenerator
+
+        rows = [{"ingredients": ["egg", "rice"]}] * 5 + [{"ingredients": ["tofu"]}] * 3 + [{"ingredients": ["kale"]}]
+        mock_repo.return_value.iter_search_payloads.return_value = iter(rows)
+        mock_generator.return_value.generate.side_effect = lambda payload: RecipeGenerator(llm=None)._fallback(payload)
+        mock_generator.return_value.last_fallback_reason = None
+        mock_generator.return_value.last_token_usage = 100
+
+        out = StringIO()
+        call_command("prewarm_recipe_cache", top=2, parallelism=1, token_budget=1000, stdout=out)
+
+        self.assertIsNotNone(RecipeCache().get({"ingredients": ["rice", "eggs"], "servings": 2}))
+        self.assertIsNone(RecipeCache().get({"ingredients": ["kale"], "servings": 2}))
+        self.assertIn("using 200 tokens", out.getvalue())
+        self.assertIn("Estimated hit-rate uplift: 88.9%", out.getvalue())
+
+    @mock.patch("recipes.management.commands.prewarm_recipe_cache.RecipeGenerator")
+    @mock.patch("recipes.management.commands.prewarm_recipe_cache.SupabaseRepository")
+    def test_warms_the_recorded_payload_live_requests_look_up(self, mock_repo, mock_generator):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from recipes.services import RecipeCache, RecipeGenerator, apply_profile_preferences
+        from recipes.services.repositories import history_record
+
+        profile = {"allergens": ["peanuts"], "diet_preferences": ["vegan"], "calorie_target": 600}
+        live = apply_profile_preferences({"ingredients": ["Tofu", "rice"], "servings": 4}, profile)
+        recorded = history_record("user-1", live, None)
+        mock_repo.return_value.iter_search_payloads.return_value = iter(
+            [{"payload": recorded["payload"]}] * 3 + [{"ingredients": ["kale"], "diet_preferences": []}]
+        )
+        mock_generator.return_value.generate.side_effect = lambda payload: RecipeGenerator(llm=None)._fallback(payload)
+        mock_generator.return_value.last_fallback_reason = None
+        mock_generator.return_value.last_token_usage = 100
+
+        out = StringIO()
+        call_command("prewarm_recipe_cache", top=1, parallelism=1, stdout=out)
+
+        self.assertIsNotNone(RecipeCache().get(live))
+        self.assertIsNone(RecipeCache().get({"ingredients": ["tofu", "rice"], "servings": 2}))
+        self.assertIn("1 searches predate recorded payloads", out.getvalue())
+
+
+class ShoppingListTests(SimpleTestCase):
+    def test_consolidates_quantities_across_recipes(self):
+        from recipes.services import consolidate_shopping_list
+
+        recipes = [
+            {
+                "ingredients": [{"name": "Tomatoes", "quantity": "200 g"}, {"name": "olive oil", "quantity": "1 tbsp"}],
+                "shopping_list": ["tomatoes", "basil"],
+            },
+            {
+                "ingredients": [{"name": "tomato", "quantity": "0.3 kg"}, {"name": "salt", "quantity": "to taste"}],
+                "shopping_list": [],
+            },
+        ]
+        merged = {item["name"]: item for item in consolidate_shopping_list(recipes)}
+
+        self.assertEqual(merged["tomato"]["quantity"], "500 g")
+        self.assertEqual(merged["tomato"]["recipes"], 2)
+        self.assertEqual(merged["salt"]["quantity"], "to taste")
+        self.assertEqual(merged["basil"]["quantity"], "")
+
+    def test_spoons_cups_and_pounds_are_shown_in_kitchen_units(self):
+        from recipes.services import consolidate_shopping_list
+
+        recipes = [
+            {"ingredients": [{"name": "olive oil", "quantity": "2 tbsp"}, {"name": "flour", "quantity": "1 cup"},
+                             {"name": "beef", "quantity": "12 oz"}, {"name": "milk", "quantity": "200 ml"}]},
+            {"ingredients": [{"name": "olive oil", "quantity": "3 tsp"}, {"name": "flour", "quantity": "1/2 cup"},
+                             {"name": "beef", "quantity": "1 lb"}, {"name": "milk", "quantity": "1 cup"}]},
+        ]
+        merged = {item["name"]: item["quantity"] for item in consolidate_shopping_list(recipes)}
+
+        self.assertEqual(
+            merged, {"olive oil": "3 tbsp", "flour": "1 1/2 cups", "beef": "1 3/4 lb", "milk": "440 ml"}
+        )
+
+
+class RecipeScalingTests(SimpleTestCase):
+    def test_scales_fractions_ranges_and_units(self):
+        from recipes.services import scale_quantity
+
+        self.assertEqual(scale_quantity("1 1/2 cups flour", 2), "3 cups flour")
+        self.assertEqual(scale_quantity("2-3 cloves garlic", 3), "6-9 cloves garlic")
+        self.assertEqual(scale_quantity("½ tsp cumin", 0.5), "1/4 tsp cumin")
+        self.assertEqual(scale_quantity("4 tsp salt", 1.5), "2 tbsp salt")
+        self.assertEqual(scale_quantity("700 g tofu", 3), "2.1 kg tofu")
+        self.assertEqual(scale_quantity("1 lb beef", 0.5), "8 oz beef")
+        self.assertEqual(scale_quantity("2 eggs", 0.25), "1/2 egg")
+        self.assertEqual(scale_quantity("3 eggs", 1 / 3), "1 egg")
+        self.assertEqual(scale_quantity("2 large eggs", 0.5), "1 large egg")
+        self.assertEqual(scale_quantity("4 tomatoes, diced", 0.25), "1 tomato, diced")
+        self.assertEqual(scale_quantity("2 cups cherries", 0.5), "1 cup cherries")
+        self.assertEqual(scale_quantity("1 egg", 3), "3 eggs")
+        self.assertEqual(scale_quantity("1 tomato, diced", 2), "2 tomatoes, diced")
+        self.assertEqual(scale_quantity("1 bay leaf", 3), "3 bay leaves")
+        self.assertEqual(scale_quantity("1 garlic", 2), "2 garlic")
+        # 1 1/4 tbsp would be 6% short; the conversion is skipped.
+        self.assertEqual(scale_quantity("2 tsp salt", 2), "4 tsp salt")
+        self.assertEqual(scale_quantity("2 tsp salt", 3), "2 tbsp salt")
+        self.assertEqual(scale_quantity("to taste", 3), "to taste")
+
+    def test_rescale_recipe_keeps_per_serving_nutrition(self):
+        from recipes.services import rescale_recipe
+        from recipes.services.nutrition import compute_nutrition
+
+        ingredients = [{"name": "rice", "quantity": "200 g"}, {"name": "salt", "quantity": "to taste"}]
+        recipe = {
+            "servings": 2,
+            "ingredients": ingredients,
+            "nutrition": compute_nutrition(ingredients, 2),
+            "shopping_list": ["rice"],
+        }
+
+        scaled = rescale_recipe(recipe, 5)
+        self.assertEqual(scaled["ingredients"][0]["quantity"], "500 g")
+        self.assertEqual(scaled["ingredients"][1]["quantity"], "to taste")
+        self.assertEqual(scaled["nutrition"]["calories"], recipe["nutrition"]["calories"])
+        self.assertEqual(recipe["ingredients"][0]["quantity"], "200 g")
+        self.assertIs(rescale_recipe(recipe, 2), recipe)
+
+
+class MealPlanGenerationTests(SimpleTestCase):
+    def test_streamed_recipes_are_parsed_as_they_complete(self):
+        from recipes.services import RecipeGenerator
+
+        text = (
+            '{"title": "Day 1", "ingredients": [{"name": "egg", "quantity": "2"}]}\n'
+            '{"title": "Day {2}", "ingredients": []}\n'
+        )
+        chunks = [mock.Mock(content=text[i:i + 7], usage_metadata=None) for i in range(0, len(text), 7)]
+        llm = mock.Mock()
+        llm.stream.return_value = iter(chunks)
+
+        recipes = RecipeGenerator(llm=llm).generate_meal_plan({"ingredients": ["egg"]}, count=3)
+
+        self.assertEqual([recipe.title for recipe in recipes[:2]], ["Day 1", "Day {2}"])
+        self.assertEqual(recipes[2].model_version, "meal-plan-incomplete")
+        llm.stream.assert_called_once()
+        llm.invoke.assert_not_called()
+
+
+@override_settings(SUPABASE_JWT_SECRET="test-secret", SUPABASE_URL="https://example.supabase.co")
+class MealPlanViewTests(AuthenticatedAPITestMixin, APITestCase):
+    def setUp(self):
+        from recipes.services import reset_near_duplicate_index
+
+        reset_near_duplicate_index()
+        self.addCleanup(reset_near_duplicate_index)
+
+    @mock.patch("recipes.services.suggestions.RecipeGenerator")
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_meal_plan_is_persisted_in_one_batch(self, mock_repo, mock_generator):
+        from recipes.services import RecipeGenerator
+
+        def distinct_plan(payload, days):
+            fallback = RecipeGenerator(llm=None)
+            return [
+                fallback._fallback({**payload, "ingredients": [*payload["ingredients"], extra]})
+                for extra in ("kale", "leek", "okra")
+            ]
+
+        mock_generator.return_value.generate_meal_plan.side_effect = distinct_plan
+        mock_repo.return_value.get_profile.return_value = {}
+        mock_repo.return_value.insert_recipe_batch.return_value = ["r1", "r2", "r3"]
+        mock_repo.return_value.log_search_history.return_value = "h1"
+
+        payload = {"ingredients": ["tofu", "rice"], "days": 3}
+        response = self.client.post("/api/meal-plans/", payload, format="json", **self.auth_headers())
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(len(data["recipes"]), 3)
+        self.assertEqual(data["saved_recipe_ids"], ["r1", "r2", "r3"])
+        tofu = next(line for line in data["shopping_list"] if line["name"] == "tofu")
+        self.assertEqual(tofu["recipes"], 3)
+        mock_repo.return_value.insert_recipe_batch.assert_called_once()
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_identical_recipes_in_a_plan_are_stored_once(self, mock_repo):
+        mock_repo.return_value.get_profile.return_value = {}
+        mock_repo.return_value.insert_recipe.return_value = "r1"
+        mock_repo.return_value.log_search_history.return_value = "h1"
+
+        payload = {"ingredients": ["tofu", "rice"], "days": 3}
+        response = self.client.post("/api/meal-plans/", payload, format="json", **self.auth_headers())
+
+        data = response.json()
+        self.assertEqual(data["saved_recipe_ids"], ["r1", "r1", "r1"])
+        self.assertEqual(data["duplicate_of"], [None, "r1", "r1"])
+        mock_repo.return_value.insert_recipe.assert_called_once()
+        mock_repo.return_value.insert_recipe_batch.assert_not_called()
+
+
+class DeploymentCheckTests(SimpleTestCase):
+    def test_quotas_on_a_process_local_cache_are_flagged(self):
+        from recipes.checks import check_shared_throttle_cache
+
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        with override_settings(CACHES=locmem, LLM_DAILY_TOKEN_QUOTA_USER=1000):
+            self.assertEqual([warning.id for warning in check_shared_throttle_cache(None)], ["recipes.W001"])
+        with override_settings(CACHES=locmem, LLM_DAILY_TOKEN_QUOTA_USER=0, LLM_DAILY_TOKEN_QUOTA_ANON=0):
+            self.assertEqual(check_shared_throttle_cache(None), [])
+        shared = {"default": {"BACKEND": "recipes.cache_backends.SharedMemoryCache"}}
+        with override_settings(CACHES=shared, LLM_DAILY_TOKEN_QUOTA_USER=1000):
+            self.assertEqual(check_shared_throttle_cache(None), [])
+
+
+class NutritionEngineTests(SimpleTestCase):
+    def test_compiled_table_computes_per_serving_nutrition(self):
+        import tempfile
+        from pathlib import Path
+
+        from recipes.services.nutrition import NutrientTable, compile_nutrient_table, compute_nutrition
+
+        with tempfile.TemporaryDirectory() as directory:
+            table = NutrientTable(compile_nutrient_table(output=Path(directory) / "nutrients.bin"))
+            nutrition = compute_nutrition(
+                [
+                    {"name": "Firm Tofu", "quantity": "200 g"},
+                    {"name": "eggs", "quantity": "2"},
+                    {"name": "olive oil", "quantity": "1 tbsp"},
+                    {"name": "salt", "quantity": "to taste"},
+                ],
+                servings=2,
+                table=table,
+            )
+
+        # tofu 152 kcal + 2 eggs (100 g) 143 kcal + 1 tbsp oil (~13.5 g) ~119 kcal, split in two
+        self.assertAlmostEqual(nutrition["calories"], 207, delta=2)
+        self.assertAlmostEqual(nutrition["protein_g"], 14.3, delta=0.2)
+        self.assertEqual(nutrition["coverage"], 0.75)
+
+    def test_non_numeric_servings_from_the_model_are_parsed(self):
+        from recipes.services import RecipeGenerator
+        from recipes.services.quantities import parse_servings
+
+        recipe = RecipeGenerator(llm=None)._from_model_payload(
+            {"title": "Tofu Scramble", "servings": "4 servings", "ingredients": [{"name": "firm tofu", "quantity": "400 g"}]}
+        )
+        self.assertEqual(recipe.servings, 4)
+        self.assertEqual(
+            [parse_servings(value, default=2) for value in ("serves 3-4", 2.6, "a few", None, 0, True)],
+            [3, 3, 2, 2, 2, 2],
+        )
+
+    def test_prompt_no_longer_requests_nutrition(self):
+        from recipes.services import RecipeGenerator
+
+        prompt = RecipeGenerator(llm=None)._build_prompt({"ingredients": ["tofu"]})
+        self.assertNotIn("nutrition (", prompt)
+
+
+class PantryIndexTests(SimpleTestCase):
+    def build_index(self):
+        from recipes.services import PantryIndex
+
+        index = PantryIndex()
+        index.add("r-tofu", [{"name": "Firm Tofu"}, {"name": "broccoli"}, {"name": "soy sauce"}])
+        index.add("r-chicken", [{"name": "chicken breast"}, {"name": "broccoli"}, {"name": "rice"}])
+        index.add("r-satay", [{"name": "tofu"}, {"name": "peanut butter"}, {"name": "broccoli"}])
+        index.add("r-pasta", ["spaghetti", "tomatoes", "basil", "parmesan"])
+        return index
+
+    def test_ranks_by_weighted_pantry_coverage(self):
+        index = self.build_index()
+        matches = index.search(["tofu", "broccoli", "Soy Sauce"], limit=3)
+        self.assertEqual(matches[0].recipe_id, "r-tofu")
+        self.assertEqual(matches[0].score, 1.0)
+        self.assertEqual(matches[0].missing, ())
+        self.assertNotIn("r-pasta", [match.recipe_id for match in matches])
+
+    def test_diets_and_exclusions_filter_candidates(self):
+        index = self.build_index()
+        vegan = index.search(["tofu", "broccoli", "chicken breast"], diets=["plant-based"], limit=5)
+        self.assertNotIn("r-chicken", [match.recipe_id for match in vegan])
+        no_peanuts = index.search(["tofu", "broccoli"], exclude=["peanuts"], limit=5)
+        self.assertNotIn("r-satay", [match.recipe_id for match in no_peanuts])
+        self.assertEqual(index.search(["tofu"], diets=["paleo"]), [])
+
+    def test_bitmap_switches_to_bitset_containers_when_dense(self):
+        from recipes.services.pantry_index import ARRAY_MAX, Bitmap
+
+        dense, sparse = Bitmap(), Bitmap()
+        for value in range(ARRAY_MAX + 10):
+            dense.add(value * 2)
+        for value in (3, 4, 70000, 70001):
+            sparse.add(value)
+
+        self.assertIsInstance(dense._chunks[0], int)
+        self.assertEqual(list(dense & sparse), [4])
+        self.assertEqual(list(sparse - dense), [3, 70000, 70001])
+        self.assertEqual(len(dense | sparse), ARRAY_MAX + 10 + 3)
+
+    def test_best_match_respects_threshold(self):
+        index = self.build_index()
+        self.assertIsNone(index.best_match({"ingredients": ["broccoli"]}, threshold=0.6))
+        match = index.best_match({"ingredients": ["spaghetti", "tomato", "basil", "parmesan"]}, threshold=0.6)
+        self.assertEqual(match.recipe_id, "r-pasta")
+
+
+@override_settings(SUPABASE_JWT_SECRET="test-secret", SUPABASE_URL="https://example.supabase.co")
+class PantryReuseViewTests(AuthenticatedAPITestMixin, APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from recipes.services import reset_pantry_index
+
+        from recipes.services import reset_near_duplicate_index
+
+        cache.clear()
+        reset_pantry_index()
+        reset_near_duplicate_index()
+        self.addCleanup(reset_pantry_index)
+        self.addCleanup(reset_near_duplicate_index)
+
+    def configure_repo(self, mock_repo):
+        repo = mock_repo.return_value
+        repo.get_profile.return_value = {}
+        repo.iter_recipe_ingredients.return_value = iter(
+            [{"id": "r-1", "ingredients": [{"name": "tofu"}, {"name": "broccoli"}]}]
+        )
+        repo.get_recipe.return_value = {"id": "r-1", "title": "Tofu Broccoli"}
+        repo.log_search_history.return_value = "h-1"
+        repo.insert_recipe.return_value = "r-2"
+        return repo
+
+    def warm(self, repo):
+        from recipes.services import get_pantry_index
+
+        get_pantry_index(repo)
+
+    @mock.patch("recipes.services.suggestions.RecipeGenerator")
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_reuses_stored_recipe_without_calling_the_model(self, mock_repo, mock_generator):
+        repo = self.configure_repo(mock_repo)
+        self.warm(repo)
+        payload = {"ingredients": ["Tofu", "broccoli"]}
+        response = self.client.post("/api/suggestions/", payload, format="json", **self.auth_headers())
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertTrue(data["reused"])
+        self.assertEqual(data["saved_recipe_id"], "r-1")
+        self.assertEqual(data["recipe"]["title"], "Tofu Broccoli")
+        mock_generator.assert_not_called()
+        repo.insert_recipe.assert_not_called()
+        repo.log_search_history.assert_called_once()
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_reuse_only_mode_returns_404_without_a_match(self, mock_repo):
+        self.warm(self.configure_repo(mock_repo))
+        payload = {"ingredients": ["salmon", "dill"], "mode": "reuse"}
+        response = self.client.post("/api/suggestions/", payload, format="json", **self.auth_headers())
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @mock.patch("recipes.services.suggestions.RecipeGenerator")
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_requests_do_not_build_the_index_themselves(self, mock_repo, mock_generator):
+        from recipes.services import GeneratedRecipe, get_pantry_index
+        from recipes.services.pantry_index import _pantry_index
+
+        repo = self.configure_repo(mock_repo)
+        rows = [{"id": "r-1", "ingredients": [{"name": "tofu"}, {"name": "broccoli"}]}]
+        repo.iter_recipe_ingredients.side_effect = lambda: iter(rows)
+        mock_generator.return_value.generate.return_value = GeneratedRecipe("Tofu Stir Fry", "", 2, 10, 10)
+        mock_generator.return_value.last_token_usage = 0
+        mock_generator.return_value.last_fallback_reason = None
+        with mock.patch.object(_pantry_index, "_start_rebuild") as start_rebuild:
+            response = self.client.post(
+                "/api/suggestions/", {"ingredients": ["tofu", "broccoli"]}, format="json", **self.auth_headers()
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertFalse(response.json()["reused"])
+            start_rebuild.assert_called_once_with(repo)
+
+            response = self.client.post(
+                "/api/suggestions/",
+                {"ingredients": ["tofu", "broccoli"], "mode": "reuse"},
+                format="json",
+                **self.auth_headers(),
+            )
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # The background build stores the index for later requests.
+        self.assertIsNone(get_pantry_index(repo, wait=False))
+        for _ in range(200):
+            if get_pantry_index(repo, wait=False) is not None:
+                break
+            time.sleep(0.01)
+        self.assertIsNotNone(get_pantry_index(repo, wait=False).best_match({"ingredients": ["tofu", "broccoli"]}))
+
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_generate_mode_skips_the_index(self, mock_repo):
+        repo = self.configure_repo(mock_repo)
+        payload = {"ingredients": ["tofu", "broccoli"], "mode": "generate"}
+        response = self.client.post("/api/suggestions/", payload, format="json", **self.auth_headers())
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.json()["reused"])
+        repo.get_recipe.assert_not_called()
+        repo.insert_recipe.assert_called_once()
+
+    @mock.patch("recipes.services.suggestions.RecipeGenerator")
+    @mock.patch("recipes.views.SupabaseRepository")
+    def test_stored_recipe_breaking_a_diet_is_adapted(self, mock_repo, mock_generator):
+        repo = self.configure_repo(mock_repo)
+        repo.iter_recipe_ingredients.return_value = iter(
+            [{"id": "r-1", "ingredients": [{"name": "chicken"}, {"name": "broccoli"}]}]
+        )
+        self.warm(repo)
+        repo.get_recipe.return_value = {
+            "id": "r-1",
+            "title": "Chicken Broccoli",
+            "servings": 2,
+            "ingredients": [{"name": "chicken", "quantity": "300 g"}, {"name": "broccoli", "quantity": "200 g"}],
+            "instructions": [{"step": 1, "description": "Stir-fry the chicken."}],
+        }
+        payload = {"ingredients": ["chicken", "broccoli"], "diet_preferences": ["vegetarian"]}
+        response = self.client.post("/api/suggestions/", payload, format="json", **self.auth_headers())
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(data["cache"], "adapted")
+        self.assertEqual(data["adaptation"]["adapted_from"], "r-1")
+        self.assertEqual(data["recipe"]["title"], "Tofu Broccoli")
+        self.assertEqual(data["recipe"]["instructions"][0]["description"], "Stir-fry the tofu.")
+        mock_generator.assert_not_called()
+
+
+class SubstitutionTests(SimpleTestCase):
+    RECIPE = {
+        "title": "Garlic Butter Chicken",
+        "servings": 2,
+        "ingredients": [
+            {"name": "Chicken breast", "quantity": "400 g"},
+            {"name": "unsalted butter", "quantity": "2 tbsp"},
+            {"name": "soy sauce", "quantity": "3 tbsp"},
+            {"name": "garlic", "quantity": "2 cloves"},
+        ],
+        "instructions": [{"step": 1, "description": "Sear the chicken breasts in butter, then add soy sauce."}],
+        "shopping_list": ["chicken breast", "butter", "soy sauce"],
+    }
+
+    def test_rewrites_ingredients_and_text_for_new_diets(self):
+        from recipes.services import adapt_recipe
+
+        adaptation = adapt_recipe(self.RECIPE, ["vegan", "gluten-free"])
+        recipe = adaptation.recipe
+
+        self.assertEqual([item["name"] for item in recipe["ingredients"]], ["tofu", "vegan butter", "tamari", "garlic"])
+        self.assertEqual(recipe["title"], "Garlic Vegan Butter Tofu")
+        self.assertEqual(recipe["instructions"][0]["description"], "Sear the tofu in vegan butter, then add tamari.")
+        self.assertEqual(recipe["shopping_list"], ["tofu", "vegan butter", "tamari"])
+        self.assertAlmostEqual(adaptation.confidence, 0.8 * 0.95 * 0.95, places=3)
+        self.assertEqual(self.RECIPE["ingredients"][0]["name"], "Chicken breast")
+
+    def test_exclusions_skip_candidates_and_unknown_constraints_give_up(self):
+        from recipes.services import adapt_recipe
+
+        adaptation = adapt_recipe(self.RECIPE, ["vegetarian"], exclude=["tofu"])
+        self.assertEqual(adaptation.recipe["ingredients"][0]["name"], "chickpea")
+        self.assertEqual(adapt_recipe(self.RECIPE, [], exclude=["soy sauce", "tamari"]), None)
+        self.assertIsNone(adapt_recipe(self.RECIPE, ["halal"]))
+        self.assertEqual(adapt_recipe(self.RECIPE, ["nut-free"]).confidence, 1.0)
+
+    def test_multi_word_names_are_renamed_once_and_only_where_they_belong(self):
+        from recipes.services import adapt_recipe
+
+        recipe = {
+            "title": "Chicken Thigh Stew",
+            "ingredients": [
+                {"name": "chicken thighs", "quantity": "500 g"},
+                {"name": "chicken broth", "quantity": "2 cups"},
+                {"name": "unsalted butter", "quantity": "2 tbsp"},
+            ],
+            "instructions": [{"step": 1, "description": "Brown the chicken thighs in butter, then pour in the chicken broth."}],
+            "shopping_list": ["500 g chicken thighs", "2 cups chicken broth", "2 tbsp unsalted butter"],
+        }
+
+        adaptation = adapt_recipe(recipe, ["vegan"])
+        adapted = adaptation.recipe
+
+        self.assertEqual([item["name"] for item in adapted["ingredients"]], ["tofu", "vegetable broth", "vegan butter"])
+        self.assertEqual(adapted["ingredients"][1]["quantity"], "2 cups")
+        self.assertEqual(
+            adapted["instructions"][0]["description"], "Brown the tofu in vegan butter, then pour in the vegetable broth."
+        )
+        self.assertEqual(adapted["shopping_list"], ["500 g tofu", "2 cups vegetable broth", "2 tbsp vegan butter"])
+        self.assertAlmostEqual(adaptation.confidence, 0.8 * 0.85 * 0.95, places=3)
+
+        # Only the thighs are replaced; the broth keeps its name everywhere.
+        adapted = adapt_recipe(recipe, [], exclude=["chicken thigh"]).recipe
+        self.assertEqual([item["name"] for item in adapted["ingredients"]][1], "chicken broth")
+        self.assertIn("pour in the chicken broth", adapted["instructions"][0]["description"])
+
+    def test_names_that_are_more_than_a_substitutable_term_are_not_substituted(self):
+        from recipes.services import adapt_recipe
+
+        recipe = {"title": "Butter Bean Mash", "ingredients": [{"name": "butter beans", "quantity": "1 can"}]}
+
+        self.assertIsNone(adapt_recipe(recipe, ["vegan"]))
+
+
+class NearDuplicateTests(SimpleTestCase):
+    def test_reordered_title_and_extra_ingredient_are_near_duplicates(self):
+        from recipes.services import NearDuplicateIndex, recipe_signature
+
+        staples = ["tofu", "broccoli", "soy sauce", "garlic", "ginger", "rice", "sesame oil"]
+        original = {"title": "Creative tofu, broccoli Bowl", "ingredients": [{"name": name} for name in staples]}
+        variant = {
+            "title": "Creative Broccoli, Tofu bowl",
+            "ingredients": [{"name": name.title()} for name in staples] + [{"name": "green onions"}],
+        }
+        other = {"title": "Chicken Rice Bowl", "ingredients": [{"name": "chicken"}, {"name": "rice"}, {"name": "garlic"}]}
+
+        index = NearDuplicateIndex(threshold=0.8)
+        index.add("r-original", recipe_signature(original))
+        index.add("r-other", recipe_signature(other))
+
+        match = index.find(variant)
+        self.assertEqual(match.recipe_id, "r-original")
+        self.assertGreaterEqual(match.similarity, 0.8)
+        self.assertIsNone(index.find({"title": "Salmon Tacos", "ingredients": [{"name": "salmon"}, {"name": "tortilla"}]}))
+
+    def test_new_recipes_only_link_to_the_same_owner_and_servings(self):
+        from recipes.services import GeneratedRecipe, get_near_duplicate_index, reset_near_duplicate_index, store_recipes
+
+        reset_near_duplicate_index()
+        self.addCleanup(reset_near_duplicate_index)
+        ingredients = [{"name": name} for name in ("tofu", "broccoli", "soy sauce", "garlic", "rice")]
+        repo = mock.Mock()
+        repo.iter_recipe_ingredients.return_value = iter(
+            [
+                {"id": "theirs", "title": "Tofu Broccoli Bowl", "ingredients": ingredients, "servings": 2, "created_by": "user-2"},
+                {"id": "for-four", "title": "Tofu Broccoli Bowl", "ingredients": ingredients, "servings": 4, "created_by": "user-1"},
+                {"id": "mine", "title": "Tofu Broccoli Bowl", "ingredients": ingredients, "servings": 2, "created_by": "user-1"},
+            ]
+        )
+        repo.insert_recipe.return_value = "new"
+        recipe = GeneratedRecipe("Tofu Broccoli Bowl", "", 2, 10, 10, ingredients=ingredients)
+        get_near_duplicate_index(repo)
+
+        self.assertEqual(store_recipes(repo, [recipe], "user-1"), (["mine"], ["mine"]))
+        self.assertEqual(store_recipes(repo, [recipe], "user-3"), (["new"], [None]))
+        recipe.servings = 6
+        self.assertEqual(store_recipes(repo, [recipe], "user-1"), (["new"], [None]))
+
+    def test_new_recipes_are_added_to_an_empty_shared_index(self):
+        from recipes.services import GeneratedRecipe, NearDuplicateIndex
+        from recipes.services.suggestions import _StoragePlan
+
+        index = NearDuplicateIndex()
+        recipe = GeneratedRecipe("Tofu Broccoli Bowl", "", 2, 10, 10, ingredients=[{"name": "tofu"}])
+        plan = _StoragePlan(index, [recipe], "user-1")
+        plan.finish(["new"])
+
+        self.assertIn("new", index)
+
+    def test_saving_does_not_wait_for_the_index_to_be_built(self):
+        from recipes.services import GeneratedRecipe, reset_near_duplicate_index, store_recipes
+        from recipes.services.near_duplicates import _near_duplicate_index
+
+        reset_near_duplicate_index()
+        self.addCleanup(reset_near_duplicate_index)
+        repo = mock.Mock()
+        repo.insert_recipe.return_value = "new"
+        recipe = GeneratedRecipe("Tofu Broccoli Bowl", "", 2, 10, 10, ingredients=[{"name": "tofu"}])
+        with mock.patch.object(_near_duplicate_index, "_start_rebuild") as start_rebuild:
+            self.assertEqual(store_recipes(repo, [recipe], "user-1"), (["new"], [None]))
+        start_rebuild.assert_called_once_with(repo)
+        repo.iter_recipe_ingredients.assert_not_called()
+
+
+class DedupeRecipesCommandTests(SimpleTestCase):
+    @mock.patch("recipes.management.commands.dedupe_recipes.SupabaseRepository")
+    def test_merges_near_duplicates_into_the_oldest_recipe(self, mock_repo):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        ingredients = [{"name": name} for name in ("tofu", "broccoli", "soy sauce", "garlic", "rice")]
+        mock_repo.return_value.iter_recipe_ingredients.return_value = iter(
+            [
+                {"id": "a", "title": "Tofu Broccoli Bowl", "ingredients": ingredients, "created_at": "2024-03-02T00:00:00Z"},
+                {"id": "b", "title": "Salmon Tacos", "ingredients": [{"name": "salmon"}], "created_at": "2024-03-01T00:00:00Z"},
+                {"id": "c", "title": "Tofu & Broccoli Bowl", "ingredients": ingredients, "created_at": "2024-03-01T00:00:00Z"},
+            ]
+        )
+        out = StringIO()
+        call_command("dedupe_recipes", stdout=out)
+
+        mock_repo.return_value.merge_duplicate_recipes.assert_called_once_with("c", ["a"])
+        self.assertIn("1 duplicate", out.getvalue())
+
+    @mock.patch("recipes.management.commands.dedupe_recipes.SupabaseRepository")
+    def test_recipes_of_different_creators_are_not_merged(self, mock_repo):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        ingredients = [{"name": name} for name in ("tofu", "broccoli", "soy sauce", "garlic", "rice")]
+        mock_repo.return_value.iter_recipe_ingredients.return_value = iter(
+            [
+                {"id": "a", "title": "Tofu Broccoli Bowl", "ingredients": ingredients, "created_by": "user-1", "created_at": "2024-03-01T00:00:00Z"},
+                {"id": "b", "title": "Tofu Broccoli Bowl", "ingredients": ingredients, "created_by": "user-2", "created_at": "2024-03-02T00:00:00Z"},
+                {"id": "c", "title": "Tofu & Broccoli Bowl", "ingredients": ingredients, "created_by": "user-2", "created_at": "2024-03-03T00:00:00Z"},
+            ]
+        )
+        call_command("dedupe_recipes", stdout=StringIO())
+
+        mock_repo.return_value.merge_duplicate_recipes.assert_called_once_with("b", ["c"])
+
+
+@override_settings(
+    SUPABASE_URL=None,
+    SUGGESTION_RATE_ANON="2/min",
+    LLM_DAILY_TOKEN_QUOTA_ANON=0,
+    THROTTLE_BUCKET_STORE="recipes.throttling.LocalBucketStore",
+)
+class SuggestionThrottleTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from recipes.throttling import reset_bucket_store
+
+        cache.clear()
+        reset_bucket_store()
+        self.addCleanup(reset_bucket_store)
+
+    def test_bucket_refills_at_the_configured_rate(self):
+        from recipes.throttling import LocalBucketStore
+
+        store = LocalBucketStore(shards=4)
+        self.assertEqual(store.take("user:a", 2, 60, now=1000.0), 0)
+        self.assertEqual(store.take("user:a", 2, 60, now=1000.0), 0)
+        self.assertAlmostEqual(store.take("user:a", 2, 60, now=1000.0), 30.0)
+        self.assertAlmostEqual(store.take("user:a", 2, 60, now=1010.0), 20.0)
+        self.assertEqual(store.take("user:a", 2, 60, now=1030.0), 0)
+        self.assertEqual(store.take("user:b", 2, 60, now=1000.0), 0)
+
+    def test_anonymous_callers_get_429_with_retry_after(self):
+        payload = {"ingredients": ["tofu"]}
+        for _ in range(2):
+            self.assertEqual(self.client.post("/api/suggestions/", payload, format="json").status_code, 201)
+        response = self.client.post("/api/suggestions/", payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(int(response["Retry-After"]), range(1, 31))
+
+    @override_settings(SUGGESTION_RATE_ANON="", LLM_DAILY_TOKEN_QUOTA_ANON=1000)
+    @mock.patch("recipes.services.suggestions.RecipeGenerator")
+    def test_daily_token_quota_blocks_until_midnight(self, mock_generator):
+        from recipes.services import RecipeGenerator
+
+        mock_generator.return_value.generate.side_effect = lambda payload: RecipeGenerator(llm=None)._fallback(payload)
+        mock_generator.return_value.last_token_usage = 1200
+        mock_generator.return_value.last_fallback_reason = "test"
+
+        first = self.client.post("/api/suggestions/", {"ingredients": ["tofu"]}, format="json")
+        second = self.client.post("/api/suggestions/", {"ingredients": ["leek"]}, format="json")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertLessEqual(int(second["Retry-After"]), 86400)
+
+
+class AdmissionControlTests(SimpleTestCase):
+    def _hold(self, controller, lane):
+        from recipes.services.admission import AdmissionRejected
+
+        outcome = {}
+
+        def run():
+            try:
+                controller.acquire(lane)
+                outcome["admitted"] = True
+                controller.release()
+            except AdmissionRejected as exc:
+                outcome["rejected"] = exc.reason
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, outcome
+
+    def _wait_for_queue(self, controller, depth):
+        deadline = time.monotonic() + 2
+        while controller.snapshot()["queue_depth"] != depth and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def test_full_queue_sheds_and_authenticated_callers_jump_ahead(self):
+        from recipes.services.admission import (
+            LANE_ANONYMOUS,
+            LANE_AUTHENTICATED,
+            AdmissionController,
+            AdmissionRejected,
+        )
+
+        controller = AdmissionController(max_concurrency=1, max_queue=1, timeout=2)
+        controller.acquire(LANE_AUTHENTICATED)
+        anonymous, anonymous_outcome = self._hold(controller, LANE_ANONYMOUS)
+        self._wait_for_queue(controller, 1)
+
+        with self.assertRaises(AdmissionRejected) as raised:
+            controller.acquire(LANE_ANONYMOUS)
+        self.assertEqual(raised.exception.reason, "queue full")
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+
+        authenticated, authenticated_outcome = self._hold(controller, LANE_AUTHENTICATED)
+        anonymous.join(2)
+        self.assertEqual(anonymous_outcome, {"rejected": "evicted"})
+        controller.release(0.5)
+        authenticated.join(2)
+        self.assertEqual(authenticated_outcome, {"admitted": True})
+
+        snapshot = controller.snapshot()
+        self.assertEqual(snapshot["in_flight"], 0)
+        self.assertEqual(snapshot["rejected"], {"queue_full": 1, "timeout": 0, "evicted": 1})
+        self.assertEqual(snapshot["admitted"], {"authenticated": 2, "anonymous": 0})
+
+    def test_waiters_give_up_after_the_deadline(self):
+        from recipes.services.admission import AdmissionController, AdmissionRejected
+
+        controller = AdmissionController(max_concurrency=1, max_queue=4, timeout=0.02)
+        with controller.admit():
+            with self.assertRaises(AdmissionRejected) as raised:
+                controller.acquire()
+        self.assertEqual(raised.exception.reason, "timeout")
+        snapshot = controller.snapshot()
+        self.assertEqual((snapshot["queue_depth"], snapshot["in_flight"]), (0, 0))
+
+    @override_settings(LLM_MAX_CONCURRENCY=1, LLM_QUEUE_MAX=0)
+    def test_generator_does_not_fall_back_when_shed(self):
+        from recipes.services import AdmissionRejected, RecipeGenerator, get_admission_controller, reset_admission_controller
+
+        reset_admission_controller()
+        self.addCleanup(reset_admission_controller)
+        llm = mock.Mock()
+        with get_admission_controller().admit():
+            with self.assertRaises(AdmissionRejected):
+                RecipeGenerator(llm=llm).generate({"ingredients": ["egg"]})
+        llm.invoke.assert_not_called()
+
+
+@override_settings(
+    SUPABASE_JWT_SECRET="test-secret",
+    SUPABASE_URL=None,
+    SUGGESTION_RATE_ANON="",
+    LLM_DAILY_TOKEN_QUOTA_ANON=0,
+    ADMIN_USER_IDS=["admin-1"],
+)
+class AdmissionViewTests(AuthenticatedAPITestMixin, APITestCase):
+    @mock.patch("recipes.services.suggestions.RecipeGenerator")
+    def test_shed_generation_returns_503_with_retry_after(self, mock_generator):
+        from recipes.services import AdmissionRejected
+
+        mock_generator.return_value.generate.side_effect = AdmissionRejected("queue full", 7)
+        response = self.client.post("/api/suggestions/", {"ingredients": ["okra"]}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "7")
+
+    def test_metrics_report_admission_queue(self):
+        response = self.client.get("/api/metrics/", **self.auth_headers("admin-1"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        admission = response.json()["llm_admission"]
+        self.assertIn("queue_depth", admission)
+        self.assertIn("buckets", admission["wait_seconds"])
+
+    def test_metrics_are_admin_only(self):
+        self.assertEqual(self.client.get("/api/metrics/").status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get("/api/metrics/", **self.auth_headers("user-123"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(
+    SUPABASE_JWT_SECRET="test-secret",
+    SUPABASE_URL=None,
+    GENERATION_JOBS_EAGER=True,
+    SUGGESTION_RATE_USER="",
+    SUGGESTION_RATE_ANON="",
+    LLM_DAILY_TOKEN_QUOTA_ANON=0,
+)
+class GenerationJobTests(AuthenticatedAPITestMixin, APITestCase):
+    def test_async_suggestion_returns_202_and_result_is_pollable(self):
+        response = self.client.post(
+            "/api/suggestions/", {"ingredients": ["tofu"]}, format="json", HTTP_PREFER="respond-async"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        status_url = response.json()["status_url"]
+        self.assertEqual(response["Location"], status_url)
+
+        job = self.client.get(status_url).json()
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["result_status"], 201)
+        self.assertIn("tofu", [item["name"] for item in job["result"]["recipe"]["ingredients"]])
+
+    def test_jobs_of_signed_in_users_are_private(self):
+        response = self.client.post(
+            "/api/meal-plans/",
+            {"ingredients": ["rice"], "days": 2},
+            format="json",
+            HTTP_PREFER="respond-async",
+            **self.auth_headers(),
+        )
+        status_url = response.json()["status_url"]
+
+        self.assertEqual(self.client.get(status_url).status_code, status.HTTP_404_NOT_FOUND)
+        job = self.client.get(status_url, **self.auth_headers()).json()
+        self.assertEqual(len(job["result"]["recipes"]), 2)
+
+    @mock.patch("recipes.services.suggestions.RecipeGenerator")
+    def test_shed_job_is_requeued_and_claimed_once(self, mock_generator):
+        from recipes.models import GenerationJob
+        from recipes.services import AdmissionRejected, run_job
+
+        mock_generator.return_value.generate.side_effect = AdmissionRejected("queue full", 30)
+        response = self.client.post(
+            "/api/suggestions/", {"ingredients": ["leek"]}, format="json", HTTP_PREFER="respond-async"
+        )
+        job = GenerationJob.objects.get(pk=response.json()["job_id"])
+
+        self.assertEqual((job.status, job.attempts), (GenerationJob.Status.QUEUED, 1))
+        run_job(job.id)  # not due for another 30 seconds
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+
+    def test_purge_removes_jobs_past_their_ttl(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+        from recipes.models import GenerationJob
+        from recipes.services import purge_expired_jobs
+
+        old = GenerationJob.objects.create(kind="suggestion", payload={}, available_at=timezone.now())
+        GenerationJob.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=2))
+        GenerationJob.objects.create(kind="suggestion", payload={}, available_at=timezone.now())
+
+        self.assertEqual(purge_expired_jobs(), 1)
+        self.assertEqual(GenerationJob.objects.count(), 1)
+
+
+class RecipeImagePipelineTests(SimpleTestCase):
+    class FakeRepo:
+        def __init__(self, rows):
+            self.rows = rows
+            self.images = {}
+            self.updates = {}
+
+        def iter_recipes_missing_images(self):
+            return iter(self.rows)
+
+        def get_recipe_image(self, prompt_hash):
+            return self.images.get(prompt_hash)
+
+        def save_recipe_image(self, image):
+            self.images.setdefault(image["prompt_hash"], image)
+
+        def set_recipe_image(self, recipe_id, image_url, thumbnail_url):
+            self.updates[recipe_id] = (image_url, thumbnail_url)
+
+        def record_recipe_image_failure(self, recipe_id, attempts, retry_at):
+            self.updates[recipe_id] = (attempts, retry_at)
+
+    def test_failed_renders_back_off_and_are_given_up(self):
+        from datetime import datetime, timedelta, timezone
+
+        from recipes.services import SupabaseRepository
+        from recipes.services.images import ImagePipeline
+
+        provider = mock.Mock(name="provider")
+        provider.name = "broken"
+        provider.render.side_effect = RuntimeError("content policy")
+        repo = self.FakeRepo([{"id": "r1", "image_prompt": "Studio photo of Tofu Bowl", "image_attempts": 0}])
+
+        delays = []
+        with override_settings(RECIPE_IMAGE_POLL_SECONDS=60, RECIPE_IMAGE_MAX_ATTEMPTS=3), self.assertLogs(
+            "recipes.services.images", level="ERROR"
+        ):
+            pipeline = ImagePipeline(repo, provider=provider, store=mock.Mock())
+            for _ in range(3):
+                self.assertEqual(pipeline.backfill(), 0)
+                attempts, retry_at = repo.updates["r1"]
+                repo.rows[0]["image_attempts"] = attempts
+                delays.append(round((retry_at - datetime.now(timezone.utc)) / timedelta(seconds=1)) if retry_at else None)
+
+        self.assertEqual(delays, [60, 120, None])
+
+        client = mock.MagicMock()
+        list(SupabaseRepository(client=client).iter_recipes_missing_images())
+        query = client.table.return_value.select.return_value
+        self.assertTrue(query.is_.return_value.not_.is_.return_value.or_.call_args.args[0].startswith("image_retry_at.is.null,"))
+
+    def test_identical_prompts_render_once_under_content_keys(self):
+        import hashlib
+        import tempfile
+        from pathlib import Path
+
+        from recipes.services.images import FileSystemImageStore, ImagePipeline, PlaceholderImageProvider
+
+        repo = self.FakeRepo(
+            [
+                {"id": "r1", "image_prompt": "Studio photo of Tofu Bowl"},
+                {"id": "r2", "image_prompt": "  studio photo of tofu   bowl"},
+                {"id": "r3", "image_prompt": "Studio photo of Leek Soup"},
+            ]
+        )
+        provider = PlaceholderImageProvider()
+        with tempfile.TemporaryDirectory() as root:
+            store = FileSystemImageStore(root=root, base_url="/media/recipe-images/")
+            with mock.patch.object(provider, "render", wraps=provider.render) as render:
+                pipeline = ImagePipeline(repo, provider=provider, store=store)
+                self.assertEqual(pipeline.backfill(), 3)
+
+            self.assertEqual(render.call_count, 2)
+            self.assertEqual(repo.updates["r1"], repo.updates["r2"])
+            self.assertNotEqual(repo.updates["r1"], repo.updates["r3"])
+            image = next(iter(repo.images.values()))
+            stored = (Path(root) / image["original_key"]).read_bytes()
+            self.assertTrue(stored.startswith(b"\x89PNG"))
+            self.assertIn(hashlib.sha256(stored).hexdigest(), image["original_key"])
+            if image["thumbnail_key"]:
+                self.assertTrue(image["thumbnail_key"].endswith(".webp"))
+                self.assertEqual((Path(root) / image["thumbnail_key"]).read_bytes()[8:12], b"WEBP")
+
+        # A second pass finds the stored render instead of drawing it again.
+        repo.rows = [{"id": "r4", "image_prompt": "Studio photo of Leek Soup"}]
+        with mock.patch.object(PlaceholderImageProvider, "render") as render:
+            ImagePipeline(repo, provider=PlaceholderImageProvider(), store=store).backfill()
+        render.assert_not_called()
+        self.assertEqual(repo.updates["r4"], repo.updates["r3"])
+
+    def test_saving_new_recipes_wakes_the_worker_only_when_enabled(self):
+        from recipes.services import RecipeGenerator, store_recipes, reset_near_duplicate_index
+
+        reset_near_duplicate_index()
+        self.addCleanup(reset_near_duplicate_index)
+        repo = mock.Mock()
+        repo.iter_recipe_ingredients.return_value = iter([])
+        repo.insert_recipe.return_value = "r1"
+        recipe = RecipeGenerator(llm=None)._fallback({"ingredients": ["okra"]})
+
+        with mock.patch("recipes.services.images.ImageBackfillWorker") as worker, mock.patch(
+            "recipes.services.images._worker", None
+        ):
+            store_recipes(repo, [recipe], None)
+            worker.assert_not_called()
+            with override_settings(RECIPE_IMAGES_ENABLED=True):
+                store_recipes(repo, [RecipeGenerator(llm=None)._fallback({"ingredients": ["kale"]})], None)
+        worker.return_value.wake.assert_called_once()
+        self.assertIn("kale", repo.insert_recipe.call_args.args[0]["image_prompt"])
+
+
+class ModelRoutingTests(SimpleTestCase):
+    class FakeClock:
+        now = 0.0
+
+        def __call__(self):
+            return self.now
+
+    class FakeModel:
+        def __init__(self, clock, latency, fail=False):
+            self.clock, self.latency, self.fail = clock, latency, fail
+
+        def invoke(self, prompt):
+            self.clock.now += self.latency
+            if self.fail:
+                raise TimeoutError("upstream timeout")
+            return json.dumps({"title": "Fake", "servings": 1, "ingredients": [{"name": "egg", "quantity": "2"}]})
+
+        def stream(self, prompt):
+            for _ in range(7):
+                yield self.invoke(prompt) + "\n"
+
+    def make_router(self, latencies, fail=()):
+        import random
+
+        from recipes.services import ModelRouter, ModelTier
+
+        clock = self.FakeClock()
+        tiers = [
+            ModelTier("small", "mini", 600, max_complexity=0.3, latency_slo=2.0),
+            ModelTier("large", "big", 1400, max_complexity=1.0, latency_slo=10.0),
+        ]
+        models = {name: self.FakeModel(clock, latency, name in fail) for name, latency in latencies.items()}
+        return ModelRouter(
+            tiers,
+            llm_factory=lambda tier, max_tokens: models[tier.name],
+            probe_rate=0.0,
+            clock=clock,
+            rng=random.Random(0),
+        )
+
+    def test_complexity_picks_the_tier_and_lands_in_model_version(self):
+        from recipes.services import RecipeGenerator
+
+        router = self.make_router({"small": 0.5, "large": 3.0})
+        simple = RecipeGenerator(router=router).generate({"ingredients": ["eggs"], "servings": 1})
+        thai = {
+            "ingredients": [f"item {n}" for n in range(15)],
+            "diet_preferences": ["vegan"],
+            "cuisine": "thai",
+            "servings": 8,
+        }
+        elaborate = RecipeGenerator(router=router).generate(thai)
+
+        self.assertEqual(simple.model_version, "mini:small")
+        self.assertEqual(elaborate.model_version, "big:large")
+        self.assertEqual(router.route(thai, count=3).max_tokens, 4200)
+
+    def test_meal_plan_token_budget_is_clamped_to_the_model_output_limit(self):
+        from recipes.services import ModelRouter, ModelTier
+
+        router = ModelRouter([ModelTier("large", "gpt-4o", 1400), ModelTier("custom", "local", 1000, max_output_tokens=3000)])
+        self.assertEqual(router.route({}, count=7).max_tokens, 9800)
+        self.assertEqual(router.route({}, count=14).max_tokens, 16384)
+
+        router = ModelRouter([ModelTier("custom", "local", 1000, max_output_tokens=3000)])
+        self.assertEqual(router.route({}, count=7).max_tokens, 3000)
+
+    def test_slow_or_failing_tier_sheds_traffic(self):
+        from recipes.services import RecipeGenerator
+
+        payload = {"ingredients": ["eggs"]}
+        for latencies, fail in (({"small": 5.0, "large": 1.0}, ()), ({"small": 0.1, "large": 1.0}, ("small",))):
+            router = self.make_router(latencies, fail)
+            with self.assertLogs("recipes.services", level="WARNING") if fail else contextlib.nullcontext():
+                for _ in range(5):
+                    RecipeGenerator(router=router).generate(payload)
+
+            route = router.route(payload)
+            self.assertEqual((route.tier.name, route.reason), ("large", "avoid-small"))
+            snapshot = router.snapshot()
+            self.assertTrue(snapshot["tiers"]["small"]["degraded"])
+            self.assertFalse(snapshot["tiers"]["large"]["degraded"])
+
+
+    def test_meal_plans_are_charged_per_recipe_against_the_latency_slo(self):
+        from recipes.services import RecipeGenerator
+
+        router = self.make_router({"small": 1.5, "large": 1.0})
+        for _ in range(5):
+            plan = RecipeGenerator(router=router).generate_meal_plan({"ingredients": ["eggs"]}, 4)
+            self.assertEqual([recipe.model_version for recipe in plan], ["mini:small"] * 4)
+
+        small = router.snapshot()["tiers"]["small"]
+        self.assertAlmostEqual(small["latency_ewma_seconds"], 1.5)
+        self.assertFalse(small["degraded"])
+
+
+class CompiledValidationTests(SimpleTestCase):
+    PAYLOADS = [
+        {"ingredients": ["  eggs ", "spinach"], "servings": 3, "cuisine": "", "calorie_target": None},
+        {"ingredients": ["tofu"], "diet_preferences": ["vegan"], "notes": " quick ", "mode": "generate"},
+        {"ingredients": ["eggs"], "servings": "4"},
+        {"ingredients": ["eggs"], "servings": True},
+        {"ingredients": ["eggs"], "servings": 0},
+        {"ingredients": []},
+        {"ingredients": "eggs"},
+        {"ingredients": ["  "]},
+        {"ingredients": ["eggs\x00"]},
+        {"ingredients": ["eggs"], "mode": "sometimes"},
+        {"ingredients": ["eggs"], "notes": "no weapon talk"},
+        {"servings": 2},
+        ["eggs"],
+    ]
+
+    def run_both(self, serializer_class, schema, payload):
+        from rest_framework.exceptions import ValidationError
+
+        serializer = serializer_class(data=payload)
+        expected = dict(serializer.validated_data) if serializer.is_valid() else serializer.errors
+        try:
+            actual = schema.validate(payload)
+        except ValidationError as exc:
+            actual = exc.detail
+        return expected, actual
+
+    def test_matches_drf_for_valid_and_invalid_payloads(self):
+        from recipes.serializers import (
+            MealPlanRequestSerializer,
+            RecipeSuggestionRequestSerializer,
+            meal_plan_request_schema,
+            suggestion_request_schema,
+        )
+
+        self.assertTrue(suggestion_request_schema.compiled)
+        self.assertTrue(meal_plan_request_schema.compiled)
+        for payload in self.PAYLOADS:
+            with self.subTest(payload=payload):
+                self.assertEqual(*self.run_both(RecipeSuggestionRequestSerializer, suggestion_request_schema, payload))
+        for payload in ({"ingredients": ["rice"], "days": 3}, {"ingredients": ["rice"], "days": 30}):
+            with self.subTest(payload=payload):
+                self.assertEqual(*self.run_both(MealPlanRequestSerializer, meal_plan_request_schema, payload))
+
+    def test_unsupported_fields_use_the_serializer(self):
+        from recipes.serializers import RecipeImportSerializer
+        from recipes.services import CompiledSerializer
+
+        schema = CompiledSerializer(RecipeImportSerializer)
+        self.assertFalse(schema.compiled)
+        self.assertEqual(schema.validate({"title": "Toast", "ingredients": [{"name": "bread"}]})["servings"], 2)
+
+    def test_generated_recipe_is_slotted_and_serializes_without_copies(self):
+        from dataclasses import asdict
+
+        from recipes.services import GeneratedRecipe
+
+        recipe = GeneratedRecipe("Toast", "", 1, 1, 2, ingredients=[{"name": "bread", "quantity": "1"}])
+        self.assertFalse(hasattr(recipe, "__dict__"))
+        self.assertEqual(recipe.to_dict(), asdict(recipe))
+        self.assertIs(recipe.to_dict()["ingredients"], recipe.to_record()["ingredients"])
+
+
+class SharedMemoryCacheTests(SimpleTestCase):
+    def make_cache(self, directory, slots=64, slot_size=512, ways=4):
+        from recipes.cache_backends import SharedMemoryCache
+
+        return SharedMemoryCache(directory, {"OPTIONS": {"SLOTS": slots, "SLOT_SIZE": slot_size, "WAYS": ways}})
+
+    def test_cache_api_round_trip(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = self.make_cache(directory)
+            cache.set("recipe", {"title": "Toast", "ingredients": ["bread"]})
+            self.assertEqual(cache.get("recipe"), {"title": "Toast", "ingredients": ["bread"]})
+            self.assertFalse(cache.add("recipe", "other"))
+            self.assertTrue(cache.add("tokens", 10))
+            self.assertEqual(cache.incr("tokens", 5), 15)
+            cache.set("huge", "x" * 1000)
+            self.assertIsNone(cache.get("huge"))
+            cache.set("brief", 1, timeout=0)
+            self.assertFalse(cache.has_key("brief"))
+            self.assertTrue(cache.delete("recipe"))
+            cache.clear()
+            self.assertIsNone(cache.get("tokens"))
+
+    def test_entries_are_shared_with_other_processes(self):
+        import multiprocessing
+        import tempfile
+
+        def child(directory, queue):
+            cache = self.make_cache(directory)
+            queue.put(cache.get("warm"))
+            cache.set("from-child", 42)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = self.make_cache(directory)
+            cache.set("warm", ["eggs", "rice"])
+            context = multiprocessing.get_context("fork")
+            queue = context.Queue()
+            process = context.Process(target=child, args=(directory, queue))
+            process.start()
+            self.assertEqual(queue.get(timeout=10), ["eggs", "rice"])
+            process.join(10)
+            self.assertEqual(cache.get("from-child"), 42)
+
+    def test_clock_eviction_keeps_recently_read_entries(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            # One set of four slots, so every key competes for the same ways.
+            cache = self.make_cache(directory, slots=4, ways=4)
+            for key in "abcd":
+                cache.set(key, key)
+            cache.get("a")
+            cache.set("e", "e")
+
+            self.assertEqual(cache.get("a"), "a")
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual(cache.stats()["used"], 4)
+
+
+class AsyncPathTests(SimpleTestCase):
+    class FakeAsyncClient:
+        """Chains any query-builder call; `execute` awaits the table's handler."""
+
+        def __init__(self, handlers):
+            self.handlers = handlers
+
+        def table(self, name):
+            return AsyncPathTests.FakeQuery(self.handlers[name])
+
+    class FakeQuery:
+        def __init__(self, handler):
+            self.handler = handler
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: self
+
+        async def execute(self):
+            from types import SimpleNamespace
+
+            return SimpleNamespace(data=await self.handler())
+
+    def test_async_admission_queues_without_threads_and_honours_cancellation(self):
+        import asyncio
+
+        from recipes.services.admission import AdmissionController
+
+        async def scenario():
+            controller = AdmissionController(max_concurrency=1, max_queue=2, timeout=5)
+            await controller.aacquire()
+            waiting = asyncio.ensure_future(controller.aacquire())
+            abandoned = asyncio.ensure_future(controller.aacquire())
+            await asyncio.sleep(0)
+            abandoned.cancel()
+            await asyncio.sleep(0)
+            # Released from another thread, as a sync view finishing its call would.
+            await asyncio.to_thread(controller.release, 0.1)
+            await asyncio.wait_for(waiting, 1)
+            snapshot = controller.snapshot()
+            controller.release()
+            return snapshot, controller.snapshot()
+
+        busy, idle = asyncio.run(scenario())
+        self.assertEqual((busy["in_flight"], busy["queue_depth"]), (1, 0))
+        self.assertEqual(idle["in_flight"], 0)
+
+    def test_list_recipes_fetches_favorites_concurrently(self):
+        import asyncio
+
+        from recipes.services import AsyncSupabaseRepository
+
+        async def scenario():
+            favorites_started = asyncio.Event()
+
+            async def recipes():
+                # Deadlocks (and times out) unless the favorites query is already running.
+                await asyncio.wait_for(favorites_started.wait(), 1)
+                return [{"id": "r1"}, {"id": "r2"}]
+
+            async def favorites():
+                favorites_started.set()
+                return [{"recipe_id": "r2"}]
+
+            repo = AsyncSupabaseRepository(self.FakeAsyncClient({"recipes": recipes, "favorites": favorites}))
+            return await repo.list_recipes("user-1", scope="public")
+
+        records = asyncio.run(scenario())
+        self.assertEqual([record["is_favorite"] for record in records], [False, True])
+
+    def test_one_thread_holds_hundreds_of_generations(self):
+        import asyncio
+
+        from recipes.services import ModelRouter, ModelTier, RecipeGenerator
+        from recipes.services.admission import AdmissionController
+
+        count = 200
+
+        class SlowModel:
+            in_flight = 0
+            all_started = None
+
+            async def ainvoke(self, prompt):
+                SlowModel.in_flight += 1
+                if SlowModel.in_flight == count:
+                    SlowModel.all_started.set()
+                await asyncio.wait_for(SlowModel.all_started.wait(), 5)
+                return json.dumps({"title": "Omelette", "servings": 1, "ingredients": [{"name": "egg", "quantity": "2"}]})
+
+        router = ModelRouter([ModelTier("only", "fake", 600)], llm_factory=lambda tier, max_tokens: SlowModel())
+
+        async def scenario():
+            SlowModel.all_started = asyncio.Event()
+            return await asyncio.gather(*(RecipeGenerator(router=router).agenerate({"ingredients": ["eggs"]}) for _ in range(count)))
+
+        controller = AdmissionController(max_concurrency=count, max_queue=0, timeout=1)
+        with mock.patch("recipes.services.recipe_generator.get_admission_controller", return_value=controller):
+            recipes = asyncio.run(scenario())
+        self.assertEqual({recipe.model_version for recipe in recipes}, {"fake:only"})
+
+    def test_async_views_serve_suggestions_and_details(self):
+        import uuid
+
+        from asgiref.sync import async_to_sync
+        from rest_framework.test import APIRequestFactory, force_authenticate
+
+        from recipes.async_views import AsyncRecipeDetailView, AsyncRecipeSuggestionView
+        from recipes.authentication import SupabaseUser
+
+        factory = APIRequestFactory()
+        with override_settings(SUPABASE_URL=None), mock.patch("recipes.services.suggestions.RecipeCache") as cache:
+            cache.return_value.get.return_value = None
+            cache.return_value.get_rescaled.return_value = None
+            request = factory.post("/api/suggestions/", {"ingredients": ["eggs"], "mode": "generate"}, format="json")
+            response = async_to_sync(AsyncRecipeSuggestionView.as_view())(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["supabase"], "unconfigured")
+
+        recipe_id = str(uuid.uuid4())
+        repo = mock.Mock()
+        repo.get_recipe = mock.AsyncMock(return_value={"id": recipe_id, "title": "Toast"})
+        repo.is_favorite = mock.AsyncMock(return_value=True)
+        with mock.patch("recipes.async_views.AsyncSupabaseRepository.create", mock.AsyncMock(return_value=repo)):
+            request = factory.get(f"/api/recipes/{recipe_id}/")
+            force_authenticate(request, user=SupabaseUser(id="user-1"))
+            response = async_to_sync(AsyncRecipeDetailView.as_view())(request, recipe_id=uuid.UUID(recipe_id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["recipe"]["is_favorite"])
+        repo.is_favorite.assert_awaited_once_with("user-1", recipe_id)
+
+
+@override_settings(
+    SUPABASE_JWT_SECRET="test-secret",
+    SUPABASE_URL="https://example.supabase.co",
+    PROFILER_INTERVAL_MS=1,
+    ADMIN_USER_IDS=["admin-1"],
+)
+class RequestProfilerTests(AuthenticatedAPITestMixin, APITestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from recipes.profiling import reset_sampler
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        settings_override = override_settings(PROFILER_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_sampler()
+        self.addCleanup(reset_sampler)
+
+    def run_request(self, seconds, **headers):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+
+        from recipes.profiling import profiling_middleware
+
+        def simmer_view(request):
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                sum(range(200))
+            return HttpResponse("ok")
+
+        return profiling_middleware(simmer_view)(RequestFactory().get("/api/health/", **headers))
+
+    def test_signed_header_profiles_the_request(self):
+        from recipes.profiling import RESPONSE_HEADER, list_profiles, profile_path, profile_token
+
+        self.assertFalse(self.run_request(0.05, HTTP_X_PROFILE_REQUEST="forged").has_header(RESPONSE_HEADER))
+
+        response = self.run_request(0.05, HTTP_X_PROFILE_REQUEST=profile_token())
+        profile_id = response[RESPONSE_HEADER]
+        (profile,) = list_profiles()
+        self.assertEqual((profile["id"], profile["reason"], profile["path"]), (profile_id, "header", "/api/health/"))
+        stacks = profile_path(profile_id).read_text().splitlines()
+        self.assertTrue(any("simmer_view" in line for line in stacks))
+        self.assertEqual(sum(int(line.rsplit(" ", 1)[1]) for line in stacks), profile["samples"])
+
+    def test_sessions_sharing_a_thread_only_count_their_own_stacks(self):
+        from recipes.profiling import StackSampler
+
+        # Two async requests on one event loop thread: only the running one is on the stack.
+        suspended = (item for item in [1])
+        sampler = StackSampler(interval=60)
+        running = sampler.start("header", None, sys._getframe())
+        waiting = sampler.start("header", None, suspended.gi_frame)
+        self.addCleanup(sampler.stop, running)
+        self.addCleanup(sampler.stop, waiting)
+
+        sampler.sample(time.monotonic())
+        self.assertGreaterEqual(running.samples, 1)
+        self.assertEqual(waiting.samples, 0)
+        self.assertTrue(any("test_sessions_sharing_a_thread" in stack for stack in running.stacks))
+        sampler.stop(waiting)
+        self.assertEqual(sampler.snapshot()["active"], 1)
+
+    @override_settings(PROFILER_SLOW_REQUEST_MS=30)
+    def test_slow_requests_are_profiled_past_the_threshold(self):
+        from recipes.profiling import RESPONSE_HEADER, list_profiles
+
+        self.assertFalse(self.run_request(0).has_header(RESPONSE_HEADER))
+        self.assertTrue(self.run_request(0.15).has_header(RESPONSE_HEADER))
+        (profile,) = list_profiles()
+        self.assertEqual(profile["reason"], "slow")
+        self.assertGreaterEqual(profile["duration_ms"], 150)
+
+    @override_settings(PROFILER_SAMPLE_PERCENT=100, PROFILER_MAX_PROFILES=2)
+    def test_sampled_profiles_are_capped_and_admin_only(self):
+        from recipes.profiling import list_profiles
+
+        for _ in range(3):
+            self.run_request(0.02)
+        profiles = list_profiles()
+        self.assertEqual(len(profiles), 2)
+        sampling_off = override_settings(PROFILER_SAMPLE_PERCENT=0)
+        sampling_off.enable()
+        self.addCleanup(sampling_off.disable)
+
+        denied = self.client.get("/api/profiler/profiles/", **self.auth_headers("user-123"))
+        self.assertEqual(denied.status_code, status.HTTP_403_FORBIDDEN)
+
+        listed = self.client.get("/api/profiler/profiles/", **self.auth_headers("admin-1")).json()["profiles"]
+        self.assertEqual({profile["id"] for profile in listed}, {profile["id"] for profile in profiles})
+        download = self.client.get(listed[0]["download_url"], **self.auth_headers("admin-1"))
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        self.assertIn("attachment", download["Content-Disposition"])
+        self.assertIn(b"simmer_view", b"".join(download.streaming_content))
+
+        missing = self.client.get(
+            "/api/profiler/profiles/00000000-0000-0000-0000-000000000000/", **self.auth_headers("admin-1")
+        )
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,223 @@
+"""
+Rate limiting and daily LLM-token quotas for the generation endpoints.
+
+Request rates use token buckets implemented as GCRA (generic cell rate algorithm):
+each bucket is a single "theoretical arrival time", so a check is one read and one
+write, and the exact time until enough tokens are available is known for
+`Retry-After`. Bucket state lives in a pluggable store (`THROTTLE_BUCKET_STORE`):
+the default keeps it in process, sharded across locks; `CacheBucketStore` keeps it
+in the Django cache so every worker shares the same buckets.
+"""
+
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+
+def parse_rate(rate: Optional[str]) -> Optional[Tuple[int, float]]:
+    """
+    "10/min" -> (10, 60.0). A bucket holds `count` tokens and refills over `period`.
+    """
+
+    if not rate:
+        return None
+    count, _, period = rate.partition("/")
+    seconds = PERIODS.get(period.strip().lower())
+    if seconds is None:
+        raise ValueError(f"Unknown throttle period in {rate!r}.")
+    return int(count), float(seconds)
+
+
+class LocalBucketStore:
+    """
+    In-process GCRA state, split over `shards` independently locked LRU maps so
+    concurrent requests for different callers rarely contend on the same lock.
+    """
+
+    def __init__(self, shards: int = 16, max_keys_per_shard: int = 10_000):
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self._max_keys = max_keys_per_shard
+
+    def take(self, key: str, capacity: int, period: float, cost: int = 1, now: Optional[float] = None) -> float:
+        """
+        Spend `cost` tokens from `key`'s bucket. Returns 0 when allowed, otherwise the
+        seconds until the request would be allowed (nothing is spent).
+        """
+
+        now = time.time() if now is None else now
+        lock, buckets = self._shards[zlib.crc32(key.encode("utf-8")) % len(self._shards)]
+        with lock:
+            wait, new_tat = _gcra(buckets.get(key), capacity, period, cost, now)
+            if wait:
+                return wait
+            buckets[key] = new_tat
+            buckets.move_to_end(key)
+            if len(buckets) > self._max_keys:
+                buckets.popitem(last=False)
+        return 0.0
+
+
+class CacheBucketStore:
+    """
+    GCRA state in the Django cache, shared by every worker that uses the same cache.
+
+    Updates are read-then-write, so two workers racing on one key can both be
+    admitted; that slack is at most one request per worker.
+    """
+
+    prefix = "recipes:throttle:"
+
+    def take(self, key: str, capacity: int, period: float, cost: int = 1, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        cache_key = f"{self.prefix}{key}"
+        wait, new_tat = _gcra(cache.get(cache_key), capacity, period, cost, now)
+        if wait:
+            return wait
+        cache.set(cache_key, new_tat, timeout=int(new_tat - now) + 1)
+        return 0.0
+
+
+def _gcra(tat: Optional[float], capacity: int, period: float, cost: int, now: float) -> Tuple[float, float]:
+    interval = period / capacity
+    new_tat = max(tat or now, now) + interval * cost
+    allowed_at = new_tat - period
+    if allowed_at > now:
+        return allowed_at - now, tat or now
+    return 0.0, new_tat
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = getattr(settings, "THROTTLE_BUCKET_STORE", "recipes.throttling.LocalBucketStore")
+                _store = import_string(path)()
+    return _store
+
+
+def reset_bucket_store() -> None:
+    global _store
+    with _store_lock:
+        _store = None
+
+
+def throttle_ident(request, throttle: BaseThrottle) -> str:
+    """Authenticated callers are limited per Supabase user id, anonymous ones per IP."""
+
+    user = getattr(request, "user", None)
+    user_id = getattr(user, "id", None) if getattr(user, "is_authenticated", False) else None
+    return f"user:{user_id}" if user_id else f"ip:{throttle.get_ident(request)}"
+
+
+class SuggestionRateThrottle(BaseThrottle):
+    """
+    Token bucket per caller: `SUGGESTION_RATE_USER` for signed-in users and
+    `SUGGESTION_RATE_ANON` for everyone else (e.g. "10/min").
+    """
+
+    scope = "suggestions"
+
+    def allow_request(self, request, view):
+        ident = throttle_ident(request, self)
+        setting = "SUGGESTION_RATE_USER" if ident.startswith("user:") else "SUGGESTION_RATE_ANON"
+        rate = parse_rate(getattr(settings, setting, None))
+        if rate is None:
+            return True
+        capacity, period = rate
+        self._wait = get_bucket_store().take(f"{self.scope}:{ident}", capacity, period)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+def _quota_key(ident: str, day: str) -> str:
+    return f"recipes:llm-quota:{ident}:{day}"
+
+
+def _utc_now() -> datetime:
+    return datetime.now(dt_timezone.utc)
+
+
+def _seconds_until_midnight(now: datetime) -> float:
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+
+class LLMTokenQuotaThrottle(BaseThrottle):
+    """
+    Daily LLM-token allowance per caller (`LLM_DAILY_TOKEN_QUOTA_USER` /
+    `LLM_DAILY_TOKEN_QUOTA_ANON`), reset at midnight UTC. Views report what each
+    request actually spent with `record_llm_tokens`.
+
+    Usage is counted in the default cache, so the quota only holds across workers when
+    that cache is shared; with the per-process LocMemCache every worker grants the full
+    quota (`manage.py check --deploy` warns about this).
+    """
+
+    def allow_request(self, request, view):
+        ident = throttle_ident(request, self)
+        setting = "LLM_DAILY_TOKEN_QUOTA_USER" if ident.startswith("user:") else "LLM_DAILY_TOKEN_QUOTA_ANON"
+        quota = getattr(settings, setting, 0)
+        if not quota:
+            return True
+        now = _utc_now()
+        used = cache.get(_quota_key(ident, now.date().isoformat()), 0)
+        self._wait = _seconds_until_midnight(now) if used >= quota else 0.0
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+def request_throttle_ident(request) -> str:
+    return throttle_ident(request, BaseThrottle())
+
+
+def record_llm_tokens(request, tokens: int) -> None:
+    record_llm_tokens_for(request_throttle_ident(request), tokens)
+
+
+def record_llm_tokens_for(ident: str, tokens: int) -> None:
+    """Charge `tokens` to the quota of `ident` (as built by `throttle_ident`)."""
+
+    if not ident or not isinstance(tokens, int) or tokens <= 0:
+        return
+    now = _utc_now()
+    key = _quota_key(ident, now.date().isoformat())
+    timeout = int(_seconds_until_midnight(now)) + 60
+    if cache.add(key, tokens, timeout=timeout):
+        return
+    try:
+        cache.incr(key, tokens)
+    except ValueError:
+        # Expired between add() and incr().
+        cache.add(key, tokens, timeout=timeout)
+
+
+__all__ = [
+    "CacheBucketStore",
+    "LLMTokenQuotaThrottle",
+    "LocalBucketStore",
+    "SuggestionRateThrottle",
+    "parse_rate",
+    "record_llm_tokens",
+    "record_llm_tokens_for",
+    "request_throttle_ident",
+    "reset_bucket_store",
+]
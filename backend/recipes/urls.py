@@ -1,23 +1,55 @@
+from django.conf import settings
 from django.urls import path
 
 from .views import (
+    ExportView,
+    FavoriteBulkView,
     FavoriteToggleView,
+    GenerationJobView,
     HealthCheckView,
+    MealPlanView,
+    MetricsView,
+    LogoutView,
+    ProfileView,
+    RecipeDetailView,
     RecipeListView,
+    RecipeRescaleView,
+    RecipeSearchView,
     RecipeSuggestionView,
+    RecommendationView,
+    RequestProfileDownloadView,
+    RequestProfileListView,
     SearchHistoryView,
     RegistrationView,
 )
 
+if getattr(settings, "ASYNC_VIEWS", False):
+    # Same routes and responses; handlers await the model and Supabase (serve via ASGI).
+    from .async_views import (
+        AsyncMealPlanView as MealPlanView,
+        AsyncRecipeDetailView as RecipeDetailView,
+        AsyncRecipeListView as RecipeListView,
+        AsyncRecipeSuggestionView as RecipeSuggestionView,
+    )
 
 app_name = "recipes"
 
 urlpatterns = [
     path("health/", HealthCheckView.as_view(), name="health-check"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
+    path("profiler/profiles/", RequestProfileListView.as_view(), name="request-profiles"),
+    path("profiler/profiles/<uuid:profile_id>/", RequestProfileDownloadView.as_view(), name="request-profile"),
     path("suggestions/", RecipeSuggestionView.as_view(), name="recipe-suggestion"),
+    path("meal-plans/", MealPlanView.as_view(), name="meal-plan"),
+    path("jobs/<uuid:job_id>/", GenerationJobView.as_view(), name="generation-job"),
     path("recipes/", RecipeListView.as_view(), name="recipes-list"),
+    path("recipes/search/", RecipeSearchView.as_view(), name="recipe-search"),
+    path("recipes/<uuid:recipe_id>/", RecipeDetailView.as_view(), name="recipe-detail"),
+    path("recipes/<uuid:recipe_id>/rescale/", RecipeRescaleView.as_view(), name="recipe-rescale"),
     path("history/", SearchHistoryView.as_view(), name="search-history"),
     path("favorites/", FavoriteToggleView.as_view(), name="favorite-toggle"),
+    path("favorites/bulk/", FavoriteBulkView.as_view(), name="favorite-bulk"),
+    path("export/", ExportView.as_view(), name="export"),
     path("profile/", ProfileView.as_view(), name="profile"),
     path("recommendations/", RecommendationView.as_view(), name="recommendations"),
     path("auth/logout/", LogoutView.as_view(), name="auth-logout"),
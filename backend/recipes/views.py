@@ -1,24 +1,43 @@
-from dataclasses import asdict
-
 from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
 from rest_framework import exceptions, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .authentication import SupabaseJWTAuthentication
+from .authentication import IsAdminUserId, SupabaseJWTAuthentication
+from .idempotency import idempotent
+from .models import GenerationJob
+from .profiling import list_profiles, profile_path
 from .serializers import (
+    ExportQuerySerializer,
+    FavoriteBulkSerializer,
     FavoriteToggleSerializer,
     ProfileUpdateSerializer,
     RecipeListQuerySerializer,
-    RecipeSuggestionRequestSerializer,
+    RecipeRescaleQuerySerializer,
+    RecipeSearchQuerySerializer,
     RegistrationSerializer,
+    encode_search_cursor,
+    meal_plan_request_schema,
+    suggestion_request_schema,
 )
 from .services import (
-    RecipeGenerator,
+    AdmissionRejected,
     SupabaseConfigurationError,
     SupabaseRepository,
+    collect_metrics,
+    export_filename,
+    get_job_pool,
     get_supabase_client,
+    plan_meals,
+    request_lane,
+    rescale_recipe,
+    stream_export,
+    submit_job,
+    suggest_recipe,
 )
+from .throttling import LLMTokenQuotaThrottle, SuggestionRateThrottle, record_llm_tokens, request_throttle_ident
 
 
 class HealthCheckView(APIView):
@@ -44,60 +63,69 @@ class HealthCheckView(APIView):
         return Response(health, status=status.HTTP_200_OK)
 
 
+def overloaded_response(exc: AdmissionRejected) -> Response:
+    return Response(
+        {"detail": str(exc)},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 class RecipeSuggestionView(APIView):
     """
     Generate personalized recipes via LangChain/OpenAI and persist the output to Supabase.
+
+    With `Prefer: respond-async` the request is queued as a generation job instead and
+    answered with `202` and the job's status URL.
     """
 
     authentication_classes = [SupabaseJWTAuthentication]
     permission_classes: list = []
+    throttle_classes = [SuggestionRateThrottle, LLMTokenQuotaThrottle]
 
+    @idempotent
     def post(self, request):
-        serializer = RecipeSuggestionRequestSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        payload = serializer.validated_data
+        payload = suggestion_request_schema.validate(request.data)
+        if self._wants_async(request):
+            return self._submit_job(request, GenerationJob.Kind.SUGGESTION, payload)
 
-        generator = RecipeGenerator()
-        recipe = generator.generate(payload)
-        recipe_dict = asdict(recipe)
-
-        supabase_status = "unconfigured"
-        saved_recipe_id = None
-        history_entry_id = None
-
-        repo = self._get_repository_optional()
-        if repo:
-            supabase_status = "connected"
-            user_id = getattr(getattr(request, "user", None), "id", None)
-            saved_recipe_id = repo.insert_recipe(
-                {
-                    "title": recipe.title,
-                    "description": recipe.description,
-                    "servings": recipe.servings,
-                    "prep_time_minutes": recipe.prep_time_minutes,
-                    "cook_time_minutes": recipe.cook_time_minutes,
-                    "ingredients": recipe.ingredients,
-                    "instructions": recipe.instructions,
-                    "nutrition": recipe.nutrition,
-                    "image_url": recipe.image_url,
-                    "source": recipe.source,
-                    "model_version": recipe.model_version,
-                    "shopping_list": recipe.shopping_list,
-                },
-                user_id=user_id,
+        mode = payload.pop("mode")
+        try:
+            result = suggest_recipe(
+                self._get_repository_optional(),
+                payload,
+                mode=mode,
+                user_id=self._user_id(request),
+                lane=request_lane(request),
             )
-            history_entry_id = repo.log_search_history(user_id, payload, saved_recipe_id)
-        elif settings.SUPABASE_URL:
-            supabase_status = "misconfigured"
-
-        response_payload = {
-            "recipe": recipe_dict,
-            "supabase": supabase_status,
-            "saved_recipe_id": saved_recipe_id,
-            "history_entry_id": history_entry_id,
-        }
-
-        return Response(response_payload, status=status.HTTP_201_CREATED)
+        except AdmissionRejected as exc:
+            return overloaded_response(exc)
+        record_llm_tokens(request, result.tokens)
+        return Response(result.data, status=result.status)
+
+    @staticmethod
+    def _user_id(request):
+        return getattr(getattr(request, "user", None), "id", None)
+
+    @staticmethod
+    def _wants_async(request) -> bool:
+        prefer = request.headers.get("Prefer", "")
+        return "respond-async" in {token.strip().lower() for token in prefer.split(",")}
+
+    def _submit_job(self, request, kind, payload):
+        job = submit_job(
+            kind,
+            payload,
+            user_id=self._user_id(request),
+            lane=request_lane(request),
+            throttle_ident=request_throttle_ident(request),
+        )
+        status_url = reverse("recipes:generation-job", args=[job.id])
+        return Response(
+            {"job_id": str(job.id), "status": job.status, "status_url": status_url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": status_url},
+        )
 
     def _get_repository_optional(self) -> SupabaseRepository | None:
         if not settings.SUPABASE_URL:
@@ -109,6 +137,68 @@ class RecipeSuggestionView(APIView):
             return None
 
 
+class MealPlanView(RecipeSuggestionView):
+    """
+    Generate several recipes from one streamed completion, persist them with one bulk
+    insert and return a consolidated shopping list.
+    """
+
+    @idempotent
+    def post(self, request):
+        payload = meal_plan_request_schema.validate(request.data)
+        if self._wants_async(request):
+            return self._submit_job(request, GenerationJob.Kind.MEAL_PLAN, payload)
+
+        days = payload.pop("days")
+        try:
+            result = plan_meals(
+                self._get_repository_optional(),
+                payload,
+                days=days,
+                user_id=self._user_id(request),
+                lane=request_lane(request),
+            )
+        except AdmissionRejected as exc:
+            return overloaded_response(exc)
+        record_llm_tokens(request, result.tokens)
+        return Response(result.data, status=result.status)
+
+
+class GenerationJobView(APIView):
+    """
+    Status and, once finished, the result of an asynchronous generation job.
+
+    Jobs submitted by a signed-in user are only visible to that user; anonymous jobs
+    to anyone holding the id.
+    """
+
+    authentication_classes = [SupabaseJWTAuthentication]
+    permission_classes: list = []
+
+    def get(self, request, job_id):
+        job = GenerationJob.objects.filter(pk=job_id).first()
+        if job is None or (job.user_id and job.user_id != getattr(request.user, "id", None)):
+            return Response({"detail": "Job not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        finished = job.status in (GenerationJob.Status.SUCCEEDED, GenerationJob.Status.FAILED)
+        if not finished and not getattr(settings, "GENERATION_JOBS_EAGER", False):
+            # Starts this process's workers, so jobs orphaned by a restart get picked up.
+            get_job_pool()
+        return Response(
+            {
+                "job_id": str(job.id),
+                "kind": job.kind,
+                "status": job.status,
+                "created_at": job.created_at,
+                "finished_at": job.finished_at,
+                "result_status": job.result_status,
+                "result": job.result if finished else None,
+                "error": job.error or None,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class SupabaseProtectedAPIView(APIView):
     authentication_classes = [SupabaseJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
@@ -119,6 +209,18 @@ class SupabaseProtectedAPIView(APIView):
         raise exceptions.PermissionDenied(detail=message)
 
 
+class MetricsView(SupabaseProtectedAPIView):
+    """
+    Per-process operational counters (LLM admission queue depth, wait times, ...).
+    Admins only: the numbers describe load, routing and profiling activity.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, IsAdminUserId]
+
+    def get(self, request):
+        return Response(collect_metrics(), status=status.HTTP_200_OK)
+
+
 class RecipeListView(SupabaseProtectedAPIView):
 
     def get(self, request):
@@ -138,10 +240,82 @@ class RecipeListView(SupabaseProtectedAPIView):
             user_id=request.user.id,
             scope=params["scope"],
             limit=params["limit"],
+            fields=params["fields"],
         )
         return Response({"recipes": records}, status=status.HTTP_200_OK)
 
 
+class RecipeSearchView(SupabaseProtectedAPIView):
+    """
+    Ranked full-text and fuzzy title search over stored recipes, paged by `cursor`.
+    """
+
+    def get(self, request):
+        query_serializer = RecipeSearchQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        params = query_serializer.validated_data
+
+        try:
+            repo = SupabaseRepository()
+        except SupabaseConfigurationError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        records, after = repo.search_recipes(
+            user_id=request.user.id,
+            query=params["q"],
+            scope=params["scope"],
+            limit=params["limit"],
+            fields=params["fields"],
+            after=params.get("cursor"),
+        )
+        return Response(
+            {"recipes": records, "next_cursor": encode_search_cursor(after) if after else None},
+            status=status.HTTP_200_OK,
+        )
+
+
+class RecipeDetailView(SupabaseProtectedAPIView):
+    """
+    Full recipe record; listings only carry the card projection.
+    """
+
+    def get(self, request, recipe_id):
+        try:
+            repo = SupabaseRepository()
+        except SupabaseConfigurationError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        recipe = repo.get_recipe(str(recipe_id))
+        if recipe is None:
+            return Response({"detail": "Recipe not found."}, status=status.HTTP_404_NOT_FOUND)
+        recipe["is_favorite"] = repo.is_favorite(request.user.id, recipe["id"])
+        return Response({"recipe": recipe}, status=status.HTTP_200_OK)
+
+
+class RecipeRescaleView(SupabaseProtectedAPIView):
+    """
+    A stored recipe scaled to `?servings=`, computed locally; nothing is saved.
+    """
+
+    def get(self, request, recipe_id):
+        query_serializer = RecipeRescaleQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        servings = query_serializer.validated_data["servings"]
+
+        try:
+            repo = SupabaseRepository()
+        except SupabaseConfigurationError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        recipe = repo.get_recipe(str(recipe_id))
+        if recipe is None:
+            return Response({"detail": "Recipe not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(
+            {"recipe": rescale_recipe(recipe, servings), "original_servings": recipe.get("servings")},
+            status=status.HTTP_200_OK,
+        )
+
+
 class SearchHistoryView(SupabaseProtectedAPIView):
 
     def get(self, request):
@@ -158,8 +332,43 @@ class SearchHistoryView(SupabaseProtectedAPIView):
         return Response({"history": history}, status=status.HTTP_200_OK)
 
 
+class ExportView(SupabaseProtectedAPIView):
+    """
+    Stream a user's recipes, favorites and search history as NDJSON or CSV.
+    """
+
+    def get(self, request):
+        query_serializer = ExportQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        params = query_serializer.validated_data
+
+        try:
+            repo = SupabaseRepository()
+        except SupabaseConfigurationError as exc:
+            return Response(
+                {"detail": str(exc)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        content_type = "text/csv" if params["output"] == "csv" else "application/x-ndjson"
+        response = StreamingHttpResponse(
+            stream_export(
+                repo,
+                request.user.id,
+                datasets=params["datasets"],
+                output_format=params["output"],
+                compress=params["gzip"],
+            ),
+            content_type="application/gzip" if params["gzip"] else content_type,
+        )
+        filename = export_filename(params["output"], params["gzip"])
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
 class FavoriteToggleView(SupabaseProtectedAPIView):
 
+    @idempotent
     def post(self, request):
         serializer = FavoriteToggleSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -181,6 +390,37 @@ class FavoriteToggleView(SupabaseProtectedAPIView):
         )
 
 
+class FavoriteBulkView(SupabaseProtectedAPIView):
+    """
+    Add and remove many favorites in one request (collection import / clear).
+    """
+
+    @idempotent
+    def post(self, request):
+        serializer = FavoriteBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add_ids = [str(recipe_id) for recipe_id in serializer.validated_data["add"]]
+        remove_ids = [str(recipe_id) for recipe_id in serializer.validated_data["remove"]]
+
+        try:
+            repo = SupabaseRepository()
+        except SupabaseConfigurationError as exc:
+            return Response(
+                {"detail": str(exc)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        results = repo.set_favorites_bulk(request.user.id, add_ids, remove_ids)
+        return Response(
+            {
+                "results": results,
+                "added": sum(1 for item in results if item["status"] == "added"),
+                "removed": sum(1 for item in results if item["status"] == "removed"),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class ProfileView(SupabaseProtectedAPIView):
 
     def get(self, request):
@@ -191,6 +431,7 @@ class ProfileView(SupabaseProtectedAPIView):
         profile = repo.get_profile(request.user.id)
         return Response({"profile": profile}, status=status.HTTP_200_OK)
 
+    @idempotent
     def put(self, request):
         serializer = ProfileUpdateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -252,16 +493,20 @@ class RecommendationView(SupabaseProtectedAPIView):
     """
     Very lightweight recommender based on frequency of ingredients
     in a user's search history. It returns a list of suggested tags/ingredients.
+    Months already compacted out of the raw history count through their rollups, newest
+    first, for whatever is left of the same window of searches.
     """
 
+    window = 100
+
     def get(self, request):
         try:
             repo = SupabaseRepository()
         except SupabaseConfigurationError as exc:
             return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-        history = repo.list_history(request.user.id, limit=100)
-        counts: dict[str, int] = {}
+        history = repo.list_history(request.user.id, limit=self.window)
+        counts: dict[str, float] = {}
         for item in history:
             for ing in (item.get("ingredients") or []):
                 if not isinstance(ing, str):
@@ -270,6 +515,17 @@ class RecommendationView(SupabaseProtectedAPIView):
                 if not key:
                     continue
                 counts[key] = counts.get(key, 0) + 1
+        remaining = self.window - len(history)
+        for rollup in repo.get_history_rollups(request.user.id):
+            searches = rollup.get("searches")
+            if remaining <= 0 or not isinstance(searches, int) or searches <= 0:
+                break
+            # A month with more searches than the window has left counts in proportion.
+            share = min(remaining / searches, 1.0)
+            remaining -= searches
+            for key, uses in (rollup.get("ingredient_counts") or {}).items():
+                if isinstance(uses, int):
+                    counts[key] = counts.get(key, 0) + uses * share
         # top-N ingredients
         suggestions = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:10]
         return Response({"suggestions": [name for name, _ in suggestions]}, status=status.HTTP_200_OK)
@@ -286,3 +542,38 @@ class LogoutView(APIView):
 
     def post(self, _request):
         return Response({"status": "ok"}, status=status.HTTP_200_OK)
+
+
+class RequestProfileListView(SupabaseProtectedAPIView):
+    """
+    Stored request profiles (see recipes/profiling.py), newest first. Admins only.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, IsAdminUserId]
+
+    def get(self, request):
+        profiles = [
+            {**profile, "download_url": reverse("recipes:request-profile", args=[profile["id"]])}
+            for profile in list_profiles()
+            if profile.get("id")
+        ]
+        return Response({"profiles": profiles}, status=status.HTTP_200_OK)
+
+
+class RequestProfileDownloadView(SupabaseProtectedAPIView):
+    """
+    One profile as collapsed stacks, ready for flamegraph.pl or speedscope. Admins only.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, IsAdminUserId]
+
+    def get(self, request, profile_id):
+        path = profile_path(profile_id)
+        if path is None:
+            return Response({"detail": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            path.open("rb"),
+            as_attachment=True,
+            filename=path.name,
+            content_type="text/plain; charset=utf-8",
+        )